@@ -0,0 +1,113 @@
+"""
+Benchmark de los codificadores de respuesta (servicios/*/app/encoding.py) con listas de EventInDB.
+
+Compara el camino por defecto de FastAPI (validar con el response_model -> objetos JSON-compatibles
+-> json.dumps) con el de EncodedResponse, que codifica lo que devuelve el endpoint sin volver a
+validarlo (to_jsonable_python -> JSON rápido, orjson, o MessagePack), midiendo codificaciones por
+segundo y tamaño.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_encoders.py
+    python benchmarks/bench_encoders.py --tamanos 10 100 1000 --segundos 1
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List
+from uuid import uuid4
+import argparse
+import json
+import random
+import sys
+import time
+
+# Los modelos y codificadores viven en el paquete 'app' del servicio de eventos
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "servicios" / "event_service"))
+
+from pydantic import TypeAdapter  # noqa: E402
+from pydantic_core import to_jsonable_python  # noqa: E402
+
+from app.model.event_model import EventInDB  # noqa: E402
+from app.encoding import CODIFICADORES, JSON, MSGPACK  # noqa: E402
+
+LISTA_EVENTOS = TypeAdapter(List[EventInDB])
+
+
+def generar_eventos(n: int, semilla: int = 42) -> List[EventInDB]:
+    """Genera 'n' eventos sintéticos (deterministas para una misma semilla)."""
+    rnd = random.Random(semilla)
+    inicio = datetime(2025, 1, 1)
+    return [
+        EventInDB.model_validate({
+            "_id": uuid4(),
+            "idCalendario": uuid4(),
+            "titulo": f"Evento {i}",
+            "horaComienzo": inicio + timedelta(hours=rnd.randint(0, 24 * 365)),
+            "duracionMinutos": rnd.randint(15, 240),
+            "lugar": rnd.choice(["Parque Central", "Auditorio", "Plaza Mayor", "Teatro Cervantes"]),
+            "organizador": rnd.choice(["Concejalía de Cultura", "Ayuntamiento Central", "Asociación Vecinal"]),
+            "contenidoAdjunto": {
+                "imagenes": [f"https://ejemplo.com/{i}.jpg"],
+                "archivos": [],
+                "mapa": {"latitud": 36.7 + rnd.random() / 10, "longitud": -4.4 - rnd.random() / 10},
+            },
+            "version": rnd.randint(1, 5),
+            "fechaActualizacion": inicio,
+        })
+        for i in range(n)
+    ]
+
+
+def _response_model(eventos: List[EventInDB]):
+    """Lo que hace FastAPI con el response_model antes de renderizar la respuesta: validar y serializar."""
+    return LISTA_EVENTOS.dump_python(LISTA_EVENTOS.validate_python(eventos, from_attributes=True), mode="json", by_alias=True)
+
+
+def _a_primitivos(eventos: List[EventInDB]):
+    """Lo que hace EncodedResponse antes de codificar (sin volver a validar)."""
+    return to_jsonable_python(eventos, by_alias=True)
+
+
+def codificadores() -> dict:
+    resultado = {
+        "fastapi (response_model)": lambda eventos: json.dumps(
+            _response_model(eventos), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8"),
+        "json rápido (EncodedResponse)": lambda eventos: CODIFICADORES[JSON][0](_a_primitivos(eventos)),
+        "pydantic dump_json (referencia)": lambda eventos: LISTA_EVENTOS.dump_json(eventos, by_alias=True),
+    }
+    if MSGPACK in CODIFICADORES:
+        resultado["msgpack (EncodedResponse)"] = lambda eventos: CODIFICADORES[MSGPACK][0](_a_primitivos(eventos))
+    return resultado
+
+
+def medir(codificar: Callable, eventos: List[EventInDB], segundos: float) -> tuple:
+    """Devuelve (codificaciones por segundo, bytes de la carga)."""
+    carga = codificar(eventos)  # Calentamiento
+    repeticiones = 0
+    inicio = time.perf_counter()
+    fin = inicio + segundos
+    while time.perf_counter() < fin:
+        codificar(eventos)
+        repeticiones += 1
+    return repeticiones / (time.perf_counter() - inicio), len(carga)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10, 100, 1000], help="Eventos por lista")
+    parser.add_argument("--segundos", type=float, default=1.0, help="Duración de cada medición")
+    args = parser.parse_args()
+
+    print(f"{'codificador':<34}{'eventos':>8}{'ops/s':>12}{'eventos/s':>14}{'bytes':>11}{'vs json':>9}")
+    for n in args.tamanos:
+        eventos = generar_eventos(n)
+        base = None
+        for nombre, codificar in codificadores().items():
+            ops, tamano = medir(codificar, eventos, args.segundos)
+            base = base or tamano
+            print(f"{nombre:<34}{n:>8}{ops:>12.1f}{ops * n:>14.0f}{tamano:>11}{tamano / base:>9.2f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark de la importación masiva de eventos (ImportService del servicio de eventos).
+
+Genera un CSV sintético en trozos (nunca entero en memoria) y lo importa con ImportService:
+validación con EventCreate, insert_many por lotes, outbox y agregados. Mide eventos por segundo.
+Contra MongoDB usa la configuración del servicio (MONGO_URI...); sin MongoDB:
+
+Uso (desde la raíz del repositorio):
+    STORAGE_BACKEND=memory python benchmarks/bench_import.py
+    STORAGE_BACKEND=memory python benchmarks/bench_import.py --eventos 50000 --lote 2000
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+# El servicio vive en el paquete 'app' del servicio de eventos
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "servicios" / "event_service"))
+
+from app.dependencies import get_import_service  # noqa: E402
+from app.model.import_models import ImportCreate  # noqa: E402
+from app.service import importService  # noqa: E402
+
+CABECERA = "idCalendario,titulo,horaComienzo,duracionMinutos,lugar,organizador,latitud,longitud\n"
+
+
+async def generar_csv(n: int, filas_por_trozo: int = 2000, semilla: int = 42):
+    """Produce 'n' filas de CSV en trozos de bytes, como llegarían en el cuerpo de la petición."""
+    rnd = random.Random(semilla)
+    calendarios = [uuid4() for _ in range(20)]
+    inicio = datetime(2025, 1, 1)
+    yield CABECERA.encode()
+    for desde in range(0, n, filas_por_trozo):
+        filas = [
+            f"{rnd.choice(calendarios)},Evento {i},"
+            f"{(inicio + timedelta(hours=rnd.randint(0, 24 * 365))).isoformat()},{rnd.randint(15, 240)},"
+            f"\"{rnd.choice(['Parque Central', 'Auditorio', 'Plaza Mayor, 1'])}\",Ayuntamiento,"
+            f"{36.7 + rnd.random() / 10:.5f},{-4.4 - rnd.random() / 10:.5f}\n"
+            for i in range(desde, min(desde + filas_por_trozo, n))
+        ]
+        yield "".join(filas).encode()
+
+
+async def importar(n: int) -> tuple:
+    service = get_import_service()
+    job = await service.create_import(ImportCreate(formato="csv", nombre="bench.csv"))
+    inicio = time.perf_counter()
+    job = await service.run(job.id, generar_csv(n))
+    return job, time.perf_counter() - inicio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eventos", type=int, default=20000, help="Filas del CSV")
+    parser.add_argument("--lote", type=int, default=importService.IMPORT_BATCH_SIZE, help="Filas por insert_many")
+    args = parser.parse_args()
+    importService.IMPORT_BATCH_SIZE = args.lote
+
+    job, segundos = asyncio.run(importar(args.eventos))
+    print(f"{'eventos':>8}{'lote':>7}{'insertados':>12}{'rechazados':>12}{'segundos':>10}{'eventos/s':>12}")
+    print(f"{args.eventos:>8}{args.lote:>7}{job.insertadas:>12}{job.rechazadas:>12}{segundos:>10.2f}{job.insertadas / segundos:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
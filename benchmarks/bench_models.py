@@ -0,0 +1,228 @@
+"""
+Micro-benchmark de los modelos Pydantic en los caminos calientes de los servicios.
+
+Para EventInDB, CalendarInDB y CommentInDB mide, por documento:
+- validar:      Model.model_validate(dict de Mongo)            (cada lectura del CRUD)
+- volcar:       model_dump(by_alias=True)                       (cada escritura del servicio)
+- a primitivos: TypeAdapter(List[Model]).dump_python(mode=json)  (response_model de FastAPI)
+- json:         primitivos -> codificador JSON de EncodedResponse
+- dump_json:    TypeAdapter(List[Model]).dump_json (referencia, todo en pydantic-core)
+
+Además del tiempo por documento registra con tracemalloc el pico de memoria y los
+bytes que quedan retenidos por documento (el tamaño de los objetos resultantes).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_models.py
+    python benchmarks/bench_models.py --tamanos 1 100 1000 --adjuntos 10 --guardar base.json
+    python benchmarks/bench_models.py --comparar base.json
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from uuid import UUID
+import argparse
+import gc
+import importlib.util
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from pydantic import TypeAdapter
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def _cargar(nombre: str, ruta: Path):
+    """
+    Carga un módulo por su ruta. Los tres servicios se llaman 'app', así que sus modelos
+    (que solo dependen de pydantic) se importan como módulos sueltos con nombres distintos.
+    """
+    spec = importlib.util.spec_from_file_location(nombre, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+event_model = _cargar("bench_event_model", RAIZ / "servicios" / "event_service" / "app" / "model" / "event_model.py")
+calendar_models = _cargar("bench_calendar_models", RAIZ / "servicios" / "calendar_service" / "app" / "model" / "calendar_models.py")
+comment_models = _cargar("bench_comment_models", RAIZ / "servicios" / "comment_service" / "app" / "model" / "comment_models.py")
+encoding = _cargar("bench_encoding", RAIZ / "servicios" / "event_service" / "app" / "encoding.py")
+
+codificar_json = encoding.CODIFICADORES[encoding.JSON][0]
+
+INICIO = datetime(2025, 1, 1)
+
+
+# --- Documentos tal y como los devuelve MongoDB ---
+
+def _uuid(rnd: random.Random) -> UUID:
+    return UUID(int=rnd.getrandbits(128), version=4)
+
+
+def documento_evento(rnd: random.Random, adjuntos: int) -> dict:
+    hora = INICIO + timedelta(minutes=rnd.randrange(365 * 24 * 60))
+    latitud, longitud = 36.7 + rnd.random() / 10, -4.4 - rnd.random() / 10
+    return {
+        "_id": _uuid(rnd),
+        "idCalendario": _uuid(rnd),
+        "titulo": f"Concierto de Verano {rnd.randint(0, 10**6)}",
+        "horaComienzo": hora,
+        "duracionMinutos": rnd.randint(15, 240),
+        "lugar": rnd.choice(["Parque Central", "Auditorio", "Plaza Mayor", "Teatro Cervantes"]),
+        "organizador": rnd.choice(["Concejalía de Cultura", "Ayuntamiento Central", "Asociación Vecinal"]),
+        "contenidoAdjunto": {
+            "imagenes": [f"https://ejemplo.com/eventos/{rnd.getrandbits(32):08x}/imagen-{i}.jpg" for i in range(adjuntos)],
+            "archivos": [f"https://ejemplo.com/eventos/{rnd.getrandbits(32):08x}/programa-{i}.pdf" for i in range(adjuntos // 2)],
+            "mapa": {"latitud": latitud, "longitud": longitud},
+        },
+        # Campos que solo existen en Mongo (se ignoran al validar)
+        "ubicacion": {"type": "Point", "coordinates": [longitud, latitud]},
+        "version": rnd.randint(1, 5),
+        "fechaActualizacion": hora - timedelta(days=rnd.randint(1, 30)),
+    }
+
+
+def documento_calendario(rnd: random.Random, adjuntos: int) -> dict:
+    return {
+        "_id": _uuid(rnd),
+        "titulo": f"Eventos Culturales {rnd.randint(0, 10**6)}",
+        "organizador": rnd.choice(["Ayuntamiento Central", "Concejalía de Deportes"]),
+        "palabras_clave": rnd.sample(["cultura", "ciudad", "deporte", "música", "infantil", "teatro"], 3),
+        "es_publico": rnd.random() < 0.8,
+        "idCalendarioPadre": _uuid(rnd) if rnd.random() < 0.5 else None,
+        "version": rnd.randint(1, 5),
+        "fechaActualizacion": INICIO + timedelta(minutes=rnd.randrange(365 * 24 * 60)),
+    }
+
+
+def documento_comentario(rnd: random.Random, adjuntos: int) -> dict:
+    fecha = INICIO + timedelta(minutes=rnd.randrange(365 * 24 * 60))
+    return {
+        "_id": _uuid(rnd),
+        "contenido": "Excelente evento, muy recomendable. " * rnd.randint(1, 4),
+        "idCalendario": None,
+        "idEvento": _uuid(rnd),
+        "fechaCreacion": fecha,
+        "version": rnd.randint(1, 5),
+        "fechaActualizacion": fecha,
+    }
+
+
+MODELOS = {
+    "EventInDB": (event_model.EventInDB, documento_evento),
+    "CalendarInDB": (calendar_models.CalendarInDB, documento_calendario),
+    "CommentInDB": (comment_models.CommentInDB, documento_comentario),
+}
+
+
+def operaciones(modelo) -> Dict[str, Callable[[List[dict], List[Any]], Any]]:
+    """Cada operación recibe (documentos de Mongo, instancias ya validadas) y procesa la lista entera."""
+    lista = TypeAdapter(List[modelo])
+    return {
+        "validar": lambda docs, objs: [modelo.model_validate(doc) for doc in docs],
+        "volcar": lambda docs, objs: [obj.model_dump(by_alias=True) for obj in objs],
+        "a primitivos": lambda docs, objs: lista.dump_python(objs, mode="json", by_alias=True),
+        "json": lambda docs, objs: codificar_json(lista.dump_python(objs, mode="json", by_alias=True)),
+        "dump_json": lambda docs, objs: lista.dump_json(objs, by_alias=True),
+    }
+
+
+def medir_tiempo(operacion: Callable, docs: List[dict], objs: List[Any], segundos: float) -> float:
+    """Microsegundos por documento (media de todas las repeticiones durante 'segundos')."""
+    operacion(docs, objs)  # Calentamiento
+    repeticiones = 0
+    inicio = time.perf_counter()
+    fin = inicio + segundos
+    while repeticiones == 0 or time.perf_counter() < fin:
+        operacion(docs, objs)
+        repeticiones += 1
+    return (time.perf_counter() - inicio) / repeticiones / len(docs) * 1e6
+
+
+def medir_memoria(operacion: Callable, docs: List[dict], objs: List[Any]) -> tuple:
+    """(pico de memoria, memoria retenida por el resultado) en bytes por documento."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        resultado = operacion(docs, objs)
+        actual, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del resultado
+    return (pico - base) / len(docs), (actual - base) / len(docs)
+
+
+def ejecutar(args) -> List[dict]:
+    filas = []
+    for nombre, (modelo, generar) in MODELOS.items():
+        if args.modelos and nombre not in args.modelos:
+            continue
+        for n in args.tamanos:
+            rnd = random.Random(args.semilla)
+            docs = [generar(rnd, args.adjuntos) for _ in range(n)]
+            objs = [modelo.model_validate(doc) for doc in docs]
+            for operacion, funcion in operaciones(modelo).items():
+                pico, retenido = medir_memoria(funcion, docs, objs)
+                filas.append({
+                    "modelo": nombre,
+                    "documentos": n,
+                    "operacion": operacion,
+                    "us_doc": round(medir_tiempo(funcion, docs, objs, args.segundos), 3),
+                    "pico_b_doc": round(pico),
+                    "retenido_b_doc": round(retenido),
+                })
+    return filas
+
+
+def _clave(fila: dict) -> tuple:
+    return fila["modelo"], fila["documentos"], fila["operacion"]
+
+
+def imprimir(filas: List[dict], base: Dict[tuple, dict]) -> None:
+    cabecera = f"{'modelo':<14}{'docs':>6}  {'operación':<14}{'µs/doc':>10}{'docs/s':>12}{'pico B/doc':>12}{'ret. B/doc':>12}"
+    print(cabecera + (f"{'vs base':>10}" if base else ""))
+    anterior = None
+    for fila in filas:
+        if anterior and (fila["modelo"], fila["documentos"]) != anterior:
+            print()
+        anterior = fila["modelo"], fila["documentos"]
+        linea = (f"{fila['modelo']:<14}{fila['documentos']:>6}  {fila['operacion']:<14}{fila['us_doc']:>10.2f}"
+                 f"{1e6 / fila['us_doc']:>12.0f}{fila['pico_b_doc']:>12}{fila['retenido_b_doc']:>12}")
+        referencia = base.get(_clave(fila))
+        if referencia:
+            # >1 significa más lento que la línea base
+            linea += f"{fila['us_doc'] / referencia['us_doc']:>9.2f}x"
+        print(linea)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1, 10, 100, 1000], help="Documentos por lista")
+    parser.add_argument("--adjuntos", type=int, default=3, help="Imágenes por evento en contenidoAdjunto (y la mitad de archivos)")
+    parser.add_argument("--modelos", nargs="+", choices=sorted(MODELOS), help="Solo estos modelos")
+    parser.add_argument("--segundos", type=float, default=0.5, help="Duración de cada medición de tiempo")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--guardar", help="Guardar los resultados en un JSON")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior con el que comparar el tiempo por documento")
+    args = parser.parse_args()
+
+    base = {}
+    if args.comparar:
+        base = {_clave(fila): fila for fila in json.loads(Path(args.comparar).read_text())["resultados"]}
+
+    filas = ejecutar(args)
+    imprimir(filas, base)
+
+    if args.guardar:
+        Path(args.guardar).write_text(json.dumps({
+            "meta": {"fecha": datetime.utcnow().isoformat(), "python": sys.version.split()[0], "adjuntos": args.adjuntos},
+            "resultados": filas,
+        }, indent=2))
+        print(f"\nResultados guardados en {args.guardar}")
+
+
+if __name__ == "__main__":
+    main()
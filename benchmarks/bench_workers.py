@@ -0,0 +1,189 @@
+"""
+Throughput de `python -m app.serve` según el número de procesos worker.
+
+Para cada número de workers arranca el gateway o un servicio con app.serve, lo calienta y
+lo satura durante unos segundos con varios procesos generadores de carga (un único proceso
+Python no basta para saturar varios workers). Informa de peticiones por segundo, latencias
+p50/p99 y la aceleración y eficiencia frente a 1 worker.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/bench_workers.py                                  # gateway, GET /
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/bench_workers.py --servicio event --ruta "/events/"
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --conexiones 128 --guardar workers.json
+
+Los servicios usan MongoDB (MONGODB_URI, base de datos KalendasDB_Bench): con el motor en
+memoria app.serve solo arranca un worker. El gateway en GET / no toca ninguna base de datos.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+RAIZ = Path(__file__).resolve().parent.parent
+DIRECTORIOS = {
+    "gateway": RAIZ / "gateway",
+    "calendar": RAIZ / "servicios" / "calendar_service",
+    "event": RAIZ / "servicios" / "event_service",
+    "comment": RAIZ / "servicios" / "comment_service",
+}
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+# ---------------------------------------------------------------------------
+# Generador de carga (se ejecuta en cada proceso del pool)
+# ---------------------------------------------------------------------------
+
+async def _cargar(url: str, conexiones: int, segundos: float) -> tuple:
+    latencias: List[float] = []
+    errores = 0
+    fin = time.perf_counter() + segundos
+    limites = httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones)
+    async with httpx.AsyncClient(limits=limites, timeout=30.0) as cliente:
+
+        async def trabajador():
+            nonlocal errores
+            while time.perf_counter() < fin:
+                inicio = time.perf_counter()
+                try:
+                    response = await cliente.get(url)
+                    if response.status_code >= 400:
+                        errores += 1
+                except httpx.HTTPError:
+                    errores += 1
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        await asyncio.gather(*(trabajador() for _ in range(conexiones)))
+    return latencias, errores
+
+
+def generar_carga(url: str, conexiones: int, segundos: float) -> tuple:
+    return asyncio.run(_cargar(url, conexiones, segundos))
+
+
+# ---------------------------------------------------------------------------
+# Servidor
+# ---------------------------------------------------------------------------
+
+def arrancar(args, workers: int) -> subprocess.Popen:
+    entorno = {
+        **os.environ,
+        "MONGODB_DB": os.getenv("MONGODB_DB", "KalendasDB_Bench"),
+        "MONGODB_TRANSACTIONS": os.getenv("MONGODB_TRANSACTIONS", "false"),
+        "WEB_CONCURRENCY": str(workers),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(args.puerto), "--log-level", "warning"],
+        cwd=DIRECTORIOS[args.servicio], env=entorno,
+    )
+
+
+def esperar(url: str, proceso: subprocess.Popen, segundos: float = 60.0) -> None:
+    limite = time.perf_counter() + segundos
+    while time.perf_counter() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit(f"El servidor terminó al arrancar (código {proceso.returncode})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"El servidor no respondió en {segundos:.0f}s")
+
+
+def parar(proceso: subprocess.Popen) -> None:
+    proceso.terminate()  # SIGTERM: apagado ordenado de todos los workers
+    try:
+        proceso.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+def medir(args, workers: int, pool: ProcessPoolExecutor) -> dict:
+    url = f"http://127.0.0.1:{args.puerto}{args.ruta}"
+    proceso = arrancar(args, workers)
+    try:
+        esperar(url, proceso)
+        por_cliente = max(1, args.conexiones // args.clientes)
+        print(f"[{workers} workers] calentamiento: {args.calentamiento:.0f}s...", flush=True)
+        list(pool.map(generar_carga, [url] * args.clientes, [por_cliente] * args.clientes, [args.calentamiento] * args.clientes))
+        print(f"[{workers} workers] medición: {args.duracion:.0f}s con {por_cliente * args.clientes} conexiones...", flush=True)
+        inicio = time.perf_counter()
+        resultados = list(pool.map(generar_carga, [url] * args.clientes, [por_cliente] * args.clientes, [args.duracion] * args.clientes))
+        duracion = time.perf_counter() - inicio
+    finally:
+        parar(proceso)
+    latencias = sorted(l for lista, _ in resultados for l in lista)
+    return {
+        "workers": workers,
+        "peticiones": len(latencias),
+        "errores": sum(e for _, e in resultados),
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+    }
+
+
+def imprimir(filas: List[dict]) -> None:
+    base = filas[0]["rps"] / filas[0]["workers"] if filas and filas[0]["rps"] else None
+    print(f"\n{'workers':>8}{'rps':>11}{'p50 ms':>10}{'p99 ms':>10}{'errores':>9}{'aceleración':>13}{'eficiencia':>12}")
+    for fila in filas:
+        aceleracion = fila["rps"] / base if base else 0.0
+        print(f"{fila['workers']:>8}{fila['rps']:>11.1f}{fila['p50_ms']:>10.2f}{fila['p99_ms']:>10.2f}{fila['errores']:>9}"
+              f"{aceleracion:>12.2f}x{aceleracion / fila['workers']:>11.0%}")
+
+
+def main() -> None:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    por_defecto = sorted({1, *[n for n in (2, 4, 8, 16) if n <= cpus], cpus})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servicio", choices=sorted(DIRECTORIOS), default="gateway")
+    parser.add_argument("--ruta", default="/", help="Ruta GET que se satura (con su query string)")
+    parser.add_argument("--workers", type=int, nargs="+", default=por_defecto, help="Números de workers a medir")
+    parser.add_argument("--conexiones", type=int, default=64, help="Conexiones concurrentes en total")
+    parser.add_argument("--clientes", type=int, default=max(1, cpus // 2), help="Procesos generadores de carga")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de medición por número de workers")
+    parser.add_argument("--calentamiento", type=float, default=2.0)
+    parser.add_argument("--puerto", type=int, default=8090)
+    parser.add_argument("--guardar", help="Guardar los resultados en un JSON")
+    args = parser.parse_args()
+
+    if args.servicio != "gateway" and not os.getenv("MONGODB_URI"):
+        raise SystemExit("Los servicios necesitan MONGODB_URI (p.ej. mongodb://localhost:27017)")
+    if cpus < max(args.workers) + args.clientes:
+        print(f"Aviso: {cpus} núcleos para {max(args.workers)} workers y {args.clientes} generadores: "
+              "servidor y carga compiten por la CPU y la aceleración medida será menor.", flush=True)
+
+    with ProcessPoolExecutor(max_workers=args.clientes) as pool:
+        filas = [medir(args, workers, pool) for workers in args.workers]
+    imprimir(filas)
+
+    if args.guardar:
+        Path(args.guardar).write_text(json.dumps({
+            "meta": {"fecha": datetime.utcnow().isoformat(), "servicio": args.servicio, "ruta": args.ruta,
+                     "cpus": cpus, "conexiones": args.conexiones, "clientes": args.clientes},
+            "resultados": filas,
+        }, indent=2))
+        print(f"\nResultados guardados en {args.guardar}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+"""
+Banco de pruebas de carga extremo a extremo del gateway y de los tres servicios.
+
+1. (Opcional, --lanzar) arranca los servicios y el gateway con uvicorn en puertos locales,
+   contra la MongoDB de MONGODB_URI y la base de datos MONGODB_DB (por defecto KalendasDB_Bench).
+2. Siembra datos a través de la API: calendarios (con subcalendarios), eventos y comentarios.
+3. Lanza una mezcla ponderada de peticiones contra cada ruta, directamente a los servicios
+   y/o a través del gateway, con la concurrencia indicada.
+4. Informa por ruta de peticiones, errores, throughput y latencias p50/p95/p99, y puede
+   guardar el resultado como línea base JSON o compararlo con otra y marcar regresiones.
+
+Ejemplos (desde la raíz del repositorio):
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/load_test.py --lanzar --guardar base.json
+    python benchmarks/load_test.py --lanzar --comparar base.json --umbral 0.15
+    python benchmarks/load_test.py --lanzar --memoria --duracion 10
+    python benchmarks/load_test.py --objetivo gateway --mezcla lectura --concurrencia 64 --duracion 60
+    python benchmarks/load_test.py --solo "events" --peso "GET /events/{id}=10"
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Puertos locales por defecto (los mismos que publica docker-compose)
+PUERTOS = {"gateway": 8000, "calendar": 8001, "event": 8002, "comment": 8003}
+# Prefijo con el que el gateway reenvía a cada servicio
+PREFIJO_GATEWAY = {"calendar": "/calendar", "event": "/event", "comment": "/comment"}
+
+ORGANIZADORES = ["Concejalía de Cultura", "Ayuntamiento Central", "Asociación Vecinal", "Club Deportivo"]
+LUGARES = ["Parque Central", "Auditorio", "Plaza Mayor", "Teatro Cervantes", "Polideportivo"]
+
+
+# ---------------------------------------------------------------------------
+# Datos sembrados (los IDs que usan las peticiones)
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Datos:
+    calendarios: List[str] = field(default_factory=list)
+    eventos: List[str] = field(default_factory=list)
+    comentarios: List[str] = field(default_factory=list)
+    # Entidades creadas solo para ser eliminadas por las rutas DELETE
+    desechables: Dict[str, List[str]] = field(default_factory=lambda: {"calendar": [], "event": [], "comment": []})
+
+
+def _calendario(rnd: random.Random, padre: Optional[str] = None) -> dict:
+    return {
+        "titulo": f"Calendario {rnd.randint(0, 10**6)}",
+        "organizador": rnd.choice(ORGANIZADORES),
+        "palabras_clave": rnd.sample(["cultura", "deporte", "musica", "ciudad", "infantil"], 2),
+        "es_publico": rnd.random() < 0.8,
+        "idCalendarioPadre": padre,
+    }
+
+
+def _evento(rnd: random.Random, calendario: str) -> dict:
+    return {
+        "idCalendario": calendario,
+        "titulo": f"Evento {rnd.randint(0, 10**6)}",
+        "horaComienzo": (datetime(2025, 1, 1) + timedelta(hours=rnd.randint(0, 24 * 365))).isoformat(),
+        "duracionMinutos": rnd.randint(15, 240),
+        "lugar": rnd.choice(LUGARES),
+        "organizador": rnd.choice(ORGANIZADORES),
+        "contenidoAdjunto": {
+            "imagenes": [],
+            "archivos": [],
+            "mapa": {"latitud": 36.70 + rnd.random() / 10, "longitud": -4.40 - rnd.random() / 10},
+        },
+    }
+
+
+def _comentario(rnd: random.Random, evento: Optional[str] = None, calendario: Optional[str] = None) -> dict:
+    return {"contenido": f"Comentario {rnd.randint(0, 10**6)}", "idEvento": evento, "idCalendario": calendario}
+
+
+async def _crear_todos(cliente: httpx.AsyncClient, url: str, cuerpos: List[dict], concurrencia: int) -> List[str]:
+    """Crea las entidades con POST (con concurrencia acotada) y devuelve sus IDs en orden."""
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def crear(cuerpo: dict) -> str:
+        async with semaforo:
+            response = await cliente.post(url, json=cuerpo)
+            response.raise_for_status()
+            return response.json()["_id"]
+
+    return await asyncio.gather(*(crear(cuerpo) for cuerpo in cuerpos))
+
+
+async def sembrar(urls: Dict[str, str], args, rnd: random.Random) -> Datos:
+    """Siembra los volúmenes pedidos a través de la API de cada servicio."""
+    datos = Datos()
+    inicio = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60.0) as cliente:
+        raices = await _crear_todos(
+            cliente, f"{urls['calendar']}/calendars/", [_calendario(rnd) for _ in range(args.calendarios)], args.concurrencia
+        )
+        # Una parte de los calendarios cuelga de otro (jerarquía de un nivel)
+        hijos = await _crear_todos(
+            cliente, f"{urls['calendar']}/calendars/",
+            [_calendario(rnd, rnd.choice(raices)) for _ in range(int(args.calendarios * args.subcalendarios))],
+            args.concurrencia,
+        )
+        datos.calendarios = raices + hijos
+
+        datos.eventos = await _crear_todos(
+            cliente, f"{urls['event']}/events/",
+            [_evento(rnd, calendario) for calendario in datos.calendarios for _ in range(args.eventos_por_calendario)],
+            args.concurrencia,
+        )
+        cuerpos = [_comentario(rnd, evento=evento) for evento in datos.eventos for _ in range(args.comentarios_por_evento)]
+        cuerpos += [_comentario(rnd, calendario=calendario) for calendario in datos.calendarios]
+        datos.comentarios = await _crear_todos(cliente, f"{urls['comment']}/comments/", cuerpos, args.concurrencia)
+
+        datos.desechables["calendar"] = await _crear_todos(
+            cliente, f"{urls['calendar']}/calendars/", [_calendario(rnd) for _ in range(args.desechables)], args.concurrencia
+        )
+        datos.desechables["event"] = await _crear_todos(
+            cliente, f"{urls['event']}/events/",
+            [_evento(rnd, rnd.choice(datos.calendarios)) for _ in range(args.desechables)], args.concurrencia
+        )
+        datos.desechables["comment"] = await _crear_todos(
+            cliente, f"{urls['comment']}/comments/",
+            [_comentario(rnd, evento=rnd.choice(datos.eventos)) for _ in range(args.desechables)], args.concurrencia
+        )
+
+    total = len(datos.calendarios) + len(datos.eventos) + len(datos.comentarios) + 3 * args.desechables
+    duracion = time.perf_counter() - inicio
+    print(f"Sembrados {len(datos.calendarios)} calendarios, {len(datos.eventos)} eventos y "
+          f"{len(datos.comentarios)} comentarios en {duracion:.1f}s ({total / duracion:.0f} docs/s)")
+    return datos
+
+
+# ---------------------------------------------------------------------------
+# Rutas y mezcla de peticiones
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Peticion:
+    metodo: str
+    ruta: str
+    params: Optional[dict] = None
+    json: Optional[dict] = None
+
+
+@dataclass
+class Ruta:
+    nombre: str                     # Plantilla legible, p.ej. "GET /events/{id}"
+    servicio: str                   # calendar | event | comment
+    peso: float                     # Peso en la mezcla por defecto
+    construir: Callable[[Datos, random.Random], Optional[Peticion]]
+    escritura: bool = False
+
+
+def _desechable(servicio: str, plantilla: str) -> Callable[[Datos, random.Random], Optional[Peticion]]:
+    def construir(datos: Datos, rnd: random.Random) -> Optional[Peticion]:
+        if not datos.desechables[servicio]:
+            return None  # Agotados: la ruta deja de ejecutarse
+        return Peticion("DELETE", plantilla.format(id=datos.desechables[servicio].pop()))
+    return construir
+
+
+def _rango_fechas(rnd: random.Random) -> dict:
+    inicio = datetime(2025, 1, 1) + timedelta(days=rnd.randint(0, 330))
+    return {"fecha_inicio": inicio.isoformat(), "fecha_fin": (inicio + timedelta(days=30)).isoformat()}
+
+
+RUTAS: List[Ruta] = [
+    # Calendarios
+    Ruta("POST /calendars/", "calendar", 2, lambda d, r: Peticion("POST", "/calendars/", json=_calendario(r)), True),
+    Ruta("GET /calendars/", "calendar", 3, lambda d, r: Peticion("GET", "/calendars/", params={"organizador": r.choice(ORGANIZADORES)})),
+    Ruta("GET /calendars/lookup", "calendar", 2, lambda d, r: Peticion("GET", "/calendars/lookup", params={"ids": r.sample(d.calendarios, min(10, len(d.calendarios)))})),
+    Ruta("POST /calendars/lookup", "calendar", 1, lambda d, r: Peticion("POST", "/calendars/lookup", json={"ids": r.sample(d.calendarios, min(50, len(d.calendarios)))})),
+    Ruta("GET /calendars/{id}", "calendar", 10, lambda d, r: Peticion("GET", f"/calendars/{r.choice(d.calendarios)}")),
+    Ruta("PUT /calendars/{id}", "calendar", 1, lambda d, r: Peticion("PUT", f"/calendars/{r.choice(d.calendarios)}", json=_calendario(r)), True),
+    Ruta("DELETE /calendars/{id}", "calendar", 0.2, _desechable("calendar", "/calendars/{id}"), True),
+    Ruta("GET /calendars/{id}/subcalendars", "calendar", 3, lambda d, r: Peticion("GET", f"/calendars/{r.choice(d.calendarios)}/subcalendars")),
+    Ruta("GET /deletion-jobs/", "calendar", 0.5, lambda d, r: Peticion("GET", "/deletion-jobs/", params={"limite": 20})),
+    Ruta("GET /changes/ (calendarios)", "calendar", 1, lambda d, r: Peticion("GET", "/changes/", params={"since": "0", "limite": 100})),
+    Ruta("GET /metrics/cache (calendarios)", "calendar", 0.2, lambda d, r: Peticion("GET", "/metrics/cache")),
+    # Eventos
+    Ruta("POST /events/", "event", 3, lambda d, r: Peticion("POST", "/events/", json=_evento(r, r.choice(d.calendarios))), True),
+    Ruta("GET /events/", "event", 4, lambda d, r: Peticion("GET", "/events/", params={**_rango_fechas(r), "lugar": r.choice(LUGARES)})),
+    Ruta("GET /events/near", "event", 3, lambda d, r: Peticion("GET", "/events/near", params={"lat": 36.75, "lon": -4.45, "radius": r.choice([500, 2000, 5000]), "limite": 50})),
+    Ruta("GET /events/bbox", "event", 2, lambda d, r: Peticion("GET", "/events/bbox", params={"lat_min": 36.70, "lon_min": -4.50, "lat_max": 36.75, "lon_max": -4.45, "limite": 100})),
+    Ruta("GET /events/lookup", "event", 2, lambda d, r: Peticion("GET", "/events/lookup", params={"ids": r.sample(d.eventos, min(20, len(d.eventos)))})),
+    Ruta("POST /events/lookup", "event", 1, lambda d, r: Peticion("POST", "/events/lookup", json={"ids": r.sample(d.eventos, min(100, len(d.eventos)))})),
+    Ruta("GET /events/{id}", "event", 12, lambda d, r: Peticion("GET", f"/events/{r.choice(d.eventos)}")),
+    Ruta("PUT /events/{id}", "event", 2, lambda d, r: Peticion("PUT", f"/events/{r.choice(d.eventos)}", json=_evento(r, r.choice(d.calendarios))), True),
+    Ruta("DELETE /events/{id}", "event", 0.5, _desechable("event", "/events/{id}"), True),
+    Ruta("POST /events/ids", "event", 1, lambda d, r: Peticion("POST", "/events/ids", json={"idsCalendario": r.sample(d.calendarios, min(5, len(d.calendarios))), "limite": 500})),
+    Ruta("GET /events/calendar/{calendar_id}", "event", 3, lambda d, r: Peticion("GET", f"/events/calendar/{r.choice(d.calendarios)}")),
+    Ruta("GET /stats/calendars/{calendar_id}/events-per-month", "event", 1, lambda d, r: Peticion("GET", f"/stats/calendars/{r.choice(d.calendarios)}/events-per-month")),
+    Ruta("GET /stats/organizers/minutes", "event", 1, lambda d, r: Peticion("GET", "/stats/organizers/minutes")),
+    Ruta("GET /changes/ (eventos)", "event", 1, lambda d, r: Peticion("GET", "/changes/", params={"since": "0", "limite": 100})),
+    Ruta("GET /metrics/cache (eventos)", "event", 0.2, lambda d, r: Peticion("GET", "/metrics/cache")),
+    # Comentarios
+    Ruta("POST /comments/", "comment", 4, lambda d, r: Peticion("POST", "/comments/", json=_comentario(r, evento=r.choice(d.eventos))), True),
+    Ruta("GET /comments/", "comment", 2, lambda d, r: Peticion("GET", "/comments/", params={"idEvento": r.choice(d.eventos)})),
+    Ruta("GET /comments/event/{id_evento}", "comment", 8, lambda d, r: Peticion("GET", f"/comments/event/{r.choice(d.eventos)}", params={"limite": 20})),
+    Ruta("GET /comments/calendar/{id_calendario}", "comment", 3, lambda d, r: Peticion("GET", f"/comments/calendar/{r.choice(d.calendarios)}", params={"limite": 20})),
+    Ruta("GET /comments/lookup", "comment", 1, lambda d, r: Peticion("GET", "/comments/lookup", params={"ids": r.sample(d.comentarios, min(20, len(d.comentarios)))})),
+    Ruta("POST /comments/lookup", "comment", 1, lambda d, r: Peticion("POST", "/comments/lookup", json={"ids": r.sample(d.comentarios, min(100, len(d.comentarios)))})),
+    Ruta("GET /comments/{id}", "comment", 6, lambda d, r: Peticion("GET", f"/comments/{r.choice(d.comentarios)}")),
+    Ruta("PUT /comments/{id}", "comment", 1, lambda d, r: Peticion("PUT", f"/comments/{r.choice(d.comentarios)}", json={"contenido": f"Editado {r.randint(0, 10**6)}", "idEvento": r.choice(d.eventos)}), True),
+    Ruta("DELETE /comments/{id}", "comment", 0.5, _desechable("comment", "/comments/{id}"), True),
+    Ruta("GET /stats/calendars/{calendar_id}/comments", "comment", 1, lambda d, r: Peticion("GET", f"/stats/calendars/{r.choice(d.calendarios)}/comments")),
+    Ruta("GET /stats/events/{event_id}/comments", "comment", 1, lambda d, r: Peticion("GET", f"/stats/events/{r.choice(d.eventos)}/comments")),
+    Ruta("GET /changes/ (comentarios)", "comment", 1, lambda d, r: Peticion("GET", "/changes/", params={"since": "0", "limite": 100})),
+    Ruta("GET /metrics/cache (comentarios)", "comment", 0.2, lambda d, r: Peticion("GET", "/metrics/cache")),
+]
+
+# Multiplicador del peso de las rutas de escritura según la mezcla elegida
+MEZCLAS = {"lectura": 0.0, "mixta": 1.0, "escritura": 5.0}
+
+
+def pesos_efectivos(args) -> Dict[str, float]:
+    """Peso de cada ruta tras aplicar la mezcla, el filtro --solo y las sustituciones --peso."""
+    sustituciones = {}
+    for item in args.peso:
+        nombre, _, valor = item.rpartition("=")
+        sustituciones[nombre.strip()] = float(valor)
+
+    pesos = {}
+    for ruta in RUTAS:
+        peso = ruta.peso * (MEZCLAS[args.mezcla] if ruta.escritura else 1.0)
+        if args.solo and not re.search(args.solo, ruta.nombre):
+            peso = 0.0
+        pesos[ruta.nombre] = sustituciones.get(ruta.nombre, peso)
+    return pesos
+
+
+# ---------------------------------------------------------------------------
+# Ejecución de la carga y estadísticas
+# ---------------------------------------------------------------------------
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def resumir(latencias: Dict[str, List[float]], errores: Dict[str, int], duracion: float) -> Dict[str, dict]:
+    resumen = {}
+    for nombre, valores in sorted(latencias.items()):
+        valores.sort()
+        resumen[nombre] = {
+            "peticiones": len(valores),
+            "errores": errores.get(nombre, 0),
+            "rps": round(len(valores) / duracion, 2) if duracion else 0.0,
+            "media_ms": round(sum(valores) / len(valores), 3) if valores else 0.0,
+            "p50_ms": round(percentil(valores, 50), 3),
+            "p95_ms": round(percentil(valores, 95), 3),
+            "p99_ms": round(percentil(valores, 99), 3),
+        }
+    return resumen
+
+
+async def ejecutar_carga(base_url: str, prefijos: Dict[str, str], datos: Datos, args, rnd: random.Random, etiqueta: str) -> Dict[str, dict]:
+    """Lanza 'concurrencia' trabajadores que eligen rutas según su peso durante 'duracion' segundos."""
+    pesos = pesos_efectivos(args)
+    rutas = [ruta for ruta in RUTAS if pesos[ruta.nombre] > 0]
+    if not rutas:
+        raise SystemExit("La mezcla no contiene ninguna ruta (revise --solo/--peso/--mezcla)")
+    pesos_rutas = [pesos[ruta.nombre] for ruta in rutas]
+
+    latencias: Dict[str, List[float]] = {}
+    duracion = 0.0
+    errores: Dict[str, int] = {}
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limites) as cliente:
+        async def trabajador(semilla: int, hasta: float, medir: bool) -> None:
+            rnd_local = random.Random(semilla)
+            while time.perf_counter() < hasta:
+                ruta = rnd_local.choices(rutas, weights=pesos_rutas)[0]
+                peticion = ruta.construir(datos, rnd_local)
+                if peticion is None:
+                    continue
+                inicio = time.perf_counter()
+                try:
+                    response = await cliente.request(
+                        peticion.metodo, prefijos[ruta.servicio] + peticion.ruta,
+                        params=peticion.params, json=peticion.json,
+                    )
+                    fallo = response.status_code >= 400
+                except httpx.HTTPError:
+                    fallo = True
+                transcurrido = (time.perf_counter() - inicio) * 1000
+                if medir:
+                    latencias.setdefault(ruta.nombre, []).append(transcurrido)
+                    if fallo:
+                        errores[ruta.nombre] = errores.get(ruta.nombre, 0) + 1
+
+        for fase, segundos, medir in (("calentamiento", args.calentamiento, False), ("medición", args.duracion, True)):
+            if segundos <= 0:
+                continue
+            print(f"[{etiqueta}] {fase}: {segundos}s con {args.concurrencia} clientes concurrentes...")
+            hasta = time.perf_counter() + segundos
+            inicio = time.perf_counter()
+            await asyncio.gather(*(trabajador(rnd.randrange(2**32), hasta, medir) for _ in range(args.concurrencia)))
+            duracion = time.perf_counter() - inicio
+
+    return resumir(latencias, errores, duracion)
+
+
+def imprimir(resultados: Dict[str, Dict[str, dict]]) -> None:
+    for objetivo, rutas in resultados.items():
+        print(f"\n== {objetivo} ==")
+        print(f"{'ruta':<52}{'peticiones':>11}{'errores':>9}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for nombre, r in rutas.items():
+            print(f"{nombre:<52}{r['peticiones']:>11}{r['errores']:>9}{r['rps']:>10.1f}"
+                  f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+        total = sum(r["peticiones"] for r in rutas.values())
+        print(f"{'TOTAL':<52}{total:>11}{sum(r['errores'] for r in rutas.values()):>9}"
+              f"{sum(r['rps'] for r in rutas.values()):>10.1f}")
+
+
+def comparar(actual: dict, base: dict, umbral: float, minimo_ms: float) -> List[str]:
+    """
+    Compara con una línea base y devuelve las regresiones: p95/p99 que empeoran más del umbral
+    (y más de 'minimo_ms', para ignorar el ruido) o throughput que cae más del umbral.
+    """
+    regresiones = []
+    for objetivo, rutas in actual["resultados"].items():
+        for nombre, r in rutas.items():
+            b = base.get("resultados", {}).get(objetivo, {}).get(nombre)
+            if not b:
+                continue
+            for metrica in ("p95_ms", "p99_ms"):
+                if r[metrica] > b[metrica] * (1 + umbral) and r[metrica] - b[metrica] > minimo_ms:
+                    regresiones.append(f"{objetivo} {nombre}: {metrica} {b[metrica]:.2f} -> {r[metrica]:.2f}")
+            if r["rps"] < b["rps"] * (1 - umbral):
+                regresiones.append(f"{objetivo} {nombre}: rps {b['rps']:.1f} -> {r['rps']:.1f}")
+            if r["errores"] > b["errores"]:
+                regresiones.append(f"{objetivo} {nombre}: errores {b['errores']} -> {r['errores']}")
+    return regresiones
+
+
+# ---------------------------------------------------------------------------
+# Arranque local de los servicios
+# ---------------------------------------------------------------------------
+
+def lanzar_servicios(args) -> List[subprocess.Popen]:
+    """Arranca los tres servicios y el gateway con uvicorn en los puertos locales."""
+    if not args.memoria and not os.getenv("MONGODB_URI"):
+        raise SystemExit("--lanzar necesita MONGODB_URI (p.ej. mongodb://localhost:27017) o --memoria")
+    entorno = {
+        **os.environ,
+        # Con --memoria cada servicio guarda sus datos en su propio proceso (sin MongoDB)
+        "STORAGE_BACKEND": "memory" if args.memoria else os.getenv("STORAGE_BACKEND", "mongo"),
+        "MONGODB_DB": os.getenv("MONGODB_DB", "KalendasDB_Bench"),
+        # Una MongoDB local suele ser standalone: sin transacciones salvo que se indique
+        "MONGODB_TRANSACTIONS": os.getenv("MONGODB_TRANSACTIONS", "false"),
+        "CALENDAR_SERVICE_URL": f"http://127.0.0.1:{PUERTOS['calendar']}",
+        "EVENT_SERVICE_URL": f"http://127.0.0.1:{PUERTOS['event']}",
+        "COMMENT_SERVICE_URL": f"http://127.0.0.1:{PUERTOS['comment']}",
+    }
+    directorios = {
+        "calendar": RAIZ / "servicios" / "calendar_service",
+        "event": RAIZ / "servicios" / "event_service",
+        "comment": RAIZ / "servicios" / "comment_service",
+        "gateway": RAIZ / "gateway",
+    }
+    procesos = []
+    for nombre, directorio in directorios.items():
+        procesos.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(PUERTOS[nombre]), "--log-level", "warning"],
+            cwd=directorio, env=entorno,
+        ))
+    return procesos
+
+
+async def esperar_servicios(urls: Dict[str, str], segundos: float = 30.0) -> None:
+    limite = time.perf_counter() + segundos
+    async with httpx.AsyncClient(timeout=2.0) as cliente:
+        for nombre, url in urls.items():
+            while True:
+                try:
+                    if (await cliente.get(f"{url}/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > limite:
+                    raise SystemExit(f"El servicio '{nombre}' no responde en {url}")
+                await asyncio.sleep(0.2)
+
+
+# ---------------------------------------------------------------------------
+
+async def principal(args) -> int:
+    rnd = random.Random(args.semilla)
+    urls = {nombre: f"http://{args.host}:{puerto}" for nombre, puerto in PUERTOS.items()}
+
+    procesos = lanzar_servicios(args) if args.lanzar else []
+    try:
+        await esperar_servicios(urls)
+        datos = await sembrar({k: v for k, v in urls.items() if k != "gateway"}, args, rnd)
+
+        resultados = {}
+        if "servicios" in args.objetivo:
+            # Directo a cada servicio: cada ruta va a la URL de su servicio
+            resultados["servicios"] = {}
+            for servicio in ("calendar", "event", "comment"):
+                args_servicio = argparse.Namespace(**vars(args))
+                args_servicio.peso = list(args.peso) + [f"{r.nombre}=0" for r in RUTAS if r.servicio != servicio]
+                resultados["servicios"].update(await ejecutar_carga(
+                    urls[servicio], {servicio: ""}, datos, args_servicio, rnd, f"servicio {servicio}"
+                ))
+        if "gateway" in args.objetivo:
+            resultados["gateway"] = await ejecutar_carga(urls["gateway"], PREFIJO_GATEWAY, datos, args, rnd, "gateway")
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait(timeout=10)
+
+    imprimir(resultados)
+
+    informe = {
+        "meta": {
+            "fecha": datetime.utcnow().isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("guardar", "comparar")},
+            "volumen": {"calendarios": len(datos.calendarios), "eventos": len(datos.eventos), "comentarios": len(datos.comentarios)},
+        },
+        "resultados": resultados,
+    }
+    if args.guardar:
+        Path(args.guardar).write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+        print(f"\nLínea base guardada en {args.guardar}")
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text())
+        regresiones = comparar(informe, base, args.umbral, args.minimo_ms)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones respecto a {args.comparar} (umbral {args.umbral:.0%}):")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            return 1
+        print(f"\nSin regresiones respecto a {args.comparar} (umbral {args.umbral:.0%})")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lanzar", action="store_true", help="Arrancar localmente los servicios y el gateway con uvicorn")
+    parser.add_argument("--memoria", action="store_true", help="Con --lanzar, usar el motor en memoria en lugar de MongoDB")
+    parser.add_argument("--host", default="127.0.0.1", help="Host donde escuchan los servicios")
+    parser.add_argument("--objetivo", nargs="+", choices=["servicios", "gateway"], default=["servicios", "gateway"])
+    # Volumen sembrado
+    parser.add_argument("--calendarios", type=int, default=50, help="Calendarios raíz")
+    parser.add_argument("--subcalendarios", type=float, default=0.5, help="Subcalendarios por calendario raíz (fracción)")
+    parser.add_argument("--eventos-por-calendario", type=int, default=20)
+    parser.add_argument("--comentarios-por-evento", type=int, default=3)
+    parser.add_argument("--desechables", type=int, default=200, help="Entidades creadas para las rutas DELETE")
+    # Carga
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--duracion", type=float, default=20.0, help="Segundos de medición por objetivo/servicio")
+    parser.add_argument("--calentamiento", type=float, default=3.0, help="Segundos previos sin medir")
+    parser.add_argument("--mezcla", choices=sorted(MEZCLAS), default="mixta", help="Proporción de escrituras")
+    parser.add_argument("--solo", help="Expresión regular: solo las rutas cuyo nombre coincida")
+    parser.add_argument("--peso", action="append", default=[], help="Sustituye el peso de una ruta: 'GET /events/{id}=20'")
+    parser.add_argument("--semilla", type=int, default=1)
+    # Líneas base
+    parser.add_argument("--guardar", help="Guardar los resultados como línea base JSON")
+    parser.add_argument("--comparar", help="Comparar con una línea base JSON y marcar regresiones")
+    parser.add_argument("--umbral", type=float, default=0.10, help="Empeoramiento relativo que cuenta como regresión")
+    parser.add_argument("--minimo-ms", type=float, default=1.0, help="Diferencia mínima de latencia (ms) para marcar regresión")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(principal(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Muestra las trazas exportadas por los servicios con TRACING_EXPORTER=file.
+
+Cada traza se imprime como un árbol de spans (gateway -> servicio -> servicio -> MongoDB)
+con la duración de cada salto, para ver de un vistazo cuál es el lento. Con --resumen
+agrega todas las trazas por nombre de span (llamadas, p50, p95 y tiempo total).
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/trace_view.py traces.jsonl
+    python benchmarks/trace_view.py traces.jsonl --ultimas 5 --minimo-ms 50
+    python benchmarks/trace_view.py traces.jsonl --resumen
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import math
+
+
+def cargar(ruta: Path) -> Dict[str, List[dict]]:
+    """Spans agrupados por traceId, en el orden en que aparece cada traza."""
+    trazas: Dict[str, List[dict]] = {}
+    for linea in ruta.read_text(encoding="utf-8").splitlines():
+        if linea.strip():
+            span = json.loads(linea)
+            trazas.setdefault(span["traceId"], []).append(span)
+    return trazas
+
+
+def imprimir_traza(trace_id: str, spans: List[dict]) -> None:
+    ids = {span["spanId"] for span in spans}
+    hijos = defaultdict(list)
+    raices = []
+    for span in sorted(spans, key=lambda s: s["startTime"]):
+        if span["parentSpanId"] in ids:
+            hijos[span["parentSpanId"]].append(span)
+        else:
+            # El padre puede no estar (p.ej. un servicio que no exporta): se muestra como raíz
+            raices.append(span)
+
+    print(f"traza {trace_id}")
+
+    def imprimir(span: dict, nivel: int) -> None:
+        marca = " [error]" if span["status"] == "error" else ""
+        estado = span["attributes"].get("http.status_code")
+        estado = f" {estado}" if estado else ""
+        print(f"  {'  ' * nivel}{span['durationMs']:>9.2f} ms  {span['service']:<16} {span['name']}{estado}{marca}")
+        for hijo in hijos[span["spanId"]]:
+            imprimir(hijo, nivel + 1)
+
+    for raiz in raices:
+        imprimir(raiz, 0)
+    print()
+
+
+def percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def imprimir_resumen(trazas: Dict[str, List[dict]]) -> None:
+    duraciones = defaultdict(list)
+    for spans in trazas.values():
+        for span in spans:
+            duraciones[(span["service"], span["name"])].append(span["durationMs"])
+    print(f"{'servicio':<16} {'span':<56}{'llamadas':>9}{'p50 ms':>10}{'p95 ms':>10}{'total ms':>12}")
+    for (servicio, nombre), valores in sorted(duraciones.items(), key=lambda kv: -sum(kv[1])):
+        print(f"{servicio:<16} {nombre[:55]:<56}{len(valores):>9}{percentil(valores, 50):>10.2f}"
+              f"{percentil(valores, 95):>10.2f}{sum(valores):>12.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fichero", type=Path, help="Fichero JSON Lines de TRACING_FILE")
+    parser.add_argument("--ultimas", type=int, default=10, help="Número de trazas a mostrar (las más recientes)")
+    parser.add_argument("--minimo-ms", type=float, default=0.0, help="Solo trazas cuya raíz dure al menos esto")
+    parser.add_argument("--resumen", action="store_true", help="Agregar por nombre de span en lugar de mostrar árboles")
+    args = parser.parse_args()
+
+    trazas = cargar(args.fichero)
+    if args.resumen:
+        imprimir_resumen(trazas)
+        return
+
+    seleccionadas = [
+        (trace_id, spans) for trace_id, spans in trazas.items()
+        if max(span["durationMs"] for span in spans) >= args.minimo_ms
+    ]
+    for trace_id, spans in seleccionadas[-args.ultimas:]:
+        imprimir_traza(trace_id, spans)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
-from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi import FastAPI, Request, HTTPException, Response, Header, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Optional
 import os
 import httpx
 
+from . import profiling
+from .tracing import TRACEPARENT, TracingMiddleware, cabeceras_traza, start_span
+
 app = FastAPI(title="API Gateway")
 
+# Trazas distribuidas: el gateway abre la traza de cada petición y la propaga a los servicios
+app.add_middleware(TracingMiddleware, service_name="gateway")
+# Perfilado bajo demanda del propio gateway. X-Profile-Token se reenvía a los servicios,
+# que perfilan también su parte: la respuesta trae un X-Profile-Id por cada uno.
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware, service_name="gateway")
+
 # URLs internas de los microservicios (definidas en docker-compose)
 SERVICES = {
     "calendar": os.getenv("CALENDAR_SERVICE_URL", "http://calendar_service:8000"),
@@ -20,19 +32,26 @@ async def _proxy_request(service: str, path: str, request: Request):
     service_base_url = SERVICES[service]
     
     body = await request.body()
+    headers = dict(request.headers)
     
     # Inicializa el cliente con el base_url del microservicio de destino
     async with httpx.AsyncClient(base_url=service_base_url) as client:
         try:
-            # Ahora la URL de la petición es relativa al base_url
-            response = await client.request(
-                method=request.method,
-                url=f"/{path}",
-                headers=dict(request.headers),
-                params=request.query_params,
-                content=body,
-                follow_redirects=True,
-            )
+            # Span del salto gateway -> servicio; su traceparent sustituye al que trajo el cliente
+            with start_span(f"{request.method} {service}_service", "client", {"http.url": f"{service_base_url}/{path}"}) as span:
+                headers.pop(TRACEPARENT, None)
+                headers.update(cabeceras_traza())
+                # Ahora la URL de la petición es relativa al base_url
+                response = await client.request(
+                    method=request.method,
+                    url=f"/{path}",
+                    headers=headers,
+                    params=request.query_params,
+                    content=body,
+                    follow_redirects=True,
+                )
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
             return Response(
                 content=response.content,
                 status_code=response.status_code,
@@ -41,13 +60,116 @@ async def _proxy_request(service: str, path: str, request: Request):
         except httpx.RequestError as e:
             raise HTTPException(status_code=500, detail=f"Error al conectar con {service}: {str(e)}")
 
+# Cabeceras de la conexión con el servicio que no se reenvían al cliente
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "content-length"}
+
+async def _proxy_stream(service: str, path: str, request: Request):
+    """
+    Reenvía una respuesta de larga duración (Server-Sent Events) trozo a trozo, sin leerla
+    entera como _proxy_request y sin límite de tiempo de lectura.
+    """
+    service_base_url = SERVICES[service]
+    headers = dict(request.headers)
+    client = httpx.AsyncClient(base_url=service_base_url, timeout=httpx.Timeout(10.0, read=None))
+    try:
+        with start_span(f"{request.method} {service}_service", "client", {"http.url": f"{service_base_url}/{path}"}) as span:
+            headers.pop(TRACEPARENT, None)
+            headers.update(cabeceras_traza())
+            upstream = await client.send(
+                client.build_request("GET", f"/{path}", headers=headers, params=request.query_params),
+                stream=True,
+            )
+            if span is not None:
+                span.attributes["http.status_code"] = upstream.status_code
+    except httpx.RequestError as e:
+        await client.aclose()
+        raise HTTPException(status_code=500, detail=f"Error al conectar con {service}: {str(e)}")
+
+    async def cuerpo():
+        try:
+            async for trozo in upstream.aiter_raw():
+                yield trozo
+        finally:
+            # Al irse el cliente se cierra también la conexión con el servicio
+            await upstream.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        cuerpo(),
+        status_code=upstream.status_code,
+        headers={k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP},
+    )
+
+async def _proxy_upload(service: str, path: str, request: Request):
+    """
+    Reenvía una subida de fichero (PUT con el fichero como cuerpo) trozo a trozo según llega,
+    sin leerla entera como _proxy_request y sin límite de tiempo entre trozos.
+    """
+    service_base_url = SERVICES[service]
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+    async with httpx.AsyncClient(base_url=service_base_url, timeout=httpx.Timeout(10.0, read=None)) as client:
+        try:
+            with start_span(f"{request.method} {service}_service", "client", {"http.url": f"{service_base_url}/{path}"}) as span:
+                headers.pop(TRACEPARENT, None)
+                headers.update(cabeceras_traza())
+                response = await client.request(
+                    method=request.method,
+                    url=f"/{path}",
+                    headers=headers,
+                    params=request.query_params,
+                    content=request.stream(),
+                )
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=500, detail=f"Error al conectar con {service}: {str(e)}")
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP},
+    )
+
 # --- Rutas Explícitas para cada Microservicio ---
 
 @app.get("/")
 def root():
     return {"message": "Bienvenido a la API de Kalendas. Visita /docs para ver la documentación."}
 
+# --- Perfiles del gateway (los de cada servicio: /<servicio>/profiles/...) ---
+def _autorizar_perfiles(token: Optional[str]) -> None:
+    if not profiling.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="El perfilado no está activado en el gateway")
+    if not profiling.token_valido(token):
+        raise HTTPException(status_code=403, detail="Token de perfilado no válido")
+
+@app.get("/profiles/", tags=["Perfilado"])
+async def list_profiles(limite: int = Query(50, ge=1, le=500), x_profile_token: Optional[str] = Header(None)):
+    _autorizar_perfiles(x_profile_token)
+    return profiling.list_profiles(limite)
+
+@app.get("/profiles/{id}", tags=["Perfilado"])
+async def get_profile(id: str, x_profile_token: Optional[str] = Header(None)):
+    _autorizar_perfiles(x_profile_token)
+    perfil = profiling.get_profile(id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail=f"Perfil {id} no encontrado")
+    perfil.pop("fichero")
+    return perfil
+
+@app.get("/profiles/{id}/raw", tags=["Perfilado"], response_class=FileResponse)
+async def get_profile_raw(id: str, x_profile_token: Optional[str] = Header(None)):
+    _autorizar_perfiles(x_profile_token)
+    perfil = profiling.get_profile(id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail=f"Perfil {id} no encontrado")
+    return FileResponse(perfil["fichero"], filename=f"gateway-{id}.{perfil['formato']}")
+
 # --- Calendar Service Proxy ---
+# Flujo SSE de un calendario: antes que la ruta genérica, que espera la respuesta completa
+@app.get("/calendar/calendars/{id}/stream", tags=["Calendar Service"])
+async def calendar_stream_proxy(id: str, request: Request):
+    return await _proxy_stream("calendar", f"calendars/{id}/stream", request)
+
 @app.get("/calendar/{path:path}", tags=["Calendar Service"])
 @app.post("/calendar/{path:path}", tags=["Calendar Service"])
 @app.put("/calendar/{path:path}", tags=["Calendar Service"])
@@ -56,6 +178,11 @@ async def calendar_proxy(path: str, request: Request):
     return await _proxy_request("calendar", path, request)
 
 # --- Event Service Proxy ---
+# Fichero de una importación masiva: antes que la ruta genérica, que lo leería entero en memoria
+@app.put("/event/imports/{id}/contenido", tags=["Event Service"])
+async def event_import_upload_proxy(id: str, request: Request):
+    return await _proxy_upload("event", f"imports/{id}/contenido", request)
+
 @app.get("/event/{path:path}", tags=["Event Service"])
 @app.post("/event/{path:path}", tags=["Event Service"])
 @app.put("/event/{path:path}", tags=["Event Service"])
@@ -0,0 +1,246 @@
+"""
+Perfilado bajo demanda de peticiones concretas (diagnóstico en producción).
+
+Una petición se perfila si trae la cabecera X-Profile-Token con el token de PROFILING_TOKEN
+o si sale elegida al azar con probabilidad PROFILING_SAMPLE_RATE. El perfil se guarda en
+PROFILING_DIR y la respuesta lleva X-Profile-Id (<servicio>:<id>) para recuperarlo con
+GET /profiles/{id}. Dos modos (PROFILING_MODE o la cabecera X-Profile-Mode):
+
+- 'cprofile' (por defecto): perfil determinista con cProfile. Se guarda el .prof (pstats,
+  p.ej. para snakeviz) y un resumen de las funciones con más tiempo acumulado.
+- 'sampling': un hilo toma la pila del bucle de eventos cada PROFILING_INTERVAL_MS ms.
+  Se guardan las pilas colapsadas (.folded, para flamegraph.pl o speedscope) y un resumen.
+  Perturba mucho menos la petición que cProfile.
+
+Ambos observan el hilo del bucle de eventos, así que incluyen a las demás corrutinas que
+se ejecuten a la vez. Solo se perfila una petición a la vez por proceso.
+
+Sin token ni muestreo el middleware no se instala (ENABLED es False): coste cero.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_MODE = os.getenv("PROFILING_MODE", "cprofile").lower()
+PROFILING_DIR = Path(os.getenv("PROFILING_DIR", "/tmp/perfiles"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+# Perfiles que se conservan en disco (se borran los más antiguos)
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+ENABLED = bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+MODOS = ("cprofile", "sampling")
+# Líneas del resumen de texto
+LINEAS_RESUMEN = 40
+
+
+def token_valido(token: Optional[str]) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+# --- Perfiladores ---
+
+class _CProfile:
+    extension = "prof"
+
+    def __init__(self):
+        self._perfil = cProfile.Profile()
+
+    def start(self) -> None:
+        self._perfil.enable()
+
+    def stop(self) -> None:
+        self._perfil.disable()
+
+    def guardar(self, base: Path) -> str:
+        self._perfil.dump_stats(str(base.with_suffix(".prof")))
+        salida = io.StringIO()
+        estadisticas = pstats.Stats(self._perfil, stream=salida)
+        estadisticas.strip_dirs().sort_stats("cumulative").print_stats(LINEAS_RESUMEN)
+        return salida.getvalue()
+
+
+class _Muestreador:
+    """Toma la pila del hilo indicado a intervalos regulares desde otro hilo."""
+
+    extension = "folded"
+
+    def __init__(self, intervalo_ms: float = PROFILING_INTERVAL_MS):
+        self._hilo_objetivo = threading.get_ident()
+        self._intervalo = intervalo_ms / 1000
+        self._pilas: Dict[str, int] = {}
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._hilo = threading.Thread(target=self._muestrear, name="profiling-sampler", daemon=True)
+        self._hilo.start()
+
+    def stop(self) -> None:
+        self._parar.set()
+        self._hilo.join()
+
+    def _muestrear(self) -> None:
+        while not self._parar.wait(self._intervalo):
+            frame = sys._current_frames().get(self._hilo_objetivo)
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f"{Path(codigo.co_filename).name}:{codigo.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            clave = ";".join(reversed(pila))
+            self._pilas[clave] = self._pilas.get(clave, 0) + 1
+
+    def guardar(self, base: Path) -> str:
+        base.with_suffix(".folded").write_text(
+            "".join(f"{pila} {n}\n" for pila, n in self._pilas.items()), encoding="utf-8"
+        )
+        total = sum(self._pilas.values())
+        propias: Dict[str, int] = {}
+        acumuladas: Dict[str, int] = {}
+        for pila, n in self._pilas.items():
+            # Sin número de línea: la función cuenta una vez por pila aunque aparezca varias veces
+            funciones = [marco.rsplit(":", 1)[0] for marco in pila.split(";")]
+            propias[funciones[-1]] = propias.get(funciones[-1], 0) + n
+            for funcion in set(funciones):
+                acumuladas[funcion] = acumuladas.get(funcion, 0) + n
+        lineas = [f"{total} muestras cada {self._intervalo * 1000:g} ms", "",
+                  f"{'propias':>9}{'acumuladas':>12}  función"]
+        # Primero las funciones en las que más muestras caen (donde de verdad se gasta el tiempo)
+        for funcion, n in sorted(acumuladas.items(), key=lambda kv: (-propias.get(kv[0], 0), -kv[1]))[:LINEAS_RESUMEN]:
+            lineas.append(f"{propias.get(funcion, 0):>9}{n:>12}  {funcion}")
+        return "\n".join(lineas) + "\n"
+
+
+# --- Almacén de perfiles ---
+
+def _ruta(profile_id: str) -> Path:
+    # El ID solo puede tener el formato generado aquí (evita salir del directorio)
+    if not profile_id or any(c not in "0123456789abcdefT-" for c in profile_id):
+        raise KeyError(profile_id)
+    return PROFILING_DIR / profile_id
+
+
+def _nuevo_id() -> str:
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def _guardar(perfilador, profile_id: str, metadatos: dict) -> None:
+    PROFILING_DIR.mkdir(parents=True, exist_ok=True)
+    base = _ruta(profile_id)
+    resumen = perfilador.guardar(base)
+    base.with_suffix(".txt").write_text(resumen, encoding="utf-8")
+    base.with_suffix(".json").write_text(json.dumps({"id": profile_id, **metadatos}), encoding="utf-8")
+    _podar()
+
+
+def _podar() -> None:
+    perfiles = sorted(PROFILING_DIR.glob("*.json"))
+    for antiguo in perfiles[:max(0, len(perfiles) - PROFILING_MAX_FILES)]:
+        for fichero in PROFILING_DIR.glob(f"{antiguo.stem}.*"):
+            fichero.unlink(missing_ok=True)
+
+
+def list_profiles(limite: int = 50) -> List[dict]:
+    """Metadatos de los perfiles guardados, del más reciente al más antiguo."""
+    if not PROFILING_DIR.exists():
+        return []
+    perfiles = sorted(PROFILING_DIR.glob("*.json"), reverse=True)[:limite]
+    return [json.loads(p.read_text(encoding="utf-8")) for p in perfiles]
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    """Metadatos y resumen de un perfil, con la ruta del fichero completo (None si no existe)."""
+    try:
+        base = _ruta(profile_id)
+    except KeyError:
+        return None
+    metadatos = base.with_suffix(".json")
+    if not metadatos.exists():
+        return None
+    datos = json.loads(metadatos.read_text(encoding="utf-8"))
+    datos["resumen"] = base.with_suffix(".txt").read_text(encoding="utf-8")
+    datos["fichero"] = str(base.with_suffix(f".{datos['formato']}"))
+    return datos
+
+
+# --- Middleware ---
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila las peticiones marcadas (token) o muestreadas."""
+
+    def __init__(self, app, service_name: str, sample_rate: float = PROFILING_SAMPLE_RATE):
+        self.app = app
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self._ocupado = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token, modo = None, PROFILING_MODE
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-profile-token":
+                token = valor.decode("latin-1")
+            elif nombre == b"x-profile-mode":
+                modo = valor.decode("latin-1").lower()
+        if modo not in MODOS:
+            modo = PROFILING_MODE
+        pedido = token_valido(token)
+        if not pedido and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+        # Las consultas de perfiles llevan el mismo token pero no se perfilan.
+        # Y un solo perfil a la vez: cProfile y el muestreador observan todo el hilo.
+        if scope["path"].startswith("/profiles") or not self._ocupado.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            perfilador = _Muestreador() if modo == "sampling" else _CProfile()
+            # El ID se fija antes de ejecutar la petición: va en la cabecera de la respuesta
+            profile_id = _nuevo_id()
+            estado = {"status": None}
+
+            async def send_con_id(message):
+                if message["type"] == "http.response.start":
+                    estado["status"] = message["status"]
+                    valor = f"{self.service_name}:{profile_id}".encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", valor)]}
+                await send(message)
+
+            inicio = time.perf_counter()
+            perfilador.start()
+            try:
+                await self.app(scope, receive, send_con_id)
+            finally:
+                perfilador.stop()
+                duracion_ms = (time.perf_counter() - inicio) * 1000
+                _guardar(perfilador, profile_id, {
+                    "servicio": self.service_name,
+                    "metodo": scope["method"],
+                    "ruta": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status": estado["status"],
+                    "duracionMs": round(duracion_ms, 3),
+                    "modo": modo,
+                    "formato": perfilador.extension,
+                    "origen": "token" if pedido else "muestreo",
+                    "fecha": datetime.utcnow().isoformat(),
+                })
+        finally:
+            self._ocupado.release()
@@ -1,139 +1,287 @@
+"""
+Generador de datos sintéticos para KalendasDB.
+
+Genera calendarios organizados en jerarquías profundas, eventos con distribuciones
+realistas de fechas (tardes y fines de semana) y de posiciones (agrupados alrededor
+de varias ciudades), y comentarios con un volumen muy sesgado (pocos eventos
+concentran la mayoría). Todo es determinista a partir de --semilla: los IDs y el
+contenido de cada calendario dependen solo de la semilla y de su índice, así que
+el resultado es el mismo con cualquier número de procesos.
+
+El trabajo se reparte en bloques de calendarios entre varios procesos; cada uno
+inserta con insert_many(ordered=False) en lotes y se informa del throughput.
+
+Ejemplos:
+    python seed_database.py                                   # Datos pequeños para desarrollo
+    python seed_database.py --calendarios 1000000 --procesos 8
+    python seed_database.py --anadir --desde 1000000 --calendarios 500000
+    MONGODB_DB=KalendasDB_Bench python seed_database.py --calendarios 20000 --reconstruir-estadisticas
+"""
+from pymongo.errors import BulkWriteError
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from multiprocessing import Pool
+from pathlib import Path
+import argparse
 import os
+import random
+import subprocess
+import sys
+import time
 import uuid # Aseguramos que uuid esté importado
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
 uri = os.getenv('MONGODB_URI')
+# MONGODB_DB permite usar otra base de datos (p.ej. la de los benchmarks)
+DB_NAME = os.getenv('MONGODB_DB', 'KalendasDB')
+
+ORGANIZADORES = [
+    "Ayuntamiento Central", "Concejalía de Cultura", "Concejalía de Deportes", "Centro Cultural Independiente",
+    "Asociación Vecinal", "Universidad", "Club Deportivo", "Biblioteca Municipal", "Teatro Cervantes",
+]
+TEMAS = ["Agenda", "Eventos", "Actividades", "Programación", "Ciclo", "Festival", "Talleres", "Jornadas"]
+AMBITOS = ["Culturales", "Deportivos", "Infantiles", "de Verano", "de Barrio", "Musicales", "Gastronómicos", "Científicos"]
+PALABRAS_CLAVE = ["ciudad", "cultura", "deporte", "música", "infantil", "teatro", "exposición", "gastronomía", "ciencia", "barrio"]
+LUGARES = ["Parque Central", "Auditorio Municipal", "Plaza Mayor", "Estadio Municipal", "Biblioteca", "Centro Cívico", "Puerto", "Museo"]
+FRASES = [
+    "¡Excelente evento! Muy bien organizado.", "¿Alguien sabe si hay aparcamiento cerca?", "Repetiremos el año que viene.",
+    "El horario no me viene nada bien.", "Gran iniciativa de la ciudad.", "Se quedó pequeño el sitio, había mucha gente.",
+    "Me encanta este calendario, tiene eventos muy variados.", "¿Es apto para niños?",
+]
+# Centros (latitud, longitud) alrededor de los que se agrupan los eventos, con su peso relativo
+CIUDADES = [((36.7213, -4.4214), 5), ((37.3891, -5.9845), 3), ((40.4168, -3.7038), 8), ((41.3874, 2.1686), 6), ((39.4699, -0.3763), 3)]
+# Horas de comienzo más habituales (tardes) y peso de cada día de la semana (lunes..domingo)
+HORAS = [(h, 3 if 17 <= h <= 21 else 2 if 10 <= h <= 13 else 1) for h in range(8, 24)]
+DIAS_SEMANA = [1, 1, 1, 1.5, 2.5, 3, 2]
+
+INICIO_PERIODO = datetime(2025, 1, 1)
+
+
+def _uuid(semilla: int, tipo: str, *indices: int) -> uuid.UUID:
+    """UUID determinista a partir de la semilla, el tipo de entidad y su posición."""
+    return uuid.uuid5(uuid.UUID(int=semilla), ":".join([tipo, *map(str, indices)]))
+
+
+def _padre(indice: int, args) -> int:
+    """
+    Índice del calendario padre, o -1 si es raíz. Los calendarios forman árboles de
+    --por-arbol nodos con --ramificacion hijos por nodo (profundidad ~ log_b(por_arbol)).
+    """
+    posicion = indice % args.por_arbol
+    if posicion == 0:
+        return -1
+    return indice - posicion + (posicion - 1) // args.ramificacion
+
+
+def _sesgado(rnd: random.Random, media: float, maximo: int) -> int:
+    """Cantidad con distribución de Pareto (alpha=1.5) y la media indicada: la mayoría pocas, algunas muchas."""
+    if media <= 0:
+        return 0
+    alpha = 1.5
+    return min(maximo, int((rnd.paretovariate(alpha) - 1) * (alpha - 1) * media))
+
+
+def _hora_comienzo(rnd: random.Random, dias: int) -> datetime:
+    dia = INICIO_PERIODO + timedelta(days=rnd.randrange(dias))
+    # Se desplaza el día hacia el más cercano de la semana elegido según su peso (más eventos en fin de semana)
+    dia_semana = rnd.choices(range(7), weights=DIAS_SEMANA)[0]
+    dia += timedelta(days=(dia_semana - dia.weekday()) % 7)
+    hora = rnd.choices([h for h, _ in HORAS], weights=[p for _, p in HORAS])[0]
+    return dia.replace(hour=hora, minute=rnd.choice([0, 0, 15, 30, 30, 45]))
+
+
+def _mapa(rnd: random.Random):
+    if rnd.random() < 0.1:
+        return None  # Algunos eventos no tienen ubicación
+    (latitud, longitud), = rnd.choices([c for c, _ in CIUDADES], weights=[p for _, p in CIUDADES])
+    # Dispersión de unos pocos kilómetros alrededor del centro de la ciudad
+    return {"latitud": round(rnd.gauss(latitud, 0.03), 6), "longitud": round(rnd.gauss(longitud, 0.03), 6)}
+
+
+def generar_bloque(bloque: int, args):
+    """
+    Genera los documentos de los calendarios [bloque*tamaño, (bloque+1)*tamaño): los calendarios,
+    sus eventos y los comentarios de ambos. Devuelve (calendarios, eventos, comentarios).
+    """
+    inicio = args.desde + bloque * args.bloque
+    fin = min(args.desde + args.calendarios, inicio + args.bloque)
+    calendarios, eventos, comentarios = [], [], []
+
+    for i in range(inicio, fin):
+        rnd = random.Random(f"{args.semilla}:{i}")
+        id_calendario = _uuid(args.semilla, "calendario", i)
+        padre = _padre(i, args)
+        organizador = rnd.choice(ORGANIZADORES)
+        calendarios.append({
+            "_id": id_calendario,
+            "titulo": f"{rnd.choice(TEMAS)} {rnd.choice(AMBITOS)} {i}",
+            "organizador": organizador,
+            "palabras_clave": rnd.sample(PALABRAS_CLAVE, rnd.randint(1, 3)),
+            "es_publico": rnd.random() < 0.85,
+            "idCalendarioPadre": _uuid(args.semilla, "calendario", padre) if padre >= 0 else None,
+            "version": 1,
+            "fechaActualizacion": INICIO_PERIODO - timedelta(minutes=rnd.randrange(90 * 24 * 60)),
+        })
+
+        for c in range(_sesgado(rnd, args.comentarios_por_calendario, args.max_comentarios)):
+            comentarios.append(_comentario(rnd, _uuid(args.semilla, "comentario", i, -1, c), INICIO_PERIODO, calendario=id_calendario, dias=args.dias))
+
+        for e in range(int(rnd.expovariate(1 / args.eventos_por_calendario)) if args.eventos_por_calendario > 0 else 0):
+            id_evento = _uuid(args.semilla, "evento", i, e)
+            hora_comienzo = _hora_comienzo(rnd, args.dias)
+            mapa = _mapa(rnd)
+            eventos.append({
+                "_id": id_evento,
+                "idCalendario": id_calendario,
+                "titulo": f"{rnd.choice(TEMAS)} en {rnd.choice(LUGARES)}",
+                "horaComienzo": hora_comienzo,
+                "duracionMinutos": rnd.choice([30, 45, 60, 90, 120, 180, 240]),
+                "lugar": rnd.choice(LUGARES),
+                "organizador": organizador if rnd.random() < 0.8 else rnd.choice(ORGANIZADORES),
+                "contenidoAdjunto": {"imagenes": [], "archivos": [], "mapa": mapa},
+                # Punto GeoJSON indexado (2dsphere) que mantiene el EventService a partir del mapa
+                "ubicacion": {"type": "Point", "coordinates": [mapa["longitud"], mapa["latitud"]]} if mapa else None,
+                "version": 1,
+                "fechaActualizacion": hora_comienzo - timedelta(minutes=rnd.randrange(60 * 24 * 60)),
+            })
+            for c in range(_sesgado(rnd, args.comentarios_por_evento, args.max_comentarios)):
+                comentarios.append(_comentario(rnd, _uuid(args.semilla, "comentario", i, e, c), hora_comienzo, evento=id_evento))
+
+    return calendarios, eventos, comentarios
+
+
+def _comentario(rnd: random.Random, id_comentario, desde: datetime, evento=None, calendario=None, dias: int = 30) -> dict:
+    # Los comentarios de un evento se concentran en los días alrededor de su celebración
+    fecha = desde + timedelta(minutes=rnd.randint(-3 * 24 * 60, dias * 24 * 60 if calendario else 7 * 24 * 60))
+    return {
+        "_id": id_comentario,
+        "contenido": rnd.choice(FRASES),
+        "idCalendario": calendario,
+        "idEvento": evento,
+        "fechaCreacion": fecha,
+        "version": 1,
+        "fechaActualizacion": fecha,
+    }
+
+
+# --- Trabajo de cada proceso ---
+
+_db = None
+
+
+def _iniciar_proceso():
+    global _db
+    _db = MongoClient(uri, server_api=ServerApi('1'), uuidRepresentation='standard')[DB_NAME]
+
+
+def _insertar(coleccion: str, documentos: list, lote: int):
+    """Inserta en lotes sin orden. Los duplicados (p.ej. al repetir un --anadir) se cuentan y se ignoran."""
+    insertados = duplicados = 0
+    for i in range(0, len(documentos), lote):
+        try:
+            insertados += len(_db[coleccion].insert_many(documentos[i:i + lote], ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errores = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errores):
+                raise
+            insertados += e.details.get("nInserted", 0)
+            duplicados += len(errores)
+    return insertados, duplicados
+
+
+def procesar_bloque(trabajo):
+    bloque, args = trabajo
+    calendarios, eventos, comentarios = generar_bloque(bloque, args)
+    return {
+        "calendarios": _insertar("calendarios", calendarios, args.lote),
+        "eventos": _insertar("eventos", eventos, args.lote),
+        "comentarios": _insertar("comentarios", comentarios, args.lote),
+    }
+
+
+def _informe(totales: dict, segundos: float) -> str:
+    insertados = sum(n for n, _ in totales.values())
+    partes = ", ".join(f"{n} {coleccion}" for coleccion, (n, _) in totales.items())
+    duplicados = sum(d for _, d in totales.values())
+    extra = f", {duplicados} duplicados ignorados" if duplicados else ""
+    return f"{partes} en {segundos:.1f}s ({insertados / max(segundos, 1e-9):,.0f} docs/s{extra})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calendarios", type=int, default=100, help="Número de calendarios a generar")
+    parser.add_argument("--por-arbol", type=int, default=200, help="Calendarios por jerarquía (árbol)")
+    parser.add_argument("--ramificacion", type=int, default=2, help="Subcalendarios por calendario en cada jerarquía")
+    parser.add_argument("--eventos-por-calendario", type=float, default=10, help="Media de eventos por calendario (exponencial)")
+    parser.add_argument("--comentarios-por-evento", type=float, default=3, help="Media de comentarios por evento (Pareto)")
+    parser.add_argument("--comentarios-por-calendario", type=float, default=1, help="Media de comentarios por calendario (Pareto)")
+    parser.add_argument("--max-comentarios", type=int, default=5000, help="Máximo de comentarios de un mismo evento o calendario")
+    parser.add_argument("--dias", type=int, default=365, help="Días del periodo en el que se reparten los eventos")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bloque", type=int, default=1000, help="Calendarios por unidad de trabajo de cada proceso")
+    parser.add_argument("--lote", type=int, default=1000, help="Documentos por insert_many")
+    parser.add_argument("--anadir", action="store_true", help="No borrar las colecciones: añadir a los datos existentes")
+    parser.add_argument("--desde", type=int, default=0, help="Índice del primer calendario (para añadir datos nuevos con la misma semilla)")
+    parser.add_argument("--reconstruir-estadisticas", action="store_true", help="Recalcular al final los agregados de estadísticas")
+    args = parser.parse_args()
+
+    if not uri:
+        sys.exit("❌ Falta la variable de entorno MONGODB_URI")
+
+    # --- Conexión a MongoDB ---
+    # Aseguramos que la representación de UUID sea 'standard'
+    client = MongoClient(uri, server_api=ServerApi('1'), uuidRepresentation='standard')
+    db = client[DB_NAME]
+
+    try:
+        if not args.anadir:
+            # Eliminamos las colecciones si ya existen para empezar desde cero.
+            print("\nLimpiando colecciones antiguas...")
+            for coleccion in ('calendarios', 'eventos', 'comentarios'):
+                db.drop_collection(coleccion)
+            print("🧹 Colecciones 'calendarios', 'eventos' y 'comentarios' eliminadas.")
+
+        bloques = range((args.calendarios + args.bloque - 1) // args.bloque)
+        print(f"\nGenerando {args.calendarios} calendarios en {len(bloques)} bloques con {args.procesos} procesos...")
+
+        totales = {"calendarios": (0, 0), "eventos": (0, 0), "comentarios": (0, 0)}
+        inicio = ultimo_informe = time.perf_counter()
+        with Pool(args.procesos, initializer=_iniciar_proceso) as pool:
+            for hechos, resultado in enumerate(pool.imap_unordered(procesar_bloque, ((b, args) for b in bloques)), 1):
+                for coleccion, (n, d) in resultado.items():
+                    totales[coleccion] = (totales[coleccion][0] + n, totales[coleccion][1] + d)
+                if time.perf_counter() - ultimo_informe >= 5:
+                    ultimo_informe = time.perf_counter()
+                    print(f"  {hechos}/{len(bloques)} bloques: {_informe(totales, ultimo_informe - inicio)}")
+
+        print(f"✅ Insertados {_informe(totales, time.perf_counter() - inicio)}")
+
+        db['eventos'].create_index([("ubicacion", "2dsphere")], name="ubicacion_2dsphere")
+
+        if args.reconstruir_estadisticas:
+            # Los agregados solo se mantienen solos con las escrituras a través de los servicios
+            for servicio in ("event_service", "comment_service"):
+                subprocess.run(
+                    [sys.executable, "-m", "app.rebuild_stats"],
+                    cwd=Path(__file__).resolve().parent / "servicios" / servicio, check=True,
+                )
+
+        print("\n🎉 Base de datos poblada con éxito.")
+
+    except Exception as e:
+        print(f"❌ Error al insertar los datos: {e}")
+        sys.exit(1)
+
+    finally:
+        # Cerramos la conexión al finalizar
+        client.close()
+        print("\nConexión a MongoDB cerrada.")
+
 
-# --- Conexión a MongoDB ---
-# Aseguramos que la representación de UUID sea 'standard'
-client = MongoClient(uri, server_api=ServerApi('1'), uuidRepresentation='standard')
-db = client['KalendasDB']
-
-try:
-    # Eliminamos las colecciones si ya existen para empezar desde cero.
-    print("\nLimpiando colecciones antiguas...")
-    db.drop_collection('calendarios')
-    db.drop_collection('eventos')
-    db.drop_collection('comentarios')
-    print("🧹 Colecciones 'calendarios', 'eventos' y 'comentarios' eliminadas.")
-
-    # Obtenemos las colecciones (se crearán automáticamente al insertar datos)
-    calendarios_collection = db['calendarios']
-    eventos_collection = db['eventos']
-    comentarios_collection = db['comentarios']
-
-    # --- Creación de Datos de Ejemplo ---
-    print("\nGenerando datos de ejemplo...")
-
-    # Generamos los UUIDs para los IDs
-    calendario_principal_id = uuid.uuid4()
-    sub_calendario_id = uuid.uuid4()
-    otro_calendario_id = uuid.uuid4()
-
-    # 1. Insertar Calendarios
-    calendarios_collection.insert_many([
-        {
-            "_id": calendario_principal_id,
-            "titulo": "Calendario Principal de la Ciudad",
-            "organizador": "Ayuntamiento Central",
-            "palabras_clave": ["ciudad", "eventos", "público"],
-            "es_publico": True,
-            "idCalendarioPadre": None
-        },
-        {
-            "_id": sub_calendario_id,
-            "titulo": "Eventos Deportivos",
-            "organizador": "Concejalía de Deportes",
-            "palabras_clave": ["deporte", "competición"],
-            "es_publico": True,
-            "idCalendarioPadre": calendario_principal_id
-        },
-        {
-            "_id": otro_calendario_id,
-            "titulo": "Agenda Cultural Privada",
-            "organizador": "Centro Cultural Independiente",
-            "palabras_clave": ["cultura", "exposición", "música"],
-            "es_publico": False,
-            "idCalendarioPadre": None
-        }
-    ])
-    print("✅ 3 calendarios de ejemplo insertados.")
-
-    # 2. Insertar Eventos
-    evento_maraton_id = uuid.uuid4()
-    evento_noche_blanco_id = uuid.uuid4()
-    
-    eventos_collection.insert_many([
-        {
-            "_id": evento_maraton_id,
-            "idCalendario": sub_calendario_id,
-            "titulo": "Maratón de la Ciudad",
-            "horaComienzo": datetime(2025, 11, 15, 9, 0, 0),
-            "duracionMinutos": 240,
-            "lugar": "Salida desde el Estadio Municipal",
-            "organizador": "Concejalía de Deportes",
-            "contenidoAdjunto": {
-                "imagenes": [], "archivos": [], "mapa": {"latitud": 36.7213, "longitud": -4.4214}
-            }
-        },
-        {
-            "_id": evento_noche_blanco_id,
-            "idCalendario": calendario_principal_id,
-            "titulo": "Noche en Blanco",
-            "horaComienzo": datetime(2025, 10, 26, 20, 0, 0),
-            "duracionMinutos": 360,
-            "lugar": "Varios lugares en el centro",
-            "organizador": "Ayuntamiento Central",
-            "contenidoAdjunto": {"imagenes": ["https://ejemplo.com/noche_en_blanco.jpg"], "archivos": [], "mapa": None}
-        }
-    ])
-    print("✅ 2 eventos de ejemplo insertados.")
-
-    # 3. Insertar Comentarios
-    comentarios_collection.insert_many([
-        {
-            "_id": uuid.uuid4(),
-            "contenido": "¡Excelente maratón! Muy bien organizado y el recorrido estuvo perfecto.",
-            "idCalendario": None,
-            "idEvento": evento_maraton_id,
-            "fechaCreacion": datetime(2025, 11, 16, 10, 30, 0)
-        },
-        {
-            "_id": uuid.uuid4(),
-            "contenido": "Gran iniciativa de la ciudad. Esperamos más eventos así.",
-            "idCalendario": calendario_principal_id,
-            "idEvento": None,
-            "fechaCreacion": datetime(2025, 10, 20, 15, 45, 0)
-        },
-        {
-            "_id": uuid.uuid4(),
-            "contenido": "La Noche en Blanco fue increíble, muchas actividades culturales.",
-            "idCalendario": None,
-            "idEvento": evento_noche_blanco_id,
-            "fechaCreacion": datetime(2025, 10, 27, 9, 15, 0)
-        },
-        {
-            "_id": uuid.uuid4(),
-            "contenido": "Me encanta este calendario deportivo, tiene eventos muy variados.",
-            "idCalendario": sub_calendario_id,
-            "idEvento": None,
-            "fechaCreacion": datetime(2025, 11, 5, 12, 0, 0)
-        }
-    ])
-    print("✅ 4 comentarios de ejemplo insertados.")
-
-    print("\n🎉 Base de datos poblada con éxito.")
-
-except Exception as e:
-    print(f"❌ Error al insertar los datos: {e}")
-
-finally:
-    # Cerramos la conexión al finalizar
-    client.close()
-    print("\nConexión a MongoDB cerrada.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Un manejador recibe el cambio tal y como lo publica el servicio (dict JSON). Puede ser async.
+Handler = Callable[[dict], Union[None, Awaitable[None]]]
+
+
+class ChangeSubscriber:
+    """
+    Suscriptor de la outbox de cambios de un microservicio (GET /changes?since=<token>).
+    Guarda el token de reanudación tras procesar cada página, de modo que se puede parar y
+    continuar (o persistir 'token' y pasarlo al reiniciar) sin perder ni repetir cambios.
+
+    Uso:
+        subscriber = ChangeSubscriber(SERVICES["event"], invalidar_cache, on_reset=vaciar_cache)
+        asyncio.create_task(subscriber.run())
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        handler: Handler,
+        token: str = "0",
+        on_reset: Optional[Callable[[], Union[None, Awaitable[None]]]] = None,
+        interval: float = 1.0,
+        limite: int = 100,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.base_url = base_url
+        self.handler = handler
+        self.token = token
+        self.on_reset = on_reset
+        self.interval = interval
+        self.limite = limite
+        self._client = client
+        self._running = False
+
+
+    async def poll_once(self) -> int:
+        """Procesa una página de cambios y devuelve cuántos cambios se han procesado."""
+        client = self._client or httpx.AsyncClient(base_url=self.base_url)
+        try:
+            response = await client.get("/changes/", params={"since": self.token, "limite": self.limite})
+        finally:
+            if self._client is None:
+                await client.aclose()
+
+        if response.status_code == 410:
+            # El token caducó: lo que se haya cacheado ya no es fiable. Se vacía y se empieza de nuevo.
+            logger.warning("Token de cambios caducado en %s, resincronizando", self.base_url)
+            await _call(self.on_reset)
+            self.token = "0"
+            return 0
+        response.raise_for_status()
+
+        page = response.json()
+        for cambio in page["cambios"]:
+            await _call(self.handler, cambio)
+        self.token = page["token"]
+        return len(page["cambios"])
+
+
+    async def run(self) -> None:
+        """Bucle de consumo: sigue leyendo mientras haya páginas llenas y espera 'interval' si no."""
+        self._running = True
+        backoff = self.interval
+        while self._running:
+            try:
+                procesados = await self.poll_once()
+                backoff = self.interval
+                if procesados < self.limite:
+                    await asyncio.sleep(self.interval)
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                logger.warning("No se pudieron leer los cambios de %s: %s", self.base_url, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+    def stop(self) -> None:
+        """Detiene el bucle de run() tras la iteración en curso."""
+        self._running = False
+
+
+async def _call(func, *args):
+    """Llama a una función que puede ser síncrona o asíncrona."""
+    if func is None:
+        return
+    result = func(*args)
+    if inspect.isawaitable(result):
+        await result
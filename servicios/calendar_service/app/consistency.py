@@ -0,0 +1,113 @@
+"""
+Lectura de las propias escrituras (read-your-writes) entre peticiones, con sesiones causales.
+
+Las lecturas de listados (y, si se configura, las de por ID) pueden ir a secundarios, que
+van algo por detrás del primario. Para que un cliente vea siempre lo que acaba de escribir:
+
+1. Cada escritura se hace en una sesión causal; su operationTime (y el clusterTime firmado)
+   se guarda en la petición en curso.
+2. ConsistencyMiddleware lo devuelve en la respuesta como X-Consistency-Token (opaco).
+3. Si el cliente reenvía ese token en sus siguientes lecturas, estas se hacen en una sesión
+   causal avanzada hasta él: el secundario espera a haber replicado esa escritura antes de
+   responder (readConcern afterClusterTime). Mientras el token es reciente, las lecturas
+   además se saltan las cachés en proceso, que pueden ser de otro worker.
+
+Sin token las lecturas son como siempre (con el retraso acotado por maxStalenessSeconds).
+"""
+from contextvars import ContextVar
+from typing import Optional, Tuple
+import base64
+import time
+
+import bson
+from bson import Timestamp
+
+CABECERA = b"x-consistency-token"
+
+
+class _Marca:
+    """Última escritura que deben ver las lecturas de la petición en curso."""
+
+    __slots__ = ("operation_time", "cluster_time", "escrita")
+
+    def __init__(self, operation_time: Optional[Timestamp] = None, cluster_time: Optional[dict] = None):
+        self.operation_time = operation_time
+        self.cluster_time = cluster_time
+        self.escrita = False  # Si la petición escribió (y hay que devolver un token nuevo)
+
+
+_marca_actual: ContextVar[Optional[_Marca]] = ContextVar("marca_causal", default=None)
+
+
+def codificar(operation_time: Timestamp, cluster_time: Optional[dict]) -> str:
+    datos = bson.encode({"o": operation_time, "c": cluster_time})
+    return base64.urlsafe_b64encode(datos).decode("ascii").rstrip("=")
+
+
+def decodificar(token: str) -> Optional[Tuple[Timestamp, Optional[dict]]]:
+    """(operationTime, clusterTime) del token, o None si no es válido (se ignora)."""
+    try:
+        datos = bson.decode(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(datos.get("o"), Timestamp):
+            return None
+        return datos["o"], datos.get("c")
+    except Exception:
+        return None
+
+
+def registrar_escritura(session) -> None:
+    """Anota en la petición en curso el momento de una escritura hecha en 'session'."""
+    marca = _marca_actual.get()
+    if marca is None or session is None or session.operation_time is None:
+        return
+    if marca.operation_time is None or session.operation_time > marca.operation_time:
+        marca.operation_time = session.operation_time
+        marca.cluster_time = session.cluster_time
+    marca.escrita = True
+
+
+def marca_causal() -> Optional[_Marca]:
+    """La marca que deben respetar las lecturas de la petición en curso (None si no hay)."""
+    marca = _marca_actual.get()
+    return marca if marca is not None and marca.operation_time is not None else None
+
+
+def marca_reciente(segundos: float) -> bool:
+    """Si la petición trae (o ha hecho) una escritura de hace menos de 'segundos'."""
+    marca = marca_causal()
+    return marca is not None and time.time() - marca.operation_time.time < segundos
+
+
+class ConsistencyMiddleware:
+    """
+    Middleware ASGI: lee X-Consistency-Token de la petición y, si la petición escribió,
+    devuelve el token de su última escritura en la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marca = _Marca()
+        for nombre, valor in scope["headers"]:
+            if nombre == CABECERA:
+                decodificado = decodificar(valor.decode("latin-1"))
+                if decodificado is not None:
+                    marca.operation_time, marca.cluster_time = decodificado
+                break
+        token = _marca_actual.set(marca)
+
+        async def send_con_token(message):
+            if message["type"] == "http.response.start" and marca.escrita:
+                valor = codificar(marca.operation_time, marca.cluster_time).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (CABECERA, valor)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_token)
+        finally:
+            _marca_actual.reset(token)
@@ -1,65 +1,283 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
-from pymongo import ReturnDocument
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 
 # Importaciones de tu proyecto
 from .. import database
+from ..storage import LECTURA_ID, LISTADO, MASIVA, Storage
 from ..model.calendar_models import CalendarCreate, CalendarInDB 
+from .outbox_crud import OutboxCRUD
+from ..etag import filtro_version
+from ..cache import EntityCache, ResultCache
+
+# Nombre de la entidad en los cambios publicados en la outbox
+ENTIDAD = "calendario"
+
+
+def _padres(calendar: dict) -> dict:
+    """IDs de las entidades padre de un calendario (para invalidar sus listados en los suscriptores)."""
+    return {"idCalendarioPadre": calendar.get("idCalendarioPadre")}
 
-# Alias para la colección de MongoDB (simplifica el código)
-CalendarCollection = database.calendarios_collection 
 
 class CalendarCRUD:
     """
     Capa de Acceso a Datos (Repository) para Calendarios (MongoDB).
     Toda la sintaxis de PyMongo se encapsula aquí.
+    Las escrituras publican cada cambio en la outbox (OutboxCRUD) dentro de la misma
+    transacción que el documento.
     """
+    def __init__(
+        self,
+        storage: Optional[Storage] = None,
+        outbox: Optional[OutboxCRUD] = None,
+        cache: Optional[EntityCache] = None,
+        list_cache: Optional[ResultCache] = None,
+    ):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.CALENDARIOS)
+        # Misma colección con las opciones de cada clase de operación (read preference / write concern)
+        self.id_collection = self.storage.collection(database.CALENDARIOS, LECTURA_ID)
+        self.list_collection = self.storage.collection(database.CALENDARIOS, LISTADO)
+        self.bulk_collection = self.storage.collection(database.CALENDARIOS, MASIVA)
+        self.outbox = outbox or OutboxCRUD(self.storage)
+        self.cache = cache or EntityCache()
+        # Caché de listados de la colección: cada escritura incrementa su generación
+        self.list_cache = list_cache or ResultCache()
+
 
     async def create(self, calendar_data: dict) -> CalendarInDB:
         """Inserta el diccionario de calendario en la BD y lo recupera."""
-        new_calendar = CalendarCollection.insert_one(calendar_data)
-        created_calendar = CalendarCollection.find_one({"_id": new_calendar.inserted_id})
+        calendar_data = {**calendar_data, "version": 1, "fechaActualizacion": datetime.utcnow()}
+
+        def _insert(session):
+            new_calendar = self.collection.insert_one({**calendar_data, "secuencia": secuencia}, session=session)
+            cambio = self.outbox.record(
+                ENTIDAD, new_calendar.inserted_id, "crear", 1, _padres(calendar_data), session=session, secuencia=secuencia
+            )
+            return new_calendar.inserted_id, cambio
+
+        # La secuencia del cambio es también la del documento: con ella lo encuentra GET /sync
+        with self.outbox.reservar() as secuencia:
+            inserted_id, cambio = self.storage.run_in_transaction(_insert)
+        self.cache.invalidate(inserted_id)  # Descarta un posible "no encontrado" cacheado
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+
+        created_calendar = self.collection.find_one({"_id": inserted_id})
         return CalendarInDB.model_validate(created_calendar)  # Convierte el dict de Mongo a Pydantic
 
 
     async def get_by_id(self, calendar_id: UUID) -> Optional[CalendarInDB]:
-        """Busca un calendario por ID."""
-        calendar_data = CalendarCollection.find_one({"_id": calendar_id})
+        """Busca un calendario por ID (a través de la caché en proceso)."""
+        return await self.cache.get_or_load(calendar_id, lambda: self._load_by_id(calendar_id))
+
+
+    async def _load_by_id(self, calendar_id: UUID) -> Optional[CalendarInDB]:
+        """Lee un calendario de la BD (carga de la caché de get_by_id)."""
+        calendar_data = self.storage.run_causal(
+            lambda session: self.id_collection.find_one({"_id": calendar_id}, session=session)
+        )
         if calendar_data:
             return CalendarInDB.model_validate(calendar_data)
         return None
 
     
-    async def list_by_filter(self, filters: dict) -> List[CalendarInDB]:
-        """Devuelve una lista de calendarios aplicando el filtro de MongoDB."""
-        cursor = CalendarCollection.find(filters)
-        calendar_list = list(cursor)
+    async def list_by_filter(self, filters: dict, limit: int = 0) -> List[CalendarInDB]:
+        """Devuelve una lista de calendarios aplicando el filtro de MongoDB (como mucho 'limit' si no es 0)."""
+        calendar_list = self.storage.run_causal(
+            lambda session: list(self.list_collection.find(filters, session=session).limit(limit))
+        )
         return [CalendarInDB.model_validate(calendar) for calendar in calendar_list]
 
 
-    async def update(self, calendar_id: UUID, update_data: dict) -> Optional[CalendarInDB]:
-        """Actualiza y devuelve el documento actualizado."""
-        updated_data = CalendarCollection.find_one_and_update(
-            {"_id": calendar_id},
-            {"$set": update_data},
-            return_document=ReturnDocument.AFTER
+    async def count_by_filter(self, filters: dict, limit: int = 0) -> int:
+        """Cuenta los calendarios del filtro; con 'limit' deja de contar al alcanzarlo."""
+        # pymongo convierte 'limit' en una etapa $limit, que no admite 0
+        opciones = {"limit": limit} if limit else {}
+        return self.storage.run_causal(
+            lambda session: self.list_collection.count_documents(filters, session=session, **opciones)
         )
-        if updated_data:
-            return CalendarInDB.model_validate(updated_data)
-        return None
+
+
+    async def estimated_count(self) -> int:
+        """Total aproximado de calendarios según los metadatos de la colección (no recorre documentos)."""
+        return self.list_collection.estimated_document_count()
+
+
+    async def facet_counts(self, filters: dict, fields: Dict[str, bool], top: int) -> dict:
+        """
+        Cuenta los calendarios del filtro agrupados por cada campo, en una única agregación ($facet).
+        'fields' indica por campo si es un array (entonces cuenta cada elemento por separado).
+        Devuelve {"total": [{"n": total}], campo: [{"_id": valor, "total": n}, ...]} con los 'top'
+        valores más frecuentes de cada campo.
+        """
+        facetas = {"total": [{"$count": "n"}]}
+        for campo, es_array in fields.items():
+            facetas[campo] = [
+                *([{"$unwind": f"${campo}"}] if es_array else []),
+                {"$group": {"_id": f"${campo}", "total": {"$sum": 1}}},
+                {"$sort": {"total": -1, "_id": 1}},
+                {"$limit": top},
+            ]
+        resultado = self.storage.run_causal(lambda session: list(
+            self.list_collection.aggregate([{"$match": filters}, {"$facet": facetas}], session=session)
+        ))
+        return resultado[0]
+
+
+    async def update(
+        self, calendar_id: UUID, update_data: dict, expected_versions: Optional[List[int]] = None
+    ) -> Optional[CalendarInDB]:
+        """
+        Actualiza y devuelve el documento actualizado.
+        Con 'expected_versions' (If-Match) solo actualiza si la versión almacenada es una de ellas;
+        si no existe o la versión no coincide devuelve None.
+        """
+        update_data = {**update_data, "fechaActualizacion": datetime.utcnow()}
+        filtro = {"_id": calendar_id}
+        if expected_versions is not None:
+            filtro["version"] = filtro_version(expected_versions)
+
+        def _update(session):
+            # Se pide el documento ANTERIOR para conocer el padre previo si el calendario se mueve;
+            # el posterior es el anterior con los campos del $set aplicados.
+            previous_data = self.collection.find_one_and_update(
+                filtro,
+                {"$set": {**update_data, "secuencia": secuencia}, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if previous_data is None:
+                return None, None
+            updated_data = {
+                **previous_data, **update_data, "secuencia": secuencia, "version": previous_data.get("version", 0) + 1
+            }
+            cambio = self.outbox.record(
+                ENTIDAD, calendar_id, "actualizar", updated_data["version"], _padres(updated_data),
+                padres_anteriores=_padres(previous_data), session=session, secuencia=secuencia
+            )
+            return updated_data, cambio
+
+        with self.outbox.reservar() as secuencia:
+            updated_data, cambio = self.storage.run_in_transaction(_update)
+        self.cache.invalidate(calendar_id)
+        if updated_data is None:
+            return None
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+        return CalendarInDB.model_validate(updated_data)
 
 
     async def delete(self, calendar_id: UUID) -> int:
         """Elimina un calendario y devuelve el número de documentos eliminados (0 o 1)."""
-        delete_result = CalendarCollection.delete_one({"_id": calendar_id})
-        return delete_result.deleted_count
+
+        def _delete(session):
+            deleted_calendar = self.collection.find_one_and_delete({"_id": calendar_id}, session=session)
+            if deleted_calendar is None:
+                return None, None
+            cambio = self.outbox.record(
+                ENTIDAD, calendar_id, "eliminar", deleted_calendar.get("version", 0) + 1,
+                _padres(deleted_calendar), session=session, secuencia=secuencia
+            )
+            return deleted_calendar, cambio
+
+        with self.outbox.reservar() as secuencia:
+            deleted_calendar, cambio = self.storage.run_in_transaction(_delete)
+        self.cache.invalidate(calendar_id)
+        if deleted_calendar is None:
+            return 0
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+        return 1
     
 
     async def get_subcalendars(self, parent_id: UUID) -> List[CalendarInDB]:
         """Devuelve los subcalendarios que tienen como padre el ID indicado."""
         filtro = {"idCalendarioPadre": parent_id}
-        cursor = CalendarCollection.find(filtro)
-        calendar_list = list(cursor)
+        calendar_list = self.storage.run_causal(lambda session: list(self.list_collection.find(filtro, session=session)))
+        return [CalendarInDB.model_validate(calendar) for calendar in calendar_list]
+
+
+    async def get_many(self, calendar_ids: List[UUID]) -> List[CalendarInDB]:
+        """Busca varios calendarios por ID con una única consulta $in (sin orden garantizado)."""
+        calendar_list = self.storage.run_causal(
+            lambda session: list(self.id_collection.find({"_id": {"$in": calendar_ids}}, session=session))
+        )
+        return [CalendarInDB.model_validate(calendar) for calendar in calendar_list]
+
+
+    async def get_subcalendar_ids(self, parent_ids: List[UUID]) -> List[UUID]:
+        """Devuelve los IDs de los subcalendarios directos de los calendarios indicados."""
+        cursor = self.collection.find({"idCalendarioPadre": {"$in": parent_ids}}, {"_id": 1})
+        return [calendar["_id"] for calendar in cursor]
+
+
+    async def delete_many(self, calendar_ids: List[UUID]) -> int:
+        """
+        Elimina un lote de calendarios por ID y devuelve cuántos se eliminaron.
+        Como delete(): publica un cambio "eliminar" por calendario en la misma transacción.
+        """
+
+        def _delete(session):
+            deleted_calendars = list(self.collection.find({"_id": {"$in": calendar_ids}}, session=session))
+            if not deleted_calendars:
+                return [], []
+            self.bulk_collection.delete_many(
+                {"_id": {"$in": [calendar["_id"] for calendar in deleted_calendars]}}, session=session
+            )
+            cambios = [
+                self.outbox.record(
+                    ENTIDAD, calendar["_id"], "eliminar", calendar.get("version", 0) + 1,
+                    _padres(calendar), session=session, secuencia=primera + i
+                )
+                for i, calendar in enumerate(deleted_calendars)
+            ]
+            return deleted_calendars, cambios
+
+        # Una secuencia por ID pedido (los que ya no existan dejan hueco).
+        # Borrado en cascada: no necesita esperar a la confirmación de la mayoría
+        with self.outbox.reservar(len(calendar_ids)) as ultima:
+            primera = ultima - len(calendar_ids) + 1
+            deleted_calendars, cambios = self.storage.run_in_transaction(_delete, MASIVA)
+        for calendar_id in calendar_ids:
+            self.cache.invalidate(calendar_id)
+        if not deleted_calendars:
+            return 0
+        self.list_cache.bump()
+        for cambio in cambios:
+            self.outbox.dispatch(cambio)
+        return len(deleted_calendars)
+
+
+    async def list_changed_since(self, since: int, limit: int, hasta: int) -> List[CalendarInDB]:
+        """
+        Devuelve hasta 'limit' calendarios escritos después de la secuencia 'since' (hasta 'hasta'), en orden de secuencia.
+        Se lee del primario (perfil de escritura): 'hasta' es la secuencia confirmada en el primario y un
+        secundario atrasado podría devolver la N sin la N-1, que quedaría para siempre detrás del token.
+        """
+        calendar_list = self.storage.run_causal(lambda session: list(
+            self.collection.find({"secuencia": {"$gt": since, "$lte": hasta}}, session=session)
+            .sort("secuencia", 1).limit(limit)
+        ))
         return [CalendarInDB.model_validate(calendar) for calendar in calendar_list]
 
 
+    async def backfill_secuencias(self) -> int:
+        """
+        Asigna secuencia a los calendarios escritos antes de que existiera (sin el campo), para que
+        la sincronización delta los entregue. Devuelve el número de documentos modificados.
+        """
+        pendientes = [calendar["_id"] for calendar in self.collection.find({"secuencia": {"$exists": False}}, {"_id": 1})]
+        if not pendientes:
+            return 0
+        with self.outbox.reservar(len(pendientes)) as ultima:
+            primera = ultima - len(pendientes) + 1
+            update_result = self.bulk_collection.bulk_write([
+                # Si otro proceso se adelanta, su secuencia se respeta (el filtro ya no coincide)
+                UpdateOne({"_id": calendar_id, "secuencia": {"$exists": False}}, {"$set": {"secuencia": primera + i}})
+                for i, calendar_id in enumerate(pendientes)
+            ], ordered=False)
+        if update_result.modified_count:
+            self.list_cache.bump()
+        return update_result.modified_count
@@ -0,0 +1,111 @@
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, DESCENDING
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+from ..model.deletion_job_models import DeletionJob
+
+# Estados en los que un trabajo todavía tiene trabajo por hacer
+ESTADOS_ACTIVOS = ["pendiente", "en_curso"]
+
+
+class DeletionJobCRUD:
+    """
+    Capa de Acceso a Datos para los trabajos de borrado en cascada.
+    Cada trabajo guarda su fase y progreso, de modo que cualquier proceso puede reanudarlo
+    tras una caída. Un proceso solo ejecuta un trabajo mientras tiene su 'lease' vigente
+    (propietario + leaseHasta), que renueva en cada lote.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.TRABAJOS_BORRADO)
+
+    async def create(self, job_data: dict) -> DeletionJob:
+        """Inserta un trabajo nuevo y lo devuelve."""
+        self.collection.insert_one(job_data)
+        return DeletionJob.model_validate(job_data)
+
+
+    async def get_by_id(self, job_id: UUID) -> Optional[DeletionJob]:
+        """Busca un trabajo por ID."""
+        job_data = self.collection.find_one({"_id": job_id})
+        if job_data:
+            return DeletionJob.model_validate(job_data)
+        return None
+
+
+    async def list_by_filter(self, filters: dict, limit: int) -> List[DeletionJob]:
+        """Devuelve los trabajos más recientes que cumplen el filtro."""
+        cursor = self.collection.find(filters).sort("creadoEn", DESCENDING).limit(limit)
+        return [DeletionJob.model_validate(job) for job in cursor]
+
+
+    async def claim(self, job_id: UUID, propietario: str, lease_seconds: float) -> Optional[dict]:
+        """
+        Toma el trabajo si está activo y nadie tiene un lease vigente sobre él (o ya es suyo).
+        Devuelve el documento del trabajo o None si otro proceso lo está ejecutando.
+        """
+        ahora = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "estado": {"$in": ESTADOS_ACTIVOS},
+                "$or": [{"leaseHasta": {"$lt": ahora}}, {"leaseHasta": None}, {"propietario": propietario}],
+            },
+            {
+                "$set": {
+                    "estado": "en_curso",
+                    "propietario": propietario,
+                    "leaseHasta": ahora + timedelta(seconds=lease_seconds),
+                    "actualizadoEn": ahora,
+                },
+                "$inc": {"intentos": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+
+    async def update_progress(
+        self,
+        job_id: UUID,
+        propietario: str,
+        lease_seconds: float,
+        set_data: Optional[dict] = None,
+        inc_data: Optional[dict] = None,
+    ) -> bool:
+        """
+        Guarda el progreso del trabajo y renueva su lease.
+        Devuelve False si el proceso ha perdido el lease (otro proceso tomó el trabajo).
+        """
+        ahora = datetime.utcnow()
+        update = {"$set": {**(set_data or {}), "leaseHasta": ahora + timedelta(seconds=lease_seconds), "actualizadoEn": ahora}}
+        if inc_data:
+            update["$inc"] = inc_data
+        result = self.collection.update_one({"_id": job_id, "propietario": propietario}, update)
+        return result.matched_count == 1
+
+
+    async def increment(self, job_id: UUID, inc_data: dict) -> None:
+        """Suma contadores de progreso sin necesidad de tener el lease (p.ej. el borrado de la raíz)."""
+        self.collection.update_one({"_id": job_id}, {"$inc": inc_data, "$set": {"actualizadoEn": datetime.utcnow()}})
+
+
+    async def release(self, job_id: UUID, propietario: str, set_data: dict) -> None:
+        """Cierra o libera el trabajo (fin, error o parada) y suelta el lease."""
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {"$set": {**set_data, "leaseHasta": None, "actualizadoEn": datetime.utcnow()}},
+        )
+
+
+    async def list_resumable_ids(self) -> List[UUID]:
+        """IDs de los trabajos activos sin lease vigente (abandonados por un proceso caído)."""
+        cursor = self.collection.find(
+            {"estado": {"$in": ESTADOS_ACTIVOS}, "$or": [{"leaseHasta": {"$lt": datetime.utcnow()}}, {"leaseHasta": None}]},
+            {"_id": 1},
+        )
+        return [job["_id"] for job in cursor]
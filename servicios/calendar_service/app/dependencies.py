@@ -1,14 +1,90 @@
-from app.service.calendarService import CalendarService
-from app.crud.calendar_crud import CalendarCRUD
+from .service.calendarService import CalendarService
+from .service.changesService import ChangesService
+from .service.syncService import SyncService
+from .service.cascadeService import CascadeDeleteService
+from .service.jobQueue import JobQueue
+from .service.jobHandlers import registrar_manejadores
+from .crud.calendar_crud import CalendarCRUD
+from .crud.outbox_crud import OutboxCRUD
+from .crud.deletion_job_crud import DeletionJobCRUD
+from .crud.job_crud import JobCRUD
+from .crud.idempotency_crud import IdempotencyCRUD
+from .service.idempotencyService import IdempotencyService
+from .service.streamService import CalendarStreamHub
+from .cache import OutboxInvalidator
+from .storage import Storage
+from . import database
 
-# Instanciación estática del CRUD (si no requiere sesión/estado)
-# Si CalendarCRUD requiriera una sesión de BD, esto usaría 'yield' y el patrón Context Manager
-CALENDAR_CRUD_INSTANCE = CalendarCRUD()
+# Instanciación estática de los CRUD sobre el almacenamiento del proceso.
+# configure_storage() los reconstruye sobre otro (p.ej. uno en memoria por test).
+STORAGE_INSTANCE: Storage = None
+OUTBOX_INSTANCE: OutboxCRUD = None
+IDEMPOTENCY_CRUD_INSTANCE: IdempotencyCRUD = None
+CALENDAR_CRUD_INSTANCE: CalendarCRUD = None
+# El servicio de borrado en cascada es único por proceso: lleva la cuenta de sus tareas de fondo
+CASCADE_SERVICE_INSTANCE: CascadeDeleteService = None
+# Igual que la cola de trabajos: sus manejadores y sus trabajadores de fondo son del proceso
+JOB_QUEUE_INSTANCE: JobQueue = None
+# Las conexiones SSE de /calendars/{id}/stream y la lectura de las outbox que las alimenta
+STREAM_HUB_INSTANCE: CalendarStreamHub = None
+# Invalida las cachés de este proceso con las escrituras de los demás (lee la outbox)
+CACHE_INVALIDATOR_INSTANCE: OutboxInvalidator = None
+
+def configure_storage(storage: Storage) -> None:
+    """Construye de nuevo los CRUD (y los servicios de fondo) sobre el almacenamiento indicado."""
+    global STORAGE_INSTANCE, OUTBOX_INSTANCE, CALENDAR_CRUD_INSTANCE, CASCADE_SERVICE_INSTANCE, JOB_QUEUE_INSTANCE, IDEMPOTENCY_CRUD_INSTANCE, STREAM_HUB_INSTANCE, CACHE_INVALIDATOR_INSTANCE
+    STORAGE_INSTANCE = storage
+    OUTBOX_INSTANCE = OutboxCRUD(storage)
+    IDEMPOTENCY_CRUD_INSTANCE = IdempotencyCRUD(storage)
+    CALENDAR_CRUD_INSTANCE = CalendarCRUD(storage, outbox=OUTBOX_INSTANCE)
+    CASCADE_SERVICE_INSTANCE = CascadeDeleteService(CALENDAR_CRUD_INSTANCE, DeletionJobCRUD(storage))
+    JOB_QUEUE_INSTANCE = JobQueue(JobCRUD(storage))
+    registrar_manejadores(JOB_QUEUE_INSTANCE, CALENDAR_CRUD_INSTANCE)
+    STREAM_HUB_INSTANCE = CalendarStreamHub(CALENDAR_CRUD_INSTANCE, OUTBOX_INSTANCE)
+    CACHE_INVALIDATOR_INSTANCE = OutboxInvalidator(OUTBOX_INSTANCE, CALENDAR_CRUD_INSTANCE.cache, CALENDAR_CRUD_INSTANCE.list_cache)
+
+configure_storage(database.storage)
+
+def get_storage() -> Storage:
+    """Provee el almacenamiento sobre el que trabajan los CRUD."""
+    return STORAGE_INSTANCE
 
 def get_calendar_crud() -> CalendarCRUD:
     """Provee la instancia del CRUD (útil para otros servicios o tests)."""
     return CALENDAR_CRUD_INSTANCE
 
 def get_calendar_service() -> CalendarService:
-    """Provee la instancia del CalendarService, inyectándole el CRUD."""
-    return CalendarService(crud_repository=CALENDAR_CRUD_INSTANCE)
\ No newline at end of file
+    """Provee la instancia del CalendarService, inyectándole el CRUD, el borrado en cascada y la cola."""
+    return CalendarService(crud_repository=CALENDAR_CRUD_INSTANCE, cascade=CASCADE_SERVICE_INSTANCE, jobs=JOB_QUEUE_INSTANCE)
+
+def get_outbox() -> OutboxCRUD:
+    """Provee la outbox de cambios (p.ej. para suscribirse en proceso con subscribe())."""
+    return OUTBOX_INSTANCE
+
+def get_changes_service() -> ChangesService:
+    """Provee la instancia del ChangesService, inyectándole la outbox."""
+    return ChangesService(outbox=OUTBOX_INSTANCE)
+
+def get_sync_service() -> SyncService:
+    """Provee la instancia del SyncService, inyectándole el CRUD y la outbox (bajas)."""
+    return SyncService(crud=CALENDAR_CRUD_INSTANCE, outbox=OUTBOX_INSTANCE)
+
+def get_cascade_service() -> CascadeDeleteService:
+    """Provee el servicio de borrado en cascada (trabajos de fondo y su estado)."""
+    return CASCADE_SERVICE_INSTANCE
+
+def get_job_queue() -> JobQueue:
+    """Provee la cola de trabajos del proceso (encolar, consultar y ejecutar trabajos)."""
+    return JOB_QUEUE_INSTANCE
+
+def get_idempotency_service() -> IdempotencyService:
+    """Provee el IdempotencyService (cabecera Idempotency-Key de los POST de creación)."""
+    return IdempotencyService(crud=IDEMPOTENCY_CRUD_INSTANCE)
+
+def get_stream_hub() -> CalendarStreamHub:
+    """Provee el reparto de cambios a las conexiones SSE del proceso."""
+    return STREAM_HUB_INSTANCE
+
+def get_cache_invalidator() -> OutboxInvalidator:
+    """Provee el invalidador de cachés del proceso (se arranca en el lifespan)."""
+    return CACHE_INVALIDATOR_INSTANCE
@@ -0,0 +1,55 @@
+"""
+Proceso aparte que ejecuta la cola de trabajos (notificaciones, validaciones cruzadas...).
+
+Uso (desde el directorio del servicio):
+    python -m app.job_worker
+    python -m app.job_worker --trabajadores 8
+    python -m app.job_worker --drenar        # ejecuta lo pendiente y termina
+
+Se combina con JOBS_WORKERS=0 en la API para que sus procesos solo encolen. Se pueden
+lanzar varios: cada trabajo lo toma uno solo. Necesita MongoDB (con STORAGE_BACKEND=memory
+la cola vive en el proceso de la API y no se puede consumir desde otro).
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from . import database
+from .dependencies import get_job_queue, get_storage
+from .service.jobQueue import JOBS_WORKERS
+
+logger = logging.getLogger("app.job_worker")
+
+
+async def ejecutar(trabajadores: int, drenar: bool) -> None:
+    database.ensure_indexes(get_storage())
+    # Transacciones si MongoDB las admite (replica set); si no, se avisa en el log al arrancar
+    get_storage().comprobar_transacciones()
+    queue = get_job_queue()
+    if drenar:
+        logger.info("Trabajos ejecutados: %d", await queue.procesar_pendientes())
+        return
+
+    parar = asyncio.Event()
+    bucle = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        bucle.add_signal_handler(senal, parar.set)
+    queue.iniciar(trabajadores)
+    logger.info("Cola de trabajos en marcha con %d trabajadores", trabajadores)
+    await parar.wait()
+    # Los trabajos en curso vuelven a la cola para otro proceso
+    await queue.detener()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trabajadores", type=int, default=JOBS_WORKERS or 2, help="Trabajos simultáneos en este proceso")
+    parser.add_argument("--drenar", action="store_true", help="Ejecutar los trabajos disponibles y terminar")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(ejecutar(args.trabajadores, args.drenar))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,65 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .router import calendars
+import asyncio
+from . import database
+from .tracing import TracingMiddleware
+from .db_timing import ServerTimingMiddleware
+from .consistency import ConsistencyMiddleware
+from .profiling import ENABLED as PROFILING_ENABLED, ProfilingMiddleware
+from .dependencies import get_cache_invalidator, get_calendar_crud, get_cascade_service, get_job_queue, get_storage, get_stream_hub
+from .service.jobQueue import JOBS_WORKERS
+from .router import calendars, changes, sync, metrics, deletion_jobs, profiles, jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Índices y secuencia de sincronización de los calendarios antiguos antes de servir peticiones
+    database.ensure_indexes(get_storage())
+    # Transacciones si MongoDB las admite (replica set); si no, se avisa en el log al arrancar
+    get_storage().comprobar_transacciones()
+    await get_calendar_crud().backfill_secuencias()
+    # Reanuda los borrados en cascada que quedaron a medias (caídas, reinicios, otros procesos)
+    cascade = get_cascade_service()
+    vigilante = asyncio.create_task(cascade.vigilar())
+    # Trabajadores de la cola en este proceso (con JOBS_WORKERS=0 los ejecuta app.job_worker)
+    queue = get_job_queue()
+    queue.iniciar(JOBS_WORKERS)
+    # Escrituras de otros workers o réplicas: se descartan de las cachés de este proceso
+    invalidador = get_cache_invalidator()
+    invalidador.iniciar()
+    yield
+    await invalidador.detener()
+    vigilante.cancel()
+    await cascade.detener()
+    await queue.detener()
+    # Cierra la lectura de las outbox de los flujos SSE
+    await get_stream_hub().detener()
 
 
 app = FastAPI(
     title="API de Kalendas",
     description="API para la gestión de calendarios y eventos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Trazas distribuidas (traceparent W3C); sin TRACING_EXPORTER solo se propaga la cabecera
+app.add_middleware(TracingMiddleware, service_name="calendar_service")
+# Server-Timing: tiempo en MongoDB frente al total de cada petición
+app.add_middleware(ServerTimingMiddleware)
+# Lecturas causales: X-Consistency-Token de la última escritura del cliente
+app.add_middleware(ConsistencyMiddleware)
+# Perfilado bajo demanda (PROFILING_TOKEN o PROFILING_SAMPLE_RATE); sin configurar no se instala
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, service_name="calendar_service")
+
 app.include_router(calendars.router)
+app.include_router(changes.router)
+app.include_router(sync.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(deletion_jobs.router)
+app.include_router(jobs.router)
 
 
 @app.get("/")
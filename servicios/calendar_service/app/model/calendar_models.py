@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from datetime import datetime
 from uuid import UUID 
 
 # Modelo BASE
@@ -17,6 +18,11 @@ class CalendarCreate(CalendarBase):
 # Modelo para RESPUESTA (lo que devolvemos desde la API)
 class CalendarInDB(CalendarBase):
     id: UUID = Field(..., alias="_id")
+    # Control de concurrencia: 'version' se incrementa en cada escritura y es el ETag del recurso
+    version: int = 0
+    fecha_actualizacion: Optional[datetime] = Field(default=None, alias="fechaActualizacion")
+    # Posición de la última escritura en la secuencia de cambios del servicio (GET /sync)
+    secuencia: int = 0
 
     # Configuración para Pydantic v2
     model_config = ConfigDict(
@@ -31,4 +37,29 @@ class CalendarInDB(CalendarBase):
                 "id_calendario_padre": None
             }
         }
-    )
\ No newline at end of file
+    )
+
+
+# Modelo para PEDIR varios calendarios por ID en una sola llamada
+class BatchLookup(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1)
+
+
+# Modelo para RESPUESTA de la búsqueda por lotes (en el orden pedido, con los IDs que no existen)
+class CalendarBatch(BaseModel):
+    calendarios: List[CalendarInDB]
+    no_encontrados: List[UUID] = Field(default=[], alias="noEncontrados")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para RESPUESTA de las facetas: un valor del campo y cuántos calendarios lo tienen
+class ValorFaceta(BaseModel):
+    valor: Any = Field(..., json_schema_extra={"example": "Universidad de Málaga"})
+    total: int
+
+
+# Modelo para RESPUESTA de GET /calendars/facets: total del filtro y recuentos por campo
+class Facetas(BaseModel):
+    total: int
+    facetas: Dict[str, List[ValorFaceta]]
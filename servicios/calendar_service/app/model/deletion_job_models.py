@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+
+# Contadores de documentos eliminados por un trabajo de borrado
+class EliminadosCascada(BaseModel):
+    calendarios: int = 0
+    eventos: int = 0
+    comentarios: int = 0
+
+
+# Modelo de RESPUESTA: estado de un borrado en cascada de calendario
+class DeletionJob(BaseModel):
+    id: UUID = Field(..., alias="_id")
+    id_calendario: UUID = Field(..., alias="idCalendario")
+    estado: Literal["pendiente", "en_curso", "completado", "fallido"]
+    fase: Literal["jerarquia", "eventos", "comentarios", "calendarios", "fin"]
+    calendarios: List[UUID] = Field(default=[], description="Calendario raíz y todos sus subcalendarios")
+    eliminados: EliminadosCascada = Field(default_factory=EliminadosCascada)
+    intentos: int = 0
+    error: Optional[str] = None
+    creado_en: datetime = Field(..., alias="creadoEn")
+    actualizado_en: datetime = Field(..., alias="actualizadoEn")
+    completado_en: Optional[datetime] = Field(default=None, alias="completadoEn")
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
+            "example": {
+                "id": "0b8e1c8e-3f0e-4bb5-9a49-3f1f3bd0c001",
+                "id_calendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+                "estado": "en_curso",
+                "fase": "eventos",
+                "calendarios": ["f47ac10b-58cc-4372-a567-0e02b2c3d479"],
+                "eliminados": {"calendarios": 1, "eventos": 1500, "comentarios": 4210},
+                "intentos": 1,
+                "error": None,
+                "creado_en": "2025-11-04T10:30:00",
+                "actualizado_en": "2025-11-04T10:30:12",
+                "completado_en": None
+            }
+        }
+    )
@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Any, Dict, Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+
+# Modelo de RESPUESTA: un trabajo de la cola de efectos secundarios (notificaciones, validaciones...)
+class Job(BaseModel):
+    id: UUID = Field(..., alias="_id")
+    tipo: str = Field(..., description="Manejador que ejecuta el trabajo")
+    payload: Dict[str, Any] = {}
+    clave_dedup: Optional[str] = Field(default=None, alias="claveDedup")
+    estado: Literal["pendiente", "en_curso", "completado", "fallido"]
+    intentos: int = 0
+    max_intentos: int = Field(..., alias="maxIntentos")
+    disponible_en: datetime = Field(..., alias="disponibleEn", description="Cuándo se puede ejecutar (reintentos con espera)")
+    error: Optional[str] = None
+    resultado: Optional[Dict[str, Any]] = None
+    creado_en: datetime = Field(..., alias="creadoEn")
+    actualizado_en: datetime = Field(..., alias="actualizadoEn")
+    terminado_en: Optional[datetime] = Field(default=None, alias="terminadoEn")
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
+            "example": {
+                "id": "5c1d1b2e-8f0e-4bb5-9a49-3f1f3bd0c0aa",
+                "tipo": "notificar",
+                "payload": {"evento": "evento.creado", "id": "a3bb189e-8bf9-3888-9912-ace4e6543002"},
+                "clave_dedup": "notificar:evento.creado:a3bb189e-8bf9-3888-9912-ace4e6543002",
+                "estado": "pendiente",
+                "intentos": 1,
+                "max_intentos": 5,
+                "disponible_en": "2025-11-04T10:30:04",
+                "error": "ConnectError: All connection attempts failed",
+                "resultado": None,
+                "creado_en": "2025-11-04T10:30:00",
+                "actualizado_en": "2025-11-04T10:30:01",
+                "terminado_en": None
+            }
+        }
+    )
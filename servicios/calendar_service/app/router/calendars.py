@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Body, Response, status, HTTPException, Query, Depends
-from typing import List, Annotated, Optional
+from fastapi import APIRouter, Body, Response, status, HTTPException, Query, Depends, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import List, Annotated, Literal, Optional
 from uuid import UUID
 
 from ..service.calendarService import CalendarService 
-from ..dependencies import get_calendar_service 
-from ..model.calendar_models import CalendarCreate, CalendarInDB
+from ..service.idempotencyService import IdempotencyService
+from ..service.streamService import CalendarStreamHub
+from ..dependencies import get_calendar_service, get_idempotency_service, get_stream_hub
+from ..etag import etag_de, no_modificado, respuesta_no_modificado, versiones_if_match
+from ..model.calendar_models import CalendarCreate, CalendarInDB, CalendarBatch, BatchLookup, Facetas
+from ..model.deletion_job_models import DeletionJob
+from ..encoding import EncodedRoute, EncodedResponse
 
 router = APIRouter(
     prefix="/calendars",
-    tags=["Calendarios"]
+    tags=["Calendarios"],
+    # Respuestas JSON rápidas o MessagePack según Accept (ver app/encoding.py)
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
 )
 
 # Definición del tipo inyectado (Dependencia del Servicio)
 CalendarServiceDep = Annotated[CalendarService, Depends(get_calendar_service)]
+IdempotencyDep = Annotated[IdempotencyService, Depends(get_idempotency_service)]
+StreamHubDep = Annotated[CalendarStreamHub, Depends(get_stream_hub)]
 
 # --- Endpoints ---
 
@@ -33,13 +45,41 @@ async def create_calendar(
             "idCalendarioPadre": None,
         }]
     )],
-    calendar_service: CalendarServiceDep  # 👈 Inyección del Service
+    calendar_service: CalendarServiceDep,  # 👈 Inyección del Service
+    idempotency: IdempotencyDep,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Clave única del cliente para poder repetir la petición sin duplicar"
+    ),
 ):
     """
     Crea un nuevo calendario en la base de datos.
+    Con la cabecera Idempotency-Key, repetir la petición (p.ej. tras un timeout del gateway)
+    devuelve lo creado la primera vez, con Idempotent-Replayed: true, sin volver a escribir.
     """
     # Llama al Servicio y le pasa el modelo Pydantic validado.
-    return await calendar_service.create_calendar(calendar)
+    if idempotency_key is None:
+        return await calendar_service.create_calendar(calendar)
+    calendario, repetida = await idempotency.run(
+        "calendars", idempotency_key, calendar,
+        crear=lambda calendar_id: calendar_service.create_calendar(calendar, calendar_id),
+        recuperar=calendar_service.get_calendar_by_id,
+    )
+    if repetida:
+        response.headers["Idempotent-Replayed"] = "true"
+    return calendario
+
+
+def filtros_listado(
+    titulo: Optional[str] = Query(None, description="Filtrar por título"),
+    organizador: Optional[str] = Query(None, description="Filtrar por organizador"),
+    palabras_clave: Optional[List[str]] = Query(None, description="Filtrar por palabras clave"),
+    es_publico: Optional[bool] = Query(None, description="Filtrar por visibilidad pública"),
+) -> dict:
+    """Filtros del listado de calendarios (los comparten el listado, su conteo y sus facetas)."""
+    return dict(titulo=titulo, organizador=organizador, palabras_clave=palabras_clave, es_publico=es_publico)
+
+FiltrosDep = Annotated[dict, Depends(filtros_listado)]
 
 
 # 2. GET /calendars : Obtener una lista de todos los calendarios (con filtros opcionales)
@@ -50,21 +90,81 @@ async def create_calendar(
 )
 async def list_calendars(
     calendar_service: CalendarServiceDep,  # 👈 Inyección del Service
-    titulo: Optional[str] = Query(None, description="Filtrar por título"),
-    organizador: Optional[str] = Query(None, description="Filtrar por organizador"),
-    palabras_clave: Optional[List[str]] = Query(None, description="Filtrar por palabras clave"),
-    es_publico: Optional[bool] = Query(None, description="Filtrar por visibilidad pública"),
+    filtros: FiltrosDep,
+    response: Response,
+    limite: Optional[int] = Query(None, ge=0, description="Número máximo de calendarios devueltos (0: solo el conteo)"),
+    conteo: Optional[Literal["exacto", "estimado"]] = Query(
+        None, description="Añade X-Total-Count con el total del filtro: 'exacto' o 'estimado' (más barato)"
+    ),
 ):
     """
     Devuelve una lista de calendarios filtrados. La lógica de construcción del filtro se delega al Servicio.
+    Con 'conteo' añade X-Total-Count y X-Total-Count-Exact (false si el total es aproximado).
     """
+    if conteo:
+        total, exacto = await calendar_service.count_calendars(conteo, **filtros)
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Exact"] = "true" if exacto else "false"
     # Llama al Servicio con los parámetros de la Query.
-    return await calendar_service.list_calendars(
-        titulo=titulo,
-        organizador=organizador,
-        palabras_clave=palabras_clave,
-        es_publico=es_publico
-    )
+    return await calendar_service.list_calendars(**filtros, limite=limite)
+
+
+# 2.1 GET /calendars/lookup?ids=... : Obtener varios calendarios por ID en una sola llamada
+# (declarada antes de /{id} para que "lookup" no se interprete como un ID)
+@router.get(
+    "/lookup",
+    response_model=CalendarBatch,
+    response_description="Obtener varios calendarios por ID, en el orden pedido",
+)
+async def lookup_calendars(
+    calendar_service: CalendarServiceDep,
+    ids: List[UUID] = Query(..., description="IDs a resolver (se puede repetir el parámetro: ?ids=a&ids=b)"),
+):
+    """
+    Resuelve varios calendarios con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await calendar_service.get_calendars_batch(ids)
+
+
+# 2.2 POST /calendars/lookup : Igual que el anterior, con los IDs en el cuerpo (listas largas)
+@router.post(
+    "/lookup",
+    response_model=CalendarBatch,
+    response_description="Obtener varios calendarios por ID, en el orden pedido",
+)
+async def lookup_calendars_post(
+    lookup: Annotated[BatchLookup, Body(
+        examples=[{"ids": ["f47ac10b-58cc-4372-a567-0e02b2c3d479"]}]
+    )],
+    calendar_service: CalendarServiceDep,
+):
+    """
+    Resuelve varios calendarios con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await calendar_service.get_calendars_batch(lookup.ids)
+
+
+# 2.3 GET /calendars/facets : Recuentos de los calendarios del listado agrupados por campo
+@router.get(
+    "/facets",
+    response_model=Facetas,
+    response_description="Total de calendarios del filtro y número de calendarios por valor de cada campo",
+)
+async def facet_calendars(
+    calendar_service: CalendarServiceDep,
+    filtros: FiltrosDep,
+    campos: Optional[List[str]] = Query(
+        None, description="Campos a agrupar: organizador, palabras_clave, es_publico (por defecto todos)"
+    ),
+    top: int = Query(10, ge=1, le=100, description="Número máximo de valores por campo (los más frecuentes)"),
+):
+    """
+    Devuelve, con los mismos filtros que el listado, el total de calendarios y su reparto por
+    cada campo pedido, calculado en el servidor en una sola agregación.
+    """
+    return await calendar_service.facet_calendars(campos, top, **filtros)
 
 
 # 3. GET /calendars/{id} : Obtener un calendario específico por su ID
@@ -73,12 +173,21 @@ async def list_calendars(
     response_model=CalendarInDB,
     response_description="Obtener un calendario por su ID",
 )
-async def get_calendar(id: UUID, calendar_service: CalendarServiceDep):
+async def get_calendar(
+    id: UUID,
+    response: Response,
+    calendar_service: CalendarServiceDep,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Busca un calendario por su ID. Devuelve 404 si no lo encuentra.
+    Incluye el ETag (versión) del calendario; con If-None-Match coincidente responde 304 sin cuerpo.
     """
     calendar = await calendar_service.get_calendar_by_id(id)  # Llama al Servicio
     if calendar:
+        if no_modificado(if_none_match, calendar.version):
+            return respuesta_no_modificado(calendar.version)
+        response.headers["ETag"] = etag_de(calendar.version)
         return calendar
 
     # El manejo de errores de "No encontrado" (404) permanece en el router.
@@ -94,36 +203,42 @@ async def get_calendar(id: UUID, calendar_service: CalendarServiceDep):
 async def update_calendar(
     id: UUID, 
     calendar_update: Annotated[CalendarCreate, Body(...)],
-    calendar_service: CalendarServiceDep
+    response: Response,
+    calendar_service: CalendarServiceDep,
+    if_match: Optional[str] = Header(None),
 ):
     """
     Actualiza un calendario existente. Devuelve 404 si no lo encuentra.
+    Con If-Match solo actualiza si el ETag coincide con la versión actual (412 si otra petición lo modificó).
     """
-    updated_calendar = await calendar_service.update_calendar(id, calendar_update)  # Llama al Servicio
+    updated_calendar = await calendar_service.update_calendar(id, calendar_update, versiones_if_match(if_match))  # Llama al Servicio
 
     if updated_calendar:
+        response.headers["ETag"] = etag_de(updated_calendar.version)
         return updated_calendar
     
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se pudo actualizar, calendario con ID {id} no encontrado")
 
 
-# 5. DELETE /calendars/{id} : Eliminar un calendario
+# 5. DELETE /calendars/{id} : Eliminar un calendario (y en segundo plano todo su contenido)
 @router.delete(
     "/{id}",
-    status_code=status.HTTP_204_NO_CONTENT,
-    response_description="Eliminar un calendario por su ID",
+    response_model=DeletionJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    response_description="Calendario eliminado; borrado en cascada en curso",
 )
-async def delete_calendar(id: UUID, calendar_service: CalendarServiceDep):
+async def delete_calendar(id: UUID, response: Response, calendar_service: CalendarServiceDep):
     """
-    Elimina un calendario por su ID. Devuelve 204 si tiene éxito o 404 si no lo encuentra.
+    Elimina un calendario por su ID y lanza el borrado en cascada de sus subcalendarios,
+    eventos y comentarios. Devuelve 202 con el trabajo (consultable en Location) o 404 si no lo encuentra.
     """
-    was_deleted = await calendar_service.delete_calendar(id)  # Llama al Servicio
+    job = await calendar_service.delete_calendar(id)  # Llama al Servicio
 
-    if not was_deleted:
+    if job is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Calendario con ID {id} no encontrado")
 
-    # Si fue eliminado, devuelve la respuesta de éxito sin contenido.
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    response.headers["Location"] = f"/deletion-jobs/{job.id}"
+    return job
 
 # 6. GET /calendars/{id}/subcalendars : Obtener los subcalendarios de un calendario padre
 @router.get(
@@ -145,3 +260,40 @@ async def get_subcalendars(
 
     return subcalendars
 
+
+# 7. GET /calendars/{id}/stream : Cambios en directo del calendario y sus subcalendarios (SSE)
+@router.get(
+    "/{id}/stream",
+    response_class=StreamingResponse,
+    response_description="Flujo text/event-stream con los cambios de calendarios, eventos y comentarios",
+)
+async def stream_calendar(
+    id: UUID,
+    calendar_service: CalendarServiceDep,
+    stream_hub: StreamHubDep,
+    last_event_id: Optional[str] = Header(None, description="Id del último mensaje recibido (reanudación)"),
+):
+    """
+    Server-Sent Events con las altas, modificaciones y bajas de calendarios, eventos y comentarios
+    del calendario y de sus subcalendarios. Cada mensaje trae el cambio (entidad, idEntidad,
+    operacion, version, padres); el cliente pide por ID lo que necesite en lugar de sondear listados.
+    Al reconectar con Last-Event-ID recibe lo que se perdió, o un mensaje 'reset' si ya no se
+    conserva (hay que recargar). Devuelve 404 si el calendario no existe.
+    """
+    if await calendar_service.get_calendar_by_id(id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Calendario con ID {id} no encontrado")
+
+    conexion = await stream_hub.conectar(id, last_event_id)
+    if conexion is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas conexiones de streaming en este proceso",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        stream_hub.transmitir(conexion),
+        media_type="text/event-stream",
+        # Sin caché ni buffer en proxies (nginx); la baja también si el cliente se va antes de empezar
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(stream_hub.desconectar, conexion),
+    )
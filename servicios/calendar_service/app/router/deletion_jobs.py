@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Query, Depends
+from typing import List, Annotated, Literal, Optional
+from uuid import UUID
+
+from ..service.cascadeService import CascadeDeleteService
+from ..dependencies import get_cascade_service
+from ..model.deletion_job_models import DeletionJob
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/deletion-jobs",
+    tags=["Borrado en cascada"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+CascadeServiceDep = Annotated[CascadeDeleteService, Depends(get_cascade_service)]
+
+# --- Endpoints ---
+
+# 1. GET /deletion-jobs : Listar los trabajos de borrado más recientes
+@router.get(
+    "/",
+    response_model=List[DeletionJob],
+    response_description="Trabajos de borrado en cascada, del más reciente al más antiguo",
+)
+async def list_deletion_jobs(
+    cascade_service: CascadeServiceDep,
+    estado: Optional[Literal["pendiente", "en_curso", "completado", "fallido"]] = Query(None, description="Filtrar por estado"),
+    id_calendario: Optional[UUID] = Query(None, alias="idCalendario", description="Filtrar por calendario eliminado"),
+    limite: int = Query(50, ge=1, le=500, description="Número máximo de trabajos"),
+):
+    """
+    Devuelve los trabajos de borrado en cascada con su fase y progreso.
+    """
+    return await cascade_service.list_jobs(estado, id_calendario, limite)
+
+
+# 2. GET /deletion-jobs/{id} : Estado de un trabajo de borrado
+@router.get(
+    "/{id}",
+    response_model=DeletionJob,
+    response_description="Estado y progreso de un trabajo de borrado en cascada",
+)
+async def get_deletion_job(id: UUID, cascade_service: CascadeServiceDep):
+    """
+    Devuelve la fase, el progreso (documentos eliminados) y el estado del trabajo. 404 si no existe.
+    """
+    return await cascade_service.get_job(id)
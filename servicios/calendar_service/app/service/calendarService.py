@@ -1,30 +1,72 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID, uuid4
 from datetime import datetime
+from fastapi import HTTPException, status
+import os
 
 # Importaciones de tu proyecto
-from ..model.calendar_models import CalendarCreate, CalendarInDB
+from ..model.calendar_models import CalendarCreate, CalendarInDB, CalendarBatch, Facetas, ValorFaceta
 from ..crud.calendar_crud import CalendarCRUD  # Usamos el CRUD inyectado
+from ..model.deletion_job_models import DeletionJob
+from .cascadeService import CascadeDeleteService
+from .jobQueue import JobQueue
+
+# Máximo de IDs que se resuelven en una sola búsqueda por lotes
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+# Modos de X-Total-Count; en el estimado, con filtros se deja de contar al llegar a este total
+CONTEO_EXACTO = "exacto"
+CONTEO_ESTIMADO = "estimado"
+COUNT_ESTIMATE_LIMIT = int(os.getenv("COUNT_ESTIMATE_LIMIT", "10000"))
+# Campos por los que se pueden pedir facetas (campo del documento -> ¿es un array?)
+FACETAS = {"organizador": False, "palabras_clave": True, "es_publico": False}
+
+
+def _tamano_estimado(calendarios: List[CalendarInDB]) -> int:
+    """Tamaño aproximado en bytes de un listado (para el presupuesto de memoria de la caché)."""
+    if not calendarios:
+        return 64
+    # Se extrapola el tamaño serializado del primer calendario para no recorrer todo el listado
+    return len(calendarios) * len(calendarios[0].model_dump_json())
+
 
 class CalendarService:
     """
     Capa de Servicio para Calendarios. Maneja la lógica de negocio.
     """
-    def __init__(self, crud_repository: CalendarCRUD):
-        """Inyección de Dependencia del CRUD/Repository."""
+    def __init__(
+        self,
+        crud_repository: CalendarCRUD,
+        cascade: Optional[CascadeDeleteService] = None,
+        jobs: Optional[JobQueue] = None,
+    ):
+        """Inyección de Dependencia del CRUD/Repository, del borrado en cascada y de la cola de trabajos."""
         self.crud = crud_repository
+        self.cascade = cascade
+        self.jobs = jobs
 
     
-    async def create_calendar(self, calendar: CalendarCreate) -> CalendarInDB:
+    async def create_calendar(self, calendar: CalendarCreate, calendar_id: Optional[UUID] = None) -> CalendarInDB:
         """
         Lógica: Asigna el ID (UUID) y llama al CRUD para la inserción.
+        'calendar_id' es el ID ya reservado con la Idempotency-Key de la petición, si la trae.
         """
         calendar_dict = calendar.model_dump(by_alias=True)
-        calendar_dict["_id"] = uuid4() 
-        
-        # Aquí se podría poner lógica de negocio avanzada (ej. validaciones, notificaciones)
-        
-        return await self.crud.create(calendar_dict)
+        calendar_dict["_id"] = calendar_id or uuid4()
+
+        created = await self.crud.create(calendar_dict)
+        if self.jobs is not None:
+            # Los efectos secundarios no alargan la escritura: se encolan y los ejecuta la cola
+            await self.jobs.enqueue(
+                "notificar", {"evento": "calendario.creado", "id": str(created.id)},
+                clave_dedup=f"notificar:calendario.creado:{created.id}",
+            )
+            if created.id_calendario_padre is not None:
+                await self.jobs.enqueue(
+                    "validar_padre",
+                    {"idCalendario": str(created.id), "idCalendarioPadre": str(created.id_calendario_padre)},
+                    clave_dedup=f"validar_padre:{created.id}",
+                )
+        return created
 
 
     async def get_calendar_by_id(self, calendar_id: UUID) -> Optional[CalendarInDB]:
@@ -38,10 +80,80 @@ class CalendarService:
         organizador: Optional[str] = None,
         palabras_clave: Optional[List[str]] = None,
         es_publico: Optional[bool] = None,
+        limite: Optional[int] = None,
     ) -> List[CalendarInDB]:
         """
         Lógica: Construye el filtro de MongoDB con los parámetros de la API.
+        Con 'limite' devuelve como mucho ese número de calendarios (0: ninguno, solo el conteo).
+        """
+        filtro = self._filtro_listado(titulo, organizador, palabras_clave, es_publico)
+        if limite == 0:
+            return []
+        if limite is not None:
+            return await self.crud.list_cache.get_or_load(
+                filtro, lambda: self.crud.list_by_filter(filtro, limite), _tamano_estimado, variant=("limite", limite)
+            )
+        return await self.crud.list_cache.get_or_load(
+            filtro, lambda: self.crud.list_by_filter(filtro), _tamano_estimado
+        )
+
+
+    async def count_calendars(self, modo: str, **filtros) -> Tuple[int, bool]:
+        """
+        Lógica: Total de calendarios del listado (X-Total-Count). Devuelve (total, exacto).
+        En modo 'estimado' sin filtros basta con los metadatos de la colección; con filtros se
+        cuenta como mucho hasta COUNT_ESTIMATE_LIMIT.
+        """
+        filtro = self._filtro_listado(**filtros)
+
+        async def _contar() -> Tuple[int, bool]:
+            if modo == CONTEO_EXACTO:
+                return await self.crud.count_by_filter(filtro), True
+            if not filtro:
+                return await self.crud.estimated_count(), False
+            total = await self.crud.count_by_filter(filtro, COUNT_ESTIMATE_LIMIT)
+            return total, total < COUNT_ESTIMATE_LIMIT
+
+        return await self.crud.list_cache.get_or_load(filtro, _contar, lambda _: 64, variant=("conteo", modo))
+
+
+    async def facet_calendars(self, campos: Optional[List[str]], top: int, **filtros) -> Facetas:
         """
+        Lógica: Cuántos calendarios del listado hay por organizador, palabra clave y visibilidad
+        (o solo los campos pedidos), en una única agregación. En palabras_clave cada calendario
+        cuenta una vez por cada palabra. El resultado se cachea por filtro y conjunto de campos.
+        """
+        campos = list(dict.fromkeys(campos or FACETAS))
+        desconocidos = [campo for campo in campos if campo not in FACETAS]
+        if desconocidos:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"No se pueden pedir facetas de {', '.join(desconocidos)}; campos válidos: {', '.join(FACETAS)}"
+            )
+        filtro = self._filtro_listado(**filtros)
+        resultado = await self.crud.list_cache.get_or_load(
+            filtro,
+            lambda: self.crud.facet_counts(filtro, {campo: FACETAS[campo] for campo in campos}, top),
+            lambda valor: 64 * (1 + sum(len(valores) for valores in valor.values())),
+            variant=("facetas", tuple(campos), top),
+        )
+        return Facetas(
+            total=resultado["total"][0]["n"] if resultado["total"] else 0,
+            facetas={
+                campo: [ValorFaceta(valor=grupo["_id"], total=grupo["total"]) for grupo in resultado[campo]]
+                for campo in campos
+            },
+        )
+
+
+    def _filtro_listado(
+        self,
+        titulo: Optional[str] = None,
+        organizador: Optional[str] = None,
+        palabras_clave: Optional[List[str]] = None,
+        es_publico: Optional[bool] = None,
+    ) -> dict:
+        """Filtro de MongoDB del listado de calendarios (compartido con su conteo y sus facetas)."""
         filtro = {}
         
         if titulo:
@@ -52,25 +164,52 @@ class CalendarService:
             filtro["palabras_clave"] = {"$in": palabras_clave}
         if es_publico is not None:
             filtro["es_publico"] = es_publico
+        return filtro
 
-        return await self.crud.list_by_filter(filtro)
 
-
-    async def update_calendar(self, calendar_id: UUID, calendar_update: CalendarCreate) -> Optional[CalendarInDB]:
-        """Actualiza un calendario."""
+    async def update_calendar(
+        self, calendar_id: UUID, calendar_update: CalendarCreate, expected_versions: Optional[List[int]] = None
+    ) -> Optional[CalendarInDB]:
+        """Actualiza un calendario. Con 'expected_versions' (If-Match) lanza 412 si la versión no coincide."""
         update_data = calendar_update.model_dump(by_alias=True, exclude_unset=True)
-        return await self.crud.update(calendar_id, update_data)
+        updated_calendar = await self.crud.update(calendar_id, update_data, expected_versions)
+
+        if updated_calendar is None and expected_versions is not None and await self.crud.get_by_id(calendar_id) is not None:
+            # El recurso existe pero otra escritura cambió su versión: If-Match no coincide
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="El calendario fue modificado por otra petición; vuelva a leerlo y reintente"
+            )
+        return updated_calendar
 
 
-    async def delete_calendar(self, calendar_id: UUID) -> bool:
-        """Elimina un calendario y devuelve si la operación fue exitosa."""
-        deleted_count = await self.crud.delete(calendar_id)
-        return deleted_count > 0
+    async def delete_calendar(self, calendar_id: UUID) -> Optional[DeletionJob]:
+        """
+        Elimina un calendario y lanza en segundo plano el borrado de sus subcalendarios,
+        eventos y comentarios. Devuelve el trabajo de borrado, o None si no existe.
+        """
+        return await self.cascade.start(calendar_id)
     
 
     async def get_subcalendars(self, parent_id: UUID) -> List[CalendarInDB]:
         """Obtiene los subcalendarios de un calendario padre."""
         return await self.crud.get_subcalendars(parent_id)
 
-    
 
+    async def get_calendars_batch(self, calendar_ids: List[UUID]) -> CalendarBatch:
+        """
+        Lógica: Resuelve varios calendarios con una sola consulta. Devuelve los encontrados
+        en el orden pedido (sin duplicados) y, aparte, los IDs que no existen.
+        """
+        ids = list(dict.fromkeys(calendar_ids))
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Se pueden pedir como máximo {MAX_BATCH_IDS} calendarios por llamada ({len(ids)} recibidos)"
+            )
+
+        por_id = {calendar.id: calendar for calendar in await self.crud.get_many(ids)}
+        return CalendarBatch(
+            calendarios=[por_id[calendar_id] for calendar_id in ids if calendar_id in por_id],
+            no_encontrados=[calendar_id for calendar_id in ids if calendar_id not in por_id],
+        )
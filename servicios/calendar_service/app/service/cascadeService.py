@@ -0,0 +1,290 @@
+from typing import Awaitable, Callable, List, Optional, Set
+from uuid import UUID, uuid4
+from datetime import datetime
+from fastapi import HTTPException, status
+import asyncio
+import httpx
+import logging
+import os
+import socket
+
+# Importaciones de tu proyecto
+from ..model.deletion_job_models import DeletionJob
+from ..crud.calendar_crud import CalendarCRUD
+from ..crud.deletion_job_crud import DeletionJobCRUD
+from ..encoding import cabeceras_cliente, contenido_respuesta
+from ..tracing import cabeceras_traza
+
+EVENT_SERVICE_URL = os.getenv("EVENT_SERVICE_URL", "http://event_service:8000")
+COMMENT_SERVICE_URL = os.getenv("COMMENT_SERVICE_URL", "http://comment_service:8000")
+
+# Configuración del borrado en cascada: lotes acotados y una pausa entre lotes
+# para no acaparar la base de datos ni los servicios frente al tráfico normal.
+CASCADE_BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", "500"))
+CASCADE_PAUSE_SECONDS = float(os.getenv("CASCADE_PAUSE_SECONDS", "0.05"))
+CASCADE_LEASE_SECONDS = float(os.getenv("CASCADE_LEASE_SECONDS", "60"))
+CASCADE_MAX_ATTEMPTS = int(os.getenv("CASCADE_MAX_ATTEMPTS", "5"))
+CASCADE_WATCH_SECONDS = float(os.getenv("CASCADE_WATCH_SECONDS", "30"))
+# Calendarios por petición a los otros servicios (acota el tamaño de las listas $in)
+CALENDARIOS_POR_PETICION = 100
+
+logger = logging.getLogger(__name__)
+
+
+class _LeasePerdido(Exception):
+    """Otro proceso ha tomado el trabajo: este deja de ejecutarlo sin tocar su estado."""
+
+
+# Guarda progreso (set/inc) y renueva el lease; lanza _LeasePerdido si otro proceso tomó el trabajo
+Avanzar = Callable[..., Awaitable[None]]
+
+
+def _trozos(ids: List[UUID], tamano: int) -> List[List[UUID]]:
+    return [ids[i:i + tamano] for i in range(0, len(ids), tamano)]
+
+
+class CascadeDeleteService:
+    """
+    Borrado en cascada de un calendario en segundo plano.
+    El calendario raíz se elimina en el acto; después un trabajo persistente recorre
+    la jerarquía y elimina, en lotes acotados y con pausas, los eventos (y sus comentarios),
+    los comentarios de los calendarios y por último los subcalendarios.
+    Cada fase es idempotente y el progreso se guarda tras cada lote, así que el trabajo
+    se puede reanudar desde cualquier proceso tras una caída (reanudar_pendientes/vigilar).
+    Guardar el progreso renueva el lease en cada lote de todas las fases; si la renovación
+    falla, otro proceso ha tomado el trabajo y este se detiene en el acto.
+    """
+
+    def __init__(
+        self,
+        calendar_repository: CalendarCRUD,
+        job_repository: DeletionJobCRUD,
+        client_factory: Callable[..., httpx.AsyncClient] = httpx.AsyncClient,
+    ):
+        self.calendars = calendar_repository
+        self.jobs = job_repository
+        self.client_factory = client_factory
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._tareas: Set[asyncio.Task] = set()
+        self._en_ejecucion: Set[UUID] = set()
+
+
+    async def start(self, calendar_id: UUID) -> Optional[DeletionJob]:
+        """
+        Elimina el calendario y lanza el borrado en cascada de su contenido.
+        Devuelve el trabajo creado, o None si el calendario no existe.
+        """
+        if await self.calendars.get_by_id(calendar_id) is None:
+            return None
+
+        ahora = datetime.utcnow()
+        job = await self.jobs.create({
+            "_id": uuid4(),
+            "idCalendario": calendar_id,
+            "estado": "pendiente",
+            "fase": "jerarquia",
+            "calendarios": [calendar_id],
+            "eliminados": {"calendarios": 0, "eventos": 0, "comentarios": 0},
+            "intentos": 0,
+            "error": None,
+            "creadoEn": ahora,
+            "actualizadoEn": ahora,
+            "completadoEn": None,
+            "propietario": None,
+            "leaseHasta": None,
+        })
+        # El trabajo se registra ANTES de borrar la raíz: si el proceso cae entre ambos pasos,
+        # el trabajo se reanuda y nada queda huérfano.
+        eliminados = await self.calendars.delete(calendar_id)
+        await self.jobs.increment(job.id, {"eliminados.calendarios": eliminados})
+        self._lanzar(job.id)
+        return await self.jobs.get_by_id(job.id)
+
+
+    async def get_job(self, job_id: UUID) -> DeletionJob:
+        """Devuelve el estado de un trabajo. Lanza 404 si no existe."""
+        job = await self.jobs.get_by_id(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Trabajo de borrado con ID {job_id} no encontrado"
+            )
+        return job
+
+
+    async def list_jobs(self, estado: Optional[str], id_calendario: Optional[UUID], limite: int) -> List[DeletionJob]:
+        """Lista los trabajos más recientes, opcionalmente filtrados por estado o calendario."""
+        filtro = {}
+        if estado:
+            filtro["estado"] = estado
+        if id_calendario:
+            filtro["idCalendario"] = id_calendario
+        return await self.jobs.list_by_filter(filtro, limite)
+
+
+    def _lanzar(self, job_id: UUID) -> None:
+        """Ejecuta el trabajo en una tarea de fondo (una sola vez por proceso)."""
+        if job_id in self._en_ejecucion:
+            return
+        self._en_ejecucion.add(job_id)
+        tarea = asyncio.create_task(self.run(job_id))
+        self._tareas.add(tarea)
+
+        def _terminada(t: asyncio.Task) -> None:
+            self._tareas.discard(t)
+            self._en_ejecucion.discard(job_id)
+
+        tarea.add_done_callback(_terminada)
+
+
+    async def reanudar_pendientes(self) -> int:
+        """Relanza los trabajos activos sin lease vigente (p.ej. tras una caída). Devuelve cuántos."""
+        job_ids = await self.jobs.list_resumable_ids()
+        for job_id in job_ids:
+            self._lanzar(job_id)
+        return len(job_ids)
+
+
+    async def vigilar(self) -> None:
+        """Bucle de fondo: reanuda periódicamente los trabajos abandonados por otros procesos."""
+        while True:
+            try:
+                await self.reanudar_pendientes()
+            except Exception:
+                logger.exception("Error al buscar trabajos de borrado pendientes")
+            await asyncio.sleep(CASCADE_WATCH_SECONDS)
+
+
+    async def detener(self) -> None:
+        """Cancela los trabajos en curso de este proceso (quedan pendientes para reanudarse)."""
+        for tarea in list(self._tareas):
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+
+
+    async def run(self, job_id: UUID) -> None:
+        """Toma el trabajo y lo ejecuta desde la fase en que se quedó."""
+        job = await self.jobs.claim(job_id, self.propietario, CASCADE_LEASE_SECONDS)
+        if job is None:
+            return  # Terminado o en manos de otro proceso
+        try:
+            await self._ejecutar(job)
+        except _LeasePerdido:
+            logger.warning("Trabajo de borrado %s tomado por otro proceso", job_id)
+        except asyncio.CancelledError:
+            await self.jobs.release(job_id, self.propietario, {"estado": "pendiente"})
+            raise
+        except Exception as e:
+            logger.exception("Error en el trabajo de borrado %s", job_id)
+            estado = "fallido" if job["intentos"] >= CASCADE_MAX_ATTEMPTS else "pendiente"
+            await self.jobs.release(job_id, self.propietario, {"estado": estado, "error": str(e)})
+
+
+    async def _ejecutar(self, job: dict) -> None:
+        job_id = job["_id"]
+        fase = job["fase"]
+        calendarios = job["calendarios"]
+
+        async def avanzar(set_data: Optional[dict] = None, inc_data: Optional[dict] = None) -> None:
+            if not await self.jobs.update_progress(job_id, self.propietario, CASCADE_LEASE_SECONDS, set_data, inc_data):
+                if inc_data:
+                    # Lo borrado en este lote ya no tiene vuelta atrás: se cuenta aunque se pierda el lease
+                    await self.jobs.increment(job_id, inc_data)
+                raise _LeasePerdido()
+
+        if fase == "jerarquia":
+            # Los subcalendarios solo se borran en la última fase, así que el recorrido es repetible
+            calendarios = await self._recorrer_jerarquia(job["idCalendario"], avanzar)
+            fase = "eventos"
+            await avanzar({"calendarios": calendarios, "fase": fase})
+
+        # traceparent: las purgas en los otros servicios cuelgan de la traza del DELETE que creó el trabajo
+        async with self.client_factory(timeout=30.0, headers={**cabeceras_cliente(), **cabeceras_traza()}) as client:
+            if fase == "eventos":
+                for trozo in _trozos(calendarios, CALENDARIOS_POR_PETICION):
+                    while True:
+                        # Se leen los IDs antes de borrar: si el proceso cae a mitad del lote,
+                        # al reanudar se vuelven a obtener los mismos y no quedan comentarios huérfanos.
+                        event_ids = await self._ids_eventos(client, trozo)
+                        if not event_ids:
+                            break
+                        await self._purgar_comentarios(client, [], event_ids, avanzar)
+                        eventos = await self._purgar_eventos(client, event_ids)
+                        await avanzar(inc_data={"eliminados.eventos": eventos})
+                        await asyncio.sleep(CASCADE_PAUSE_SECONDS)
+                fase = "comentarios"
+                await avanzar({"fase": fase})
+
+            if fase == "comentarios":
+                for trozo in _trozos(calendarios, CALENDARIOS_POR_PETICION):
+                    await self._purgar_comentarios(client, trozo, [], avanzar)
+                fase = "calendarios"
+                await avanzar({"fase": fase})
+
+        if fase == "calendarios":
+            for lote in _trozos(calendarios, CASCADE_BATCH_SIZE):
+                eliminados = await self.calendars.delete_many(lote)
+                await avanzar(inc_data={"eliminados.calendarios": eliminados})
+                await asyncio.sleep(CASCADE_PAUSE_SECONDS)
+
+        await self.jobs.release(job_id, self.propietario, {
+            "estado": "completado", "fase": "fin", "error": None, "completadoEn": datetime.utcnow()
+        })
+
+
+    async def _recorrer_jerarquia(self, root_id: UUID, avanzar: Avanzar) -> List[UUID]:
+        """
+        Devuelve el calendario raíz y todos sus descendientes (recorrido en anchura, a prueba de ciclos).
+        Renueva el lease tras cada nivel: una jerarquía profunda puede tardar más que el lease.
+        """
+        calendarios = [root_id]
+        vistos = {root_id}
+        frontera = [root_id]
+        while frontera:
+            hijos = []
+            for trozo in _trozos(frontera, CALENDARIOS_POR_PETICION):
+                hijos.extend(await self.calendars.get_subcalendar_ids(trozo))
+            frontera = [hijo for hijo in dict.fromkeys(hijos) if hijo not in vistos]
+            vistos.update(frontera)
+            calendarios.extend(frontera)
+            await avanzar()
+        return calendarios
+
+
+    async def _ids_eventos(self, client: httpx.AsyncClient, calendar_ids: List[UUID]) -> List[UUID]:
+        response = await client.post(
+            f"{EVENT_SERVICE_URL}/events/ids",
+            json={"idsCalendario": [str(i) for i in calendar_ids], "limite": CASCADE_BATCH_SIZE},
+        )
+        response.raise_for_status()
+        return [UUID(i) for i in contenido_respuesta(response)]
+
+
+    async def _purgar_eventos(self, client: httpx.AsyncClient, event_ids: List[UUID]) -> int:
+        response = await client.post(f"{EVENT_SERVICE_URL}/events/purge", json={"ids": [str(i) for i in event_ids]})
+        response.raise_for_status()
+        return contenido_respuesta(response)["eliminados"]
+
+
+    async def _purgar_comentarios(
+        self, client: httpx.AsyncClient, calendar_ids: List[UUID], event_ids: List[UUID], avanzar: Avanzar
+    ) -> None:
+        """
+        Elimina por lotes todos los comentarios de los calendarios/eventos indicados.
+        Cada lote suma lo eliminado al trabajo y renueva el lease antes de pedir el siguiente.
+        """
+        while True:
+            response = await client.post(
+                f"{COMMENT_SERVICE_URL}/comments/purge",
+                json={
+                    "idsCalendario": [str(i) for i in calendar_ids],
+                    "idsEvento": [str(i) for i in event_ids],
+                    "limite": CASCADE_BATCH_SIZE,
+                },
+            )
+            response.raise_for_status()
+            eliminados = contenido_respuesta(response)["eliminados"]
+            await avanzar(inc_data={"eliminados.comentarios": eliminados})
+            if eliminados < CASCADE_BATCH_SIZE:
+                return
+            await asyncio.sleep(CASCADE_PAUSE_SECONDS)
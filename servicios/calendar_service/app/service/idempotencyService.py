@@ -0,0 +1,110 @@
+from typing import Awaitable, Callable, Optional, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import socket
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+
+# Importaciones de tu proyecto
+from ..crud.idempotency_crud import IdempotencyCRUD
+
+# Tiempo que se recuerda una clave (y su respuesta) desde que se usó por primera vez
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Si la petición que reservó la clave no termina en este tiempo (su proceso cayó), otra la retoma
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))
+# Longitud máxima de la cabecera Idempotency-Key
+MAX_KEY_LENGTH = 255
+
+
+def huella(modelo: BaseModel) -> str:
+    """
+    Huella del cuerpo de la petición: una clave solo se puede repetir con el mismo cuerpo.
+    Solo cuentan los campos que envió el cliente (exclude_unset): los que rellena el servidor
+    con default_factory, como fechaCreacion, cambian en cada reintento.
+    """
+    enviado = modelo.model_dump(mode="json", by_alias=True, exclude_unset=True)
+    return hashlib.sha256(json.dumps(enviado, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class IdempotencyService:
+    """
+    Capa de Servicio de las claves de idempotencia de los POST de creación.
+    - La primera petición con una clave reserva también el ID del recurso y ejecuta la creación.
+    - Las repeticiones reciben la respuesta guardada, sin volver a escribir.
+    - Una repetición que llega mientras la primera sigue en curso recibe 409 (reintentar luego).
+    - Reutilizar la clave con otro cuerpo es un error del cliente (422).
+    Si el proceso cae tras crear el recurso pero antes de guardar la respuesta, la petición que
+    retoma la clave usa el mismo ID: la inserción falla por duplicado y se devuelve el existente.
+    """
+
+    def __init__(self, crud: IdempotencyCRUD):
+        self.crud = crud
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}"
+
+
+    async def run(
+        self,
+        alcance: str,
+        clave: str,
+        cuerpo: BaseModel,
+        crear: Callable[[UUID], Awaitable[BaseModel]],
+        recuperar: Callable[[UUID], Awaitable[Optional[BaseModel]]],
+    ) -> Tuple[dict, bool]:
+        """
+        Ejecuta crear(id) una sola vez por (alcance, clave). Devuelve (respuesta, repetida).
+        'recuperar(id)' lee el recurso si ya existía (creación interrumpida y retomada).
+        """
+        if not clave or len(clave) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres",
+            )
+        ahora = datetime.utcnow()
+        firma = huella(cuerpo)
+        propietario = f"{self.propietario}:{uuid4().hex[:8]}"
+        doc, reservada = await self.crud.reserve({
+            "_id": f"{alcance}:{clave}",
+            "huella": firma,
+            "idRecurso": uuid4(),
+            "estado": "en_curso",
+            "propietario": propietario,
+            "bloqueoHasta": ahora + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+            "creadoEn": ahora,
+            "expiraEn": ahora + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        }, IDEMPOTENCY_LOCK_SECONDS)
+
+        if doc["huella"] != firma:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="La Idempotency-Key ya se usó con un cuerpo distinto",
+            )
+        if not reservada:
+            if doc["estado"] == "completado":
+                return doc["respuesta"], True
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Hay una petición en curso con la misma Idempotency-Key",
+                headers={"Retry-After": "1"},
+            )
+
+        id_recurso = doc["idRecurso"]
+        try:
+            try:
+                creado = await crear(id_recurso)
+            except DuplicateKeyError:
+                # Reserva retomada: la petición anterior llegó a crear el recurso
+                creado = await recuperar(id_recurso)
+                if creado is None:
+                    raise
+        except BaseException:
+            await self.crud.release(doc["_id"], propietario)
+            raise
+
+        respuesta = creado.model_dump(mode="json", by_alias=True)
+        await self.crud.complete(doc["_id"], propietario, respuesta)
+        return respuesta, False
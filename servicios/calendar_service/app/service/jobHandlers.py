@@ -0,0 +1,47 @@
+from typing import Optional
+from uuid import UUID
+import httpx
+import logging
+import os
+
+# Importaciones de tu proyecto
+from ..crud.calendar_crud import CalendarCRUD
+from .jobQueue import JobQueue
+
+# Destino de las notificaciones (POST con JSON). Sin configurar solo se registran en el log.
+NOTIFICATIONS_WEBHOOK_URL = os.getenv("NOTIFICATIONS_WEBHOOK_URL", "")
+# Llamadas simultáneas al webhook desde la cola (en cada proceso)
+MAX_LLAMADAS_EXTERNAS = int(os.getenv("JOBS_MAX_HTTP_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+async def notificar(payload: dict) -> dict:
+    """Envía la notificación de un cambio (p.ej. calendario.creado) al webhook configurado."""
+    if not NOTIFICATIONS_WEBHOOK_URL:
+        logger.info("Notificación %s de %s (sin NOTIFICATIONS_WEBHOOK_URL)", payload["evento"], payload["id"])
+        return {"enviada": False}
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.post(NOTIFICATIONS_WEBHOOK_URL, json=payload)
+    # Un error del webhook (o de red) lanza la excepción: la cola reintenta con espera
+    response.raise_for_status()
+    return {"enviada": True, "status": response.status_code}
+
+
+def registrar_manejadores(
+    queue: JobQueue, calendars: CalendarCRUD, max_llamadas: Optional[int] = MAX_LLAMADAS_EXTERNAS
+) -> None:
+    """Registra en la cola los trabajos del servicio de calendarios."""
+
+    async def validar_padre(payload: dict) -> dict:
+        """Comprueba que el calendario padre de un subcalendario recién creado existe."""
+        padre = await calendars.get_by_id(UUID(payload["idCalendarioPadre"]))
+        if padre is None:
+            logger.warning(
+                "El calendario %s cuelga de un calendario inexistente (%s)",
+                payload["idCalendario"], payload["idCalendarioPadre"],
+            )
+        return {"padreExiste": padre is not None}
+
+    queue.registrar("notificar", notificar, max_concurrencia=max_llamadas)
+    queue.registrar("validar_padre", validar_padre)
@@ -0,0 +1,398 @@
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+
+# Importaciones de tu proyecto
+from ..changes import ChangeSubscriber
+from ..crud.calendar_crud import CalendarCRUD
+from ..crud.outbox_crud import OutboxCRUD
+from ..model.change_models import Cambio
+from .changesService import ULTIMO
+
+EVENT_SERVICE_URL = os.getenv("EVENT_SERVICE_URL", "http://event_service:8000")
+COMMENT_SERVICE_URL = os.getenv("COMMENT_SERVICE_URL", "http://comment_service:8000")
+
+# Cada cuánto se leen las outbox cuando no hay cambios pendientes
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "1"))
+# Comentario SSE periódico para que proxies y balanceadores no corten la conexión inactiva
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+# Cambios recientes que se guardan para reanudar con Last-Event-ID
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "10000"))
+# Mensajes pendientes por conexión: un cliente más lento que esto se desconecta (y reanuda)
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))
+# Conexiones simultáneas por proceso (las siguientes reciben 503)
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "10000"))
+# Sin conexiones durante este tiempo se deja de leer las outbox
+STREAM_IDLE_SECONDS = float(os.getenv("STREAM_IDLE_SECONDS", "60"))
+# Espera (ms) que se indica al cliente antes de reconectar
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+
+# Fuentes de cambios, en el orden de sus componentes en la posición ("<calendarios>-<eventos>-<comentarios>")
+CALENDARIOS, EVENTOS, COMENTARIOS = range(3)
+# Eventos cuyo calendario se recuerda (para los comentarios que solo traen idEvento)
+MAX_EVENTOS_CONOCIDOS = 10000
+
+logger = logging.getLogger(__name__)
+
+Posicion = Tuple[int, int, int]
+
+
+def codificar_posicion(posicion: Posicion) -> str:
+    return "-".join(str(secuencia) for secuencia in posicion)
+
+
+def decodificar_posicion(texto: Optional[str]) -> Optional[Posicion]:
+    """Posición de un Last-Event-ID, o None si no es válido."""
+    try:
+        partes = tuple(int(parte) for parte in (texto or "").split("-"))
+    except ValueError:
+        return None
+    return partes if len(partes) == 3 and min(partes) >= 0 else None
+
+
+def _trama(evento: str, datos: dict, posicion: Optional[Posicion] = None) -> bytes:
+    """Mensaje SSE ya serializado: se construye una vez y se envía a todas las conexiones."""
+    lineas = [f"id: {codificar_posicion(posicion)}"] if posicion is not None else []
+    lineas += [f"event: {evento}", f"data: {json.dumps(datos, separators=(',', ':'))}"]
+    return ("\n".join(lineas) + "\n\n").encode("utf-8")
+
+
+def _uuid(valor) -> Optional[UUID]:
+    return valor if valor is None or isinstance(valor, UUID) else UUID(str(valor))
+
+
+class _Conexion:
+    """Una conexión SSE: los calendarios que sigue y sus mensajes pendientes."""
+
+    __slots__ = ("calendarios", "cola", "desbordada")
+
+    def __init__(self, calendarios: Set[UUID]):
+        self.calendarios = calendarios
+        self.cola: asyncio.Queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        self.desbordada = False
+
+    def enviar(self, trama: bytes) -> None:
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(trama)
+        except asyncio.QueueFull:
+            # Se dejan de encolar mensajes: tras vaciar la cola se cierra y el cliente reanuda
+            self.desbordada = True
+
+
+class CalendarStreamHub:
+    """
+    Reparto de los cambios de calendarios, eventos y comentarios a las conexiones SSE de
+    GET /calendars/{id}/stream (una por cliente, cada una sobre el subárbol de un calendario).
+    - Un único bucle por proceso lee las tres outbox (la de calendarios en la base de datos y
+      las de eventos y comentarios con GET /changes de sus servicios), sea cual sea el número
+      de conexiones. Solo está en marcha mientras hay conexiones.
+    - Cada cambio se serializa una vez y se entrega a las conexiones de sus calendarios
+      mediante un índice calendario -> conexiones.
+    - El id de cada mensaje es la posición en las tres outbox. Con Last-Event-ID se reenvían
+      los cambios posteriores que sigan en el buffer; si ya no están, se envía 'reset' para
+      que el cliente vuelva a cargar los datos.
+    """
+
+    def __init__(
+        self,
+        calendars: CalendarCRUD,
+        outbox: OutboxCRUD,
+        remotos: Optional[Dict[int, str]] = None,
+    ):
+        self.calendars = calendars
+        self.outbox = outbox
+        self.remotos = {EVENTOS: EVENT_SERVICE_URL, COMENTARIOS: COMMENT_SERVICE_URL} if remotos is None else remotos
+        self._conexiones: Set[_Conexion] = set()
+        self._por_calendario: Dict[UUID, Set[_Conexion]] = {}
+        self._buffer: Deque[Tuple[int, Posicion, frozenset, bytes]] = deque()
+        self._posicion: Optional[List[int]] = None
+        # Posición hasta la que el buffer ya no tiene todos los cambios (antes no se puede reanudar)
+        self._descartado: List[Optional[int]] = [None, None, None]
+        self._suscriptores: Dict[int, ChangeSubscriber] = {}
+        self._clientes: Dict[int, httpx.AsyncClient] = {}
+        # Fuentes cuya outbox caducó (410): se siguen desde su último cambio
+        self._reiniciadas: Set[int] = set()
+        self._eventos: "OrderedDict[UUID, Optional[UUID]]" = OrderedDict()
+        self._bucle: Optional[asyncio.Task] = None
+        self._parada: Optional[asyncio.Task] = None
+        self._arranque = asyncio.Lock()
+
+
+    @property
+    def conexiones(self) -> int:
+        return len(self._conexiones)
+
+
+    # --- Conexiones ---
+
+    async def conectar(self, calendar_id: UUID, last_event_id: Optional[str] = None) -> Optional[_Conexion]:
+        """
+        Abre una conexión sobre el subárbol de 'calendar_id'. Devuelve None si el proceso ya
+        tiene el máximo de conexiones.
+        """
+        if len(self._conexiones) >= STREAM_MAX_CONNECTIONS:
+            return None
+        calendarios = await self._subarbol(calendar_id)
+        await self._arrancar()
+
+        # Sin esperas desde aquí: ningún cambio se publica entre el reenvío y el registro
+        conexion = _Conexion(calendarios)
+        conexion.enviar(f"retry: {STREAM_RETRY_MS}\n\n".encode("ascii"))
+        if last_event_id is not None:
+            self._reanudar(conexion, decodificar_posicion(last_event_id))
+        conexion.enviar(_trama("conectado", {"calendarios": len(calendarios)}, self.posicion()))
+        self._conexiones.add(conexion)
+        for calendario in calendarios:
+            self._por_calendario.setdefault(calendario, set()).add(conexion)
+        return conexion
+
+
+    def desconectar(self, conexion: _Conexion) -> None:
+        self._conexiones.discard(conexion)
+        for calendario in conexion.calendarios:
+            suscritas = self._por_calendario.get(calendario)
+            if suscritas is not None:
+                suscritas.discard(conexion)
+                if not suscritas:
+                    del self._por_calendario[calendario]
+        if not self._conexiones and self._bucle is not None and self._parada is None:
+            self._parada = asyncio.create_task(self._parar_si_inactivo())
+
+
+    async def transmitir(self, conexion: _Conexion) -> AsyncIterator[bytes]:
+        """Cuerpo de la respuesta SSE de una conexión (con latido periódico)."""
+        try:
+            while True:
+                try:
+                    trama = await asyncio.wait_for(conexion.cola.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    trama = b": ping\n\n"
+                yield trama
+                if conexion.desbordada and conexion.cola.empty():
+                    logger.info("Conexión SSE demasiado lenta: se cierra para que reanude")
+                    return
+        finally:
+            self.desconectar(conexion)
+
+
+    def posicion(self) -> Posicion:
+        return tuple(self._posicion) if self._posicion is not None else (0, 0, 0)
+
+
+    def _reanudar(self, conexion: _Conexion, desde: Optional[Posicion]) -> None:
+        """Reenvía los cambios posteriores a 'desde', o 'reset' si no se pueden reconstruir."""
+        if desde is None or any(d is None or p < d for p, d in zip(desde, self._descartado)):
+            conexion.enviar(_trama("reset", {"motivo": "No se conservan los cambios desde Last-Event-ID"}))
+            return
+        for fuente, posicion, destinos, trama in self._buffer:
+            if posicion[fuente] > desde[fuente] and not destinos.isdisjoint(conexion.calendarios):
+                conexion.enviar(trama)
+
+
+    async def _subarbol(self, calendar_id: UUID) -> Set[UUID]:
+        """El calendario y todos sus descendientes."""
+        calendarios = {calendar_id}
+        nivel = [calendar_id]
+        while nivel:
+            nivel = [hijo for hijo in await self.calendars.get_subcalendar_ids(nivel) if hijo not in calendarios]
+            calendarios.update(nivel)
+        return calendarios
+
+
+    # --- Lectura de las outbox ---
+
+    async def _arrancar(self) -> None:
+        """Pone en marcha la lectura de las outbox (si no lo estaba) desde su último cambio."""
+        if self._parada is not None:
+            self._parada.cancel()
+            self._parada = None
+        async with self._arranque:
+            if self._bucle is not None:
+                return
+            self._posicion = [await self.outbox.latest_sequence(), 0, 0]
+            # Las remotas se conocen tras su primera lectura (las no configuradas no tienen cambios)
+            self._descartado = [self._posicion[CALENDARIOS]] + [None if f in self.remotos else 0 for f in (EVENTOS, COMENTARIOS)]
+            for fuente, url in self.remotos.items():
+                cliente = httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(10.0, connect=2.0))
+                self._clientes[fuente] = cliente
+                self._suscriptores[fuente] = ChangeSubscriber(
+                    url,
+                    lambda cambio, fuente=fuente: self.publicar(fuente, cambio),
+                    token=ULTIMO,
+                    on_reset=lambda fuente=fuente: self._reiniciar(fuente),
+                    client=cliente,
+                )
+            # La primera lectura fija la posición de las outbox remotas (desde ella se puede reanudar)
+            await self.sondear()
+            self._bucle = asyncio.create_task(self._leer())
+
+
+    async def sondear(self) -> int:
+        """Lee una vez cada outbox y publica sus cambios. Devuelve cuántos ha leído."""
+        leidos = 0
+        cambios = await self.outbox.list_since(self._posicion[CALENDARIOS])
+        for cambio in cambios:
+            await self.publicar(CALENDARIOS, cambio)
+        leidos += len(cambios)
+
+        for fuente, suscriptor in self._suscriptores.items():
+            try:
+                leidos += await suscriptor.poll_once()
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                logger.warning("No se pudieron leer los cambios de %s: %s", suscriptor.base_url, e)
+                continue
+            if fuente in self._reiniciadas:
+                self._reiniciadas.discard(fuente)
+                suscriptor.token = ULTIMO
+            elif self._descartado[fuente] is None and suscriptor.token != ULTIMO:
+                # Primera lectura: a partir de aquí se puede reanudar en esta fuente
+                self._posicion[fuente] = int(suscriptor.token)
+                self._descartado[fuente] = self._posicion[fuente]
+        return leidos
+
+
+    async def _leer(self) -> None:
+        while True:
+            try:
+                if await self.sondear() == 0:
+                    await asyncio.sleep(STREAM_POLL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error leyendo las outbox para los flujos SSE")
+                await asyncio.sleep(STREAM_POLL_SECONDS)
+
+
+    def _reiniciar(self, fuente: int) -> None:
+        """La outbox remota ya no tiene los cambios desde la posición: se pierden y nadie puede reanudar."""
+        self._reiniciadas.add(fuente)
+        self._descartado[fuente] = None
+        for conexion in self._conexiones:
+            conexion.enviar(_trama("reset", {"motivo": "Se han perdido cambios de la outbox"}))
+
+
+    async def _parar_si_inactivo(self) -> None:
+        await asyncio.sleep(STREAM_IDLE_SECONDS)
+        self._parada = None
+        if not self._conexiones:
+            await self.detener()
+
+
+    async def detener(self) -> None:
+        """Detiene la lectura de las outbox y olvida el buffer (al apagar o sin conexiones)."""
+        if self._parada is not None:
+            self._parada.cancel()
+            self._parada = None
+        if self._bucle is not None:
+            self._bucle.cancel()
+            try:
+                await self._bucle
+            except asyncio.CancelledError:
+                pass
+            self._bucle = None
+        for cliente in self._clientes.values():
+            await cliente.aclose()
+        self._clientes.clear()
+        self._suscriptores.clear()
+        self._reiniciadas.clear()
+        self._buffer.clear()
+        self._posicion = None
+        self._descartado = [None, None, None]
+
+
+    # --- Reparto ---
+
+    async def publicar(self, fuente: int, cambio: dict) -> None:
+        """Avanza la posición de la fuente y entrega el cambio a las conexiones de sus calendarios."""
+        cambio = Cambio.model_validate(cambio)
+        self._posicion[fuente] = cambio.secuencia
+        destinos = frozenset(await self._destinos(fuente, cambio))
+        if not destinos:
+            return
+
+        posicion = self.posicion()
+        datos = cambio.model_dump(mode="json", by_alias=True, exclude={"secuencia"}, exclude_none=True)
+        trama = _trama(f"{cambio.entidad}.{cambio.operacion}", datos, posicion)
+        if len(self._buffer) >= STREAM_BUFFER_SIZE:
+            _, descartada, _, _ = self._buffer.popleft()
+            self._descartado = list(descartada)
+        self._buffer.append((fuente, posicion, destinos, trama))
+
+        conexiones: Set[_Conexion] = set()
+        for calendario in destinos:
+            conexiones.update(self._por_calendario.get(calendario, ()))
+        for conexion in conexiones:
+            conexion.enviar(trama)
+
+
+    async def _destinos(self, fuente: int, cambio: Cambio) -> Set[UUID]:
+        """Calendarios afectados por un cambio (antes y después, si la entidad se ha movido)."""
+        padres = [cambio.padres, cambio.padres_anteriores or {}]
+        if fuente == CALENDARIOS:
+            destinos = {cambio.id_entidad} | {p.get("idCalendarioPadre") for p in padres}
+            self._actualizar_subarboles(cambio)
+        elif fuente == EVENTOS:
+            destinos = {p.get("idCalendario") for p in padres}
+            self._recordar_evento(cambio.id_entidad, None if cambio.operacion == "eliminar" else cambio.padres.get("idCalendario"))
+        else:
+            destinos = set()
+            for p in padres:
+                if p.get("idCalendario") is not None:
+                    destinos.add(p["idCalendario"])
+                elif p.get("idEvento") is not None:
+                    destinos.add(await self._calendario_de_evento(p["idEvento"]))
+        destinos.discard(None)
+        return destinos
+
+
+    def _actualizar_subarboles(self, cambio: Cambio) -> None:
+        """Un calendario nuevo (o movido) bajo un calendario seguido pasa a formar parte del flujo."""
+        calendario = cambio.id_entidad
+        padre = cambio.padres.get("idCalendarioPadre")
+        anterior = (cambio.padres_anteriores or {}).get("idCalendarioPadre")
+        if cambio.operacion == "eliminar":
+            return
+        for conexion in set(self._por_calendario.get(padre, ())):
+            if calendario not in conexion.calendarios:
+                conexion.calendarios.add(calendario)
+                self._por_calendario.setdefault(calendario, set()).add(conexion)
+        if anterior is not None and anterior != padre:
+            for conexion in set(self._por_calendario.get(anterior, ())):
+                if padre not in conexion.calendarios and calendario in conexion.calendarios:
+                    conexion.calendarios.discard(calendario)
+                    self._por_calendario[calendario].discard(conexion)
+
+
+    def _recordar_evento(self, event_id: UUID, calendar_id: Optional[UUID]) -> None:
+        self._eventos[event_id] = calendar_id
+        self._eventos.move_to_end(event_id)
+        while len(self._eventos) > MAX_EVENTOS_CONOCIDOS:
+            self._eventos.popitem(last=False)
+
+
+    async def _calendario_de_evento(self, event_id: UUID) -> Optional[UUID]:
+        """Calendario de un evento (para los comentarios que solo traen idEvento)."""
+        if event_id in self._eventos:
+            self._eventos.move_to_end(event_id)
+            return self._eventos[event_id]
+        cliente = self._clientes.get(EVENTOS)
+        if cliente is None:
+            return None
+        calendario = None
+        try:
+            response = await cliente.get(f"/events/{event_id}")
+            if response.status_code == 200:
+                calendario = _uuid(response.json().get("idCalendario"))
+        except httpx.RequestError as e:
+            logger.warning("No se pudo consultar el calendario del evento %s: %s", event_id, e)
+            return None
+        self._recordar_evento(event_id, calendario)
+        return calendario
@@ -0,0 +1,85 @@
+from typing import Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+
+# Importaciones de tu proyecto
+from .. import database
+from ..model.sync_models import Baja, SyncPage
+from ..crud.calendar_crud import CalendarCRUD
+from ..crud.outbox_crud import OutboxCRUD
+
+
+def codificar_token(secuencia: int, marca: datetime) -> str:
+    """Token de sincronización: "<secuencia>.<marca>" (marca en segundos Unix, UTC)."""
+    return f"{secuencia}.{int(marca.replace(tzinfo=timezone.utc).timestamp())}"
+
+
+def leer_token(since: str) -> Tuple[int, Optional[datetime]]:
+    """Devuelve (secuencia, marca) de un token; "0" (sin marca) es la sincronización inicial."""
+    secuencia, _, marca = since.partition(".")
+    try:
+        desde = int(secuencia)
+        if desde < 0 or (desde > 0 and not marca):
+            raise ValueError(since)
+        return desde, datetime.utcfromtimestamp(int(marca)) if marca else None
+    except (ValueError, OverflowError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El token 'since' no es válido")
+
+
+class SyncService:
+    """
+    Capa de Servicio de la sincronización delta para clientes offline.
+    Cada escritura guarda en el documento la secuencia de su cambio, y cada borrado deja una baja
+    con la suya; una sincronización lee ambos por su índice de secuencia desde el token del
+    cliente, así que su coste depende de lo que cambió y no del total de calendarios.
+    La marca del token es la hora de la última sincronización que llegó al final de los cambios
+    (mientras quedan páginas se conserva la anterior): toda baja que el cliente aún necesita es
+    posterior a ella. Si desde entonces ha pasado más que la retención de las bajas, alguna puede
+    haber caducado y el cliente debe empezar de cero. Las fechas de los documentos no intervienen.
+    """
+    def __init__(self, crud: CalendarCRUD, outbox: OutboxCRUD):
+        """Inyección de Dependencia de los CRUD/Repository."""
+        self.crud = crud
+        self.outbox = outbox
+
+
+    async def sync(self, since: str, limite: int = 100) -> SyncPage:
+        """
+        Lógica: Devuelve los calendarios escritos y las bajas posteriores al token, en orden de secuencia.
+        La sincronización inicial (since=0) no lleva bajas: el cliente no tiene nada que borrar.
+        Devuelve 410 si el token es más antiguo que la retención de las bajas.
+        """
+        desde, marca = leer_token(since)
+        ahora = datetime.utcnow()
+        # Margen: una escritura en curso al leer la marca puede fechar su baja hasta una reserva antes
+        vigencia = timedelta(seconds=database.TOMBSTONE_RETENTION_SECONDS - database.OUTBOX_RESERVATION_SECONDS)
+        if marca is not None and ahora - marca > vigencia:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="El token es demasiado antiguo: las bajas intermedias ya caducaron, hay que sincronizar desde since=0",
+            )
+
+        # Se pide uno más de cada lado para saber si quedan cambios tras la página
+        # Solo hasta la secuencia confirmada: un cambio anterior aún en curso no puede quedar atrás
+        hasta = await self.outbox.committed_sequence()
+        actualizados = await self.crud.list_changed_since(desde, limite + 1, hasta)
+        bajas = await self.outbox.tombstones_since(desde, limite + 1, hasta) if desde > 0 else []
+        entradas = sorted(
+            [(doc.secuencia, doc.fecha_actualizacion, doc) for doc in actualizados]
+            + [(baja["secuencia"], baja["fecha"], Baja.model_validate(baja)) for baja in bajas],
+            key=lambda entrada: entrada[0],
+        )
+        pagina = entradas[:limite]
+        hay_mas = len(entradas) > limite
+
+        # Con más páginas pendientes, las bajas que faltan pueden ser anteriores a esta pasada:
+        # la marca solo avanza cuando el cliente se pone al día
+        secuencia = pagina[-1][0] if pagina else desde
+        token = codificar_token(secuencia, marca if hay_mas and marca is not None else ahora)
+        return SyncPage(
+            actualizados=[doc for _, _, doc in pagina if not isinstance(doc, Baja)],
+            eliminados=[doc for _, _, doc in pagina if isinstance(doc, Baja)],
+            token=token,
+            hay_mas=hay_mas,
+        )
@@ -1,30 +1,84 @@
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from uuid import UUID
-from pymongo import ReturnDocument
+from datetime import datetime
+from pymongo import ReturnDocument, ASCENDING, DESCENDING, UpdateOne
 
 # Importaciones de tu proyecto
 from .. import database
+from ..storage import LECTURA_ID, LISTADO, MASIVA, Storage
 from ..model.comment_models import CommentCreate, CommentInDB 
+from .stats_crud import CommentStatsCRUD
+from .outbox_crud import OutboxCRUD
+from ..etag import filtro_version
+from ..cache import EntityCache
+
+# Nombre de la entidad en los cambios publicados en la outbox
+ENTIDAD = "comentario"
+
+
+def _padres(comment: dict) -> dict:
+    """IDs de las entidades padre de un comentario (para invalidar sus hilos en los suscriptores)."""
+    return {"idCalendario": comment.get("idCalendario"), "idEvento": comment.get("idEvento")}
 
-# Alias para la colección de MongoDB (simplifica el código)
-CommentCollection = database.comentarios_collection 
 
 class CommentCRUD:
     """
     Capa de Acceso a Datos (Repository) para Comentarios (MongoDB).
     Toda la sintaxis de PyMongo se encapsula aquí.
+    Las escrituras mantienen además los agregados de estadísticas (CommentStatsCRUD) y publican
+    cada cambio en la outbox (OutboxCRUD) dentro de la misma transacción que el documento.
     """
 
+    def __init__(
+        self,
+        storage: Optional[Storage] = None,
+        stats: Optional[CommentStatsCRUD] = None,
+        outbox: Optional[OutboxCRUD] = None,
+        cache: Optional[EntityCache] = None,
+    ):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.COMENTARIOS)
+        # Misma colección con las opciones de cada clase de operación (read preference / write concern)
+        self.id_collection = self.storage.collection(database.COMENTARIOS, LECTURA_ID)
+        self.list_collection = self.storage.collection(database.COMENTARIOS, LISTADO)
+        self.bulk_collection = self.storage.collection(database.COMENTARIOS, MASIVA)
+        self.stats = stats or CommentStatsCRUD(self.storage)
+        self.outbox = outbox or OutboxCRUD(self.storage)
+        self.cache = cache or EntityCache()
+
+
     async def create(self, comment_data: dict) -> CommentInDB:
         """Inserta el diccionario de comentario en la BD y lo recupera."""
-        new_comment = CommentCollection.insert_one(comment_data)
-        created_comment = CommentCollection.find_one({"_id": new_comment.inserted_id})
+        comment_data = {**comment_data, "version": 1, "fechaActualizacion": datetime.utcnow()}
+
+        def _insert(session):
+            new_comment = self.collection.insert_one({**comment_data, "secuencia": secuencia}, session=session)
+            cambio = self.outbox.record(
+                ENTIDAD, new_comment.inserted_id, "crear", 1, _padres(comment_data), session=session, secuencia=secuencia
+            )
+            return new_comment.inserted_id, cambio
+
+        # La secuencia del cambio es también la del documento: con ella lo encuentra GET /sync
+        with self.outbox.reservar() as secuencia:
+            inserted_id, cambio = self.storage.run_in_transaction(_insert)
+        self.cache.invalidate(inserted_id)  # Descarta un posible "no encontrado" cacheado
+        self.outbox.dispatch(cambio)
+
+        created_comment = self.collection.find_one({"_id": inserted_id})
+        await self.stats.apply_change(None, created_comment)
         return CommentInDB.model_validate(created_comment)
 
 
     async def get_by_id(self, comment_id: UUID) -> Optional[CommentInDB]:
-        """Busca un comentario por ID."""
-        comment_data = CommentCollection.find_one({"_id": comment_id})
+        """Busca un comentario por ID (a través de la caché en proceso)."""
+        return await self.cache.get_or_load(comment_id, lambda: self._load_by_id(comment_id))
+
+
+    async def _load_by_id(self, comment_id: UUID) -> Optional[CommentInDB]:
+        """Lee un comentario de la BD (carga de la caché de get_by_id)."""
+        comment_data = self.storage.run_causal(
+            lambda session: self.id_collection.find_one({"_id": comment_id}, session=session)
+        )
         if comment_data:
             return CommentInDB.model_validate(comment_data)
         return None
@@ -32,40 +86,235 @@ class CommentCRUD:
     
     async def list_by_filter(self, filters: dict) -> List[CommentInDB]:
         """Devuelve una lista de comentarios aplicando el filtro de MongoDB."""
-        cursor = CommentCollection.find(filters)
-        comment_list = list(cursor)
+        comment_list = self.storage.run_causal(lambda session: list(self.list_collection.find(filters, session=session)))
         return [CommentInDB.model_validate(comment) for comment in comment_list]
 
 
-    async def update(self, comment_id: UUID, update_data: dict) -> Optional[CommentInDB]:
-        """Actualiza y devuelve el documento actualizado."""
-        updated_data = CommentCollection.find_one_and_update(
-            {"_id": comment_id},
-            {"$set": update_data},
-            return_document=ReturnDocument.AFTER
-        )
-        if updated_data:
-            return CommentInDB.model_validate(updated_data)
-        return None
+    async def update(
+        self, comment_id: UUID, update_data: dict, expected_versions: Optional[List[int]] = None
+    ) -> Optional[CommentInDB]:
+        """
+        Actualiza y devuelve el documento actualizado.
+        Con 'expected_versions' (If-Match) solo actualiza si la versión almacenada es una de ellas;
+        si no existe o la versión no coincide devuelve None.
+        """
+        update_data = {**update_data, "fechaActualizacion": datetime.utcnow()}
+        filtro = {"_id": comment_id}
+        if expected_versions is not None:
+            filtro["version"] = filtro_version(expected_versions)
+
+        def _update(session):
+            # Se pide el documento ANTERIOR para poder descontarlo de los agregados;
+            # el posterior es el anterior con los campos del $set aplicados.
+            previous_data = self.collection.find_one_and_update(
+                filtro,
+                {"$set": {**update_data, "secuencia": secuencia}, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if previous_data is None:
+                return None, None, None
+            updated_data = {
+                **previous_data, **update_data, "secuencia": secuencia, "version": previous_data.get("version", 0) + 1
+            }
+            cambio = self.outbox.record(
+                ENTIDAD, comment_id, "actualizar", updated_data["version"], _padres(updated_data),
+                padres_anteriores=_padres(previous_data), session=session, secuencia=secuencia
+            )
+            return previous_data, updated_data, cambio
+
+        with self.outbox.reservar() as secuencia:
+            previous_data, updated_data, cambio = self.storage.run_in_transaction(_update)
+        self.cache.invalidate(comment_id)
+        if previous_data is None:
+            return None
+        self.outbox.dispatch(cambio)
+        await self.stats.apply_change(previous_data, updated_data)
+        return CommentInDB.model_validate(updated_data)
 
 
     async def delete(self, comment_id: UUID) -> int:
         """Elimina un comentario y devuelve el número de documentos eliminados (0 o 1)."""
-        delete_result = CommentCollection.delete_one({"_id": comment_id})
-        return delete_result.deleted_count
+
+        def _delete(session):
+            deleted_comment = self.collection.find_one_and_delete({"_id": comment_id}, session=session)
+            if deleted_comment is None:
+                return None, None
+            cambio = self.outbox.record(
+                ENTIDAD, comment_id, "eliminar", deleted_comment.get("version", 0) + 1,
+                _padres(deleted_comment), session=session, secuencia=secuencia
+            )
+            return deleted_comment, cambio
+
+        with self.outbox.reservar() as secuencia:
+            deleted_comment, cambio = self.storage.run_in_transaction(_delete)
+        self.cache.invalidate(comment_id)
+        if deleted_comment is None:
+            return 0
+        self.outbox.dispatch(cambio)
+        await self.stats.apply_change(deleted_comment, None)
+        return 1
+
+
+    async def delete_by_parents(self, calendar_ids: List[UUID], event_ids: List[UUID], limit: int) -> int:
+        """
+        Elimina un lote de hasta 'limit' comentarios de los calendarios o eventos indicados
+        y devuelve cuántos se eliminaron (0 cuando ya no queda ninguno).
+        Como delete(): publica un cambio "eliminar" por comentario en la misma transacción
+        y descuenta los comentarios de los agregados (en un único bulk_write).
+        """
+        condiciones = []
+        if calendar_ids:
+            condiciones.append({"idCalendario": {"$in": calendar_ids}})
+        if event_ids:
+            condiciones.append({"idEvento": {"$in": event_ids}})
+        if not condiciones:
+            return 0
+
+        def _delete(session):
+            deleted_comments = list(self.collection.find({"$or": condiciones}, session=session).limit(limit))
+            if not deleted_comments:
+                return [], []
+            self.bulk_collection.delete_many(
+                {"_id": {"$in": [comment["_id"] for comment in deleted_comments]}}, session=session
+            )
+            cambios = [
+                self.outbox.record(
+                    ENTIDAD, comment["_id"], "eliminar", comment.get("version", 0) + 1,
+                    _padres(comment), session=session, secuencia=primera + i
+                )
+                for i, comment in enumerate(deleted_comments)
+            ]
+            return deleted_comments, cambios
+
+        # Una secuencia por cada comentario que puede caer en el lote (hasta 'limit').
+        # Purga del borrado en cascada: no necesita esperar a la confirmación de la mayoría
+        with self.outbox.reservar(limit) as ultima:
+            primera = ultima - limit + 1
+            deleted_comments, cambios = self.storage.run_in_transaction(_delete, MASIVA)
+        for comment in deleted_comments:
+            self.cache.invalidate(comment["_id"])
+        for cambio in cambios:
+            self.outbox.dispatch(cambio)
+        await self.stats.apply_changes([(comment, None) for comment in deleted_comments])
+        return len(deleted_comments)
     
 
     async def get_by_calendar(self, calendar_id: UUID) -> List[CommentInDB]:
         """Devuelve los comentarios que pertenecen a un calendario específico."""
         filtro = {"idCalendario": calendar_id}
-        cursor = CommentCollection.find(filtro)
-        comment_list = list(cursor)
+        comment_list = self.storage.run_causal(lambda session: list(self.list_collection.find(filtro, session=session)))
         return [CommentInDB.model_validate(comment) for comment in comment_list]
 
 
     async def get_by_event(self, event_id: UUID) -> List[CommentInDB]:
         """Devuelve los comentarios que pertenecen a un evento específico."""
         filtro = {"idEvento": event_id}
-        cursor = CommentCollection.find(filtro)
-        comment_list = list(cursor)
-        return [CommentInDB.model_validate(comment) for comment in comment_list]
\ No newline at end of file
+        comment_list = self.storage.run_causal(lambda session: list(self.list_collection.find(filtro, session=session)))
+        return [CommentInDB.model_validate(comment) for comment in comment_list]
+
+
+    async def list_page(
+        self,
+        filters: dict,
+        descendente: bool = True,
+        limit: int = 20,
+        after: Optional[Tuple[datetime, UUID]] = None,
+    ) -> List[CommentInDB]:
+        """
+        Devuelve una página de comentarios ordenada por (fechaCreacion, _id) usando paginación keyset:
+        'after' es la clave del último comentario de la página anterior. Con el índice compuesto
+        (idEvento|idCalendario, fechaCreacion, _id) el coste no depende de la profundidad de la página.
+        """
+        filtro = dict(filters)
+        if after is not None:
+            fecha, ultimo_id = after
+            comparador = "$lt" if descendente else "$gt"
+            filtro["$or"] = [
+                {"fechaCreacion": {comparador: fecha}},
+                {"fechaCreacion": fecha, "_id": {comparador: ultimo_id}},
+            ]
+
+        direccion = DESCENDING if descendente else ASCENDING
+        comment_list = self.storage.run_causal(lambda session: list(
+            self.list_collection.find(filtro, session=session).sort([("fechaCreacion", direccion), ("_id", direccion)]).limit(limit)
+        ))
+        return [CommentInDB.model_validate(comment) for comment in comment_list]
+
+
+    async def get_many(self, comment_ids: List[UUID]) -> List[CommentInDB]:
+        """Busca varios comentarios por ID con una única consulta $in (sin orden garantizado)."""
+        comment_list = self.storage.run_causal(
+            lambda session: list(self.id_collection.find({"_id": {"$in": comment_ids}}, session=session))
+        )
+        return [CommentInDB.model_validate(comment) for comment in comment_list]
+
+
+    async def list_pending_event_ids(self, limit: int) -> List[UUID]:
+        """Eventos de (hasta 'limit') comentarios con el calendario del evento pendiente de resolver."""
+        pendientes = self.collection.find({"calendarioPendiente": True}, {"idEvento": 1}).limit(limit)
+        return list(dict.fromkeys(comment["idEvento"] for comment in pendientes))
+
+
+    async def event_ids(self) -> AsyncIterator[UUID]:
+        """Recorre los IDs distintos de los eventos comentados, sin cargarlos todos a la vez."""
+        for grupo in self.collection.aggregate([
+            {"$match": {"idEvento": {"$ne": None}}},
+            {"$group": {"_id": "$idEvento"}},
+        ]):
+            yield grupo["_id"]
+
+
+    async def set_event_calendar(self, event_id: UUID, calendar_id: Optional[UUID]) -> int:
+        """
+        Guarda el calendario del evento (idCalendarioEvento) en sus comentarios pendientes o con
+        otro calendario, y mueve su cuenta en los agregados. Cada comentario solo se actualiza si
+        sigue como se leyó (otro proceso o una edición pudo cambiarlo antes), así que repetir la
+        llamada no cuenta dos veces. Devuelve cuántos comentarios cambiaron de calendario.
+        """
+        afectados = list(self.collection.find(
+            {"idEvento": event_id, "$or": [{"calendarioPendiente": True}, {"idCalendarioEvento": {"$ne": calendar_id}}]},
+            {"idCalendarioEvento": 1},
+        ))
+        cambios = []
+        for comment in afectados:
+            previous_data = self.collection.find_one_and_update(
+                {"_id": comment["_id"], "idEvento": event_id, "idCalendarioEvento": comment.get("idCalendarioEvento")},
+                {"$set": {"idCalendarioEvento": calendar_id}, "$unset": {"calendarioPendiente": ""}},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if previous_data is not None:
+                cambios.append((previous_data, {**previous_data, "idCalendarioEvento": calendar_id}))
+        await self.stats.apply_changes(cambios)
+        return sum(1 for previous_data, _ in cambios if previous_data.get("idCalendarioEvento") != calendar_id)
+
+
+    async def list_changed_since(self, since: int, limit: int, hasta: int) -> List[CommentInDB]:
+        """
+        Devuelve hasta 'limit' comentarios escritos después de la secuencia 'since' (hasta 'hasta'), en orden de secuencia.
+        Se lee del primario (perfil de escritura): 'hasta' es la secuencia confirmada en el primario y un
+        secundario atrasado podría devolver la N sin la N-1, que quedaría para siempre detrás del token.
+        """
+        comment_list = self.storage.run_causal(lambda session: list(
+            self.collection.find({"secuencia": {"$gt": since, "$lte": hasta}}, session=session)
+            .sort("secuencia", 1).limit(limit)
+        ))
+        return [CommentInDB.model_validate(comment) for comment in comment_list]
+
+
+    async def backfill_secuencias(self) -> int:
+        """
+        Asigna secuencia a los comentarios escritos antes de que existiera (sin el campo), para que
+        la sincronización delta los entregue. Devuelve el número de documentos modificados.
+        """
+        pendientes = [comment["_id"] for comment in self.collection.find({"secuencia": {"$exists": False}}, {"_id": 1})]
+        if not pendientes:
+            return 0
+        with self.outbox.reservar(len(pendientes)) as ultima:
+            primera = ultima - len(pendientes) + 1
+            update_result = self.bulk_collection.bulk_write([
+                # Si otro proceso se adelanta, su secuencia se respeta (el filtro ya no coincide)
+                UpdateOne({"_id": comment_id, "secuencia": {"$exists": False}}, {"$set": {"secuencia": primera + i}})
+                for i, comment_id in enumerate(pendientes)
+            ], ordered=False)
+        return update_result.modified_count
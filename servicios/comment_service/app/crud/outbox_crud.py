@@ -0,0 +1,200 @@
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+import logging
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxCRUD:
+    """
+    Bandeja de salida (outbox) transaccional de cambios del servicio.
+    Cada escritura de CommentCRUD registra aquí, dentro de la misma transacción, un cambio
+    {entidad, idEntidad, operacion, version, padres} con una secuencia creciente que hace
+    de token de reanudación para los suscriptores (GET /changes?since=<token>).
+    La secuencia se reserva fuera de la transacción (reservar) para que los escritores no
+    compitan por el contador dentro de ella; como dos escrituras pueden confirmarse en otro
+    orden que el de sus secuencias, los lectores solo ven hasta committed_sequence().
+    Además, los suscriptores en proceso (subscribe) reciben cada cambio tras el commit.
+    La misma secuencia se guarda en el documento escrito ('secuencia') y, en los borrados, en
+    una baja (tombstone) que lo sustituye: así GET /sync sirve los cambios desde un token con
+    una consulta por índice, aunque la outbox ya haya caducado.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.CAMBIOS)
+        self.counters = self.storage.collection(database.CONTADORES)
+        self.tombstones = self.storage.collection(database.BAJAS)
+        self.in_flight = self.storage.collection(database.EN_CURSO)
+        # Última secuencia conocida por este proceso: cota inferior de la siguiente que se reserve
+        self._vista = 0
+        self._listeners: List[Callable[[dict], None]] = []
+
+
+    def record(
+        self,
+        entidad: str,
+        id_entidad: UUID,
+        operacion: str,
+        version: int,
+        padres: dict,
+        padres_anteriores: Optional[dict] = None,
+        session=None,
+        *,
+        secuencia: int,
+    ) -> dict:
+        """
+        Inserta un cambio en la outbox y lo devuelve. 'padres_anteriores' sólo se indica cuando
+        una actualización mueve la entidad (p.ej. de calendario), para invalidar también el origen.
+        'secuencia' es la ya reservada con reservar() para el documento.
+        Un cambio "eliminar" deja además la baja de la entidad para la sincronización delta.
+        Es síncrono a propósito: se llama dentro del callback de run_in_transaction.
+        """
+        cambio = {
+            "_id": secuencia,
+            "entidad": entidad,
+            "idEntidad": id_entidad,
+            "operacion": operacion,
+            "version": version,
+            "padres": padres,
+            "fecha": datetime.utcnow(),
+        }
+        if padres_anteriores and padres_anteriores != padres:
+            cambio["padresAnteriores"] = padres_anteriores
+        self.collection.insert_one(cambio, session=session)
+        if operacion == "eliminar":
+            self.tombstones.update_one(
+                {"_id": id_entidad},
+                {"$set": {"secuencia": secuencia, "entidad": entidad, "padres": padres, "fecha": cambio["fecha"]}},
+                upsert=True,
+                session=session,
+            )
+        return cambio
+
+
+    def record_created(self, entidad: str, altas: List[Tuple[UUID, dict]], ultima: int, session=None) -> List[dict]:
+        """
+        Como record() para un lote de altas (id, padres) en un único insert_many: la i-ésima
+        recibe la secuencia ultima - len(altas) + 1 + i, reservadas con reservar(len(altas)).
+        """
+        if not altas:
+            return []
+        primera = ultima - len(altas) + 1
+        fecha = datetime.utcnow()
+        cambios = [
+            {"_id": primera + i, "entidad": entidad, "idEntidad": id_entidad, "operacion": "crear",
+             "version": 1, "padres": padres, "fecha": fecha}
+            for i, (id_entidad, padres) in enumerate(altas)
+        ]
+        self.collection.insert_many(cambios, ordered=False, session=session)
+        return cambios
+
+
+    def next_sequence(self, cantidad: int = 1) -> int:
+        """
+        Reserva 'cantidad' secuencias consecutivas y devuelve la última. Las secuencias solo
+        garantizan el orden: una escritura que no llega a hacerse deja un hueco.
+        Las escrituras usan reservar(), que además las marca como en curso.
+        """
+        contador = self.counters.find_one_and_update(
+            {"_id": self.collection.name},
+            {"$inc": {"secuencia": cantidad}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._vista = max(self._vista, contador["secuencia"])
+        return contador["secuencia"]
+
+
+    @contextmanager
+    def reservar(self, cantidad: int = 1) -> Iterator[int]:
+        """
+        Reserva 'cantidad' secuencias para una escritura y devuelve la última; se usa envolviendo
+        el run_in_transaction de la escritura. Mientras dura, una marca en curso con una cota
+        inferior de las secuencias reservadas impide que committed_sequence() las supere, así
+        que ningún lector avanza su token por delante de un cambio que aún no se ha confirmado.
+        La marca se pone ANTES de incrementar el contador (ver committed_sequence).
+        Si el proceso cae, la marca caduca a los OUTBOX_RESERVATION_SECONDS.
+        """
+        marca = {
+            "_id": uuid4(),
+            "outbox": self.collection.name,
+            "desde": self._vista + 1,
+            "expiraEn": datetime.utcnow() + timedelta(seconds=database.OUTBOX_RESERVATION_SECONDS),
+        }
+        self.in_flight.insert_one(marca)
+        try:
+            yield self.next_sequence(cantidad)
+        finally:
+            self.in_flight.delete_one({"_id": marca["_id"]})
+
+
+    def _confirmada(self) -> int:
+        # Primero el contador y después las marcas: una secuencia que ya está en el contador
+        # tenía su marca puesta, así que o sigue en curso (y limita) o ya se confirmó
+        contador = self.counters.find_one({"_id": self.collection.name})
+        ultima = contador["secuencia"] if contador else 0
+        en_curso = self.in_flight.find_one(
+            {"outbox": self.collection.name, "expiraEn": {"$gt": datetime.utcnow()}}, sort=[("desde", 1)]
+        )
+        return min(ultima, en_curso["desde"] - 1) if en_curso else ultima
+
+
+    async def committed_sequence(self) -> int:
+        """
+        Secuencia hasta la que todas las escrituras están confirmadas o descartadas (high-water
+        mark): los cambios posteriores pueden tener aún huecos que se rellenarán.
+        """
+        return self._confirmada()
+
+
+    def subscribe(self, listener: Callable[[dict], None]) -> Callable[[], None]:
+        """Registra un suscriptor en proceso. Devuelve una función para darlo de baja."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+
+    def dispatch(self, cambio: Optional[dict]) -> None:
+        """Notifica un cambio ya confirmado a los suscriptores en proceso."""
+        if cambio is None:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(cambio)
+            except Exception:
+                # Un suscriptor roto no puede hacer fallar la escritura que ya se confirmó
+                logger.exception("Error notificando el cambio %s", cambio["_id"])
+
+
+    async def list_since(self, since: int, limit: int = 100) -> List[dict]:
+        """
+        Devuelve los cambios con secuencia mayor que 'since' y ya confirmados (hasta
+        committed_sequence()), en orden (usa el índice de _id).
+        """
+        hasta = self._confirmada()
+        cursor = self.collection.find({"_id": {"$gt": since, "$lte": hasta}}).sort("_id", 1).limit(limit)
+        return list(cursor)
+
+
+    async def latest_sequence(self) -> int:
+        """Secuencia del último cambio publicado: la confirmada (0 si no hay ninguno)."""
+        return self._confirmada()
+
+
+    async def tombstones_since(self, since: int, limit: int, hasta: int) -> List[dict]:
+        """Devuelve las bajas con secuencia en (since, hasta], en orden (índice de secuencia)."""
+        cursor = self.tombstones.find({"secuencia": {"$gt": since, "$lte": hasta}}).sort("secuencia", 1).limit(limit)
+        return list(cursor)
+
+
+    async def oldest_sequence(self) -> Optional[int]:
+        """Secuencia más antigua que se conserva (las anteriores ya caducaron por TTL)."""
+        oldest = self.collection.find_one({}, sort=[("_id", 1)])
+        return oldest["_id"] if oldest else None
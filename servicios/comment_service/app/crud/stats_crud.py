@@ -0,0 +1,125 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+from datetime import datetime
+from pymongo import UpdateOne
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import LECTURA_ID, MASIVA, Storage
+
+# Tipos de agregado que mantiene el servicio de comentarios en la colección de estadísticas
+COMENTARIOS_CALENDARIO = "comentarios_calendario"
+COMENTARIOS_EVENTO = "comentarios_evento"
+
+
+class CommentStatsCRUD:
+    """
+    Capa de Acceso a Datos para los agregados (rollups) de comentarios.
+    Cada agregado es un documento cuyo _id es su clave, p.ej.
+    {"tipo": "comentarios_calendario", "idCalendario": ...}, y se mantiene con $inc
+    desde las escrituras de CommentCRUD; rebuild() lo recalcula desde cero para corregir derivas.
+    Un calendario cuenta sus comentarios directos y los de sus eventos (idCalendarioEvento,
+    que resuelve CalendarResolver fuera de la petición), cada comentario una sola vez.
+    Los $inc se aplican después de confirmar la escritura del comentario y fuera de su
+    transacción (los contadores compartidos serían un punto de conflicto entre transacciones):
+    si el proceso cae entre ambos pasos el agregado se desajusta hasta el siguiente rebuild().
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.ESTADISTICAS)
+        # Los contadores se leen por _id; la reconstrucción es una escritura masiva
+        self.id_collection = self.storage.collection(database.ESTADISTICAS, LECTURA_ID)
+        self.bulk_collection = self.storage.collection(database.ESTADISTICAS, MASIVA)
+        # Colección de comentarios: origen de los agregados al reconstruirlos ($merge con write concern masivo)
+        self.comments = self.storage.collection(database.COMENTARIOS, MASIVA)
+
+
+    def _incrementos(self, comment: dict, signo: int) -> List[tuple]:
+        """Devuelve las parejas (clave, $inc) que aporta un comentario (signo=+1 al alta, -1 a la baja)."""
+        incrementos = []
+        for calendario in dict.fromkeys(filter(None, (comment.get("idCalendario"), comment.get("idCalendarioEvento")))):
+            incrementos.append(({"tipo": COMENTARIOS_CALENDARIO, "idCalendario": calendario}, {"total": signo}))
+        if comment.get("idEvento"):
+            incrementos.append(({"tipo": COMENTARIOS_EVENTO, "idEvento": comment["idEvento"]}, {"total": signo}))
+        return incrementos
+
+
+    async def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        """
+        Aplica a los agregados el paso de un comentario del estado 'before' al estado 'after'
+        (None en 'before' para una creación y en 'after' para un borrado) en un solo bulk_write.
+        """
+        await self.apply_changes([(before, after)])
+
+
+    async def apply_changes(self, cambios: List[Tuple[Optional[dict], Optional[dict]]]) -> None:
+        """Igual que apply_change para varios pares (before, after), acumulados en un único bulk_write."""
+        acumulado = {}
+        for before, after in cambios:
+            for comment, signo in ((before, -1), (after, 1)):
+                if comment is None:
+                    continue
+                for clave, inc in self._incrementos(comment, signo):
+                    clave_hash = tuple(clave.items())
+                    actual = acumulado.setdefault(clave_hash, (clave, {}))[1]
+                    for campo, valor in inc.items():
+                        actual[campo] = actual.get(campo, 0) + valor
+
+        operaciones = [
+            UpdateOne(
+                {"_id": clave},
+                {"$inc": inc, "$setOnInsert": {"creadoEn": datetime.utcnow()}},
+                upsert=True,
+            )
+            for clave, inc in acumulado.values()
+            if any(inc.values())  # Una actualización que no cambia ninguna clave no escribe nada
+        ]
+        if operaciones:
+            self.collection.bulk_write(operaciones, ordered=False)
+
+
+    async def get_calendar_count(self, calendar_id: UUID) -> int:
+        """Devuelve el número de comentarios de un calendario."""
+        clave = {"tipo": COMENTARIOS_CALENDARIO, "idCalendario": calendar_id}
+        doc = self.storage.run_causal(lambda session: self.id_collection.find_one({"_id": clave}, session=session))
+        return doc["total"] if doc else 0
+
+
+    async def get_event_count(self, event_id: UUID) -> int:
+        """Devuelve el número de comentarios de un evento."""
+        clave = {"tipo": COMENTARIOS_EVENTO, "idEvento": event_id}
+        doc = self.storage.run_causal(lambda session: self.id_collection.find_one({"_id": clave}, session=session))
+        return doc["total"] if doc else 0
+
+
+    async def rebuild(self) -> None:
+        """
+        Recalcula todos los agregados de comentarios con un pipeline de agregación ($group + $merge)
+        y elimina los que ya no corresponden a ningún comentario. Los agregados creados por escrituras
+        concurrentes durante la reconstrucción (creadoEn posterior a la marca) no se tocan.
+        """
+        marca = datetime.utcnow()
+        merge = {"$merge": {"into": self.collection.name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+
+        # Calendario directo y calendario del evento comentado, sin contar dos veces el mismo
+        self.comments.aggregate([
+            {"$set": {"idCalendario": {"$setUnion": [["$idCalendario"], ["$idCalendarioEvento"]]}}},
+            {"$unwind": "$idCalendario"},
+            {"$match": {"idCalendario": {"$ne": None}}},
+            {"$group": {"_id": {"tipo": COMENTARIOS_CALENDARIO, "idCalendario": "$idCalendario"}, "total": {"$sum": 1}}},
+            {"$set": {"creadoEn": marca, "reconstruidoEn": marca}},
+            merge,
+        ])
+        self.comments.aggregate([
+            {"$match": {"idEvento": {"$ne": None}}},
+            {"$group": {"_id": {"tipo": COMENTARIOS_EVENTO, "idEvento": "$idEvento"}, "total": {"$sum": 1}}},
+            {"$set": {"creadoEn": marca, "reconstruidoEn": marca}},
+            merge,
+        ])
+
+        self.bulk_collection.delete_many({
+            "_id.tipo": {"$in": [COMENTARIOS_CALENDARIO, COMENTARIOS_EVENTO]},
+            "reconstruidoEn": {"$ne": marca},
+            "creadoEn": {"$lt": marca},
+        })
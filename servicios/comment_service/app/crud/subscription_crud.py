@@ -0,0 +1,34 @@
+from typing import Optional
+from datetime import datetime
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+
+
+class SubscriptionCRUD:
+    """
+    Capa de Acceso a Datos de las suscripciones del servicio al feed de cambios (GET /changes)
+    de otros servicios. Cada suscripción es un documento cuyo _id es su nombre y guarda la
+    posición (secuencia) hasta la que se han aplicado los cambios, compartida por todos los
+    procesos: la posición solo avanza, aunque dos procesos lean el mismo tramo a la vez.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.SUSCRIPCIONES)
+
+    async def get_position(self, nombre: str) -> Optional[int]:
+        """Devuelve la posición guardada de la suscripción, o None si aún no ha empezado."""
+        suscripcion = self.collection.find_one({"_id": nombre})
+        return suscripcion["posicion"] if suscripcion else None
+
+
+    async def save_position(self, nombre: str, posicion: int) -> None:
+        """Avanza la posición de la suscripción (nunca la retrasa)."""
+        self.collection.update_one(
+            {"_id": nombre},
+            {"$max": {"posicion": posicion}, "$set": {"actualizadoEn": datetime.utcnow()}},
+            upsert=True,
+        )
+
@@ -0,0 +1,250 @@
+"""
+Tiempo de MongoDB por comando y por petición, a partir de la monitorización de comandos del driver.
+
+- DbTimingListener acumula la duración de cada comando por (comando, colección) y escribe
+  en el log los que superan SLOW_QUERY_MS, con la forma del filtro (sin valores) y un
+  resumen del plan de ejecución (explain, una vez por forma de consulta y en segundo plano).
+- ServerTimingMiddleware añade a cada respuesta la cabecera Server-Timing con el tiempo
+  de base de datos, el resto del manejador y el total:
+      Server-Timing: db;dur=12.4;desc="3 comandos", app;dur=5.1, total;dur=17.5
+
+Configuración (variables de entorno):
+    SLOW_QUERY_MS   umbral en milisegundos de una consulta lenta (por defecto 100; 0 la desactiva)
+    SERVER_TIMING   'false' para no añadir la cabecera
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+# Dónde está el filtro de cada comando (los de escritura llevan una lista de sentencias)
+CAMPOS_FILTRO = {
+    "find": "filter", "count": "query", "distinct": "query", "findAndModify": "query",
+    "aggregate": "pipeline", "update": "updates", "delete": "deletes",
+}
+# Campos del comando que no se reenvían a explain (sesión, transacción, metadatos del driver)
+CAMPOS_SESION = {"lsid", "txnNumber", "$clusterTime", "$db", "startTransaction", "autocommit",
+                 "readConcern", "writeConcern", "$readPreference", "apiVersion", "apiStrict"}
+# Comandos que no se miden: los del propio driver y los explain que lanza este módulo
+IGNORADOS = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "explain"}
+MAX_PLANES = 1000
+
+
+class _Medicion:
+    """Tiempo de base de datos de la petición en curso."""
+
+    __slots__ = ("db_ms", "comandos")
+
+    def __init__(self):
+        self.db_ms = 0.0
+        self.comandos = 0
+
+
+_medicion_actual: ContextVar[Optional[_Medicion]] = ContextVar("medicion_db", default=None)
+
+
+def forma(valor: Any) -> Any:
+    """
+    Forma de un filtro o pipeline sin sus valores: conserva campos y operadores y cambia
+    cada valor por '?' (las listas, por su primer elemento y su longitud).
+    """
+    if isinstance(valor, dict):
+        return {clave: forma(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        if not valor:
+            return []
+        return [forma(valor[0])] + ([f"…{len(valor)}"] if len(valor) > 1 else [])
+    return "?"
+
+
+def _forma_comando(command: dict, nombre: str) -> Any:
+    campo = CAMPOS_FILTRO.get(nombre)
+    if campo is None:
+        return None
+    valor = command.get(campo)
+    if nombre in ("update", "delete") and isinstance(valor, list):
+        valor = [sentencia.get("q") for sentencia in valor[:1]]
+    resultado = {campo: forma(valor)}
+    if command.get("sort"):
+        # El orden no tiene datos sensibles y ayuda a elegir el índice
+        resultado["sort"] = dict(command["sort"])
+    return resultado
+
+
+def resumen_plan(explain: Any) -> str:
+    """Resumen del plan ganador: etapas de la hoja a la raíz, p.ej. 'IXSCAN(evento_calendario) > FETCH'."""
+    plan = _buscar_clave(explain, "winningPlan")
+    if plan is None:
+        return "desconocido"
+    # Con el motor SBE el árbol clásico está dentro de 'queryPlan'
+    plan = plan.get("queryPlan", plan)
+    etapas: List[str] = []
+
+    def recorrer(nodo: dict) -> None:
+        for hijo in nodo.get("inputStages", []) or ([nodo["inputStage"]] if "inputStage" in nodo else []):
+            recorrer(hijo)
+        etapa = nodo.get("stage", "?")
+        etapas.append(f"{etapa}({nodo['indexName']})" if "indexName" in nodo else etapa)
+
+    recorrer(plan)
+    return " > ".join(etapas)
+
+
+def _buscar_clave(valor: Any, clave: str) -> Any:
+    if isinstance(valor, dict):
+        if clave in valor:
+            return valor[clave]
+        hijos = valor.values()
+    elif isinstance(valor, list):
+        hijos = valor
+    else:
+        return None
+    for hijo in hijos:
+        encontrado = _buscar_clave(hijo, clave)
+        if encontrado is not None:
+            return encontrado
+    return None
+
+
+class DbTimingListener(monitoring.CommandListener):
+    """
+    Mide cada comando de MongoDB: lo suma al tiempo de la petición en curso y a las
+    estadísticas por (comando, colección), y escribe en el log los lentos.
+    """
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.client = None  # MongoClient con el que se lanzan los explain (lo fija quien crea el cliente)
+        self._lock = threading.Lock()
+        self._pendientes: Dict[Tuple[int, Any], Tuple[str, str, str, Any]] = {}
+        self._estadisticas: Dict[Tuple[str, str], List[float]] = {}
+        self._planes: Dict[str, str] = {}
+        self._explicador: Optional[ThreadPoolExecutor] = None
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in IGNORADOS:
+            return
+        coleccion = event.command.get(event.command_name)
+        self._pendientes[(event.request_id, event.connection_id)] = (
+            event.command_name,
+            coleccion if isinstance(coleccion, str) else "",
+            event.database_name,
+            # Solo se guarda el comando si hay umbral: hace falta para la forma y el explain
+            event.command if self.slow_query_ms > 0 else None,
+        )
+
+    def _terminar(self, event) -> None:
+        pendiente = self._pendientes.pop((event.request_id, event.connection_id), None)
+        if pendiente is None:
+            return
+        nombre, coleccion, base, command = pendiente
+        duracion_ms = event.duration_micros / 1000
+
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.db_ms += duracion_ms
+            medicion.comandos += 1
+
+        lenta = 0 < self.slow_query_ms <= duracion_ms
+        with self._lock:
+            # [llamadas, total ms, máximo ms, lentas]
+            estadistica = self._estadisticas.setdefault((nombre, coleccion), [0, 0.0, 0.0, 0])
+            estadistica[0] += 1
+            estadistica[1] += duracion_ms
+            estadistica[2] = max(estadistica[2], duracion_ms)
+            estadistica[3] += lenta
+        if lenta and command is not None:
+            self._consulta_lenta(nombre, coleccion, base, command, duracion_ms)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._terminar(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._terminar(event)
+
+    def _consulta_lenta(self, nombre: str, coleccion: str, base: str, command: dict, duracion_ms: float) -> None:
+        forma_consulta = _forma_comando(command, nombre)
+        clave = json.dumps([nombre, coleccion, forma_consulta], sort_keys=True, default=str)
+        plan = self._planes.get(clave)
+        if plan is not None or self.client is None or forma_consulta is None:
+            self._log(nombre, coleccion, duracion_ms, forma_consulta, plan or "sin explain")
+            return
+        # El explain es otra ida a la base de datos: se hace fuera del hilo de la petición
+        if self._explicador is None:
+            self._explicador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._explicador.submit(self._explicar, clave, nombre, coleccion, base, command, duracion_ms, forma_consulta)
+
+    def _explicar(self, clave, nombre, coleccion, base, command, duracion_ms, forma_consulta) -> None:
+        try:
+            comando = {k: v for k, v in command.items() if k not in CAMPOS_SESION}
+            explain = self.client[base].command({"explain": comando, "verbosity": "queryPlanner"})
+            plan = resumen_plan(explain)
+        except Exception as e:  # El explain es diagnóstico: nunca debe romper nada
+            plan = f"explain falló: {e}"
+        if len(self._planes) < MAX_PLANES:
+            self._planes[clave] = plan
+        self._log(nombre, coleccion, duracion_ms, forma_consulta, plan)
+
+    def _log(self, nombre, coleccion, duracion_ms, forma_consulta, plan) -> None:
+        logger.warning(
+            "Consulta lenta (%.1f ms): %s %s forma=%s plan=%s",
+            duracion_ms, nombre, coleccion, json.dumps(forma_consulta, default=str, ensure_ascii=False), plan,
+        )
+
+    def stats(self) -> List[dict]:
+        """Estadísticas por comando y colección, de más a menos tiempo total."""
+        with self._lock:
+            filas = [
+                {"comando": nombre, "coleccion": coleccion, "llamadas": n, "totalMs": round(total, 3),
+                 "mediaMs": round(total / n, 3), "maxMs": round(maximo, 3), "lentas": lentas}
+                for (nombre, coleccion), (n, total, maximo, lentas) in self._estadisticas.items()
+            ]
+        return sorted(filas, key=lambda fila: -fila["totalMs"])
+
+
+# Listener del proceso (se registra en el MongoClient al crear el almacenamiento)
+LISTENER = DbTimingListener()
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware ASGI: mide la petición y añade Server-Timing al empezar la respuesta, con
+    el tiempo en MongoDB hasta ese momento frente al tiempo total del manejador.
+    """
+
+    def __init__(self, app, enabled: bool = SERVER_TIMING):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        medicion = _Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+
+        async def send_con_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - inicio) * 1000
+                valor = (f'db;dur={medicion.db_ms:.1f};desc="{medicion.comandos} comandos", '
+                         f"app;dur={max(total_ms - medicion.db_ms, 0):.1f}, total;dur={total_ms:.1f}")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", valor.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_timing)
+        finally:
+            _medicion_actual.reset(token)
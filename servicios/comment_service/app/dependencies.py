@@ -1,8 +1,46 @@
 from .crud.comment_crud import CommentCRUD
+from .crud.stats_crud import CommentStatsCRUD
+from .crud.outbox_crud import OutboxCRUD
+from .crud.subscription_crud import SubscriptionCRUD
 from .service.commentsService import CommentsService
+from .service.statsService import StatsService
+from .service.changesService import ChangesService
+from .service.syncService import SyncService
+from .service.calendarResolver import CalendarResolver
+from .crud.idempotency_crud import IdempotencyCRUD
+from .service.idempotencyService import IdempotencyService
+from .cache import OutboxInvalidator
+from .storage import Storage
+from . import database
 
-# Instanciación estática del CRUD (si no requiere sesión/estado)
-COMMENT_CRUD_INSTANCE = CommentCRUD()
+# Instanciación estática de los CRUD sobre el almacenamiento del proceso.
+# configure_storage() los reconstruye sobre otro (p.ej. uno en memoria por test).
+STORAGE_INSTANCE: Storage = None
+STATS_CRUD_INSTANCE: CommentStatsCRUD = None
+OUTBOX_INSTANCE: OutboxCRUD = None
+IDEMPOTENCY_CRUD_INSTANCE: IdempotencyCRUD = None
+COMMENT_CRUD_INSTANCE: CommentCRUD = None
+# Invalida las cachés de este proceso con las escrituras de los demás (lee la outbox)
+CACHE_INVALIDATOR_INSTANCE: OutboxInvalidator = None
+# Resuelve el calendario de los eventos comentados fuera de las peticiones (se arranca en el lifespan)
+CALENDAR_RESOLVER_INSTANCE: CalendarResolver = None
+
+def configure_storage(storage: Storage) -> None:
+    """Construye de nuevo los CRUD del servicio sobre el almacenamiento indicado."""
+    global STORAGE_INSTANCE, STATS_CRUD_INSTANCE, OUTBOX_INSTANCE, COMMENT_CRUD_INSTANCE, IDEMPOTENCY_CRUD_INSTANCE, CACHE_INVALIDATOR_INSTANCE, CALENDAR_RESOLVER_INSTANCE
+    STORAGE_INSTANCE = storage
+    STATS_CRUD_INSTANCE = CommentStatsCRUD(storage)
+    OUTBOX_INSTANCE = OutboxCRUD(storage)
+    IDEMPOTENCY_CRUD_INSTANCE = IdempotencyCRUD(storage)
+    COMMENT_CRUD_INSTANCE = CommentCRUD(storage, stats=STATS_CRUD_INSTANCE, outbox=OUTBOX_INSTANCE)
+    CACHE_INVALIDATOR_INSTANCE = OutboxInvalidator(OUTBOX_INSTANCE, COMMENT_CRUD_INSTANCE.cache)
+    CALENDAR_RESOLVER_INSTANCE = CalendarResolver(COMMENT_CRUD_INSTANCE, SubscriptionCRUD(storage))
+
+configure_storage(database.storage)
+
+def get_storage() -> Storage:
+    """Provee el almacenamiento sobre el que trabajan los CRUD."""
+    return STORAGE_INSTANCE
 
 def get_comment_crud() -> CommentCRUD:
     """Provee la instancia del CRUD (útil para otros servicios o tests)."""
@@ -10,4 +48,32 @@ def get_comment_crud() -> CommentCRUD:
 
 def get_comment_service() -> CommentsService:
     """Provee la instancia del CommentsService, inyectándole el CRUD."""
-    return CommentsService(crud=COMMENT_CRUD_INSTANCE)
\ No newline at end of file
+    return CommentsService(crud=COMMENT_CRUD_INSTANCE)
+
+def get_stats_service() -> StatsService:
+    """Provee la instancia del StatsService, inyectándole el CRUD de agregados y el resolutor de calendarios."""
+    return StatsService(stats=STATS_CRUD_INSTANCE, resolver=CALENDAR_RESOLVER_INSTANCE)
+
+def get_outbox() -> OutboxCRUD:
+    """Provee la outbox de cambios (p.ej. para suscribirse en proceso con subscribe())."""
+    return OUTBOX_INSTANCE
+
+def get_changes_service() -> ChangesService:
+    """Provee la instancia del ChangesService, inyectándole la outbox."""
+    return ChangesService(outbox=OUTBOX_INSTANCE)
+
+def get_sync_service() -> SyncService:
+    """Provee la instancia del SyncService, inyectándole el CRUD y la outbox (bajas)."""
+    return SyncService(crud=COMMENT_CRUD_INSTANCE, outbox=OUTBOX_INSTANCE)
+
+def get_idempotency_service() -> IdempotencyService:
+    """Provee el IdempotencyService (cabecera Idempotency-Key de los POST de creación)."""
+    return IdempotencyService(crud=IDEMPOTENCY_CRUD_INSTANCE)
+
+def get_cache_invalidator() -> OutboxInvalidator:
+    """Provee el invalidador de cachés del proceso (se arranca en el lifespan)."""
+    return CACHE_INVALIDATOR_INSTANCE
+
+def get_calendar_resolver() -> CalendarResolver:
+    """Provee el resolutor del calendario de los eventos comentados (se arranca en el lifespan)."""
+    return CALENDAR_RESOLVER_INSTANCE
@@ -0,0 +1,235 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+import functools
+import inspect
+import json
+
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic_core import to_jsonable_python
+
+# Codificadores opcionales: si no están instalados se usa el módulo json estándar
+# y no se ofrece MessagePack (las peticiones con Accept: application/msgpack reciben JSON).
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Tipo de medio negociado para la petición en curso (lo fija EncodedRoute antes de ejecutar el endpoint)
+_TIPO_RESPUESTA: ContextVar[str] = ContextVar("tipo_respuesta", default=JSON)
+
+# Parámetro con el que EncodedRoute recibe la respuesta temporal de FastAPI (cabeceras y código
+# fijados por el endpoint o sus dependencias) cuando el endpoint no declara uno propio
+_PARAMETRO_RESPUESTA = "_respuesta_codificada"
+
+
+def _json_dumps(contenido: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(datos: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+
+# Registro de codificadores por tipo de medio: (codificar, decodificar).
+# El contenido que reciben ya es "JSON-compatible" (EncodedResponse lo pasa antes por to_jsonable_python).
+CODIFICADORES: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    JSON: (_json_dumps, _json_loads),
+}
+if msgpack is not None:
+    CODIFICADORES[MSGPACK] = (
+        lambda contenido: msgpack.packb(contenido, use_bin_type=True),
+        lambda datos: msgpack.unpackb(datos, raw=False),
+    )
+
+
+def registrar_codificador(
+    media_type: str, codificar: Callable[[Any], bytes], decodificar: Callable[[bytes], Any]
+) -> None:
+    """Añade (o sustituye) el codificador de un tipo de medio."""
+    CODIFICADORES[media_type] = (codificar, decodificar)
+
+
+def _tipo_de_medio(cabecera: Optional[str]) -> str:
+    return (cabecera or "").split(";")[0].strip().lower()
+
+
+def negociar(accept: Optional[str]) -> str:
+    """
+    Elige el tipo de medio de la respuesta según Accept (por orden de preferencia 'q').
+    Devuelve JSON si el cliente no pide ninguno de los registrados.
+    """
+    preferencias = []
+    for posicion, parte in enumerate((accept or "").split(",")):
+        media_type, _, parametros = parte.partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            nombre, _, valor = parametro.strip().partition("=")
+            if nombre == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        preferencias.append((-calidad, posicion, media_type.strip().lower()))
+
+    for calidad, _, media_type in sorted(preferencias):
+        if calidad < 0 and media_type in CODIFICADORES:
+            return media_type
+    return JSON
+
+
+def decodificar(media_type: Optional[str], datos: bytes) -> Any:
+    """Decodifica un cuerpo según su Content-Type (JSON si no es uno de los registrados)."""
+    _, decodificador = CODIFICADORES.get(_tipo_de_medio(media_type), CODIFICADORES[JSON])
+    return decodificador(datos)
+
+
+def cabeceras_cliente() -> Dict[str, str]:
+    """Cabeceras para pedir a otro servicio la representación más compacta disponible."""
+    if MSGPACK in CODIFICADORES:
+        return {"Accept": f"{MSGPACK}, {JSON};q=0.5"}
+    return {"Accept": JSON}
+
+
+def contenido_respuesta(response) -> Any:
+    """Decodifica la respuesta (httpx) de otro servicio según su Content-Type."""
+    return decodificar(response.headers.get("content-type"), response.content)
+
+
+class EncodedResponse(Response):
+    """
+    Respuesta por defecto de los routers: se codifica una sola vez, directamente en el tipo de
+    medio que EncodedRoute negoció con Accept antes de ejecutar el endpoint (JSON con el
+    codificador rápido, orjson si existe, fuera de una EncodedRoute). Acepta modelos Pydantic
+    (por alias, como el response_model), listas y diccionarios con UUID y fechas.
+    """
+
+    def __init__(
+        self,
+        content: Any = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: Optional[str] = None,
+        background=None,
+    ):
+        media_type = media_type or _TIPO_RESPUESTA.get()
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        codificador, _ = CODIFICADORES.get(self.media_type, CODIFICADORES[JSON])
+        return codificador(to_jsonable_python(content, by_alias=True))
+
+
+def _codifica(response_class: Any) -> bool:
+    """True si la clase de respuesta de la ruta (o su valor por defecto) es una EncodedResponse."""
+    if isinstance(response_class, DefaultPlaceholder):
+        response_class = response_class.value
+    return isinstance(response_class, type) and issubclass(response_class, EncodedResponse)
+
+
+class EncodedRoute(APIRoute):
+    """
+    Ruta con negociación de contenido:
+    - Cuerpos de petición en cualquier formato registrado (Content-Type), p.ej. application/msgpack.
+    - Respuestas EncodedResponse codificadas en el tipo negociado con Accept (Vary: Accept para las cachés).
+    - Lo que devuelve el endpoint se codifica tal cual, sin que FastAPI lo vuelva a validar y a
+      serializar con el response_model: el modelo pasa a 'responses' y solo documenta el esquema
+      en OpenAPI. Los endpoints devuelven ya el modelo de respuesta (lo construyen los servicios).
+    """
+
+    def __init__(self, path: str, endpoint: Callable, *, response_model: Any = None, **kwargs):
+        if response_model is not None and not isinstance(response_model, DefaultPlaceholder) \
+                and _codifica(kwargs.get("response_class")):
+            codigo = kwargs.get("status_code") or 200
+            responses = dict(kwargs.get("responses") or {})
+            responses[codigo] = {"model": response_model, **responses.get(codigo, {})}
+            kwargs["responses"] = responses
+            response_model = None
+        # Sin response_model explícito FastAPI lo deduciría de la anotación de retorno
+        super().__init__(path, endpoint, response_model=response_model, **kwargs)
+
+    def _codificar_retorno(self) -> None:
+        """
+        Envuelve la llamada al endpoint para que devuelva ya la EncodedResponse: FastAPI entrega
+        las Response tal cual, sin pasar el contenido por el response_model ni por jsonable_encoder.
+        """
+        llamada = self.dependant.call
+        if getattr(llamada, "_codifica_retorno", False) or not _codifica(self.response_class):
+            return
+        parametro = self.dependant.response_param_name
+        if parametro is None:
+            parametro = self.dependant.response_param_name = _PARAMETRO_RESPUESTA
+        propio = parametro != _PARAMETRO_RESPUESTA
+
+        def responder(contenido: Any, temporal: Response) -> Any:
+            if isinstance(contenido, Response):
+                return contenido
+            # Igual que FastAPI: el código fijado por el endpoint manda sobre el de la ruta
+            response = EncodedResponse(contenido, status_code=temporal.status_code or self.status_code or 200)
+            response.headers.raw.extend(temporal.headers.raw)
+            return response
+
+        if inspect.iscoroutinefunction(llamada):
+            @functools.wraps(llamada)
+            async def endpoint(**valores):
+                temporal = valores[parametro] if propio else valores.pop(parametro)
+                return responder(await llamada(**valores), temporal)
+        else:
+            @functools.wraps(llamada)
+            def endpoint(**valores):
+                temporal = valores[parametro] if propio else valores.pop(parametro)
+                return responder(llamada(**valores), temporal)
+
+        endpoint._codifica_retorno = True
+        self.dependant.call = endpoint
+
+    def get_route_handler(self) -> Callable:
+        self._codificar_retorno()
+        handler_original = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            content_type = _tipo_de_medio(request.headers.get("content-type"))
+            if content_type != JSON and content_type in CODIFICADORES:
+                request = _PeticionDecodificada(request.scope, request.receive, content_type)
+
+            # Se negocia antes de ejecutar el endpoint: la respuesta se codifica una sola vez
+            token = _TIPO_RESPUESTA.set(negociar(request.headers.get("accept")))
+            try:
+                response = await handler_original(request)
+            finally:
+                _TIPO_RESPUESTA.reset(token)
+
+            if isinstance(response, EncodedResponse):
+                response.headers["Vary"] = "Accept"
+            return response
+
+        return handler
+
+
+class _PeticionDecodificada(Request):
+    """Petición cuyo cuerpo se entrega a FastAPI como si fuera JSON, ya decodificado."""
+
+    def __init__(self, scope, receive, content_type: str):
+        # FastAPI solo lee request.json() cuando el Content-Type es JSON
+        cabeceras = [(k, v) for k, v in scope["headers"] if k != b"content-type"]
+        cabeceras.append((b"content-type", JSON.encode()))
+        super().__init__({**scope, "headers": cabeceras}, receive)
+        self._content_type_original = content_type
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = decodificar(self._content_type_original, await self.body())
+        return self._json
@@ -1,15 +1,56 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .router import comments
+from . import database
+from .tracing import TracingMiddleware
+from .db_timing import ServerTimingMiddleware
+from .consistency import ConsistencyMiddleware
+from .profiling import ENABLED as PROFILING_ENABLED, ProfilingMiddleware
+from .dependencies import get_cache_invalidator, get_calendar_resolver, get_comment_crud, get_storage
+from .router import comments, stats, changes, sync, metrics, profiles
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Índices (hilos paginados, outbox, sincronización) y secuencia de los comentarios antiguos
+    database.ensure_indexes(get_storage())
+    # Transacciones si MongoDB las admite (replica set); si no, se avisa en el log al arrancar
+    get_storage().comprobar_transacciones()
+    await get_comment_crud().backfill_secuencias()
+    # Escrituras de otros workers o réplicas: se descartan de la caché de este proceso
+    invalidador = get_cache_invalidator()
+    invalidador.iniciar()
+    # Calendario de los eventos comentados (estadísticas por calendario), fuera de las peticiones
+    resolutor = get_calendar_resolver()
+    resolutor.iniciar()
+    yield
+    await resolutor.detener()
+    await invalidador.detener()
 
 
 app = FastAPI(
     title="API de Kalendas",
     description="API para la gestión de calendarios y eventos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Trazas distribuidas (traceparent W3C); sin TRACING_EXPORTER solo se propaga la cabecera
+app.add_middleware(TracingMiddleware, service_name="comment_service")
+# Server-Timing: tiempo en MongoDB frente al total de cada petición
+app.add_middleware(ServerTimingMiddleware)
+# Lecturas causales: X-Consistency-Token de la última escritura del cliente
+app.add_middleware(ConsistencyMiddleware)
+# Perfilado bajo demanda (PROFILING_TOKEN o PROFILING_SAMPLE_RATE); sin configurar no se instala
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, service_name="comment_service")
+
 # Incluimos el router de comentarios en la aplicación principal.
 app.include_router(comments.router)
+app.include_router(stats.router)
+app.include_router(changes.router)
+app.include_router(sync.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
 
 
 @app.get("/")
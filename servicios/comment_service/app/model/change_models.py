@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Dict, List, Optional
+from datetime import datetime
+from uuid import UUID
+
+
+# Modelo de RESPUESTA: un cambio publicado en la outbox
+class Cambio(BaseModel):
+    secuencia: int = Field(..., alias="_id")
+    entidad: str = Field(..., json_schema_extra={"example": "comentario"})
+    id_entidad: UUID = Field(..., alias="idEntidad")
+    operacion: str = Field(..., json_schema_extra={"example": "actualizar"})
+    version: int
+    padres: Dict[str, Optional[UUID]] = {}
+    padres_anteriores: Optional[Dict[str, Optional[UUID]]] = Field(default=None, alias="padresAnteriores")
+    fecha: datetime
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo de RESPUESTA: página de cambios y token para reanudar la suscripción
+class CambiosPage(BaseModel):
+    cambios: List[Cambio]
+    token: str = Field(..., description="Token de reanudación: pásalo como 'since' en la siguiente llamada")
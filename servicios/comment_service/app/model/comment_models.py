@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID 
 
@@ -17,6 +17,11 @@ class CommentCreate(CommentBase):
 # Modelo para RESPUESTA (lo que devolvemos desde la API)
 class CommentInDB(CommentBase):
     id: UUID = Field(..., alias="_id")
+    # Control de concurrencia: 'version' se incrementa en cada escritura y es el ETag del recurso
+    version: int = 0
+    fecha_actualizacion: Optional[datetime] = Field(default=None, alias="fechaActualizacion")
+    # Posición de la última escritura en la secuencia de cambios del servicio (GET /sync)
+    secuencia: int = 0
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -31,4 +36,38 @@ class CommentInDB(CommentBase):
             }
         }
     )
-    
\ No newline at end of file
+
+
+# Modelo para RESPUESTA paginada de un hilo de comentarios (paginación keyset)
+class CommentPage(BaseModel):
+    comentarios: List[CommentInDB]
+    siguiente_cursor: Optional[str] = Field(default=None, alias="siguienteCursor")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para PEDIR varios comentarios por ID en una sola llamada
+class BatchLookup(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1)
+
+
+# Modelo para RESPUESTA de la búsqueda por lotes (en el orden pedido, con los IDs que no existen)
+class CommentBatch(BaseModel):
+    comentarios: List[CommentInDB]
+    no_encontrados: List[UUID] = Field(default=[], alias="noEncontrados")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para PEDIR el borrado de los comentarios de varios calendarios/eventos (borrado en cascada)
+class CommentPurge(BaseModel):
+    ids_calendario: List[UUID] = Field(default=[], alias="idsCalendario")
+    ids_evento: List[UUID] = Field(default=[], alias="idsEvento")
+    limite: int = Field(500, ge=1, le=5000)
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para RESPUESTA de un borrado por lotes
+class PurgeResult(BaseModel):
+    eliminados: int
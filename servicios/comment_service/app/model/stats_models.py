@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional
+from uuid import UUID
+
+
+# Modelo de RESPUESTA: número de comentarios de un calendario o de un evento
+class ComentariosTotal(BaseModel):
+    id_calendario: Optional[UUID] = Field(default=None, alias="idCalendario")
+    id_evento: Optional[UUID] = Field(default=None, alias="idEvento")
+    total: int = Field(..., json_schema_extra={"example": 42})
+
+    model_config = ConfigDict(populate_by_name=True)
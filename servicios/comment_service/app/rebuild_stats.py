@@ -0,0 +1,19 @@
+"""
+Recalcula desde cero los agregados de estadísticas de comentarios.
+
+Uso (desde servicios/comment_service):
+    python -m app.rebuild_stats
+"""
+import asyncio
+
+from .dependencies import get_stats_service
+
+
+async def main():
+    print("Recalculando estadísticas de comentarios...")
+    await get_stats_service().rebuild()
+    print("✅ Estadísticas de comentarios recalculadas.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Query, Depends
+from typing import Annotated
+
+from ..service.changesService import ChangesService
+from ..dependencies import get_changes_service
+from ..model.change_models import CambiosPage
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["Cambios"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+ChangesServiceDep = Annotated[ChangesService, Depends(get_changes_service)]
+
+# --- Endpoints ---
+
+# 1. GET /changes?since=<token> : Cambios posteriores a un token de reanudación
+@router.get(
+    "/",
+    response_model=CambiosPage,
+    response_description="Cambios publicados después del token indicado",
+)
+async def list_changes(
+    changes_service: ChangesServiceDep,
+    since: str = Query(
+        "0", description="Token devuelto por la llamada anterior ('0' para empezar desde el principio, 'ultimo' desde ahora)"
+    ),
+    limite: int = Query(100, ge=1, le=1000, description="Número máximo de cambios devueltos"),
+):
+    """
+    Devuelve los cambios (creación, actualización y borrado de comentarios) en orden de confirmación.
+    Los suscriptores guardan el 'token' de la respuesta y lo envían como 'since' para continuar.
+    Devuelve 410 si el token es tan antiguo que ya no se conservan todos los cambios intermedios.
+    """
+    return await changes_service.list_changes(since, limite)
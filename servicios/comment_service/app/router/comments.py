@@ -1,17 +1,32 @@
-from fastapi import APIRouter, Body, Response, status, HTTPException, Query
-from pymongo import ReturnDocument
-from typing import List, Annotated, Optional
-from uuid import UUID, uuid4
+from fastapi import APIRouter, Body, Response, status, Query, Depends, Header
+from typing import List, Annotated, Optional, Literal
+from uuid import UUID
 
-from ..model.comment_models import CommentCreate, CommentInDB
-from .. import database
+from ..service.commentsService import CommentsService
+from ..service.idempotencyService import IdempotencyService
+from ..dependencies import get_comment_service, get_idempotency_service
+from ..etag import etag_de, no_modificado, respuesta_no_modificado, versiones_if_match
+from ..model.comment_models import CommentCreate, CommentInDB, CommentPage, CommentBatch, BatchLookup, CommentPurge, PurgeResult
+from ..encoding import EncodedRoute, EncodedResponse
 
 # Router que agrupará todos los endpoints de comentarios.
 router = APIRouter(
     prefix="/comments",
-    tags=["Comentarios"]
+    tags=["Comentarios"],
+    # Respuestas JSON rápidas o MessagePack según Accept (ver app/encoding.py)
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
 )
 
+# Definición del tipo inyectado (Dependencia del Servicio)
+CommentServiceDep = Annotated[CommentsService, Depends(get_comment_service)]
+IdempotencyDep = Annotated[IdempotencyService, Depends(get_idempotency_service)]
+
+# Parámetros comunes de la paginación keyset de los hilos
+OrdenQuery = Query("desc", description="'desc' (más recientes primero) o 'asc' (más antiguos primero)")
+LimiteQuery = Query(20, ge=1, le=100, description="Número máximo de comentarios por página")
+CursorQuery = Query(None, description="Valor de 'siguienteCursor' devuelto por la página anterior")
+
 # --- Endpoints ---
 
 # 1. POST /comments : Crear un nuevo comentario
@@ -28,24 +43,31 @@ async def create_comment(
             "idCalendario": None,
             "idEvento": "a47ac10b-58cc-4372-a567-0e02b2c3d470"
         }]
-    )]
+    )],
+    comment_service: CommentServiceDep,  # 👈 Inyección del Service
+    idempotency: IdempotencyDep,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Clave única del cliente para poder repetir la petición sin duplicar"
+    ),
 ):
     """
     Crea un nuevo comentario en la base de datos.
     Debe proporcionar al menos idCalendario o idEvento.
+    Con la cabecera Idempotency-Key, repetir la petición (p.ej. tras un timeout del gateway)
+    devuelve lo creado la primera vez, con Idempotent-Replayed: true, sin volver a escribir.
     """
-    # Validar que se proporcione al menos un ID
-    if not comment.id_calendario and not comment.id_evento:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Debe proporcionar idCalendario o idEvento"
-        )
-    
-    comment_dict = comment.model_dump(by_alias=True)
-    comment_dict["_id"] = uuid4()
-    new_comment = database.comentarios_collection.insert_one(comment_dict)
-    created_comment = database.comentarios_collection.find_one({"_id": new_comment.inserted_id})
-    return created_comment
+    # La validación de negocio (idCalendario o idEvento obligatorio) vive en el Servicio.
+    if idempotency_key is None:
+        return await comment_service.create_comment(comment)
+    comentario, repetida = await idempotency.run(
+        "comments", idempotency_key, comment,
+        crear=lambda comment_id: comment_service.create_comment(comment, comment_id),
+        recuperar=comment_service.crud.get_by_id,
+    )
+    if repetida:
+        response.headers["Idempotent-Replayed"] = "true"
+    return comentario
 
 
 # 2. GET /comments : Obtener una lista de todos los comentarios
@@ -55,6 +77,7 @@ async def create_comment(
     response_description="Listar todos los comentarios con filtros opcionales",
 )
 async def list_comments(
+    comment_service: CommentServiceDep,
     id_calendario: Optional[UUID] = Query(None, alias="idCalendario", description="Filtrar por ID de calendario"),
     id_evento: Optional[UUID] = Query(None, alias="idEvento", description="Filtrar por ID de evento"),
 ):
@@ -62,75 +85,167 @@ async def list_comments(
     Devuelve una lista de comentarios filtrados.
     - **idCalendario**: Filtra comentarios de un calendario específico
     - **idEvento**: Filtra comentarios de un evento específico
-    
+
     Si no se proporciona ningún filtro, devuelve todos los comentarios.
+    Para hilos grandes use los endpoints paginados /comments/event/{id} y /comments/calendar/{id}.
+    """
+    return await comment_service.list_comments(id_calendario=id_calendario, id_evento=id_evento)
+
+
+# 3. GET /comments/event/{id_evento} : Hilo paginado de comentarios de un evento
+@router.get(
+    "/event/{id_evento}",
+    response_model=CommentPage,
+    response_description="Página del hilo de comentarios de un evento",
+)
+async def get_event_thread(
+    id_evento: UUID,
+    comment_service: CommentServiceDep,
+    orden: Literal["desc", "asc"] = OrdenQuery,
+    limite: int = LimiteQuery,
+    cursor: Optional[str] = CursorQuery,
+):
+    """
+    Devuelve los comentarios de un evento paginados por (fechaCreacion, _id).
+    Cada página cuesta lo mismo independientemente de lo largo que sea el hilo.
+    """
+    return await comment_service.get_thread(
+        id_evento=id_evento, orden=orden, limite=limite, cursor=cursor
+    )
+
+
+# 4. GET /comments/calendar/{id_calendario} : Hilo paginado de comentarios de un calendario
+@router.get(
+    "/calendar/{id_calendario}",
+    response_model=CommentPage,
+    response_description="Página del hilo de comentarios de un calendario",
+)
+async def get_calendar_thread(
+    id_calendario: UUID,
+    comment_service: CommentServiceDep,
+    orden: Literal["desc", "asc"] = OrdenQuery,
+    limite: int = LimiteQuery,
+    cursor: Optional[str] = CursorQuery,
+):
     """
-    filtro = {}
-    
-    if id_calendario:
-        filtro["idCalendario"] = id_calendario
-    
-    if id_evento:
-        filtro["idEvento"] = id_evento
-    
-    return list(database.comentarios_collection.find(filtro))
+    Devuelve los comentarios de un calendario paginados por (fechaCreacion, _id).
+    """
+    return await comment_service.get_thread(
+        id_calendario=id_calendario, orden=orden, limite=limite, cursor=cursor
+    )
 
 
-# 3. GET /comments/{id} : Obtener un comentario específico por su ID
+# 4.1 GET /comments/lookup?ids=... : Obtener varios comentarios por ID en una sola llamada
+# (declarada antes de /{id} para que "lookup" no se interprete como un ID)
+@router.get(
+    "/lookup",
+    response_model=CommentBatch,
+    response_description="Obtener varios comentarios por ID, en el orden pedido",
+)
+async def lookup_comments(
+    comment_service: CommentServiceDep,
+    ids: List[UUID] = Query(..., description="IDs a resolver (se puede repetir el parámetro: ?ids=a&ids=b)"),
+):
+    """
+    Resuelve varios comentarios con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await comment_service.get_comments_batch(ids)
+
+
+# 4.2 POST /comments/lookup : Igual que el anterior, con los IDs en el cuerpo (listas largas)
+@router.post(
+    "/lookup",
+    response_model=CommentBatch,
+    response_description="Obtener varios comentarios por ID, en el orden pedido",
+)
+async def lookup_comments_post(
+    lookup: Annotated[BatchLookup, Body(
+        examples=[{"ids": ["c47ac10b-58cc-4372-a567-0e02b2c3d481"]}]
+    )],
+    comment_service: CommentServiceDep,
+):
+    """
+    Resuelve varios comentarios con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await comment_service.get_comments_batch(lookup.ids)
+
+
+# 4.3 POST /comments/purge : Eliminar un lote de comentarios de calendarios/eventos (uso interno)
+@router.post(
+    "/purge",
+    response_model=PurgeResult,
+    response_description="Número de comentarios eliminados en este lote",
+)
+async def purge_comments(
+    purga: Annotated[CommentPurge, Body(
+        examples=[{"idsCalendario": [], "idsEvento": ["a47ac10b-58cc-4372-a567-0e02b2c3d470"], "limite": 500}]
+    )],
+    comment_service: CommentServiceDep,
+):
+    """
+    Elimina hasta 'limite' comentarios de los calendarios o eventos indicados.
+    Lo usa el borrado en cascada del servicio de calendarios, que repite la llamada hasta recibir 0.
+    """
+    return await comment_service.purge_comments(purga.ids_calendario, purga.ids_evento, purga.limite)
+
+
+# 5. GET /comments/{id} : Obtener un comentario específico por su ID
 @router.get(
     "/{id}",
     response_model=CommentInDB,
     response_description="Obtener un comentario por su ID",
 )
-async def get_comment(id: UUID):
+async def get_comment(
+    id: UUID,
+    response: Response,
+    comment_service: CommentServiceDep,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Busca un comentario por su ID. Devuelve 404 si no lo encuentra.
+    Incluye el ETag (versión) del comentario; con If-None-Match coincidente responde 304 sin cuerpo.
     """
-    comment = database.comentarios_collection.find_one({"_id": id})
-    if comment:
-        return comment
+    comment = await comment_service.get_comment(id)  # Lanza 404 si no existe
+    if no_modificado(if_none_match, comment.version):
+        return respuesta_no_modificado(comment.version)
+    response.headers["ETag"] = etag_de(comment.version)
+    return comment
 
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Comentario con ID {id} no encontrado")
 
-
-# 4. PUT /comments/{id} : Actualizar un comentario existente
+# 6. PUT /comments/{id} : Actualizar un comentario existente
 @router.put(
     "/{id}",
     response_model=CommentInDB,
     response_description="Actualizar un comentario por su ID",
 )
 async def update_comment(
-    id: UUID, 
-    comment_update: Annotated[CommentCreate, Body(...)]
+    id: UUID,
+    comment_update: Annotated[CommentCreate, Body(...)],
+    response: Response,
+    comment_service: CommentServiceDep,
+    if_match: Optional[str] = Header(None),
 ):
     """
     Actualiza un comentario existente. Devuelve 404 si no lo encuentra.
+    Con If-Match solo actualiza si el ETag coincide con la versión actual (412 si otra petición lo modificó).
     """
-    updated_comment = database.comentarios_collection.find_one_and_update(
-        {"_id": id},
-        {"$set": comment_update.model_dump(by_alias=True, exclude_unset=True)},
-        return_document=ReturnDocument.AFTER
-    )
-
-    if updated_comment:
-        return updated_comment
+    updated_comment = await comment_service.update_comment(id, comment_update, versiones_if_match(if_match))
+    response.headers["ETag"] = etag_de(updated_comment.version)
+    return updated_comment
 
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se pudo actualizar, comentario con ID {id} no encontrado")
 
-
-# 5. DELETE /comments/{id} : Eliminar un comentario
+# 7. DELETE /comments/{id} : Eliminar un comentario
 @router.delete(
     "/{id}",
     status_code=status.HTTP_204_NO_CONTENT,
     response_description="Eliminar un comentario por su ID",
 )
-async def delete_comment(id: UUID):
+async def delete_comment(id: UUID, comment_service: CommentServiceDep):
     """
     Elimina un comentario por su ID. Devuelve 204 si tiene éxito o 404 si no lo encuentra.
     """
-    delete_result = database.comentarios_collection.delete_one({"_id": id})
-
-    if delete_result.deleted_count == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Comentario con ID {id} no encontrado")
+    await comment_service.delete_comment(id)  # Lanza 404 si no existe
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends
+from typing import Annotated
+
+from ..crud.comment_crud import CommentCRUD
+from .. import db_timing
+from ..dependencies import get_comment_crud
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Métricas"]
+)
+
+# Definición del tipo inyectado (Dependencia del CRUD)
+CrudDep = Annotated[CommentCRUD, Depends(get_comment_crud)]
+
+# --- Endpoints ---
+
+# 1. GET /metrics/cache : Estadísticas de las cachés en proceso de este worker
+@router.get(
+    "/cache",
+    response_description="Estadísticas de uso de las cachés en proceso",
+)
+async def get_cache_stats(crud: CrudDep):
+    """
+    Devuelve aciertos, fallos, desalojos y tasa de aciertos de la caché de GET /comments/{id}.
+    Las cifras son de este proceso: con varios workers cada uno tiene su propia caché.
+    """
+    return {"comentarios": crud.cache.stats()}
+
+
+# 2. GET /metrics/db : Tiempo en MongoDB por comando y colección
+@router.get(
+    "/db",
+    response_description="Tiempo acumulado en MongoDB por comando y colección",
+)
+async def get_db_stats():
+    """
+    Devuelve, por comando y colección, llamadas, tiempo total, medio y máximo y cuántas
+    superaron el umbral de consulta lenta (SLOW_QUERY_MS). Las cifras son de este proceso.
+    """
+    return {"umbralLentaMs": db_timing.LISTENER.slow_query_ms, "comandos": db_timing.LISTENER.stats()}
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends
+from typing import Annotated
+from uuid import UUID
+
+from ..service.statsService import StatsService
+from ..dependencies import get_stats_service
+from ..model.stats_models import ComentariosTotal
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Estadísticas"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+StatsServiceDep = Annotated[StatsService, Depends(get_stats_service)]
+
+# --- Endpoints ---
+
+# 1. GET /stats/calendars/{calendar_id}/comments : Número de comentarios de un calendario
+@router.get(
+    "/calendars/{calendar_id}/comments",
+    response_model=ComentariosTotal,
+    response_description="Número de comentarios de un calendario",
+)
+async def get_calendar_comments(calendar_id: UUID, stats_service: StatsServiceDep):
+    """
+    Devuelve el número de comentarios del calendario indicado, leído del agregado precalculado.
+    """
+    return await stats_service.get_calendar_comments(calendar_id)
+
+
+# 2. GET /stats/events/{event_id}/comments : Número de comentarios de un evento
+@router.get(
+    "/events/{event_id}/comments",
+    response_model=ComentariosTotal,
+    response_description="Número de comentarios de un evento",
+)
+async def get_event_comments(event_id: UUID, stats_service: StatsServiceDep):
+    """
+    Devuelve el número de comentarios del evento indicado, leído del agregado precalculado.
+    """
+    return await stats_service.get_event_comments(event_id)
@@ -0,0 +1,159 @@
+"""
+Punto de entrada de producción: uvicorn con varios procesos worker y sin --reload.
+
+Uso (desde el directorio del servicio, o CMD del dockerfile):
+    python -m app.serve
+    python -m app.serve --workers 4 --port 8000
+
+Configuración (argumentos o variables de entorno):
+    WEB_CONCURRENCY          workers (por defecto, los núcleos disponibles para el contenedor)
+    HOST / PORT              dirección de escucha (0.0.0.0:8000)
+    BACKLOG                  conexiones pendientes en la cola del socket (2048)
+    KEEP_ALIVE               segundos que se mantiene abierta una conexión inactiva (5)
+    GRACEFUL_TIMEOUT         segundos para terminar las peticiones en curso al parar (30)
+    MAX_REQUESTS             peticiones tras las que se recicla un worker (0 = nunca)
+    MAX_REQUESTS_JITTER      margen aleatorio sumado a MAX_REQUESTS en cada worker, para
+                             que no se reinicien todos a la vez (por defecto MAX_REQUESTS / 10)
+    LIMIT_CONCURRENCY        conexiones simultáneas por worker antes de responder 503 (sin límite)
+    FORWARDED_ALLOW_IPS      IPs de confianza para X-Forwarded-* (por defecto 127.0.0.1)
+
+Usa uvloop y httptools si están instalados (bucle de eventos y parser HTTP en C) y, si no,
+asyncio y h11. Con varios workers el proceso principal solo vigila: reinicia los que mueren
+(también los reciclados por MAX_REQUESTS) y reparte SIGTERM para un apagado ordenado.
+"""
+from typing import Optional
+import argparse
+import importlib.util
+import logging
+import math
+import os
+import random
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def available_cpus() -> int:
+    """Núcleos que puede usar el proceso: afinidad de CPU y cuota del cgroup (límite del contenedor)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Sistemas sin afinidad (macOS, Windows)
+        cpus = os.cpu_count() or 1
+    cuota = _cuota_cgroup()
+    if cuota is not None:
+        cpus = min(cpus, max(1, math.ceil(cuota)))
+    return cpus
+
+
+def _cuota_cgroup() -> Optional[float]:
+    try:  # cgroup v2: "<cuota> <periodo>" o "max <periodo>"
+        with open("/sys/fs/cgroup/cpu.max") as fichero:
+            cuota, periodo = fichero.read().split()
+        return None if cuota == "max" else int(cuota) / int(periodo)
+    except (OSError, ValueError):
+        pass
+    try:  # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as fichero:
+            cuota = int(fichero.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as fichero:
+            periodo = int(fichero.read())
+        return None if cuota <= 0 else cuota / periodo
+    except (OSError, ValueError):
+        return None
+
+
+def _instalado(modulo: str) -> bool:
+    return importlib.util.find_spec(modulo) is not None
+
+
+class ServeConfig(uvicorn.Config):
+    """
+    Config de uvicorn con reciclado escalonado: cada worker (proceso) suma a
+    limit_max_requests su propio margen aleatorio de hasta max_requests_jitter.
+    """
+
+    max_requests_jitter = 0
+
+    @property
+    def limit_max_requests(self) -> Optional[int]:
+        base = self.__dict__.get("_limit_max_requests")
+        if not base or not self.max_requests_jitter:
+            return base
+        # La config llega a cada worker copiada: el margen se sortea una vez por proceso
+        if self.__dict__.get("_pid_limite") != os.getpid():
+            self.__dict__["_pid_limite"] = os.getpid()
+            self.__dict__["_limite"] = base + random.randint(0, self.max_requests_jitter)
+        return self.__dict__["_limite"]
+
+    @limit_max_requests.setter
+    def limit_max_requests(self, valor: Optional[int]) -> None:
+        self.__dict__["_limit_max_requests"] = valor
+
+
+def build_config(args) -> ServeConfig:
+    workers = args.workers
+    # Cada worker tendría sus propios datos: con el motor en memoria solo tiene sentido uno
+    memoria = os.getenv("STORAGE_BACKEND", "mongo").lower() == "memory"
+    if memoria:
+        workers = 1
+    config = ServeConfig(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop" if _instalado("uvloop") else "asyncio",
+        http="httptools" if _instalado("httptools") else "h11",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_max_requests=args.max_requests or None,
+        limit_concurrency=args.limit_concurrency or None,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        log_level=args.log_level,
+        access_log=args.access_log,
+    )
+    config.max_requests_jitter = args.max_requests_jitter if args.max_requests_jitter is not None else args.max_requests // 10
+    # Después de crear la config: es la que configura el logging de uvicorn
+    if memoria and args.workers > 1:
+        logger.warning("STORAGE_BACKEND=memory: se usa 1 worker en lugar de %d", args.workers)
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    env = os.getenv
+    parser.add_argument("--workers", type=int, default=int(env("WEB_CONCURRENCY", "0")) or available_cpus())
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", "8000")))
+    parser.add_argument("--backlog", type=int, default=int(env("BACKLOG", "2048")))
+    parser.add_argument("--keep-alive", type=int, default=int(env("KEEP_ALIVE", "5")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--max-requests", type=int, default=int(env("MAX_REQUESTS", "0")))
+    parser.add_argument("--max-requests-jitter", type=int,
+                        default=int(env("MAX_REQUESTS_JITTER")) if env("MAX_REQUESTS_JITTER") else None)
+    parser.add_argument("--limit-concurrency", type=int, default=int(env("LIMIT_CONCURRENCY", "0")))
+    parser.add_argument("--forwarded-allow-ips", default=env("FORWARDED_ALLOW_IPS", "127.0.0.1"))
+    parser.add_argument("--log-level", default=env("LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction,
+                        default=env("ACCESS_LOG", "false").lower() == "true",
+                        help="Log de cada petición (desactivado por defecto: cuesta throughput)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    config = build_config(parse_args(argv))
+    logger.info("Sirviendo con %d workers (bucle %s, HTTP %s)", config.workers, config.loop, config.http)
+    server = uvicorn.Server(config)
+    if config.workers > 1:
+        # El socket se abre una vez en el proceso principal y lo comparten todos los workers
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
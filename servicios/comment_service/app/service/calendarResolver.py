@@ -0,0 +1,162 @@
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+import asyncio
+import httpx
+import logging
+import os
+
+# Importaciones de tu proyecto
+from ..crud.comment_crud import CommentCRUD
+from ..crud.subscription_crud import SubscriptionCRUD
+from ..encoding import cabeceras_cliente, contenido_respuesta
+
+EVENT_SERVICE_URL = os.getenv("EVENT_SERVICE_URL", "http://event_service:8000")
+# Cada cuánto se buscan comentarios pendientes y eventos movidos de calendario (0 lo desactiva)
+EVENT_CALENDAR_POLL_SECONDS = float(os.getenv("EVENT_CALENDAR_POLL_SECONDS", "5"))
+# Eventos por consulta a POST /events/lookup (como mucho su MAX_BATCH_IDS) y cambios por página del feed
+EVENT_CALENDAR_BATCH = int(os.getenv("EVENT_CALENDAR_BATCH", "100"))
+
+# Nombre de la suscripción al feed de cambios del servicio de eventos
+FEED_EVENTOS = "eventos"
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarResolver:
+    """
+    Resuelve fuera de las peticiones el calendario de los eventos comentados (idCalendarioEvento),
+    con el que los comentarios de un evento cuentan también para su calendario:
+    - los comentarios nuevos o que cambian de evento quedan pendientes (calendarioPendiente) y se
+      resuelven por lotes con POST /events/lookup del servicio de eventos;
+    - los eventos que cambian de calendario se siguen en el feed de cambios del servicio de
+      eventos (GET /changes), desde la posición guardada en la suscripción FEED_EVENTOS.
+    Si el servicio de eventos no responde, los pendientes esperan al siguiente sondeo. Lo que
+    escapa a los dos (cambios ya caducados en el feed, comentarios anteriores a esta versión) lo
+    corrige resolver_todos(), que se ejecuta antes de reconstruir las estadísticas.
+    """
+
+    def __init__(
+        self,
+        comments: CommentCRUD,
+        subscriptions: SubscriptionCRUD,
+        client_factory: Callable[..., httpx.AsyncClient] = httpx.AsyncClient,
+        intervalo: float = EVENT_CALENDAR_POLL_SECONDS,
+        lote: int = EVENT_CALENDAR_BATCH,
+    ):
+        self.comments = comments
+        self.subscriptions = subscriptions
+        self.client_factory = client_factory
+        self.intervalo = intervalo
+        self.lote = lote
+        self._tarea: Optional[asyncio.Task] = None
+
+
+    def _cliente(self) -> httpx.AsyncClient:
+        return self.client_factory(base_url=EVENT_SERVICE_URL, timeout=10.0, headers=cabeceras_cliente())
+
+
+    async def _calendarios(self, client: httpx.AsyncClient, event_ids: List[UUID]) -> Dict[UUID, Optional[UUID]]:
+        """Calendario de cada evento (None si el evento ya no existe), con una sola consulta."""
+        response = await client.post("/events/lookup", json={"ids": [str(event_id) for event_id in event_ids]})
+        response.raise_for_status()
+        calendarios = {event_id: None for event_id in event_ids}
+        for evento in contenido_respuesta(response)["eventos"]:
+            calendarios[UUID(str(evento["_id"]))] = UUID(str(evento["idCalendario"]))
+        return calendarios
+
+
+    async def _resolver(self, client: httpx.AsyncClient, event_ids: List[UUID]) -> int:
+        """Guarda el calendario actual de los eventos en sus comentarios. Devuelve cuántos cambiaron."""
+        cambiados = 0
+        for event_id, calendar_id in (await self._calendarios(client, event_ids)).items():
+            cambiados += await self.comments.set_event_calendar(event_id, calendar_id)
+        return cambiados
+
+
+    async def resolver_pendientes(self, client: httpx.AsyncClient) -> int:
+        """Resuelve un lote de comentarios pendientes. Devuelve cuántos eventos tenían pendientes."""
+        event_ids = await self.comments.list_pending_event_ids(self.lote)
+        if event_ids:
+            await self._resolver(client, event_ids)
+        return len(event_ids)
+
+
+    async def seguir_cambios(self, client: httpx.AsyncClient) -> int:
+        """
+        Lee una página del feed de cambios de eventos y mueve los comentarios de los eventos que
+        cambiaron de calendario. Devuelve cuántos cambios leyó.
+        """
+        posicion = await self.subscriptions.get_position(FEED_EVENTOS)
+        response = await client.get("/changes/", params={"since": "ultimo" if posicion is None else posicion, "limite": self.lote})
+        if response.status_code == 410:
+            # Los cambios intermedios caducaron: los eventos movidos entonces esperan a resolver_todos()
+            logger.warning("El feed de cambios de eventos caducó desde %s: se sigue desde ahora", posicion)
+            response = await client.get("/changes/", params={"since": "ultimo"})
+        response.raise_for_status()
+        pagina = contenido_respuesta(response)
+
+        movidos = {}
+        for cambio in pagina["cambios"]:
+            if cambio["entidad"] != "evento" or cambio["operacion"] != "actualizar":
+                continue
+            anterior = (cambio.get("padresAnteriores") or {}).get("idCalendario")
+            actual = cambio["padres"].get("idCalendario")
+            if anterior != actual:
+                movidos[UUID(str(cambio["idEntidad"]))] = UUID(str(actual)) if actual else None
+        for event_id, calendar_id in movidos.items():
+            await self.comments.set_event_calendar(event_id, calendar_id)
+        await self.subscriptions.save_position(FEED_EVENTOS, int(pagina["token"]))
+        return len(pagina["cambios"])
+
+
+    async def sondear(self) -> bool:
+        """Una pasada de pendientes y del feed. Devuelve True si quedan más por leer sin esperar."""
+        async with self._cliente() as client:
+            pendientes = await self.resolver_pendientes(client)
+            cambios = await self.seguir_cambios(client)
+        return pendientes >= self.lote or cambios >= self.lote
+
+
+    async def resolver_todos(self) -> int:
+        """
+        Vuelve a resolver el calendario de todos los eventos comentados (antes de reconstruir las
+        estadísticas). Devuelve cuántos comentarios cambiaron; falla si el servicio de eventos no responde.
+        """
+        cambiados, lote = 0, []
+        async with self._cliente() as client:
+            async for event_id in self.comments.event_ids():
+                lote.append(event_id)
+                if len(lote) >= self.lote:
+                    cambiados += await self._resolver(client, lote)
+                    lote = []
+            if lote:
+                cambiados += await self._resolver(client, lote)
+        return cambiados
+
+
+    async def _leer(self) -> None:
+        while True:
+            try:
+                if await self.sondear():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("No se pudo resolver el calendario de los eventos comentados: %s", e)
+            await asyncio.sleep(self.intervalo)
+
+
+    def iniciar(self) -> None:
+        """Arranca la resolución periódica (en el lifespan de la aplicación)."""
+        if self._tarea is None and self.intervalo > 0:
+            self._tarea = asyncio.create_task(self._leer())
+
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
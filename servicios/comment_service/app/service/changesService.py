@@ -0,0 +1,43 @@
+from fastapi import HTTPException, status
+
+from ..model.change_models import Cambio, CambiosPage
+from ..crud.outbox_crud import OutboxCRUD
+
+# Valor de 'since' para empezar por el final: solo los cambios posteriores a la llamada
+ULTIMO = "ultimo"
+
+
+class ChangesService:
+    """
+    Lógica de negocio para la suscripción a cambios (outbox) de comentarios.
+    """
+
+    def __init__(self, outbox: OutboxCRUD):
+        self.outbox = outbox
+
+
+    async def list_changes(self, since: str, limite: int = 100) -> CambiosPage:
+        """
+        Lógica: Devuelve los cambios posteriores al token 'since'.
+        Si el suscriptor está tan atrasado que parte de sus cambios ya caducaron, devuelve 410
+        para que resincronice por completo antes de seguir consumiendo.
+        Con since='ultimo' no devuelve cambios, solo el token actual (para seguir solo lo nuevo).
+        """
+        if since == ULTIMO:
+            return CambiosPage(cambios=[], token=str(await self.outbox.latest_sequence()))
+        try:
+            desde = int(since)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El token 'since' no es válido")
+
+        cambios = await self.outbox.list_since(desde, limite)
+        if desde > 0 and (not cambios or cambios[0]["_id"] > desde + 1):
+            oldest = await self.outbox.oldest_sequence()
+            if oldest is not None and oldest > desde + 1:
+                raise HTTPException(
+                    status_code=status.HTTP_410_GONE,
+                    detail="El token es demasiado antiguo: los cambios intermedios ya caducaron, hay que resincronizar"
+                )
+
+        token = str(cambios[-1]["_id"]) if cambios else str(desde)
+        return CambiosPage(cambios=[Cambio.model_validate(cambio) for cambio in cambios], token=token)
@@ -1,10 +1,35 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID, uuid4
+from datetime import datetime
+import base64
+import json
+import os
 from fastapi import HTTPException, status
 
-from ..model.comment_models import CommentCreate, CommentInDB
+from ..model.comment_models import CommentCreate, CommentInDB, CommentPage, CommentBatch, PurgeResult
 from ..crud.comment_crud import CommentCRUD
 
+# Máximo de IDs que se resuelven en una sola búsqueda por lotes
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+
+
+def _encode_cursor(comment: CommentInDB) -> str:
+    """Codifica la clave keyset (fechaCreacion, _id) del último comentario como un token opaco."""
+    clave = {"f": comment.fecha_creacion.isoformat(), "id": str(comment.id)}
+    return base64.urlsafe_b64encode(json.dumps(clave).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decodifica un cursor generado por _encode_cursor. Lanza 400 si está manipulado o corrupto."""
+    try:
+        clave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(clave["f"]), UUID(clave["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El cursor de paginación no es válido"
+        )
+
 
 class CommentsService:
     """
@@ -16,10 +41,11 @@ class CommentsService:
         self.crud = crud
 
 
-    async def create_comment(self, comment_data: CommentCreate) -> CommentInDB:
+    async def create_comment(self, comment_data: CommentCreate, comment_id: Optional[UUID] = None) -> CommentInDB:
         """
         Crea un nuevo comentario.
         Valida que se proporcione al menos idCalendario o idEvento.
+        'comment_id' es el ID ya reservado con la Idempotency-Key de la petición, si la trae.
         """
         # Validación de negocio: debe haber al menos un ID
         if not comment_data.id_calendario and not comment_data.id_evento:
@@ -30,7 +56,11 @@ class CommentsService:
 
         # Convertir el modelo Pydantic a diccionario y añadir el _id
         comment_dict = comment_data.model_dump(by_alias=True)
-        comment_dict["_id"] = uuid4()
+        comment_dict["_id"] = comment_id or uuid4()
+        if comment_data.id_evento:
+            # El calendario del evento lo resuelve CalendarResolver fuera de la petición
+            comment_dict["idCalendarioEvento"] = None
+            comment_dict["calendarioPendiente"] = True
 
         # Llamar al CRUD para insertar
         return await self.crud.create(comment_dict)
@@ -73,15 +103,28 @@ class CommentsService:
     async def update_comment(
         self, 
         comment_id: UUID, 
-        comment_data: CommentCreate
+        comment_data: CommentCreate,
+        expected_versions: Optional[List[int]] = None
     ) -> CommentInDB:
         """
         Actualiza un comentario existente.
-        Lanza 404 si no existe.
+        Lanza 404 si no existe y 412 si 'expected_versions' (If-Match) no coincide con su versión.
         """
         update_dict = comment_data.model_dump(by_alias=True, exclude_unset=True)
+        if comment_data.id_evento:
+            # Hasta que CalendarResolver lo resuelva, sigue contando para el calendario anterior
+            update_dict["calendarioPendiente"] = True
+        elif "idEvento" in update_dict:
+            update_dict["idCalendarioEvento"] = None
         
-        updated_comment = await self.crud.update(comment_id, update_dict)
+        updated_comment = await self.crud.update(comment_id, update_dict, expected_versions)
+
+        if updated_comment is None and expected_versions is not None and await self.crud.get_by_id(comment_id) is not None:
+            # El recurso existe pero otra escritura cambió su versión: If-Match no coincide
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="El comentario fue modificado por otra petición; vuelva a leerlo y reintente"
+            )
         
         if not updated_comment:
             raise HTTPException(
@@ -113,4 +156,68 @@ class CommentsService:
 
     async def get_comments_by_event(self, event_id: UUID) -> List[CommentInDB]:
         """Obtiene todos los comentarios de un evento específico."""
-        return await self.crud.get_by_event(event_id)
\ No newline at end of file
+        return await self.crud.get_by_event(event_id)
+
+
+    async def get_thread(
+        self,
+        id_evento: Optional[UUID] = None,
+        id_calendario: Optional[UUID] = None,
+        orden: str = "desc",
+        limite: int = 20,
+        cursor: Optional[str] = None,
+    ) -> CommentPage:
+        """
+        Devuelve una página del hilo de comentarios de un evento o de un calendario,
+        del más reciente al más antiguo (orden="desc") o al revés (orden="asc").
+        El 'siguienteCursor' de la respuesta se pasa como 'cursor' para pedir la página siguiente.
+        """
+        filtro = {"idEvento": id_evento} if id_evento else {"idCalendario": id_calendario}
+        after = _decode_cursor(cursor) if cursor else None
+
+        # Se pide un elemento de más para saber si existe una página siguiente sin hacer un count
+        comments = await self.crud.list_page(
+            filtro, descendente=(orden == "desc"), limit=limite + 1, after=after
+        )
+        siguiente_cursor = None
+        if len(comments) > limite:
+            comments = comments[:limite]
+            siguiente_cursor = _encode_cursor(comments[-1])
+
+        return CommentPage(comentarios=comments, siguiente_cursor=siguiente_cursor)
+
+
+    async def get_comments_batch(self, comment_ids: List[UUID]) -> CommentBatch:
+        """
+        Lógica: Resuelve varios comentarios con una sola consulta. Devuelve los encontrados
+        en el orden pedido (sin duplicados) y, aparte, los IDs que no existen.
+        """
+        ids = list(dict.fromkeys(comment_ids))
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Se pueden pedir como máximo {MAX_BATCH_IDS} comentarios por llamada ({len(ids)} recibidos)"
+            )
+
+        por_id = {comment.id: comment for comment in await self.crud.get_many(ids)}
+        return CommentBatch(
+            comentarios=[por_id[comment_id] for comment_id in ids if comment_id in por_id],
+            no_encontrados=[comment_id for comment_id in ids if comment_id not in por_id],
+        )
+
+
+    async def purge_comments(self, calendar_ids: List[UUID], event_ids: List[UUID], limite: int) -> PurgeResult:
+        """
+        Elimina un lote de comentarios de los calendarios/eventos indicados (borrado en cascada).
+        Se llama repetidamente hasta que devuelve 0 eliminados. Lanza 400 si no hay ningún ID.
+        """
+        if not calendar_ids and not event_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Debe proporcionar idsCalendario o idsEvento"
+            )
+        eliminados = await self.crud.delete_by_parents(
+            list(dict.fromkeys(calendar_ids)), list(dict.fromkeys(event_ids)), limite
+        )
+        return PurgeResult(eliminados=eliminados)
+
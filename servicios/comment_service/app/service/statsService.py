@@ -0,0 +1,37 @@
+from typing import Optional
+from uuid import UUID
+
+from ..model.stats_models import ComentariosTotal
+from ..crud.stats_crud import CommentStatsCRUD
+from .calendarResolver import CalendarResolver
+
+
+class StatsService:
+    """
+    Lógica de negocio para las estadísticas de comentarios.
+    Lee los agregados que mantienen incrementalmente las escrituras de comentarios.
+    """
+
+    def __init__(self, stats: CommentStatsCRUD, resolver: Optional[CalendarResolver] = None):
+        self.stats = stats
+        self.resolver = resolver
+
+
+    async def get_calendar_comments(self, calendar_id: UUID) -> ComentariosTotal:
+        """Obtiene el número de comentarios de un calendario."""
+        return ComentariosTotal(id_calendario=calendar_id, total=await self.stats.get_calendar_count(calendar_id))
+
+
+    async def get_event_comments(self, event_id: UUID) -> ComentariosTotal:
+        """Obtiene el número de comentarios de un evento."""
+        return ComentariosTotal(id_evento=event_id, total=await self.stats.get_event_count(event_id))
+
+
+    async def rebuild(self) -> None:
+        """
+        Recalcula los agregados desde cero (reparación de derivas). Antes vuelve a resolver el
+        calendario de los eventos comentados: los pendientes y los de eventos que cambiaron de calendario.
+        """
+        if self.resolver is not None:
+            await self.resolver.resolver_todos()
+        await self.stats.rebuild()
@@ -0,0 +1,953 @@
+"""
+Almacenamiento de los CRUD del servicio.
+
+Los CRUD no crean conexiones: reciben un Storage y le piden sus colecciones y transacciones.
+- MongoStorage: MongoDB real con pymongo (producción y docker-compose).
+- MemoryStorage: motor en memoria con el subconjunto de la API de pymongo que usan los CRUD
+  (filtros, operadores de actualización, cursores, bulk_write y las etapas de agregación
+  de los servicios). Sirve para los tests (un almacén aislado por test y por proceso) y para
+  levantar un servicio sin MongoDB (STORAGE_BACKEND=memory).
+
+Cada colección se pide para una clase de operación (ESCRITURA, LECTURA_ID, LISTADO o MASIVA)
+y MongoStorage le aplica el read preference / write concern configurado para esa clase.
+"""
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+import logging
+import math
+import re
+import threading
+
+from bson import ObjectId
+from pymongo import ReturnDocument, WriteConcern
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.mongo_client import MongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from pymongo.server_api import ServerApi
+
+from .consistency import marca_causal, registrar_escritura
+
+logger = logging.getLogger(__name__)
+
+# Clases de operación
+ESCRITURA = "escritura"  # Escrituras y lecturas que deben ver lo último (siempre en el primario)
+LECTURA_ID = "id"  # Lecturas por ID
+LISTADO = "listado"  # Listados y búsquedas: los que más cargan, candidatos a ir a secundarios
+MASIVA = "masiva"  # Importaciones, purgas y reconstrucciones: write concern relajado
+
+# Errores del servidor ante un clusterTime con firma no válida (TimeProofMismatch, KeyNotFound)
+CODIGOS_CLUSTER_TIME = {204, 211}
+
+_MODOS_LECTURA = {
+    "primary": Primary, "primaryPreferred": PrimaryPreferred, "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred, "nearest": Nearest,
+}
+
+
+def read_preference(modo: str, max_staleness: int = -1):
+    """Read preference de pymongo por nombre; max_staleness (segundos, mínimo 90) acota el retraso de los secundarios."""
+    clase = _MODOS_LECTURA[modo]
+    return clase() if clase is Primary else clase(max_staleness=max_staleness)
+
+
+def write_concern(w: str, journal: Optional[bool] = None) -> WriteConcern:
+    """Write concern a partir de 'majority', un número de nodos ('1') o un tag set."""
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=journal)
+
+
+class Storage:
+    """Interfaz del almacenamiento: colecciones (API de pymongo) y transacciones."""
+
+    def collection(self, name: str, clase: str = ESCRITURA):
+        raise NotImplementedError
+
+    def run_in_transaction(self, callback: Callable[[Any], Any], clase: str = ESCRITURA) -> Any:
+        """Ejecuta callback(session) de forma atómica y devuelve su resultado."""
+        raise NotImplementedError
+
+    def comprobar_transacciones(self) -> bool:
+        """Indica si run_in_transaction es atómico (se llama al arrancar para avisar si no lo es)."""
+        return True
+
+    def run_causal(self, callback: Callable[[Any], Any]) -> Any:
+        """
+        Ejecuta la lectura callback(session) de modo que vea las escrituras que el cliente
+        ya ha hecho (X-Consistency-Token). La lectura debe consumir el cursor dentro del callback.
+        """
+        return callback(None)
+
+    def close(self) -> None:
+        pass
+
+
+class MongoStorage(Storage):
+    """
+    Almacenamiento en MongoDB. 'perfiles' asigna a cada clase de operación las opciones de
+    su colección (read_preference, write_concern, read_concern); las que no aparecen usan
+    las del cliente. Con use_transactions=None se usan transacciones si el servidor las admite.
+    """
+
+    def __init__(
+        self,
+        uri: Optional[str],
+        db_name: str,
+        use_transactions: Optional[bool] = True,
+        event_listeners: Optional[list] = None,
+        perfiles: Optional[Dict[str, dict]] = None,
+    ):
+        self.client = MongoClient(uri, server_api=ServerApi('1'), uuidRepresentation='standard', event_listeners=event_listeners or [])
+        self.db = self.client[db_name]
+        self.use_transactions = use_transactions
+        self.perfiles = perfiles or {}
+        self._colecciones: Dict[Tuple[str, str], Any] = {}
+        self._comprobado = False
+
+    def collection(self, name: str, clase: str = ESCRITURA):
+        coleccion = self._colecciones.get((name, clase))
+        if coleccion is None:
+            coleccion = self.db.get_collection(name, **self.perfiles.get(clase, {}))
+            self._colecciones[(name, clase)] = coleccion
+        return coleccion
+
+    def comprobar_transacciones(self) -> bool:
+        """
+        Decide (la primera vez) si las escrituras van en transacción. MongoDB solo las admite en
+        un replica set o a través de mongos: sin configurar (None) se usan si el servidor las
+        admite, y si se exigen en un servidor standalone se avisa de que toda escritura fallará.
+        """
+        if self._comprobado or self.use_transactions is False:
+            return self.use_transactions
+        hello = self.client.admin.command("hello")
+        admite = "setName" in hello or hello.get("msg") == "isdbgrid"
+        if self.use_transactions is None:
+            self.use_transactions = admite
+            if not admite:
+                logger.warning(
+                    "MongoDB no es un replica set: las escrituras y su cambio en la outbox se guardan "
+                    "SIN transacción (solo para desarrollo; MONGODB_TRANSACTIONS=false para no comprobarlo)"
+                )
+        elif not admite:
+            logger.error(
+                "MONGODB_TRANSACTIONS=true pero MongoDB no es un replica set: todas las escrituras fallarán. "
+                "Usa un replica set (docker-compose.replica.yml) o MONGODB_TRANSACTIONS=auto"
+            )
+        self._comprobado = True
+        return self.use_transactions
+
+    def run_in_transaction(self, callback, clase: str = ESCRITURA):
+        """
+        Ejecuta callback(session) dentro de una transacción y devuelve su resultado.
+        El driver reintenta el callback ante errores transitorios (with_transaction).
+        Dentro de una transacción cuenta el write concern de la transacción (el de la clase),
+        no el de cada colección. La sesión es causal: su operationTime sirve de token.
+        """
+        with self.client.start_session(causal_consistency=True) as session:
+            if self.comprobar_transacciones():
+                resultado = session.with_transaction(
+                    callback, write_concern=self.perfiles.get(clase, {}).get("write_concern")
+                )
+            else:
+                resultado = callback(session)
+            registrar_escritura(session)
+            return resultado
+
+    def run_causal(self, callback):
+        marca = marca_causal()
+        if marca is None:
+            return callback(None)
+        with self.client.start_session(causal_consistency=True) as session:
+            try:
+                if marca.cluster_time:
+                    session.advance_cluster_time(marca.cluster_time)
+                session.advance_operation_time(marca.operation_time)
+            except (TypeError, ValueError) as e:
+                logger.warning("Token de consistencia no válido, se lee sin él: %s", e)
+                return callback(None)
+            try:
+                return callback(session)
+            except OperationFailure as e:
+                if e.code not in CODIGOS_CLUSTER_TIME:
+                    raise
+                # Token manipulado o de otro clúster: el servidor rechaza la firma del clusterTime
+                logger.warning("Token de consistencia rechazado por el servidor, se lee sin él: %s", e)
+        return callback(None)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class MemoryStorage(Storage):
+    """
+    Almacenamiento en memoria de un solo proceso.
+    Cada operación es atómica (un cerrojo por almacén) y run_in_transaction deshace
+    las escrituras del callback si este lanza una excepción.
+    """
+
+    def __init__(self):
+        self._colecciones: Dict[str, "MemoryCollection"] = {}
+        self._lock = threading.RLock()
+        self._deshacer: Optional[List[Tuple["MemoryCollection", Any, Optional[dict]]]] = None
+
+    def collection(self, name: str, clase: str = ESCRITURA) -> "MemoryCollection":
+        with self._lock:
+            if name not in self._colecciones:
+                self._colecciones[name] = MemoryCollection(name, self)
+            return self._colecciones[name]
+
+    def __getitem__(self, name: str) -> "MemoryCollection":
+        return self.collection(name)
+
+    def run_in_transaction(self, callback, clase: str = ESCRITURA):
+        with self._lock:
+            if self._deshacer is not None:
+                return callback(None)  # Transacción anidada: forma parte de la exterior
+            self._deshacer = []
+            try:
+                return callback(None)
+            except BaseException:
+                for coleccion, clave, anterior in reversed(self._deshacer):
+                    coleccion._restaurar(clave, anterior)
+                raise
+            finally:
+                self._deshacer = None
+
+
+# --- Valores: copia, comparación y orden al estilo BSON ---
+
+def _fecha(valor: datetime) -> datetime:
+    """Las fechas se guardan como en MongoDB: en UTC, sin zona horaria y con precisión de milisegundos."""
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor.replace(microsecond=valor.microsecond // 1000 * 1000)
+
+
+def _copiar(valor: Any) -> Any:
+    """Copia profunda de dicts y listas (el resto de valores que se guardan son inmutables)."""
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_copiar(v) for v in valor]
+    if isinstance(valor, datetime):
+        return _fecha(valor)
+    return valor
+
+
+def _congelar(valor: Any) -> Any:
+    """Versión hashable de un valor (para usar el _id como clave del diccionario)."""
+    if isinstance(valor, dict):
+        return ("__dict__",) + tuple((k, _congelar(v)) for k, v in valor.items())
+    if isinstance(valor, list):
+        return ("__list__",) + tuple(_congelar(v) for v in valor)
+    return valor
+
+
+def _rango(valor: Any) -> int:
+    """Orden entre tipos de MongoDB: null < números < texto < objetos < arrays < binarios/UUID < ObjectId < bool < fechas."""
+    if valor is None:
+        return 1
+    if isinstance(valor, bool):
+        return 8
+    if isinstance(valor, (int, float)):
+        return 2
+    if isinstance(valor, str):
+        return 3
+    if isinstance(valor, dict):
+        return 4
+    if isinstance(valor, list):
+        return 5
+    if isinstance(valor, ObjectId):
+        return 7
+    if isinstance(valor, datetime):
+        return 9
+    return 6  # UUID, bytes
+
+
+def _clave_orden(valor: Any) -> tuple:
+    if isinstance(valor, dict):
+        return (4, tuple((k, _clave_orden(v)) for k, v in valor.items()))
+    if isinstance(valor, list):
+        return (5, tuple(_clave_orden(v) for v in valor))
+    if valor is None:
+        return (1, 0)
+    if isinstance(valor, datetime):
+        valor = _fecha(valor)
+    return (_rango(valor), valor)
+
+
+def _comparar(a: Any, b: Any) -> Optional[int]:
+    """-1/0/1, o None si los tipos no son comparables (MongoDB solo compara dentro del mismo tipo)."""
+    if _rango(a) != _rango(b):
+        return None
+    ka, kb = _clave_orden(a), _clave_orden(b)
+    return (ka > kb) - (ka < kb)
+
+
+_FALTA = object()
+
+
+def _obtener(doc: Any, ruta: str) -> List[Any]:
+    """
+    Valores de 'ruta' (con puntos) en el documento. Recorre los arrays como MongoDB:
+    {"a.b": 1} coincide con {"a": [{"b": 1}]}. Devuelve [_FALTA] si el campo no existe.
+    """
+    valores = [doc]
+    for parte in ruta.split("."):
+        siguientes = []
+        for valor in valores:
+            if isinstance(valor, dict):
+                siguientes.append(valor.get(parte, _FALTA))
+            elif isinstance(valor, list):
+                if parte.isdigit() and int(parte) < len(valor):
+                    siguientes.append(valor[int(parte)])
+                else:
+                    siguientes.extend(v.get(parte, _FALTA) for v in valor if isinstance(v, dict))
+            else:
+                siguientes.append(_FALTA)
+        valores = siguientes or [_FALTA]
+    return valores
+
+
+def _valor_simple(doc: dict, ruta: str) -> Any:
+    """Valor de una ruta sin expandir arrays (para ordenar, agrupar y expresiones): None si falta."""
+    valor = doc
+    for parte in ruta.split("."):
+        if isinstance(valor, dict):
+            valor = valor.get(parte)
+        elif isinstance(valor, list) and parte.isdigit() and int(parte) < len(valor):
+            valor = valor[int(parte)]
+        else:
+            return None
+    return valor
+
+
+# --- Filtros ---
+
+_TIPOS = {
+    "object": dict, "array": list, "string": str, "bool": bool, "date": datetime,
+    "double": float, "int": int, "long": int, "objectId": ObjectId,
+}
+
+
+def _tipo_coincide(valor: Any, tipo: Any) -> bool:
+    if isinstance(tipo, list):
+        return any(_tipo_coincide(valor, t) for t in tipo)
+    if tipo in ("null", 10):
+        return valor is None
+    if tipo == "number":
+        return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+    clase = _TIPOS.get(tipo)
+    if clase is None:
+        raise NotImplementedError(f"$type '{tipo}' no soportado por el motor en memoria")
+    if clase is int:
+        return isinstance(valor, int) and not isinstance(valor, bool)
+    return isinstance(valor, clase)
+
+
+def _igual(candidato: Any, esperado: Any) -> bool:
+    if candidato is _FALTA:
+        return esperado is None
+    if isinstance(candidato, list) and not isinstance(esperado, list):
+        return any(_igual(v, esperado) for v in candidato)
+    return _comparar(candidato, esperado) == 0
+
+
+def _punto(valor: Any) -> Optional[Tuple[float, float]]:
+    """(longitud, latitud) de un punto GeoJSON o de un par de coordenadas."""
+    if isinstance(valor, dict) and valor.get("type") == "Point":
+        valor = valor.get("coordinates")
+    if isinstance(valor, (list, tuple)) and len(valor) == 2 and all(isinstance(c, (int, float)) for c in valor):
+        return float(valor[0]), float(valor[1])
+    return None
+
+
+def _dentro_poligono(punto: Tuple[float, float], anillo: List[List[float]]) -> bool:
+    """Punto en polígono por el método del rayo (coordenadas planas lon/lat; bordes incluidos)."""
+    x, y = punto
+    dentro = False
+    for (x1, y1), (x2, y2) in zip(anillo, anillo[1:] + anillo[:1]):
+        if min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2):
+            if (x2 - x1) * (y - y1) == (y2 - y1) * (x - x1):
+                return True  # Sobre un borde
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            dentro = not dentro
+    return dentro
+
+
+def _geo_within(valor: Any, forma: dict) -> bool:
+    punto = _punto(valor)
+    if punto is None:
+        return False
+    if "$geometry" in forma and forma["$geometry"].get("type") == "Polygon":
+        return _dentro_poligono(punto, forma["$geometry"]["coordinates"][0])
+    if "$box" in forma:
+        (x1, y1), (x2, y2) = forma["$box"]
+        return x1 <= punto[0] <= x2 and y1 <= punto[1] <= y2
+    if "$centerSphere" in forma:
+        centro, radianes = forma["$centerSphere"]
+        return _distancia_metros(punto, tuple(centro)) <= radianes * RADIO_TIERRA_METROS
+    raise NotImplementedError(f"$geoWithin {list(forma)} no soportado por el motor en memoria")
+
+
+def _operador(candidatos: List[Any], operador: str, argumento: Any, condicion: dict) -> bool:
+    if operador == "$eq":
+        return any(_igual(c, argumento) for c in candidatos)
+    if operador == "$ne":
+        return not any(_igual(c, argumento) for c in candidatos)
+    if operador in ("$gt", "$gte", "$lt", "$lte"):
+        aceptados = {"$gt": (1,), "$gte": (0, 1), "$lt": (-1,), "$lte": (-1, 0)}[operador]
+        for c in candidatos:
+            for valor in (c if isinstance(c, list) else [c]):
+                if valor is not _FALTA and _comparar(valor, argumento) in aceptados:
+                    return True
+        return False
+    if operador == "$in":
+        return any(_igual(c, valor) for c in candidatos for valor in argumento)
+    if operador == "$nin":
+        return not any(_igual(c, valor) for c in candidatos for valor in argumento)
+    if operador == "$exists":
+        return any(c is not _FALTA for c in candidatos) == bool(argumento)
+    if operador == "$type":
+        return any(c is not _FALTA and _tipo_coincide(c, argumento) for c in candidatos)
+    if operador == "$regex":
+        flags = 0
+        for letra in condicion.get("$options", ""):
+            flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}[letra]
+        patron = argumento if isinstance(argumento, re.Pattern) else re.compile(argumento, flags)
+        return any(
+            isinstance(valor, str) and patron.search(valor)
+            for c in candidatos for valor in (c if isinstance(c, list) else [c])
+        )
+    if operador == "$options":
+        return True  # Se aplica junto con $regex
+    if operador == "$not":
+        return not _condicion(candidatos, argumento)
+    if operador == "$size":
+        return any(isinstance(c, list) and len(c) == argumento for c in candidatos)
+    if operador == "$all":
+        return any(isinstance(c, list) and all(_igual(c, valor) for valor in argumento) for c in candidatos)
+    if operador == "$elemMatch":
+        return any(
+            isinstance(c, list) and any(isinstance(e, dict) and coincide(e, argumento) for e in c)
+            for c in candidatos
+        )
+    if operador == "$geoWithin":
+        return any(_geo_within(c, argumento) for c in candidatos)
+    raise NotImplementedError(f"Operador {operador} no soportado por el motor en memoria")
+
+
+def _es_condicion(valor: Any) -> bool:
+    return isinstance(valor, dict) and bool(valor) and all(k.startswith("$") for k in valor)
+
+
+def _condicion(candidatos: List[Any], condicion: Any) -> bool:
+    if isinstance(condicion, re.Pattern):
+        return _operador(candidatos, "$regex", condicion, {})
+    if _es_condicion(condicion):
+        return all(_operador(candidatos, op, arg, condicion) for op, arg in condicion.items())
+    return any(_igual(c, condicion) for c in candidatos)
+
+
+def coincide(doc: dict, filtro: Optional[dict]) -> bool:
+    """Evalúa un filtro de consulta de MongoDB sobre un documento."""
+    for campo, condicion in (filtro or {}).items():
+        if campo == "$or":
+            if not any(coincide(doc, f) for f in condicion):
+                return False
+        elif campo == "$and":
+            if not all(coincide(doc, f) for f in condicion):
+                return False
+        elif campo == "$nor":
+            if any(coincide(doc, f) for f in condicion):
+                return False
+        elif campo.startswith("$"):
+            raise NotImplementedError(f"Operador {campo} no soportado por el motor en memoria")
+        elif not _condicion(_obtener(doc, campo), condicion):
+            return False
+    return True
+
+
+# --- Actualizaciones ---
+
+def _fijar(doc: dict, ruta: str, valor: Any) -> None:
+    partes = ruta.split(".")
+    for parte in partes[:-1]:
+        if not isinstance(doc.get(parte), dict):
+            doc[parte] = {}
+        doc = doc[parte]
+    doc[partes[-1]] = valor
+
+
+def _quitar(doc: dict, ruta: str) -> None:
+    partes = ruta.split(".")
+    for parte in partes[:-1]:
+        doc = doc.get(parte)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(partes[-1], None)
+
+
+def _expresion(doc: dict, expresion: Any) -> Any:
+    """Evalúa una expresión de agregación: "$campo", literales, listas, documentos y los operadores usados."""
+    if isinstance(expresion, str) and expresion.startswith("$"):
+        return _copiar(_valor_simple(doc, expresion[1:]))
+    if isinstance(expresion, list):
+        return [_expresion(doc, e) for e in expresion]
+    if isinstance(expresion, dict):
+        if len(expresion) == 1:
+            operador, argumento = next(iter(expresion.items()))
+            if operador == "$dateToString":
+                fecha = _expresion(doc, argumento["date"])
+                return fecha.strftime(argumento["format"]) if isinstance(fecha, datetime) else None
+            if operador == "$literal":
+                return argumento
+            if operador == "$setUnion":
+                union = []
+                for elemento in (e for conjunto in _expresion(doc, argumento) for e in conjunto):
+                    if elemento not in union:
+                        union.append(elemento)
+                return union
+            if operador.startswith("$"):
+                raise NotImplementedError(f"Expresión {operador} no soportada por el motor en memoria")
+        return {k: _expresion(doc, v) for k, v in expresion.items()}
+    return expresion
+
+
+def _aplicar(doc: dict, update: Any, insercion: bool) -> dict:
+    """Devuelve una copia de 'doc' con la actualización aplicada (operadores o pipeline)."""
+    nuevo = _copiar(doc)
+    if isinstance(update, list):
+        for etapa in update:
+            (nombre, campos), = etapa.items()
+            if nombre not in ("$set", "$addFields"):
+                raise NotImplementedError(f"Etapa {nombre} no soportada en actualizaciones en memoria")
+            valores = {ruta: _expresion(nuevo, expr) for ruta, expr in campos.items()}
+            for ruta, valor in valores.items():
+                _fijar(nuevo, ruta, valor)
+        return nuevo
+
+    for operador, campos in update.items():
+        for ruta, valor in campos.items():
+            if operador == "$set":
+                _fijar(nuevo, ruta, _copiar(valor))
+            elif operador == "$setOnInsert":
+                if insercion:
+                    _fijar(nuevo, ruta, _copiar(valor))
+            elif operador == "$inc":
+                actual = _valor_simple(nuevo, ruta)
+                _fijar(nuevo, ruta, (actual or 0) + valor)
+            elif operador == "$max":
+                actual = _valor_simple(nuevo, ruta)
+                _fijar(nuevo, ruta, valor if actual is None or valor > actual else actual)
+            elif operador == "$unset":
+                _quitar(nuevo, ruta)
+            elif operador == "$push":
+                lista = _valor_simple(nuevo, ruta)
+                elementos = valor["$each"] if isinstance(valor, dict) and "$each" in valor else [valor]
+                _fijar(nuevo, ruta, (lista or []) + [_copiar(elemento) for elemento in elementos])
+            else:
+                raise NotImplementedError(f"Operador de actualización {operador} no soportado por el motor en memoria")
+    return nuevo
+
+
+def _base_upsert(filtro: dict) -> dict:
+    """Documento inicial de un upsert: las igualdades del filtro."""
+    doc = {}
+    for campo, condicion in (filtro or {}).items():
+        if campo.startswith("$"):
+            continue
+        if _es_condicion(condicion):
+            if "$eq" in condicion:
+                _fijar(doc, campo, _copiar(condicion["$eq"]))
+            continue
+        _fijar(doc, campo, _copiar(condicion))
+    return doc
+
+
+# --- Orden y proyección ---
+
+def _normalizar_orden(clave: Any, direccion: Optional[int] = None) -> List[Tuple[str, int]]:
+    if isinstance(clave, str):
+        return [(clave, direccion or 1)]
+    return list(clave)
+
+
+def _ordenar(docs: List[dict], orden: List[Tuple[str, int]]) -> List[dict]:
+    # Ordenaciones estables desde la última clave a la primera
+    for campo, direccion in reversed(orden):
+        docs = sorted(docs, key=lambda d: _clave_orden(_valor_simple(d, campo)), reverse=direccion < 0)
+    return docs
+
+
+def _proyectar(doc: dict, proyeccion: Optional[Any]) -> dict:
+    if not proyeccion:
+        return doc
+    if isinstance(proyeccion, (list, tuple)):
+        proyeccion = {campo: 1 for campo in proyeccion}
+    incluir = {campo for campo, v in proyeccion.items() if v and campo != "_id"}
+    if incluir or proyeccion.get("_id"):
+        resultado = {"_id": doc["_id"]} if proyeccion.get("_id", 1) and "_id" in doc else {}
+        for campo in incluir:
+            valor = _valor_simple(doc, campo)
+            if valor is not None or _obtener(doc, campo) != [_FALTA]:
+                _fijar(resultado, campo, valor)
+        return resultado
+    resultado = dict(doc)
+    for campo, v in proyeccion.items():
+        if not v:
+            _quitar(resultado, campo)
+    return resultado
+
+
+# --- Geo ---
+
+# Radio terrestre que usa MongoDB en las consultas esféricas
+RADIO_TIERRA_METROS = 6378100.0
+
+
+def _distancia_metros(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Distancia de haversine entre dos (longitud, latitud)."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_METROS * math.asin(min(1.0, math.sqrt(h)))
+
+
+# --- Colección y cursor ---
+
+class MemoryCursor:
+    """Cursor perezoso con sort/skip/limit encadenables, como el de pymongo."""
+
+    def __init__(self, coleccion: "MemoryCollection", filtro: Optional[dict], proyeccion: Optional[Any]):
+        self._coleccion = coleccion
+        self._filtro = filtro
+        self._proyeccion = proyeccion
+        self._orden: List[Tuple[str, int]] = []
+        self._saltar = 0
+        self._limite = 0
+
+    def sort(self, clave: Any, direccion: Optional[int] = None) -> "MemoryCursor":
+        self._orden = _normalizar_orden(clave, direccion)
+        return self
+
+    def skip(self, n: int) -> "MemoryCursor":
+        self._saltar = n
+        return self
+
+    def limit(self, n: int) -> "MemoryCursor":
+        self._limite = n
+        return self
+
+    def __iter__(self) -> Iterator[dict]:
+        docs = self._coleccion._buscar(self._filtro)
+        if self._orden:
+            docs = _ordenar(docs, self._orden)
+        docs = docs[self._saltar:]
+        if self._limite:
+            docs = docs[:self._limite]
+        return iter([_proyectar(_copiar(doc), self._proyeccion) for doc in docs])
+
+
+class MemoryCollection:
+    """Colección en memoria con la API de pymongo que usan los CRUD (los documentos se guardan por _id)."""
+
+    def __init__(self, name: str, storage: MemoryStorage):
+        self.name = name
+        self._storage = storage
+        self._docs: Dict[Any, dict] = {}
+
+    # Internos
+
+    def _buscar(self, filtro: Optional[dict]) -> List[dict]:
+        with self._storage._lock:
+            candidatos = self._docs.values()
+            # Con _id igual a un valor o en una lista ($in) se busca directamente por clave
+            id_buscado = (filtro or {}).get("_id")
+            if id_buscado is not None and not _es_condicion(id_buscado):
+                candidatos = [self._docs.get(_congelar(id_buscado))]
+            elif isinstance(id_buscado, dict) and set(id_buscado) == {"$in"}:
+                candidatos = [self._docs.get(clave) for clave in dict.fromkeys(map(_congelar, id_buscado["$in"]))]
+            return [doc for doc in candidatos if doc is not None and coincide(doc, filtro)]
+
+    def _guardar(self, doc: dict) -> None:
+        clave = _congelar(doc["_id"])
+        if self._storage._deshacer is not None:
+            self._storage._deshacer.append((self, clave, self._docs.get(clave)))
+        self._docs[clave] = doc
+
+    def _borrar(self, doc: dict) -> None:
+        clave = _congelar(doc["_id"])
+        if self._storage._deshacer is not None:
+            self._storage._deshacer.append((self, clave, doc))
+        del self._docs[clave]
+
+    def _restaurar(self, clave: Any, anterior: Optional[dict]) -> None:
+        if anterior is None:
+            self._docs.pop(clave, None)
+        else:
+            self._docs[clave] = anterior
+
+    def _insertar(self, doc: dict) -> Any:
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()  # Como pymongo, se añade al documento recibido
+        if _congelar(doc["_id"]) in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._guardar(_copiar(doc))
+        return doc["_id"]
+
+    def _actualizar(self, filtro: dict, update: Any, upsert: bool, varios: bool) -> Tuple[int, int, Any, Optional[dict], Optional[dict]]:
+        """Devuelve (coincidentes, modificados, id_insertado, antes, después) del primer documento."""
+        docs = self._buscar(filtro)
+        if not docs:
+            if not upsert:
+                return 0, 0, None, None, None
+            nuevo = _aplicar(_base_upsert(filtro), update, insercion=True)
+            nuevo.setdefault("_id", ObjectId())
+            self._insertar(nuevo)
+            return 0, 0, nuevo["_id"], None, nuevo
+        modificados = 0
+        antes = despues = None
+        for doc in (docs if varios else docs[:1]):
+            nuevo = _aplicar(doc, update, insercion=False)
+            if nuevo != doc:
+                self._guardar(nuevo)
+                modificados += 1
+            if antes is None:
+                antes, despues = doc, nuevo
+        return len(docs) if varios else 1, modificados, None, antes, despues
+
+    # API de pymongo
+
+    def create_index(self, keys: Any, **kwargs) -> str:
+        """Los índices no hacen falta en memoria: solo se devuelve el nombre."""
+        return kwargs.get("name") or "_".join(f"{k}_{d}" for k, d in _normalizar_orden(keys, 1))
+
+    def drop(self, session=None) -> None:
+        with self._storage._lock:
+            for doc in list(self._docs.values()):
+                self._borrar(doc)
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[Any] = None, session=None,
+             sort: Optional[Any] = None, limit: int = 0, skip: int = 0) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter, projection).limit(limit).skip(skip)
+        return cursor.sort(sort) if sort else cursor
+
+    def find_one(self, filter: Optional[dict] = None, projection: Optional[Any] = None, session=None,
+                 sort: Optional[Any] = None) -> Optional[dict]:
+        return next(iter(self.find(filter, projection, sort=sort, limit=1)), None)
+
+    def count_documents(self, filter: dict, session=None, limit: int = 0) -> int:
+        total = len(self._buscar(filter))
+        return min(total, limit) if limit else total
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    def distinct(self, key: str, filter: Optional[dict] = None, session=None) -> List[Any]:
+        valores = []
+        for doc in self._buscar(filter):
+            for valor in _obtener(doc, key):
+                for v in (valor if isinstance(valor, list) else [valor]):
+                    if v is not _FALTA and not any(_igual(v, x) for x in valores):
+                        valores.append(v)
+        return valores
+
+    def insert_one(self, document: dict, session=None) -> InsertOneResult:
+        with self._storage._lock:
+            return InsertOneResult(self._insertar(document), True)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, session=None) -> InsertManyResult:
+        with self._storage._lock:
+            return InsertManyResult([self._insertar(doc) for doc in documents], True)
+
+    def update_one(self, filter: dict, update: Any, upsert: bool = False, session=None) -> UpdateResult:
+        with self._storage._lock:
+            n, modificados, upserted, _, _ = self._actualizar(filter, update, upsert, varios=False)
+        return UpdateResult(_resultado_update(n, modificados, upserted), True)
+
+    def update_many(self, filter: dict, update: Any, upsert: bool = False, session=None) -> UpdateResult:
+        with self._storage._lock:
+            n, modificados, upserted, _, _ = self._actualizar(filter, update, upsert, varios=True)
+        return UpdateResult(_resultado_update(n, modificados, upserted), True)
+
+    def find_one_and_update(self, filter: dict, update: Any, projection: Optional[Any] = None, sort: Optional[Any] = None,
+                            upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, session=None) -> Optional[dict]:
+        with self._storage._lock:
+            if sort:
+                primero = self.find_one(filter, {"_id": 1}, sort=sort)
+                if primero is None and not upsert:
+                    return None
+                filter = {"_id": primero["_id"]} if primero else filter
+            _, _, _, antes, despues = self._actualizar(filter, update, upsert, varios=False)
+        doc = despues if return_document == ReturnDocument.AFTER else antes
+        return _proyectar(_copiar(doc), projection) if doc is not None else None
+
+    def find_one_and_delete(self, filter: dict, projection: Optional[Any] = None, sort: Optional[Any] = None,
+                            session=None) -> Optional[dict]:
+        with self._storage._lock:
+            docs = self._buscar(filter)
+            if sort:
+                docs = _ordenar(docs, _normalizar_orden(sort))
+            if not docs:
+                return None
+            self._borrar(docs[0])
+        return _proyectar(_copiar(docs[0]), projection)
+
+    def delete_one(self, filter: dict, session=None) -> DeleteResult:
+        with self._storage._lock:
+            docs = self._buscar(filter)[:1]
+            for doc in docs:
+                self._borrar(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    def delete_many(self, filter: dict, session=None) -> DeleteResult:
+        with self._storage._lock:
+            docs = self._buscar(filter)
+            for doc in docs:
+                self._borrar(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, session=None) -> BulkWriteResult:
+        """Ejecuta las operaciones de pymongo (InsertOne, UpdateOne, UpdateMany, DeleteOne, DeleteMany)."""
+        resultado = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": []}
+        with self._storage._lock:
+            for indice, operacion in enumerate(requests):
+                tipo = type(operacion).__name__
+                if tipo == "InsertOne":
+                    self._insertar(operacion._doc)
+                    resultado["nInserted"] += 1
+                elif tipo in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+                    update = operacion._doc if tipo != "ReplaceOne" else [{"$set": operacion._doc}]
+                    n, modificados, upserted, _, _ = self._actualizar(
+                        operacion._filter, update, operacion._upsert, varios=tipo == "UpdateMany"
+                    )
+                    resultado["nMatched"] += n
+                    resultado["nModified"] += modificados
+                    if upserted is not None:
+                        resultado["nUpserted"] += 1
+                        resultado["upserted"].append({"index": indice, "_id": upserted})
+                elif tipo in ("DeleteOne", "DeleteMany"):
+                    borrado = (self.delete_one if tipo == "DeleteOne" else self.delete_many)(operacion._filter)
+                    resultado["nRemoved"] += borrado.deleted_count
+                else:
+                    raise NotImplementedError(f"Operación {tipo} no soportada por el motor en memoria")
+        return BulkWriteResult(resultado, True)
+
+    def aggregate(self, pipeline: List[dict], session=None) -> Iterator[dict]:
+        """
+        Etapas soportadas: $geoNear, $match, $sort, $skip, $limit, $project, $set/$addFields, $group,
+        $unwind, $count, $facet y $merge.
+        """
+        with self._storage._lock:
+            docs = [_copiar(doc) for doc in self._docs.values()]
+        return iter(self._pipeline(docs, pipeline))
+
+    def _pipeline(self, docs: List[dict], pipeline: List[dict]) -> List[dict]:
+        for etapa in pipeline:
+            (nombre, argumento), = etapa.items()
+            if nombre == "$geoNear":
+                docs = _geo_near(docs, argumento)
+            elif nombre == "$match":
+                docs = [doc for doc in docs if coincide(doc, argumento)]
+            elif nombre == "$sort":
+                docs = _ordenar(docs, list(argumento.items()))
+            elif nombre == "$skip":
+                docs = docs[argumento:]
+            elif nombre == "$limit":
+                docs = docs[:argumento]
+            elif nombre == "$project":
+                docs = [_proyectar(doc, argumento) for doc in docs]
+            elif nombre in ("$set", "$addFields"):
+                docs = [_aplicar(doc, [{"$set": argumento}], insercion=False) for doc in docs]
+            elif nombre == "$group":
+                docs = _agrupar(docs, argumento)
+            elif nombre == "$unwind":
+                docs = _desplegar(docs, argumento)
+            elif nombre == "$count":
+                docs = [{argumento: len(docs)}] if docs else []
+            elif nombre == "$facet":
+                # Cada subpipeline recibe su propia copia de los documentos de entrada
+                docs = [{campo: self._pipeline([_copiar(doc) for doc in docs], etapas) for campo, etapas in argumento.items()}]
+            elif nombre == "$merge":
+                self._merge(docs, argumento)
+                docs = []
+            else:
+                raise NotImplementedError(f"Etapa {nombre} no soportada por el motor en memoria")
+        return docs
+
+    def _merge(self, docs: List[dict], opciones: Any) -> None:
+        destino = self._storage.collection(opciones if isinstance(opciones, str) else opciones["into"])
+        if isinstance(opciones, dict) and (opciones.get("on", "_id") != "_id"
+                                           or opciones.get("whenMatched", "merge") not in ("replace", "merge")
+                                           or opciones.get("whenNotMatched", "insert") != "insert"):
+            raise NotImplementedError("$merge en memoria solo admite on=_id, whenMatched replace/merge y whenNotMatched insert")
+        reemplazar = isinstance(opciones, dict) and opciones.get("whenMatched") == "replace"
+        with self._storage._lock:
+            for doc in docs:
+                existente = destino._docs.get(_congelar(doc["_id"]))
+                destino._guardar(doc if reemplazar or existente is None else {**existente, **doc})
+
+
+def _resultado_update(n: int, modificados: int, upserted: Any) -> dict:
+    resultado = {"n": n + (1 if upserted is not None else 0), "nModified": modificados}
+    if upserted is not None:
+        resultado["upserted"] = upserted
+    return resultado
+
+
+def _geo_near(docs: List[dict], opciones: dict) -> List[dict]:
+    centro = _punto(opciones["near"])
+    clave = opciones.get("key", "ubicacion")
+    maxima = opciones.get("maxDistance")
+    minima = opciones.get("minDistance")
+    cercanos = []
+    for doc in docs:
+        punto = _punto(_valor_simple(doc, clave))
+        if punto is None or not coincide(doc, opciones.get("query")):
+            continue
+        distancia = _distancia_metros(centro, punto)
+        if (maxima is not None and distancia > maxima) or (minima is not None and distancia < minima):
+            continue
+        _fijar(doc, opciones["distanceField"], distancia)
+        cercanos.append((distancia, doc))
+    cercanos.sort(key=lambda par: par[0])
+    return [doc for _, doc in cercanos]
+
+
+def _desplegar(docs: List[dict], especificacion: Any) -> List[dict]:
+    """$unwind: un documento por elemento del array (sin preserveNullAndEmptyArrays)."""
+    ruta = (especificacion if isinstance(especificacion, str) else especificacion["path"]).lstrip("$")
+    resultado = []
+    for doc in docs:
+        valor = _valor_simple(doc, ruta)
+        for elemento in (valor if isinstance(valor, list) else [] if valor is None else [valor]):
+            copia = _copiar(doc)
+            _fijar(copia, ruta, elemento)
+            resultado.append(copia)
+    return resultado
+
+
+def _agrupar(docs: List[dict], especificacion: dict) -> List[dict]:
+    grupos: Dict[Any, dict] = {}
+    for doc in docs:
+        id_grupo = _expresion(doc, especificacion["_id"])
+        grupo = grupos.setdefault(_congelar(id_grupo), {"_id": id_grupo})
+        for campo, acumulador in especificacion.items():
+            if campo == "_id":
+                continue
+            (operador, expresion), = acumulador.items()
+            valor = _expresion(doc, expresion)
+            if operador == "$sum":
+                grupo[campo] = grupo.get(campo, 0) + (valor if isinstance(valor, (int, float)) and not isinstance(valor, bool) else 0)
+            elif operador == "$max":
+                if campo not in grupo or _clave_orden(valor) > _clave_orden(grupo[campo]):
+                    grupo[campo] = valor
+            elif operador == "$min":
+                if campo not in grupo or _clave_orden(valor) < _clave_orden(grupo[campo]):
+                    grupo[campo] = valor
+            elif operador == "$first":
+                grupo.setdefault(campo, valor)
+            elif operador == "$push":
+                grupo.setdefault(campo, []).append(valor)
+            else:
+                raise NotImplementedError(f"Acumulador {operador} no soportado por el motor en memoria")
+    return list(grupos.values())
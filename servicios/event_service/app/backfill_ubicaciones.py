@@ -0,0 +1,23 @@
+"""
+Migración de una sola vez: añade el punto GeoJSON indexado ('ubicacion') a los eventos guardados
+antes de que existiera, a partir de su contenidoAdjunto.mapa. Los eventos nuevos ya lo traen, así
+que basta con ejecutarla una vez tras desplegar la versión con búsquedas geográficas.
+
+Uso (desde servicios/event_service):
+    python -m app.backfill_ubicaciones
+"""
+import asyncio
+
+from . import database
+from .dependencies import get_event_crud, get_storage
+
+
+async def main():
+    database.ensure_indexes(get_storage())
+    print("Añadiendo la ubicación a los eventos antiguos con mapa...")
+    modificados = await get_event_crud().backfill_ubicaciones()
+    print(f"✅ {modificados} eventos actualizados.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,358 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+from .consistency import marca_reciente
+
+# Configuración por entorno (ENTITY_CACHE_TTL_SECONDS=0 desactiva la caché)
+ENTITY_CACHE_MAX_ENTRIES = int(os.getenv("ENTITY_CACHE_MAX_ENTRIES", "10000"))
+ENTITY_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_TTL_SECONDS", "30"))
+ENTITY_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_NEGATIVE_TTL_SECONDS", "2"))
+# (LIST_CACHE_TTL_SECONDS=0 desactiva la caché de listados)
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LIST_CACHE_TTL_SECONDS = float(os.getenv("LIST_CACHE_TTL_SECONDS", "10"))
+# Cada cuánto lee cada proceso la outbox para descartar lo que escribieron otros procesos
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+# Marca interna para distinguir "no está en caché" de "está cacheado como inexistente (None)"
+_MISSING = object()
+
+
+class EntityCache:
+    """
+    Caché en proceso de lectura a través (read-through) para las búsquedas por ID.
+    - LRU acotada a 'max_entries' y caducidad por TTL.
+    - Cachea también los "no encontrado" (None) durante 'negative_ttl' segundos.
+    - Protección contra estampidas: las peticiones concurrentes de una misma clave ausente
+      comparten una única carga (single-flight).
+    - Las escrituras llaman a invalidate() para no servir datos obsoletos desde este proceso;
+      las de otros procesos llegan por la outbox (OutboxInvalidator).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ENTITY_CACHE_MAX_ENTRIES,
+        ttl: float = ENTITY_CACHE_TTL_SECONDS,
+        negative_ttl: float = ENTITY_CACHE_NEGATIVE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Sin poder leer la outbox no se sabe qué escribieron otros procesos: la caché no se usa
+        self.suspendida = False
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0 and not self.suspendida
+
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Devuelve el valor cacheado y vigente de la clave, o _MISSING."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._stats["expirations"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Devuelve el valor de la clave desde la caché o, si no está, lo carga con 'loader'."""
+        # Tras una escritura reciente del cliente se lee de la BD: la entrada pudo cachearla otro worker antes
+        if not self.enabled or marca_reciente(self.ttl):
+            return await loader()
+
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self._stats["hits" if value is not None else "negative_hits"] += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Otra petición ya está cargando esta clave: se espera su resultado
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Evita el aviso de "excepción nunca recuperada" si nadie esperaba
+            raise
+        else:
+            # Si una escritura invalidó la clave durante la carga, el valor puede estar obsoleto
+            if self._inflight.get(key) is future:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+    def invalidate(self, key: Hashable) -> None:
+        """Elimina una clave de la caché (llamar tras cada escritura de la entidad)."""
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+        self._stats["invalidations"] += 1
+
+
+    def clear(self) -> None:
+        """Vacía la caché por completo."""
+        self._entries.clear()
+        self._inflight.clear()
+
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Estadísticas de uso de la caché, incluida la tasa de aciertos."""
+        lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"] + self._stats["coalesced"]
+        aciertos = self._stats["hits"] + self._stats["negative_hits"] + self._stats["coalesced"]
+        return {
+            **self._stats,
+            "suspendida": self.suspendida,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(aciertos / lookups, 4) if lookups else None,
+        }
+
+
+def _normalize(value: Any) -> Hashable:
+    """Convierte un filtro de MongoDB en una clave hashable e independiente del orden de los campos."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def _shape(value: Any) -> str:
+    """Forma de la consulta: campos y operadores del filtro sin sus valores (p.ej. 'lugar{$options,$regex}')."""
+    if isinstance(value, dict):
+        return ",".join(
+            f"{k}{{{_shape(v)}}}" if isinstance(v, dict) else k
+            for k, v in sorted(value.items())
+        )
+    return ""
+
+
+class ResultCache:
+    """
+    Caché en proceso de resultados de listados, con clave = filtro normalizado.
+    La colección lleva un contador de generación que incrementa cualquier escritura (bump());
+    como la generación forma parte de la clave, una escritura invalida en O(1) todos los listados
+    cacheados sin recorrerlos: las entradas viejas dejan de ser alcanzables y las desaloja la LRU.
+    - Presupuesto de memoria aproximado ('max_bytes'), con el tamaño estimado de cada resultado.
+    - Las escrituras de otros procesos llegan por la outbox (OutboxInvalidator); el TTL acota
+      lo obsoleto que puede estar si aun así se pierde alguna.
+    - Métricas de aciertos/fallos por forma de consulta.
+    """
+
+    def __init__(self, max_bytes: int = LIST_CACHE_MAX_BYTES, ttl: float = LIST_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.suspendida = False
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "too_large": 0}
+        self._shapes: Dict[str, Dict[str, int]] = {}
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0 and not self.suspendida
+
+
+    def bump(self) -> None:
+        """Invalida todos los listados cacheados de la colección (llamar tras cada escritura)."""
+        self.generation += 1
+
+
+    def _evict(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+    async def get_or_load(
+        self,
+        filters: dict,
+        loader: Callable[[], Awaitable[Any]],
+        size_of: Callable[[Any], int],
+        variant: Hashable = None,
+    ) -> Any:
+        """
+        Devuelve el resultado del filtro desde la caché o lo carga con 'loader'.
+        'variant' distingue resultados distintos del mismo filtro (límite, conteo, facetas...).
+        """
+        if not self.enabled or marca_reciente(self.ttl):
+            return await loader()
+
+        shape_name = _shape(filters) or "(todos)"
+        if variant is not None:
+            shape_name += f" [{variant[0] if isinstance(variant, tuple) else variant}]"
+        shape = self._shapes.setdefault(shape_name, {"hits": 0, "misses": 0})
+        generation = self.generation
+        key = (generation, _normalize(filters), variant)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, _ = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                shape["hits"] += 1
+                return value
+            self._evict(key)
+            self._stats["expirations"] += 1
+
+        self._stats["misses"] += 1
+        shape["misses"] += 1
+        value = await loader()
+
+        size = size_of(value)
+        if generation != self.generation:
+            return value  # Hubo una escritura durante la carga: no se cachea un resultado dudoso
+        if size > self.max_bytes // 4:
+            self._stats["too_large"] += 1  # Un único listado no puede desplazar a toda la caché
+            return value
+
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+        return value
+
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché de listados, en total y por forma de consulta."""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "generation": self.generation,
+            "suspendida": self.suspendida,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            "shapes": self._shapes,
+        }
+
+
+class OutboxInvalidator:
+    """
+    Invalida las cachés en proceso con las escrituras de OTROS procesos (workers de
+    app.serve o réplicas): lee la outbox del servicio cada CACHE_INVALIDATION_POLL_SECONDS
+    y, por cada cambio, descarta la entidad de la EntityCache y da por viejos los listados.
+    Un dato escrito en otro proceso se puede seguir sirviendo, como mucho, durante un intervalo
+    de lectura (más lo que tarden en confirmarse las escrituras anteriores, ver la outbox).
+    Si no se puede leer la outbox (o se ha quedado atrás), las cachés se vacían y se
+    suspenden hasta la siguiente lectura correcta: mejor ir a la BD que servir datos viejos.
+    'outbox' es el OutboxCRUD del servicio (list_since y latest_sequence).
+    """
+
+    def __init__(
+        self,
+        outbox,
+        cache: EntityCache,
+        list_cache: Optional[ResultCache] = None,
+        intervalo: float = CACHE_INVALIDATION_POLL_SECONDS,
+        lote: int = 1000,
+    ):
+        self.outbox = outbox
+        self.cache = cache
+        self.list_cache = list_cache
+        self.intervalo = intervalo
+        self.lote = lote
+        self.posicion: Optional[int] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+
+    def _caches(self) -> List[Any]:
+        return [self.cache] + ([self.list_cache] if self.list_cache is not None else [])
+
+
+    def _suspender(self) -> None:
+        for cache in self._caches():
+            cache.suspendida = True
+        self.cache.clear()
+        if self.list_cache is not None:
+            self.list_cache.bump()
+
+
+    async def sondear(self) -> int:
+        """Lee una vez la outbox e invalida lo que haya cambiado. Devuelve cuántos cambios leyó."""
+        try:
+            if self.posicion is None:
+                # Arranque: lo cacheado antes no se sabe de qué posición es
+                self.posicion = await self.outbox.latest_sequence()
+                self.cache.clear()
+                if self.list_cache is not None:
+                    self.list_cache.bump()
+                cambios = []
+            else:
+                cambios = await self.outbox.list_since(self.posicion, self.lote)
+        except Exception:
+            logger.exception("No se pudo leer la outbox: cachés suspendidas")
+            self._suspender()
+            return 0
+
+        for cambio in cambios:
+            self.cache.invalidate(cambio["idEntidad"])
+        if cambios:
+            self.posicion = cambios[-1]["_id"]
+            if self.list_cache is not None:
+                self.list_cache.bump()
+        for cache in self._caches():
+            cache.suspendida = False
+        return len(cambios)
+
+
+    async def _leer(self) -> None:
+        while True:
+            # Con un lote lleno quedan más cambios: se sigue leyendo sin esperar
+            if await self.sondear() < self.lote:
+                await asyncio.sleep(self.intervalo)
+
+
+    def iniciar(self) -> None:
+        """Arranca la lectura periódica (en el lifespan de la aplicación)."""
+        if self._tarea is None and self.intervalo > 0:
+            self._tarea = asyncio.create_task(self._leer())
+
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
@@ -1,56 +1,353 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from datetime import datetime
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
 
 # Importaciones de tu proyecto
 from .. import database
-from ..model.event_model import EventCreate, EventInDB 
+from ..storage import LECTURA_ID, LISTADO, MASIVA, Storage
+from ..model.event_model import EventCreate, EventInDB, EventNearby
+from .stats_crud import EventStatsCRUD
+from .outbox_crud import OutboxCRUD
+from ..etag import filtro_version
+from ..cache import EntityCache, ResultCache
+
+# Nombre de la entidad en los cambios publicados en la outbox
+ENTIDAD = "evento"
+
+
+def _padres(event: dict) -> dict:
+    """IDs de las entidades padre de un evento (para invalidar sus listados en los suscriptores)."""
+    return {"idCalendario": event.get("idCalendario")}
 
-# Alias para la colección de MongoDB (simplifica el código)
-EventCollection = database.eventos_collection 
 
 class EventCRUD:
     """
     Capa de Acceso a Datos (Repository) para Eventos (MongoDB).
     Toda la sintaxis de PyMongo se encapsula aquí.
+    Las escrituras mantienen además los agregados de estadísticas (EventStatsCRUD) y publican
+    cada cambio en la outbox (OutboxCRUD) dentro de la misma transacción que el documento.
     """
+    def __init__(
+        self,
+        storage: Optional[Storage] = None,
+        stats_repository: Optional[EventStatsCRUD] = None,
+        outbox: Optional[OutboxCRUD] = None,
+        cache: Optional[EntityCache] = None,
+        list_cache: Optional[ResultCache] = None,
+    ):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.EVENTOS)
+        # Misma colección con las opciones de cada clase de operación (read preference / write concern)
+        self.id_collection = self.storage.collection(database.EVENTOS, LECTURA_ID)
+        self.list_collection = self.storage.collection(database.EVENTOS, LISTADO)
+        self.bulk_collection = self.storage.collection(database.EVENTOS, MASIVA)
+        self.stats = stats_repository or EventStatsCRUD(self.storage)
+        self.outbox = outbox or OutboxCRUD(self.storage)
+        self.cache = cache or EntityCache()
+        # Caché de listados de la colección: cada escritura incrementa su generación
+        self.list_cache = list_cache or ResultCache()
+
 
     async def create(self, event_data: dict) -> EventInDB:
         """Inserta el diccionario de evento en la BD y lo recupera."""
-        new_event = EventCollection.insert_one(event_data)
-        created_event = EventCollection.find_one({"_id": new_event.inserted_id})
+        event_data = {**event_data, "version": 1, "fechaActualizacion": datetime.utcnow()}
+
+        def _insert(session):
+            new_event = self.collection.insert_one({**event_data, "secuencia": secuencia}, session=session)
+            cambio = self.outbox.record(
+                ENTIDAD, new_event.inserted_id, "crear", 1, _padres(event_data), session=session, secuencia=secuencia
+            )
+            return new_event.inserted_id, cambio
+
+        # La secuencia del cambio es también la del documento: con ella lo encuentra GET /sync
+        with self.outbox.reservar() as secuencia:
+            inserted_id, cambio = self.storage.run_in_transaction(_insert)
+        self.cache.invalidate(inserted_id)  # Descarta un posible "no encontrado" cacheado
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+
+        created_event = self.collection.find_one({"_id": inserted_id})
+        await self.stats.apply_change(None, created_event)
         return EventInDB.model_validate(created_event) # Convierte el dict de Mongo a Pydantic
 
 
+    async def insert_many(self, events_data: List[dict]) -> int:
+        """
+        Inserta un lote de eventos nuevos (importaciones) y devuelve cuántos se insertaron.
+        Como create(): cada evento lleva su secuencia y su cambio "crear" en la outbox, en la misma
+        transacción, pero con un insert_many desordenado por colección y un solo bulk_write de
+        agregados para todo el lote. Los _id deben ser nuevos (uuid4).
+        """
+        if not events_data:
+            return 0
+        fecha = datetime.utcnow()
+
+        def _insert(session):
+            primera = ultima - len(events_data) + 1
+            documentos = [
+                {**event, "version": 1, "fechaActualizacion": fecha, "secuencia": primera + i}
+                for i, event in enumerate(events_data)
+            ]
+            self.bulk_collection.insert_many(documentos, ordered=False, session=session)
+            cambios = self.outbox.record_created(
+                ENTIDAD, [(event["_id"], _padres(event)) for event in documentos], ultima, session=session
+            )
+            return documentos, cambios
+
+        # Carga masiva: basta con la confirmación del primario (como las purgas)
+        with self.outbox.reservar(len(events_data)) as ultima:
+            documentos, cambios = self.storage.run_in_transaction(_insert, MASIVA)
+        self.list_cache.bump()
+        for cambio in cambios:
+            self.outbox.dispatch(cambio)
+        await self.stats.apply_changes([(None, event) for event in documentos])
+        return len(documentos)
+
+
     async def get_by_id(self, event_id: UUID) -> Optional[EventInDB]:
-        """Busca un evento por ID."""
-        event_data = EventCollection.find_one({"_id": event_id})
+        """Busca un evento por ID (a través de la caché en proceso)."""
+        return await self.cache.get_or_load(event_id, lambda: self._load_by_id(event_id))
+
+
+    async def _load_by_id(self, event_id: UUID) -> Optional[EventInDB]:
+        """Lee un evento de la BD (carga de la caché de get_by_id)."""
+        event_data = self.storage.run_causal(
+            lambda session: self.id_collection.find_one({"_id": event_id}, session=session)
+        )
         if event_data:
             return EventInDB.model_validate(event_data)
         return None
 
     
-    async def list_by_filter(self, filters: dict) -> List[EventInDB]:
-        """Devuelve una lista de eventos aplicando el filtro de MongoDB."""
-        cursor = EventCollection.find(filters)
-        event_list = list(cursor)
+    async def list_by_filter(self, filters: dict, limit: int = 0) -> List[EventInDB]:
+        """Devuelve una lista de eventos aplicando el filtro de MongoDB (como mucho 'limit' si no es 0)."""
+        event_list = self.storage.run_causal(
+            lambda session: list(self.list_collection.find(filters, session=session).limit(limit))
+        )
         return [EventInDB.model_validate(event) for event in event_list]
 
 
-    async def update(self, event_id: UUID, update_data: dict) -> Optional[EventInDB]:
-        """Actualiza y devuelve el documento actualizado."""
-        updated_data = EventCollection.find_one_and_update(
-            {"_id": event_id},
-            {"$set": update_data},
-            return_document=ReturnDocument.AFTER
+    async def count_by_filter(self, filters: dict, limit: int = 0) -> int:
+        """Cuenta los eventos del filtro; con 'limit' deja de contar al alcanzarlo."""
+        # pymongo convierte 'limit' en una etapa $limit, que no admite 0
+        opciones = {"limit": limit} if limit else {}
+        return self.storage.run_causal(
+            lambda session: self.list_collection.count_documents(filters, session=session, **opciones)
         )
-        if updated_data:
-            return EventInDB.model_validate(updated_data)
-        return None
+
+
+    async def estimated_count(self) -> int:
+        """Total aproximado de eventos según los metadatos de la colección (no recorre documentos)."""
+        return self.list_collection.estimated_document_count()
+
+
+    async def facet_counts(self, filters: dict, fields: Dict[str, bool], top: int) -> dict:
+        """
+        Cuenta los eventos del filtro agrupados por cada campo, en una única agregación ($facet).
+        'fields' indica por campo si es un array (entonces cuenta cada elemento por separado).
+        Devuelve {"total": [{"n": total}], campo: [{"_id": valor, "total": n}, ...]} con los 'top'
+        valores más frecuentes de cada campo.
+        """
+        facetas = {"total": [{"$count": "n"}]}
+        for campo, es_array in fields.items():
+            facetas[campo] = [
+                *([{"$unwind": f"${campo}"}] if es_array else []),
+                {"$group": {"_id": f"${campo}", "total": {"$sum": 1}}},
+                {"$sort": {"total": -1, "_id": 1}},
+                {"$limit": top},
+            ]
+        resultado = self.storage.run_causal(lambda session: list(
+            self.list_collection.aggregate([{"$match": filters}, {"$facet": facetas}], session=session)
+        ))
+        return resultado[0]
+
+
+    async def update(
+        self, event_id: UUID, update_data: dict, expected_versions: Optional[List[int]] = None
+    ) -> Optional[EventInDB]:
+        """
+        Actualiza y devuelve el documento actualizado.
+        Con 'expected_versions' (If-Match) solo actualiza si la versión almacenada es una de ellas;
+        si no existe o la versión no coincide devuelve None.
+        """
+        update_data = {**update_data, "fechaActualizacion": datetime.utcnow()}
+        filtro = {"_id": event_id}
+        if expected_versions is not None:
+            filtro["version"] = filtro_version(expected_versions)
+
+        def _update(session):
+            # Se pide el documento ANTERIOR para poder descontarlo de los agregados;
+            # el posterior es el anterior con los campos del $set aplicados.
+            previous_data = self.collection.find_one_and_update(
+                filtro,
+                {"$set": {**update_data, "secuencia": secuencia}, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if previous_data is None:
+                return None, None, None
+            updated_data = {
+                **previous_data, **update_data, "secuencia": secuencia, "version": previous_data.get("version", 0) + 1
+            }
+            cambio = self.outbox.record(
+                ENTIDAD, event_id, "actualizar", updated_data["version"], _padres(updated_data),
+                padres_anteriores=_padres(previous_data), session=session, secuencia=secuencia
+            )
+            return previous_data, updated_data, cambio
+
+        with self.outbox.reservar() as secuencia:
+            previous_data, updated_data, cambio = self.storage.run_in_transaction(_update)
+        self.cache.invalidate(event_id)
+        if previous_data is None:
+            return None
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+        await self.stats.apply_change(previous_data, updated_data)
+        return EventInDB.model_validate(updated_data)
 
 
     async def delete(self, event_id: UUID) -> int:
         """Elimina un evento y devuelve el número de documentos eliminados (0 o 1)."""
-        delete_result = EventCollection.delete_one({"_id": event_id})
-        return delete_result.deleted_count
\ No newline at end of file
+
+        def _delete(session):
+            deleted_event = self.collection.find_one_and_delete({"_id": event_id}, session=session)
+            if deleted_event is None:
+                return None, None
+            cambio = self.outbox.record(
+                ENTIDAD, event_id, "eliminar", deleted_event.get("version", 0) + 1, _padres(deleted_event),
+                session=session, secuencia=secuencia
+            )
+            return deleted_event, cambio
+
+        with self.outbox.reservar() as secuencia:
+            deleted_event, cambio = self.storage.run_in_transaction(_delete)
+        self.cache.invalidate(event_id)
+        if deleted_event is None:
+            return 0
+        self.list_cache.bump()
+        self.outbox.dispatch(cambio)
+        await self.stats.apply_change(deleted_event, None)
+        return 1
+
+
+    async def list_ids_by_calendars(self, calendar_ids: List[UUID], limit: int) -> List[UUID]:
+        """Devuelve hasta 'limit' IDs de eventos de los calendarios indicados (solo el _id, vía índice)."""
+        cursor = self.collection.find({"idCalendario": {"$in": calendar_ids}}, {"_id": 1}).limit(limit)
+        return [event["_id"] for event in cursor]
+
+
+    async def delete_many(self, event_ids: List[UUID]) -> int:
+        """
+        Elimina un lote de eventos por ID y devuelve cuántos se eliminaron.
+        Como delete(): publica un cambio "eliminar" por evento en la misma transacción
+        y descuenta los eventos de los agregados (en un único bulk_write).
+        """
+
+        def _delete(session):
+            deleted_events = list(self.collection.find({"_id": {"$in": event_ids}}, session=session))
+            if not deleted_events:
+                return [], []
+            self.bulk_collection.delete_many({"_id": {"$in": [event["_id"] for event in deleted_events]}}, session=session)
+            cambios = [
+                self.outbox.record(
+                    ENTIDAD, event["_id"], "eliminar", event.get("version", 0) + 1, _padres(event),
+                    session=session, secuencia=primera + i
+                )
+                for i, event in enumerate(deleted_events)
+            ]
+            return deleted_events, cambios
+
+        # Una secuencia por ID pedido (los que ya no existan dejan hueco).
+        # Purga del borrado en cascada: no necesita esperar a la confirmación de la mayoría
+        with self.outbox.reservar(len(event_ids)) as ultima:
+            primera = ultima - len(event_ids) + 1
+            deleted_events, cambios = self.storage.run_in_transaction(_delete, MASIVA)
+        for event_id in event_ids:
+            self.cache.invalidate(event_id)
+        if not deleted_events:
+            return 0
+        self.list_cache.bump()
+        for cambio in cambios:
+            self.outbox.dispatch(cambio)
+        await self.stats.apply_changes([(event, None) for event in deleted_events])
+        return len(deleted_events)
+
+
+    async def list_near(self, punto: dict, filters: dict, max_distance: Optional[float] = None, limit: int = 100) -> List[EventNearby]:
+        """
+        Devuelve los eventos más cercanos al punto GeoJSON indicado, ordenados por distancia.
+        La consulta se resuelve con $geoNear sobre el índice 2dsphere de 'ubicacion'.
+        """
+        geo_near = {
+            "near": punto,
+            "key": "ubicacion",
+            "distanceField": "distanciaMetros",
+            "spherical": True,
+            "query": filters,
+        }
+        if max_distance is not None:
+            geo_near["maxDistance"] = max_distance
+
+        event_list = self.storage.run_causal(
+            lambda session: list(self.list_collection.aggregate([{"$geoNear": geo_near}, {"$limit": limit}], session=session))
+        )
+        return [EventNearby.model_validate(event) for event in event_list]
+
+
+    async def backfill_ubicaciones(self) -> int:
+        """
+        Rellena el campo 'ubicacion' de los eventos antiguos que tienen mapa pero no punto GeoJSON
+        (migración de una sola vez: app.backfill_ubicaciones). Devuelve el número de documentos modificados.
+        """
+        update_result = self.collection.update_many(
+            {"ubicacion": {"$exists": False}, "contenidoAdjunto.mapa": {"$type": "object"}},
+            [{"$set": {"ubicacion": {
+                "type": "Point",
+                "coordinates": ["$contenidoAdjunto.mapa.longitud", "$contenidoAdjunto.mapa.latitud"],
+            }}}]
+        )
+        if update_result.modified_count:
+            self.list_cache.bump()
+        return update_result.modified_count
+
+
+    async def get_many(self, event_ids: List[UUID]) -> List[EventInDB]:
+        """Busca varios eventos por ID con una única consulta $in (sin orden garantizado)."""
+        event_list = self.storage.run_causal(
+            lambda session: list(self.id_collection.find({"_id": {"$in": event_ids}}, session=session))
+        )
+        return [EventInDB.model_validate(event) for event in event_list]
+
+
+    async def list_changed_since(self, since: int, limit: int, hasta: int) -> List[EventInDB]:
+        """
+        Devuelve hasta 'limit' eventos escritos después de la secuencia 'since' (hasta 'hasta'), en orden de secuencia.
+        Se lee del primario (perfil de escritura): 'hasta' es la secuencia confirmada en el primario y un
+        secundario atrasado podría devolver la N sin la N-1, que quedaría para siempre detrás del token.
+        """
+        event_list = self.storage.run_causal(lambda session: list(
+            self.collection.find({"secuencia": {"$gt": since, "$lte": hasta}}, session=session)
+            .sort("secuencia", 1).limit(limit)
+        ))
+        return [EventInDB.model_validate(event) for event in event_list]
+
+
+    async def backfill_secuencias(self) -> int:
+        """
+        Asigna secuencia a los eventos escritos antes de que existiera (sin el campo), para que
+        la sincronización delta los entregue. Devuelve el número de documentos modificados.
+        """
+        pendientes = [event["_id"] for event in self.collection.find({"secuencia": {"$exists": False}}, {"_id": 1})]
+        if not pendientes:
+            return 0
+        with self.outbox.reservar(len(pendientes)) as ultima:
+            primera = ultima - len(pendientes) + 1
+            update_result = self.bulk_collection.bulk_write([
+                # Si otro proceso se adelanta, su secuencia se respeta (el filtro ya no coincide)
+                UpdateOne({"_id": event_id, "secuencia": {"$exists": False}}, {"$set": {"secuencia": primera + i}})
+                for i, event_id in enumerate(pendientes)
+            ], ordered=False)
+        if update_result.modified_count:
+            self.list_cache.bump()
+        return update_result.modified_count
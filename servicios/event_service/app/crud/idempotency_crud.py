@@ -0,0 +1,67 @@
+from typing import Optional, Tuple
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+
+
+class IdempotencyCRUD:
+    """
+    Capa de Acceso a Datos de las claves de idempotencia (cabecera Idempotency-Key).
+    Cada clave es un documento cuyo _id es "<alcance>:<clave>", así que el índice único de _id
+    decide qué petición se queda con ella cuando llegan varias a la vez. La que la reserva
+    (propietario) ejecuta la creación y guarda la respuesta; el índice TTL sobre expiraEn
+    borra las claves caducadas.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.IDEMPOTENCIA)
+
+    async def reserve(self, key_data: dict, lock_seconds: float) -> Tuple[dict, bool]:
+        """
+        Reserva la clave para la petición en curso. Devuelve (documento, reservada): si otra
+        petición ya la tiene, el documento es el suyo. Una reserva 'en_curso' cuyo bloqueo ha
+        caducado (el proceso cayó) se retoma conservando su idRecurso.
+        """
+        ahora = key_data["creadoEn"]
+        for _ in range(2):
+            try:
+                self.collection.insert_one(key_data)
+                return key_data, True
+            except DuplicateKeyError:
+                actual = self.collection.find_one({"_id": key_data["_id"]})
+            if actual is None:
+                continue  # Caducó entre el insert y la lectura: se vuelve a intentar
+            if actual["estado"] == "en_curso" and actual["bloqueoHasta"] < ahora:
+                retomada = self.collection.update_one(
+                    {"_id": actual["_id"], "propietario": actual["propietario"]},
+                    {"$set": {
+                        "propietario": key_data["propietario"],
+                        "bloqueoHasta": ahora + timedelta(seconds=lock_seconds),
+                    }},
+                )
+                if retomada.modified_count == 1:
+                    return {**actual, "propietario": key_data["propietario"]}, True
+                actual = self.collection.find_one({"_id": key_data["_id"]}) or actual
+            return actual, False
+        # Caducó las dos veces entre el insert y la lectura: se reserva sin más
+        self.collection.insert_one(key_data)
+        return key_data, True
+
+
+    async def complete(self, key_id: str, propietario: str, cuerpo: dict) -> None:
+        """Guarda la respuesta de la creación para devolverla en las repeticiones."""
+        self.collection.update_one(
+            {"_id": key_id, "propietario": propietario},
+            {"$set": {"estado": "completado", "respuesta": cuerpo,
+                      "bloqueoHasta": None, "terminadoEn": datetime.utcnow()}},
+        )
+
+
+    async def release(self, key_id: str, propietario: str) -> None:
+        """Libera la clave tras un error: el cliente puede repetir la petición con ella."""
+        self.collection.delete_one({"_id": key_id, "propietario": propietario})
+
@@ -0,0 +1,91 @@
+from typing import AsyncIterator, List, Optional
+from uuid import UUID, uuid4
+from datetime import datetime
+from pymongo import ReturnDocument, ASCENDING, DESCENDING
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+from ..model.import_models import ImportJob
+
+
+class ImportCRUD:
+    """
+    Capa de Acceso a Datos de las importaciones masivas de eventos.
+    Cada importación es un documento con su estado, los contadores de filas y los errores de las
+    primeras filas rechazadas; el proceso que la ejecuta lo actualiza tras cada lote, así que
+    GET /imports/{id} muestra el progreso mientras se importa el fichero.
+    El fichero subido se guarda en trozos (importaciones_trozos) hasta que la cola lo procesa.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.IMPORTACIONES)
+        self.chunks_collection = self.storage.collection(database.IMPORTACIONES_TROZOS)
+
+    async def create(self, import_data: dict) -> ImportJob:
+        """Inserta una importación nueva y la devuelve."""
+        self.collection.insert_one(import_data)
+        return ImportJob.model_validate(import_data)
+
+
+    async def get_by_id(self, import_id: UUID) -> Optional[ImportJob]:
+        """Busca una importación por ID."""
+        import_data = self.collection.find_one({"_id": import_id})
+        if import_data:
+            return ImportJob.model_validate(import_data)
+        return None
+
+
+    async def list_by_filter(self, filters: dict, limit: int) -> List[ImportJob]:
+        """Devuelve las importaciones más recientes que cumplen el filtro."""
+        cursor = self.collection.find(filters).sort("creadoEn", DESCENDING).limit(limit)
+        return [ImportJob.model_validate(import_data) for import_data in cursor]
+
+
+    async def claim(self, import_id: UUID, desde: str, estado: str) -> Optional[ImportJob]:
+        """Pasa la importación del estado 'desde' a 'estado'. Devuelve None si no estaba en 'desde'."""
+        import_data = self.collection.find_one_and_update(
+            {"_id": import_id, "estado": desde},
+            {"$set": {"estado": estado, "actualizadoEn": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if import_data:
+            return ImportJob.model_validate(import_data)
+        return None
+
+
+    async def save_chunk(self, import_id: UUID, orden: int, datos: bytes) -> None:
+        """Guarda un trozo del fichero subido a la importación."""
+        self.chunks_collection.insert_one({"_id": uuid4(), "idImportacion": import_id, "orden": orden, "datos": datos})
+
+
+    async def chunks(self, import_id: UUID) -> AsyncIterator[bytes]:
+        """Devuelve en orden los trozos del fichero de la importación, sin cargarlos todos a la vez."""
+        cursor = self.chunks_collection.find({"idImportacion": import_id}, {"datos": 1}).sort("orden", ASCENDING)
+        for trozo in cursor:
+            yield bytes(trozo["datos"])
+
+
+    async def delete_chunks(self, import_id: UUID) -> None:
+        """Borra el fichero guardado de la importación (ya procesado o descartado)."""
+        self.chunks_collection.delete_many({"idImportacion": import_id})
+
+
+    async def update_progress(self, import_id: UUID, inc_data: dict, errores: List[dict]) -> None:
+        """Suma los contadores de un lote y añade los errores de sus filas rechazadas."""
+        update = {"$inc": inc_data, "$set": {"actualizadoEn": datetime.utcnow()}}
+        if errores:
+            update["$push"] = {"errores": {"$each": errores}}
+        self.collection.update_one({"_id": import_id}, update)
+
+
+    async def finish(self, import_id: UUID, set_data: dict) -> ImportJob:
+        """Cierra la importación (completada o fallida) y la devuelve."""
+        ahora = datetime.utcnow()
+        import_data = self.collection.find_one_and_update(
+            {"_id": import_id},
+            {"$set": {**set_data, "actualizadoEn": ahora, "completadoEn": ahora}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return ImportJob.model_validate(import_data)
@@ -0,0 +1,156 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import Storage
+from ..model.job_models import Job
+
+
+class JobCRUD:
+    """
+    Capa de Acceso a Datos de la cola de trabajos.
+    Un trabajo pendiente se toma con una única operación atómica (find_one_and_update), así
+    que varios procesos pueden consumir la misma cola sin ejecutar dos veces un trabajo. Quien
+    lo toma tiene un 'lease' (propietario + leaseHasta): si el proceso cae, el trabajo vuelve
+    a estar disponible cuando caduca.
+    Mientras un trabajo con claveDedup está activo lleva dedupActiva=True; el índice único
+    parcial sobre claveDedup impide encolar otro igual hasta que termine.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.COLA_TRABAJOS)
+
+    async def enqueue(self, job_data: dict) -> Tuple[Job, bool]:
+        """
+        Encola un trabajo. Si trae claveDedup y ya hay uno activo con esa clave, no crea otro.
+        Devuelve (trabajo, creado).
+        """
+        clave = job_data.get("claveDedup")
+        if clave is None:
+            self.collection.insert_one(job_data)
+            return Job.model_validate(job_data), True
+
+        filtro = {"claveDedup": clave, "dedupActiva": True}
+        nuevo = {k: v for k, v in job_data.items() if k not in filtro}
+        for _ in range(2):
+            try:
+                job = self.collection.find_one_and_update(
+                    filtro, {"$setOnInsert": nuevo}, upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Otro proceso insertó el mismo trabajo a la vez: se devuelve el suyo
+                job = self.collection.find_one(filtro)
+            if job is not None:
+                return Job.model_validate(job), job["_id"] == job_data["_id"]
+        # El trabajo duplicado terminó entre el upsert y la lectura: ya se puede encolar uno nuevo
+        self.collection.insert_one({**job_data, "dedupActiva": True})
+        return Job.model_validate(job_data), True
+
+
+    async def get_by_id(self, job_id: UUID) -> Optional[Job]:
+        """Busca un trabajo por ID."""
+        job_data = self.collection.find_one({"_id": job_id})
+        if job_data:
+            return Job.model_validate(job_data)
+        return None
+
+
+    async def list_by_filter(self, filters: dict, limit: int) -> List[Job]:
+        """Devuelve los trabajos más recientes que cumplen el filtro."""
+        cursor = self.collection.find(filters).sort("creadoEn", DESCENDING).limit(limit)
+        return [Job.model_validate(job) for job in cursor]
+
+
+    async def count_by_state(self) -> List[dict]:
+        """Número de trabajos por tipo y estado."""
+        return list(self.collection.aggregate([
+            {"$group": {"_id": {"tipo": "$tipo", "estado": "$estado"}, "total": {"$sum": 1}}},
+        ]))
+
+
+    async def claim(self, tipos: List[str], propietario: str, lease_seconds: float) -> Optional[dict]:
+        """
+        Toma el trabajo disponible más antiguo de los tipos indicados: uno pendiente cuya
+        espera ya pasó, o uno en curso cuyo lease caducó (su proceso cayó).
+        Devuelve el documento ya marcado 'en_curso', o None si no hay ninguno.
+        """
+        ahora = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {
+                "tipo": {"$in": tipos},
+                "$or": [
+                    {"estado": "pendiente", "disponibleEn": {"$lte": ahora}},
+                    {"estado": "en_curso", "leaseHasta": {"$lt": ahora}},
+                ],
+            },
+            {
+                "$set": {
+                    "estado": "en_curso",
+                    "propietario": propietario,
+                    "leaseHasta": ahora + timedelta(seconds=lease_seconds),
+                    "actualizadoEn": ahora,
+                },
+                "$inc": {"intentos": 1},
+            },
+            sort=[("disponibleEn", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+
+    async def extend_lease(self, job_id: UUID, propietario: str, lease_seconds: float) -> None:
+        """Fija el lease del trabajo a 'lease_seconds' desde ahora (tipos con intentos largos)."""
+        ahora = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {"$set": {"leaseHasta": ahora + timedelta(seconds=lease_seconds), "actualizadoEn": ahora}},
+        )
+
+
+    async def complete(self, job_id: UUID, propietario: str, resultado: Optional[dict]) -> None:
+        """Marca el trabajo como completado (si este proceso sigue teniendo el lease)."""
+        ahora = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {
+                "$set": {"estado": "completado", "resultado": resultado, "error": None,
+                         "leaseHasta": None, "actualizadoEn": ahora, "terminadoEn": ahora},
+                "$unset": {"dedupActiva": ""},
+            },
+        )
+
+
+    async def retry(self, job_id: UUID, propietario: str, error: str, disponible_en: datetime) -> None:
+        """Devuelve el trabajo a la cola para reintentarlo a partir de 'disponible_en'."""
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {"$set": {"estado": "pendiente", "error": error, "disponibleEn": disponible_en,
+                      "propietario": None, "leaseHasta": None, "actualizadoEn": datetime.utcnow()}},
+        )
+
+
+    async def fail(self, job_id: UUID, propietario: str, error: str) -> None:
+        """Marca el trabajo como fallido definitivamente (sin más reintentos)."""
+        ahora = datetime.utcnow()
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {
+                "$set": {"estado": "fallido", "error": error, "leaseHasta": None,
+                         "actualizadoEn": ahora, "terminadoEn": ahora},
+                "$unset": {"dedupActiva": ""},
+            },
+        )
+
+
+    async def release(self, job_id: UUID, propietario: str) -> None:
+        """Devuelve a la cola un trabajo interrumpido (parada del proceso) sin gastar el intento."""
+        self.collection.update_one(
+            {"_id": job_id, "propietario": propietario},
+            {"$set": {"estado": "pendiente", "propietario": None, "leaseHasta": None,
+                      "actualizadoEn": datetime.utcnow()},
+             "$inc": {"intentos": -1}},
+        )
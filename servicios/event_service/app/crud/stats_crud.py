@@ -0,0 +1,145 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+from datetime import datetime
+from pymongo import UpdateOne
+
+# Importaciones de tu proyecto
+from .. import database
+from ..storage import LISTADO, MASIVA, Storage
+
+# Tipos de agregado que mantiene el servicio de eventos en la colección de estadísticas
+EVENTOS_MES = "eventos_mes"
+MINUTOS_ORGANIZADOR = "minutos_organizador"
+
+
+def _mes(hora_comienzo: datetime) -> str:
+    """Clave del mes (YYYY-MM), igual que {$dateToString: {format: "%Y-%m"}} en la reconstrucción."""
+    return hora_comienzo.strftime("%Y-%m")
+
+
+class EventStatsCRUD:
+    """
+    Capa de Acceso a Datos para los agregados (rollups) de eventos.
+    Cada agregado es un documento cuyo _id es su clave, p.ej.
+    {"tipo": "eventos_mes", "idCalendario": ..., "mes": "2025-11"}, y se mantiene con $inc
+    desde las escrituras de EventCRUD; rebuild() lo recalcula desde cero para corregir derivas.
+    EventCRUD aplica los $inc tras confirmar la transacción del evento, no dentro de ella:
+    una caída entre ambos pasos deja el agregado desajustado hasta el siguiente rebuild().
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or database.storage
+        self.collection = self.storage.collection(database.ESTADISTICAS)
+        # Las consultas de agregados admiten secundarios; la reconstrucción es una escritura masiva
+        self.list_collection = self.storage.collection(database.ESTADISTICAS, LISTADO)
+        self.bulk_collection = self.storage.collection(database.ESTADISTICAS, MASIVA)
+        # Colección de eventos: origen de los agregados al reconstruirlos ($merge con write concern masivo)
+        self.events = self.storage.collection(database.EVENTOS, MASIVA)
+
+
+    def _incrementos(self, event: dict, signo: int) -> List[tuple]:
+        """Devuelve las parejas (clave, $inc) que aporta un evento (signo=+1 al alta, -1 a la baja)."""
+        return [
+            (
+                {"tipo": EVENTOS_MES, "idCalendario": event["idCalendario"], "mes": _mes(event["horaComienzo"])},
+                {"total": signo},
+            ),
+            (
+                {"tipo": MINUTOS_ORGANIZADOR, "organizador": event["organizador"]},
+                {"minutos": signo * event["duracionMinutos"], "eventos": signo},
+            ),
+        ]
+
+
+    async def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        """
+        Aplica a los agregados el paso de un evento del estado 'before' al estado 'after'
+        (None en 'before' para una creación y en 'after' para un borrado) en un solo bulk_write.
+        """
+        await self.apply_changes([(before, after)])
+
+
+    async def apply_changes(self, cambios: List[Tuple[Optional[dict], Optional[dict]]]) -> None:
+        """Igual que apply_change para varios pares (before, after), acumulados en un único bulk_write."""
+        acumulado = {}
+        for before, after in cambios:
+            for event, signo in ((before, -1), (after, 1)):
+                if event is None:
+                    continue
+                for clave, inc in self._incrementos(event, signo):
+                    clave_hash = tuple(clave.items())
+                    actual = acumulado.setdefault(clave_hash, (clave, {}))[1]
+                    for campo, valor in inc.items():
+                        actual[campo] = actual.get(campo, 0) + valor
+
+        operaciones = [
+            UpdateOne(
+                {"_id": clave},
+                {"$inc": inc, "$setOnInsert": {"creadoEn": datetime.utcnow()}},
+                upsert=True,
+            )
+            for clave, inc in acumulado.values()
+            if any(inc.values())  # Una actualización que no cambia ninguna clave no escribe nada
+        ]
+        if operaciones:
+            self.collection.bulk_write(operaciones, ordered=False)
+
+
+    async def get_events_per_month(self, calendar_id: UUID) -> List[dict]:
+        """Devuelve los eventos por mes de un calendario, ordenados por mes."""
+        docs = self.storage.run_causal(lambda session: list(self.list_collection.find(
+            {"_id.tipo": EVENTOS_MES, "_id.idCalendario": calendar_id, "total": {"$gt": 0}}, session=session
+        ).sort("_id.mes", 1)))
+        return [{"mes": doc["_id"]["mes"], "total": doc["total"]} for doc in docs]
+
+
+    async def get_minutes_per_organizer(self, organizador: Optional[str] = None) -> List[dict]:
+        """Devuelve los minutos programados (y nº de eventos) por organizador, de mayor a menor."""
+        filtro = {"_id.tipo": MINUTOS_ORGANIZADOR, "eventos": {"$gt": 0}}
+        if organizador:
+            filtro["_id.organizador"] = organizador
+        docs = self.storage.run_causal(
+            lambda session: list(self.list_collection.find(filtro, session=session).sort("minutos", -1))
+        )
+        return [
+            {"organizador": doc["_id"]["organizador"], "minutos": doc["minutos"], "eventos": doc["eventos"]}
+            for doc in docs
+        ]
+
+
+    async def rebuild(self) -> None:
+        """
+        Recalcula todos los agregados de eventos con un pipeline de agregación ($group + $merge)
+        y elimina los que ya no corresponden a ningún evento. Los agregados creados por escrituras
+        concurrentes durante la reconstrucción (creadoEn posterior a la marca) no se tocan.
+        """
+        marca = datetime.utcnow()
+        merge = {"$merge": {"into": self.collection.name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+
+        self.events.aggregate([
+            {"$group": {
+                "_id": {
+                    "tipo": EVENTOS_MES,
+                    "idCalendario": "$idCalendario",
+                    "mes": {"$dateToString": {"format": "%Y-%m", "date": "$horaComienzo"}},
+                },
+                "total": {"$sum": 1},
+            }},
+            {"$set": {"creadoEn": marca, "reconstruidoEn": marca}},
+            merge,
+        ])
+        self.events.aggregate([
+            {"$group": {
+                "_id": {"tipo": MINUTOS_ORGANIZADOR, "organizador": "$organizador"},
+                "minutos": {"$sum": "$duracionMinutos"},
+                "eventos": {"$sum": 1},
+            }},
+            {"$set": {"creadoEn": marca, "reconstruidoEn": marca}},
+            merge,
+        ])
+
+        self.bulk_collection.delete_many({
+            "_id.tipo": {"$in": [EVENTOS_MES, MINUTOS_ORGANIZADOR]},
+            "reconstruidoEn": {"$ne": marca},
+            "creadoEn": {"$lt": marca},
+        })
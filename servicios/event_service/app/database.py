@@ -1,13 +1,121 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from datetime import datetime
+from pymongo import ASCENDING, GEOSPHERE
 from dotenv import load_dotenv
+from typing import Optional
 import os
 
+from .storage import ESCRITURA, LECTURA_ID, LISTADO, MASIVA, MemoryStorage, MongoStorage, Storage, read_preference, write_concern
+from . import db_timing, tracing
+
 
 load_dotenv()
 
-uri = os.getenv('MONGODB_URI')
-client = MongoClient(uri, server_api=ServerApi('1'), uuidRepresentation='standard')
-db = client['KalendasDB']
-eventos_collection = db['eventos']
\ No newline at end of file
+# Nombres de las colecciones del servicio
+EVENTOS = 'eventos'
+ESTADISTICAS = 'estadisticas'
+CAMBIOS = 'cambios_eventos'
+BAJAS = 'bajas_eventos'
+CONTADORES = 'contadores'
+EN_CURSO = 'secuencias_en_curso'
+IDEMPOTENCIA = 'claves_idempotencia'
+COLA_TRABAJOS = 'cola_trabajos'
+IMPORTACIONES = 'importaciones'
+# Ficheros subidos a las importaciones, en trozos, hasta que la cola los procesa
+IMPORTACIONES_TROZOS = 'importaciones_trozos'
+
+# Las escrituras y su cambio en la outbox van en una transacción, que requiere replica set (p.ej. Atlas).
+# Con MONGODB_TRANSACTIONS=auto (por defecto) se usan si el servidor es un replica set (se comprueba al
+# arrancar); con false se escriben sin transacción (MongoDB standalone de desarrollo); con true se exigen.
+_TRANSACCIONES = os.getenv('MONGODB_TRANSACTIONS', 'auto').lower()
+USE_TRANSACTIONS = None if _TRANSACCIONES == 'auto' else _TRANSACCIONES == 'true'
+# Retención de la outbox: los suscriptores más atrasados que esto deben resincronizar
+OUTBOX_RETENTION_SECONDS = int(os.getenv('OUTBOX_RETENTION_SECONDS', str(7 * 24 * 3600)))
+# Máximo que puede durar una escritura con su secuencia reservada; si su proceso cae, pasado
+# este tiempo los lectores de la outbox dejan de esperarla (ver OutboxCRUD.reservar)
+OUTBOX_RESERVATION_SECONDS = int(os.getenv('OUTBOX_RESERVATION_SECONDS', '60'))
+# Retención de las bajas (tombstones) de GET /sync: un cliente que tarde más en volver resincroniza entero
+TOMBSTONE_RETENTION_SECONDS = int(os.getenv('TOMBSTONE_RETENTION_SECONDS', str(30 * 24 * 3600)))
+# Tiempo que se conservan los trabajos terminados (completados o fallidos) de la cola
+JOBS_RETENTION_SECONDS = int(os.getenv('JOBS_RETENTION_SECONDS', str(7 * 24 * 3600)))
+# Read preference y write concern por clase de operación (ver storage.py):
+# - listados y búsquedas: secundarios si los hay, con un retraso máximo de MONGO_MAX_STALENESS_SECONDS
+# - lecturas por ID: primario (en secundarios, X-Consistency-Token mantiene la lectura de las propias escrituras)
+# - escrituras: confirmadas por la mayoría; cargas masivas y purgas: solo por el primario
+MONGO_LIST_READ_PREFERENCE = os.getenv('MONGO_LIST_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_ID_READ_PREFERENCE = os.getenv('MONGO_ID_READ_PREFERENCE', 'primary')
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', '90'))
+MONGO_WRITE_CONCERN = os.getenv('MONGO_WRITE_CONCERN', 'majority')
+MONGO_BULK_WRITE_CONCERN = os.getenv('MONGO_BULK_WRITE_CONCERN', '1')
+# 'mongo' (por defecto) o 'memory': motor en memoria, sin MongoDB (tests y pruebas locales)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo').lower()
+
+
+def perfiles_operacion() -> dict:
+    """Opciones de colección de cada clase de operación, según la configuración."""
+    return {
+        ESCRITURA: {"write_concern": write_concern(MONGO_WRITE_CONCERN)},
+        LECTURA_ID: {"read_preference": read_preference(MONGO_ID_READ_PREFERENCE, MONGO_MAX_STALENESS_SECONDS)},
+        LISTADO: {"read_preference": read_preference(MONGO_LIST_READ_PREFERENCE, MONGO_MAX_STALENESS_SECONDS)},
+        MASIVA: {"write_concern": write_concern(MONGO_BULK_WRITE_CONCERN)},
+    }
+
+
+def create_storage() -> Storage:
+    """Crea el almacenamiento configurado por STORAGE_BACKEND."""
+    if STORAGE_BACKEND == 'memory':
+        return MemoryStorage()
+    # MONGODB_DB permite usar otra base de datos (p.ej. la de los benchmarks)
+    mongo = MongoStorage(
+        os.getenv('MONGODB_URI'), os.getenv('MONGODB_DB', 'KalendasDB'), USE_TRANSACTIONS,
+        # Cada comando como span hijo de la petición que lo lanza (si hay trazas activadas),
+        # medido para Server-Timing y el log de consultas lentas
+        event_listeners=[*tracing.mongo_listeners(), db_timing.LISTENER],
+        perfiles=perfiles_operacion(),
+    )
+    # Con este cliente se piden los planes (explain) de las consultas lentas
+    db_timing.LISTENER.client = mongo.client
+    return mongo
+
+
+# Almacenamiento por defecto del proceso (los tests construyen los CRUD con el suyo)
+storage = create_storage()
+
+
+def ensure_indexes(target: Optional[Storage] = None):
+    """Crea (si no existen) los índices que necesitan las consultas del servicio."""
+    target = target or storage
+    eventos_collection = target.collection(EVENTOS)
+    # Índice geoespacial sobre el punto GeoJSON derivado de contenidoAdjunto.mapa
+    eventos_collection.create_index([("ubicacion", GEOSPHERE)], name="ubicacion_2dsphere")
+    # Eventos de un calendario (listados por calendario y borrado en cascada)
+    eventos_collection.create_index([("idCalendario", ASCENDING), ("horaComienzo", ASCENDING)], name="evento_calendario")
+    # Consultas de los agregados de estadísticas por tipo y calendario
+    target.collection(ESTADISTICAS).create_index(
+        [("_id.tipo", ASCENDING), ("_id.idCalendario", ASCENDING), ("_id.mes", ASCENDING)],
+        name="estadisticas_tipo_calendario",
+    )
+    # Caducidad de los cambios antiguos de la outbox
+    target.collection(CAMBIOS).create_index("fecha", expireAfterSeconds=OUTBOX_RETENTION_SECONDS, name="cambios_ttl")
+    # Sincronización delta: documentos y bajas posteriores a un token, en orden de secuencia
+    target.collection(EVENTOS).create_index("secuencia", name="evento_secuencia")
+    # Escrituras con secuencia reservada y aún sin confirmar (la más baja limita a los lectores)
+    en_curso = target.collection(EN_CURSO)
+    en_curso.create_index([("outbox", ASCENDING), ("desde", ASCENDING)], name="en_curso_desde")
+    en_curso.create_index("expiraEn", expireAfterSeconds=0, name="en_curso_ttl")
+    bajas = target.collection(BAJAS)
+    bajas.create_index("secuencia", name="bajas_secuencia")
+    bajas.create_index("fecha", expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS, name="bajas_ttl")
+    # Cola de trabajos: búsqueda del siguiente disponible, deduplicación y caducidad de los terminados
+    cola = target.collection(COLA_TRABAJOS)
+    cola.create_index([("estado", ASCENDING), ("tipo", ASCENDING), ("disponibleEn", ASCENDING)], name="cola_disponibles")
+    cola.create_index([("estado", ASCENDING), ("leaseHasta", ASCENDING)], name="cola_lease")
+    cola.create_index(
+        "claveDedup", unique=True, partialFilterExpression={"dedupActiva": True}, name="cola_dedup"
+    )
+    cola.create_index("terminadoEn", expireAfterSeconds=JOBS_RETENTION_SECONDS, name="cola_ttl")
+    # Importaciones masivas: listado de las más recientes, opcionalmente por estado
+    target.collection(IMPORTACIONES).create_index([("estado", ASCENDING), ("creadoEn", ASCENDING)], name="importaciones_estado")
+    target.collection(IMPORTACIONES_TROZOS).create_index(
+        [("idImportacion", ASCENDING), ("orden", ASCENDING)], unique=True, name="trozos_importacion"
+    )
+    # Claves de idempotencia de los POST de creación: se borran al llegar a su expiraEn
+    target.collection(IDEMPOTENCIA).create_index("expiraEn", expireAfterSeconds=0, name="idempotencia_ttl")
@@ -1,13 +1,89 @@
-from app.service.eventService import EventService
-from app.crud.event_crud import EventCRUD
-# Instanciación estática del CRUD (si no requiere sesión/estado)
-# Si EventCRUD requiriera una sesión de BD, esto usaría 'yield' y el patrón Context Manager
-EVENT_CRUD_INSTANCE = EventCRUD() 
+from .service.eventService import EventService
+from .service.statsService import StatsService
+from .service.changesService import ChangesService
+from .service.syncService import SyncService
+from .service.jobQueue import JobQueue
+from .service.jobHandlers import registrar_manejadores
+from .crud.event_crud import EventCRUD
+from .crud.stats_crud import EventStatsCRUD
+from .crud.outbox_crud import OutboxCRUD
+from .crud.job_crud import JobCRUD
+from .crud.idempotency_crud import IdempotencyCRUD
+from .service.idempotencyService import IdempotencyService
+from .service.importService import ImportService
+from .crud.import_crud import ImportCRUD
+from .cache import OutboxInvalidator
+from .storage import Storage
+from . import database
+
+# Instanciación estática de los CRUD sobre el almacenamiento del proceso.
+# configure_storage() los reconstruye sobre otro (p.ej. uno en memoria por test).
+STORAGE_INSTANCE: Storage = None
+STATS_CRUD_INSTANCE: EventStatsCRUD = None
+OUTBOX_INSTANCE: OutboxCRUD = None
+IDEMPOTENCY_CRUD_INSTANCE: IdempotencyCRUD = None
+EVENT_CRUD_INSTANCE: EventCRUD = None
+IMPORT_CRUD_INSTANCE: ImportCRUD = None
+# Invalida las cachés de este proceso con las escrituras de los demás (lee la outbox)
+CACHE_INVALIDATOR_INSTANCE: OutboxInvalidator = None
+# La cola es única por proceso: lleva sus manejadores y sus trabajadores de fondo
+JOB_QUEUE_INSTANCE: JobQueue = None
+
+def configure_storage(storage: Storage) -> None:
+    """Construye de nuevo los CRUD del servicio sobre el almacenamiento indicado."""
+    global STORAGE_INSTANCE, STATS_CRUD_INSTANCE, OUTBOX_INSTANCE, EVENT_CRUD_INSTANCE, JOB_QUEUE_INSTANCE, IDEMPOTENCY_CRUD_INSTANCE, IMPORT_CRUD_INSTANCE, CACHE_INVALIDATOR_INSTANCE
+    STORAGE_INSTANCE = storage
+    STATS_CRUD_INSTANCE = EventStatsCRUD(storage)
+    OUTBOX_INSTANCE = OutboxCRUD(storage)
+    IDEMPOTENCY_CRUD_INSTANCE = IdempotencyCRUD(storage)
+    EVENT_CRUD_INSTANCE = EventCRUD(storage, stats_repository=STATS_CRUD_INSTANCE, outbox=OUTBOX_INSTANCE)
+    IMPORT_CRUD_INSTANCE = ImportCRUD(storage)
+    CACHE_INVALIDATOR_INSTANCE = OutboxInvalidator(OUTBOX_INSTANCE, EVENT_CRUD_INSTANCE.cache, EVENT_CRUD_INSTANCE.list_cache)
+    JOB_QUEUE_INSTANCE = JobQueue(JobCRUD(storage))
+    registrar_manejadores(JOB_QUEUE_INSTANCE, ImportService(EVENT_CRUD_INSTANCE, IMPORT_CRUD_INSTANCE, JOB_QUEUE_INSTANCE))
+
+configure_storage(database.storage)
+
+def get_storage() -> Storage:
+    """Provee el almacenamiento sobre el que trabajan los CRUD."""
+    return STORAGE_INSTANCE
 
 def get_event_crud() -> EventCRUD:
     """Provee la instancia del CRUD (útil para otros servicios o tests)."""
     return EVENT_CRUD_INSTANCE
 
 def get_event_service() -> EventService:
-    """Provee la instancia del EventService, inyectándole el CRUD."""
-    return EventService(crud_repository=EVENT_CRUD_INSTANCE)
\ No newline at end of file
+    """Provee la instancia del EventService, inyectándole el CRUD y la cola de trabajos."""
+    return EventService(crud_repository=EVENT_CRUD_INSTANCE, jobs=JOB_QUEUE_INSTANCE)
+
+def get_stats_service() -> StatsService:
+    """Provee la instancia del StatsService, inyectándole el CRUD de agregados."""
+    return StatsService(stats_repository=STATS_CRUD_INSTANCE)
+
+def get_outbox() -> OutboxCRUD:
+    """Provee la outbox de cambios (p.ej. para suscribirse en proceso con subscribe())."""
+    return OUTBOX_INSTANCE
+
+def get_changes_service() -> ChangesService:
+    """Provee la instancia del ChangesService, inyectándole la outbox."""
+    return ChangesService(outbox=OUTBOX_INSTANCE)
+
+def get_sync_service() -> SyncService:
+    """Provee la instancia del SyncService, inyectándole el CRUD y la outbox (bajas)."""
+    return SyncService(crud=EVENT_CRUD_INSTANCE, outbox=OUTBOX_INSTANCE)
+
+def get_job_queue() -> JobQueue:
+    """Provee la cola de trabajos del proceso (encolar, consultar y ejecutar trabajos)."""
+    return JOB_QUEUE_INSTANCE
+
+def get_idempotency_service() -> IdempotencyService:
+    """Provee el IdempotencyService (cabecera Idempotency-Key de los POST de creación)."""
+    return IdempotencyService(crud=IDEMPOTENCY_CRUD_INSTANCE)
+
+def get_import_service() -> ImportService:
+    """Provee el ImportService, inyectándole el CRUD de eventos, el de importaciones y la cola."""
+    return ImportService(crud_repository=EVENT_CRUD_INSTANCE, import_repository=IMPORT_CRUD_INSTANCE, jobs=JOB_QUEUE_INSTANCE)
+
+def get_cache_invalidator() -> OutboxInvalidator:
+    """Provee el invalidador de cachés del proceso (se arranca en el lifespan)."""
+    return CACHE_INVALIDATOR_INSTANCE
@@ -0,0 +1,67 @@
+from typing import List, Optional
+from fastapi import HTTPException, Response, status
+
+# Utilidades de validación condicional HTTP (ETag / If-None-Match / If-Match).
+# El ETag de un recurso es su 'version', que cada escritura incrementa en el CRUD.
+
+
+def etag_de(version: int) -> str:
+    """ETag (fuerte) correspondiente a una versión del documento."""
+    return f'"{version}"'
+
+
+def _etiquetas(cabecera: str) -> List[str]:
+    """Separa una cabecera If-Match / If-None-Match en sus ETags (sin el prefijo débil W/)."""
+    etiquetas = []
+    for etiqueta in cabecera.split(","):
+        etiqueta = etiqueta.strip()
+        if etiqueta.startswith("W/"):
+            etiqueta = etiqueta[2:]
+        if etiqueta:
+            etiquetas.append(etiqueta)
+    return etiquetas
+
+
+def no_modificado(if_none_match: Optional[str], version: int) -> bool:
+    """True si el cliente ya tiene esta versión (If-None-Match coincide): se responde 304."""
+    if not if_none_match:
+        return False
+    etiquetas = _etiquetas(if_none_match)
+    return "*" in etiquetas or etag_de(version) in etiquetas
+
+
+def respuesta_no_modificado(version: int) -> Response:
+    """Respuesta 304 sin cuerpo, con el ETag vigente."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag_de(version)})
+
+
+def versiones_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """
+    Traduce If-Match a la lista de versiones aceptadas para la escritura.
+    Devuelve None si no hay condición (sin cabecera o '*', que solo exige que el recurso exista).
+    Un ETag que no es una versión válida nunca coincide: se responde 412.
+    """
+    if not if_match:
+        return None
+    etiquetas = _etiquetas(if_match)
+    if "*" in etiquetas:
+        return None
+    versiones = []
+    for etiqueta in etiquetas:
+        try:
+            versiones.append(int(etiqueta.strip('"')))
+        except ValueError:
+            continue
+    if not versiones:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match no coincide con la versión actual del recurso"
+        )
+    return versiones
+
+
+def filtro_version(versiones: List[int]) -> dict:
+    """Condición de MongoDB sobre 'version' (los documentos anteriores a las versiones no tienen el campo: versión 0)."""
+    if 0 in versiones:
+        return {"$in": versiones + [None]}
+    return {"$in": versiones}
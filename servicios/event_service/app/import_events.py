@@ -0,0 +1,56 @@
+"""
+Importa eventos desde un fichero CSV o ICS, en lotes y sin cargarlo entero en memoria.
+
+Uso (desde servicios/event_service):
+    python -m app.import_events agenda.csv --calendario <uuid> [--organizador "Ayto"]
+    python -m app.import_events agenda.ics --calendario <uuid> --organizador "Ayto"
+
+El formato se deduce de la extensión (o --formato). La importación queda registrada igual que
+las de POST /imports, así que su estado también se puede consultar en GET /imports/{id}.
+"""
+import argparse
+import asyncio
+import os
+import time
+from uuid import UUID
+
+from .dependencies import get_import_service
+from .model.import_models import ImportCreate
+
+# Tamaño de los trozos que se leen del fichero
+TAMANO_TROZO = 1 << 20
+
+
+async def _trozos(ruta: str):
+    with open(ruta, "rb") as fichero:
+        while trozo := fichero.read(TAMANO_TROZO):
+            yield trozo
+
+
+async def main(args: argparse.Namespace):
+    formato = args.formato or os.path.splitext(args.fichero)[1].lstrip(".").lower()
+    service = get_import_service()
+    job = await service.create_import(ImportCreate(
+        formato=formato, nombre=os.path.basename(args.fichero),
+        id_calendario=args.calendario, organizador=args.organizador,
+    ))
+    print(f"Importando {args.fichero} ({formato}) como importación {job.id}...")
+    inicio = time.perf_counter()
+
+    def progreso(totales: dict):
+        print(f"  {totales['leidas']} filas leídas, {totales['insertadas']} insertadas, {totales['rechazadas']} rechazadas")
+
+    job = await service.run(job.id, _trozos(args.fichero), progreso)
+    segundos = time.perf_counter() - inicio
+    for error in job.errores:
+        print(f"  línea {error.linea}: {error.error}")
+    print(f"✅ {job.insertadas} eventos importados en {segundos:.1f} s ({job.insertadas / max(segundos, 1e-9):.0f} eventos/s).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa eventos desde un fichero CSV o ICS.")
+    parser.add_argument("fichero")
+    parser.add_argument("--formato", choices=["csv", "ics"], help="Por defecto, la extensión del fichero")
+    parser.add_argument("--calendario", type=UUID, help="Calendario de las filas que no lo indican")
+    parser.add_argument("--organizador", help="Organizador de las filas que no lo indican")
+    asyncio.run(main(parser.parse_args()))
@@ -1,15 +1,60 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .router import events
+from . import database
+from .tracing import TracingMiddleware
+from .db_timing import ServerTimingMiddleware
+from .consistency import ConsistencyMiddleware
+from .profiling import ENABLED as PROFILING_ENABLED, ProfilingMiddleware
+from .dependencies import get_cache_invalidator, get_event_crud, get_job_queue, get_storage
+from .service.jobQueue import JOBS_WORKERS
+from .router import events, stats, changes, sync, metrics, profiles, jobs, imports
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Índices y secuencia de sincronización de los eventos antiguos antes de servir peticiones
+    # (el punto GeoJSON de los eventos antiguos es una migración aparte: app.backfill_ubicaciones)
+    database.ensure_indexes(get_storage())
+    # Transacciones si MongoDB las admite (replica set); si no, se avisa en el log al arrancar
+    get_storage().comprobar_transacciones()
+    await get_event_crud().backfill_secuencias()
+    # Trabajadores de la cola en este proceso (con JOBS_WORKERS=0 los ejecuta app.job_worker)
+    queue = get_job_queue()
+    queue.iniciar(JOBS_WORKERS)
+    # Escrituras de otros workers o réplicas: se descartan de las cachés de este proceso
+    invalidador = get_cache_invalidator()
+    invalidador.iniciar()
+    yield
+    await invalidador.detener()
+    await queue.detener()
 
 
 app = FastAPI(
     title="API de Kalendas",
     description="API para la gestión de calendarios y eventos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Trazas distribuidas (traceparent W3C); sin TRACING_EXPORTER solo se propaga la cabecera
+app.add_middleware(TracingMiddleware, service_name="event_service")
+# Server-Timing: tiempo en MongoDB frente al total de cada petición
+app.add_middleware(ServerTimingMiddleware)
+# Lecturas causales: X-Consistency-Token de la última escritura del cliente
+app.add_middleware(ConsistencyMiddleware)
+# Perfilado bajo demanda (PROFILING_TOKEN o PROFILING_SAMPLE_RATE); sin configurar no se instala
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, service_name="event_service")
+
 # Incluimos el router de eventos en la aplicación principal.
 app.include_router(events.router)
+app.include_router(stats.router)
+app.include_router(changes.router)
+app.include_router(sync.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(jobs.router)
+app.include_router(imports.router)
 
 
 @app.get("/")
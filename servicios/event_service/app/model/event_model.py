@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from uuid import UUID 
 
@@ -30,6 +30,11 @@ class EventCreate(EventBase):
 # Modelo para RESPUESTA (lo que devolvemos desde la API)
 class EventInDB(EventBase):
     id: UUID = Field(..., alias="_id")
+    # Control de concurrencia: 'version' se incrementa en cada escritura y es el ETag del recurso
+    version: int = 0
+    fecha_actualizacion: Optional[datetime] = Field(default=None, alias="fechaActualizacion")
+    # Posición de la última escritura en la secuencia de cambios del servicio (GET /sync)
+    secuencia: int = 0
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -50,4 +55,46 @@ class EventInDB(EventBase):
                 }
             }
         }
-    )
\ No newline at end of file
+    )
+
+# Modelo para RESPUESTA de las búsquedas geoespaciales (incluye la distancia al punto de referencia)
+class EventNearby(EventInDB):
+    distancia_metros: float = Field(..., alias="distanciaMetros")
+
+
+# Modelo para PEDIR varios eventos por ID en una sola llamada
+class BatchLookup(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1)
+
+
+# Modelo para RESPUESTA de la búsqueda por lotes (en el orden pedido, con los IDs que no existen)
+class EventBatch(BaseModel):
+    eventos: List[EventInDB]
+    no_encontrados: List[UUID] = Field(default=[], alias="noEncontrados")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para PEDIR los IDs de los eventos de varios calendarios (borrado en cascada)
+class CalendarEventIds(BaseModel):
+    ids_calendario: List[UUID] = Field(..., min_length=1, alias="idsCalendario")
+    limite: int = Field(500, ge=1, le=5000)
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo para RESPUESTA de un borrado por lotes
+class PurgeResult(BaseModel):
+    eliminados: int
+
+
+# Modelo para RESPUESTA de las facetas: un valor del campo y cuántos eventos lo tienen
+class ValorFaceta(BaseModel):
+    valor: Any = Field(..., json_schema_extra={"example": "Ayuntamiento de Málaga"})
+    total: int
+
+
+# Modelo para RESPUESTA de GET /events/facets: total del filtro y recuentos por campo
+class Facetas(BaseModel):
+    total: int
+    facetas: Dict[str, List[ValorFaceta]]
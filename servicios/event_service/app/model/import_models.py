@@ -0,0 +1,65 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+
+# Modelo para CREAR una importación: formato del fichero y valores por defecto de sus filas
+class ImportCreate(BaseModel):
+    formato: Literal["csv", "ics"]
+    nombre: Optional[str] = Field(default=None, description="Nombre del fichero o descripción libre")
+    id_calendario: Optional[UUID] = Field(
+        default=None, alias="idCalendario",
+        description="Calendario de las filas que no lo indican (obligatorio en la práctica para ICS)",
+    )
+    organizador: Optional[str] = Field(default=None, description="Organizador de las filas que no lo indican")
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Error de validación de una fila (o evento ICS) del fichero
+class ErrorImportacion(BaseModel):
+    linea: int = Field(..., description="Línea del fichero donde empieza la fila")
+    error: str
+
+
+# Modelo de RESPUESTA: estado y progreso de una importación masiva de eventos
+class ImportJob(BaseModel):
+    id: UUID = Field(..., alias="_id")
+    formato: Literal["csv", "ics"]
+    nombre: Optional[str] = None
+    id_calendario: Optional[UUID] = Field(default=None, alias="idCalendario")
+    organizador: Optional[str] = None
+    estado: Literal["pendiente", "recibiendo", "en_cola", "en_curso", "completado", "fallido"]
+    bytes: int = Field(default=0, description="Bytes del fichero procesados")
+    leidas: int = Field(default=0, description="Filas leídas")
+    insertadas: int = 0
+    rechazadas: int = 0
+    errores: List[ErrorImportacion] = Field(default=[], description="Errores de las primeras filas rechazadas")
+    error: Optional[str] = Field(default=None, description="Motivo por el que falló la importación")
+    creado_en: datetime = Field(..., alias="creadoEn")
+    actualizado_en: datetime = Field(..., alias="actualizadoEn")
+    completado_en: Optional[datetime] = Field(default=None, alias="completadoEn")
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
+            "example": {
+                "id": "7d3c2a10-5b1e-4f7a-9c61-0e2f4b8d9a01",
+                "formato": "csv",
+                "nombre": "agenda-2026.csv",
+                "id_calendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+                "organizador": None,
+                "estado": "en_curso",
+                "bytes": 5242880,
+                "leidas": 41000,
+                "insertadas": 40988,
+                "rechazadas": 12,
+                "errores": [{"linea": 1207, "error": "duracionMinutos: Input should be greater than 0"}],
+                "error": None,
+                "creado_en": "2026-01-12T09:00:00",
+                "actualizado_en": "2026-01-12T09:00:07",
+                "completado_en": None
+            }
+        }
+    )
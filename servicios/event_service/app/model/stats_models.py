@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+
+
+# Modelo de RESPUESTA: eventos de un calendario en un mes
+class EventosPorMes(BaseModel):
+    mes: str = Field(..., json_schema_extra={"example": "2025-11"})
+    total: int = Field(..., json_schema_extra={"example": 12})
+
+
+# Modelo de RESPUESTA: minutos programados por organizador
+class MinutosPorOrganizador(BaseModel):
+    organizador: str = Field(..., json_schema_extra={"example": "Concejalía de Cultura"})
+    minutos: int = Field(..., json_schema_extra={"example": 1440})
+    eventos: int = Field(..., json_schema_extra={"example": 9})
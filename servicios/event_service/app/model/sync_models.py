@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Dict, List, Optional
+from datetime import datetime
+from uuid import UUID
+
+from .event_model import EventInDB
+
+
+# Modelo de RESPUESTA: baja (tombstone) de un evento eliminado
+class Baja(BaseModel):
+    id: UUID = Field(..., alias="_id")
+    secuencia: int
+    padres: Dict[str, Optional[UUID]] = {}
+    fecha: datetime
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Modelo de RESPUESTA: página de la sincronización delta (GET /sync)
+class SyncPage(BaseModel):
+    actualizados: List[EventInDB] = Field(..., description="Eventos creados o modificados desde el token, en su estado actual")
+    eliminados: List[Baja] = Field(..., description="Bajas de los eventos eliminados desde el token")
+    token: str = Field(..., description="Token para la siguiente sincronización: pásalo como 'since'")
+    hay_mas: bool = Field(..., alias="hayMas", description="Quedan cambios: repetir la llamada con el nuevo token")
+
+    model_config = ConfigDict(populate_by_name=True)
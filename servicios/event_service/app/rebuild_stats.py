@@ -0,0 +1,19 @@
+"""
+Recalcula desde cero los agregados de estadísticas de eventos.
+
+Uso (desde servicios/event_service):
+    python -m app.rebuild_stats
+"""
+import asyncio
+
+from .dependencies import get_stats_service
+
+
+async def main():
+    print("Recalculando estadísticas de eventos...")
+    await get_stats_service().rebuild()
+    print("✅ Estadísticas de eventos recalculadas.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, Body, Response, status, HTTPException, Query, Depends
-from typing import List, Annotated, Optional
+from fastapi import APIRouter, Body, Response, status, HTTPException, Query, Depends, Header
+from typing import List, Annotated, Literal, Optional
 from uuid import UUID
 from datetime import datetime
 
 from ..service.eventService import EventService 
-from ..dependencies import get_event_service 
-from ..model.event_model import EventCreate, EventInDB
+from ..service.idempotencyService import IdempotencyService
+from ..dependencies import get_event_service, get_idempotency_service
+from ..etag import etag_de, no_modificado, respuesta_no_modificado, versiones_if_match
+from ..model.event_model import EventCreate, EventInDB, EventNearby, EventBatch, BatchLookup, CalendarEventIds, PurgeResult, Facetas
+from ..encoding import EncodedRoute, EncodedResponse
 
 router = APIRouter(
     prefix="/events",
-    tags=["Eventos"]
+    tags=["Eventos"],
+    # Respuestas JSON rápidas o MessagePack según Accept (ver app/encoding.py)
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
 )
 
 # Definición del tipo inyectado (Dependencia del Servicio)
 EventServiceDep = Annotated[EventService, Depends(get_event_service)]
+IdempotencyDep = Annotated[IdempotencyService, Depends(get_idempotency_service)]
 
 # --- Endpoints ---
 
@@ -48,60 +55,250 @@ async def create_event(
             }
         }]
     )],
-    event_service: EventServiceDep # 👈 Inyección del Service
+    event_service: EventServiceDep, # 👈 Inyección del Service
+    idempotency: IdempotencyDep,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", description="Clave única del cliente para poder repetir la petición sin duplicar"
+    ),
 ):
     """
     Crea un nuevo evento en la base de datos.
+    Con la cabecera Idempotency-Key, repetir la petición (p.ej. tras un timeout del gateway)
+    devuelve lo creado la primera vez, con Idempotent-Replayed: true, sin volver a escribir.
     """
     # Llama al Servicio y le pasa el modelo Pydantic validado.
-    return await event_service.create_event(event) 
+    if idempotency_key is None:
+        return await event_service.create_event(event)
+    evento, repetida = await idempotency.run(
+        "events", idempotency_key, event,
+        crear=lambda event_id: event_service.create_event(event, event_id),
+        recuperar=event_service.get_event_by_id,
+    )
+    if repetida:
+        response.headers["Idempotent-Replayed"] = "true"
+    return evento
 
 
-# 2. GET /events : Obtener una lista de todos los eventos (con filtros opcionales)
-@router.get(
-    "/",
-    response_model=List[EventInDB],
-    response_description="Listar todos los eventos con filtros opcionales",
-)
-async def list_events(
-    event_service: EventServiceDep, # 👈 Inyección del Service
+def filtros_listado(
     fecha_inicio: Optional[datetime] = Query(
         None, 
         description="Fecha de inicio del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)",
-        example="2025-01-01T00:00:00"
+        examples=["2025-01-01T00:00:00"]
     ),
     fecha_fin: Optional[datetime] = Query(
         None, 
         description="Fecha de fin del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)",
-        example="2025-12-31T23:59:59"
+        examples=["2025-12-31T23:59:59"]
     ),
     lugar: Optional[str] = Query(None, description="Filtrar por lugar"),
     organizador: Optional[str] = Query(None, description="Filtrar por organizador"),
     titulo: Optional[str] = Query(None, description="Filtrar por título"),
     duration_minima: Optional[int] = Query(None, description="Filtrar por duración minima en minutos"),
     duration_maxima: Optional[int] = Query(None, description="Filtrar por duración maxima en minutos"),
+) -> dict:
+    """Filtros del listado de eventos (los comparten el listado, su conteo y sus facetas)."""
+    return dict(
+        fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, lugar=lugar, organizador=organizador,
+        titulo=titulo, duration_minima=duration_minima, duration_maxima=duration_maxima,
+    )
+
+FiltrosDep = Annotated[dict, Depends(filtros_listado)]
+
+
+# 2. GET /events : Obtener una lista de todos los eventos (con filtros opcionales)
+@router.get(
+    "/",
+    response_model=List[EventInDB],
+    response_description="Listar todos los eventos con filtros opcionales",
+)
+async def list_events(
+    event_service: EventServiceDep, # 👈 Inyección del Service
+    filtros: FiltrosDep,
+    response: Response,
+    limite: Optional[int] = Query(None, ge=0, description="Número máximo de eventos devueltos (0: solo el conteo)"),
+    conteo: Optional[Literal["exacto", "estimado"]] = Query(
+        None, description="Añade X-Total-Count con el total del filtro: 'exacto' o 'estimado' (más barato)"
+    ),
 ):
     """
     Devuelve una lista de eventos filtrados. La lógica de construcción del filtro se delega al Servicio.
+    Con 'conteo' la respuesta lleva X-Total-Count y X-Total-Count-Exact (false si el total es
+    aproximado o una cota inferior); con limite=0 se obtiene solo el total, sin los eventos.
     """
+    if conteo:
+        total, exacto = await event_service.count_events(conteo, **filtros)
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Exact"] = "true" if exacto else "false"
     # Llama al Servicio con los parámetros de la Query.
-    return await event_service.list_events(
-        fecha_inicio, fecha_fin, lugar, organizador, titulo, duration_minima, duration_maxima
+    return await event_service.list_events(**filtros, limite=limite)
+
+
+# 2.1 GET /events/near : Eventos cercanos a un punto, ordenados por distancia
+# (declarada antes de /{id} para que "near" no se interprete como un ID)
+@router.get(
+    "/near",
+    response_model=List[EventNearby],
+    response_description="Listar los eventos cercanos a un punto, del más cercano al más lejano",
+)
+async def list_events_near(
+    event_service: EventServiceDep,
+    lat: float = Query(..., ge=-90, le=90, description="Latitud del punto de referencia", examples=[36.7213]),
+    lon: float = Query(..., ge=-180, le=180, description="Longitud del punto de referencia", examples=[-4.4214]),
+    radius: float = Query(..., gt=0, description="Radio de búsqueda en metros", examples=[2000]),
+    fecha_inicio: Optional[datetime] = Query(None, description="Fecha de inicio del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)"),
+    fecha_fin: Optional[datetime] = Query(None, description="Fecha de fin del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)"),
+    limite: int = Query(100, ge=1, le=1000, description="Número máximo de eventos devueltos"),
+):
+    """
+    Devuelve los eventos cuyo mapa está a menos de `radius` metros del punto (lat, lon),
+    ordenados por distancia. Se resuelve con el índice geoespacial de la colección.
+    """
+    return await event_service.list_events_near(lat, lon, radius, fecha_inicio, fecha_fin, limite)
+
+
+# 2.2 GET /events/bbox : Eventos dentro de un rectángulo geográfico
+@router.get(
+    "/bbox",
+    response_model=List[EventNearby],
+    response_description="Listar los eventos dentro de un bounding box, ordenados por distancia a su centro",
+)
+async def list_events_in_bbox(
+    event_service: EventServiceDep,
+    lat_min: float = Query(..., ge=-90, le=90, description="Latitud mínima (sur)"),
+    lon_min: float = Query(..., ge=-180, le=180, description="Longitud mínima (oeste)"),
+    lat_max: float = Query(..., ge=-90, le=90, description="Latitud máxima (norte)"),
+    lon_max: float = Query(..., ge=-180, le=180, description="Longitud máxima (este)"),
+    fecha_inicio: Optional[datetime] = Query(None, description="Fecha de inicio del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)"),
+    fecha_fin: Optional[datetime] = Query(None, description="Fecha de fin del rango (formato ISO: YYYY-MM-DDTHH:MM:SS)"),
+    limite: int = Query(100, ge=1, le=1000, description="Número máximo de eventos devueltos"),
+):
+    """
+    Devuelve los eventos situados dentro del rectángulo indicado (útil para la vista de mapa).
+    Responde 422 si una coordenada está fuera de rango o un mínimo es mayor que su máximo.
+    """
+    return await event_service.list_events_in_bbox(
+        lat_min, lon_min, lat_max, lon_max, fecha_inicio, fecha_fin, limite
     )
 
 
+# 2.3 GET /events/lookup?ids=... : Obtener varios eventos por ID en una sola llamada
+# (declarada antes de /{id} para que "lookup" no se interprete como un ID)
+@router.get(
+    "/lookup",
+    response_model=EventBatch,
+    response_description="Obtener varios eventos por ID, en el orden pedido",
+)
+async def lookup_events(
+    event_service: EventServiceDep,
+    ids: List[UUID] = Query(..., description="IDs a resolver (se puede repetir el parámetro: ?ids=a&ids=b)"),
+):
+    """
+    Resuelve varios eventos con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await event_service.get_events_batch(ids)
+
+
+# 2.4 POST /events/lookup : Igual que el anterior, con los IDs en el cuerpo (listas largas)
+@router.post(
+    "/lookup",
+    response_model=EventBatch,
+    response_description="Obtener varios eventos por ID, en el orden pedido",
+)
+async def lookup_events_post(
+    lookup: Annotated[BatchLookup, Body(
+        examples=[{"ids": ["a47ac10b-58cc-4372-a567-0e02b2c3d470"]}]
+    )],
+    event_service: EventServiceDep,
+):
+    """
+    Resuelve varios eventos con una única consulta a la base de datos.
+    Devuelve los encontrados en el orden pedido y la lista de IDs que no existen.
+    """
+    return await event_service.get_events_batch(lookup.ids)
+
+
+# 2.5 POST /events/ids : IDs de los eventos de varios calendarios (uso interno: borrado en cascada)
+@router.post(
+    "/ids",
+    response_model=List[UUID],
+    response_description="Lote de IDs de eventos de los calendarios indicados",
+)
+async def list_event_ids(
+    consulta: Annotated[CalendarEventIds, Body(
+        examples=[{"idsCalendario": ["f47ac10b-58cc-4372-a567-0e02b2c3d479"], "limite": 500}]
+    )],
+    event_service: EventServiceDep,
+):
+    """
+    Devuelve hasta 'limite' IDs de eventos de los calendarios indicados.
+    Lo usa el servicio de calendarios para borrar en lotes los eventos de un calendario eliminado.
+    """
+    return await event_service.list_event_ids_by_calendars(consulta.ids_calendario, consulta.limite)
+
+
+# 2.6 POST /events/purge : Eliminar un lote de eventos por ID (uso interno: borrado en cascada)
+@router.post(
+    "/purge",
+    response_model=PurgeResult,
+    response_description="Número de eventos eliminados",
+)
+async def purge_events(
+    lote: Annotated[BatchLookup, Body(
+        examples=[{"ids": ["a47ac10b-58cc-4372-a567-0e02b2c3d470"]}]
+    )],
+    event_service: EventServiceDep,
+):
+    """
+    Elimina en una sola operación los eventos indicados (los que no existen se ignoran),
+    manteniendo las estadísticas y publicando un cambio por evento en la outbox.
+    """
+    return await event_service.purge_events(lote.ids)
+
+
+# 2.7 GET /events/facets : Recuentos de los eventos del listado agrupados por campo
+@router.get(
+    "/facets",
+    response_model=Facetas,
+    response_description="Total de eventos del filtro y número de eventos por valor de cada campo",
+)
+async def facet_events(
+    event_service: EventServiceDep,
+    filtros: FiltrosDep,
+    campos: Optional[List[str]] = Query(
+        None, description="Campos a agrupar: organizador, lugar, idCalendario (por defecto todos)"
+    ),
+    top: int = Query(10, ge=1, le=100, description="Número máximo de valores por campo (los más frecuentes)"),
+):
+    """
+    Devuelve, con los mismos filtros que el listado, cuántos eventos hay en total y por cada
+    valor de los campos pedidos, calculado en el servidor con una única agregación.
+    """
+    return await event_service.facet_events(campos, top, **filtros)
+
+
 # 3. GET /events/{id} : Obtener un evento específico por su ID
 @router.get(
     "/{id}",
     response_model=EventInDB,
     response_description="Obtener un evento por su ID",
 )
-async def get_event(id: UUID, event_service: EventServiceDep):
+async def get_event(
+    id: UUID,
+    response: Response,
+    event_service: EventServiceDep,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Busca un evento por su ID. Devuelve 404 si no lo encuentra.
+    Incluye el ETag (versión) del evento; con If-None-Match coincidente responde 304 sin cuerpo.
     """
     event = await event_service.get_event_by_id(id) # Llama al Servicio
     if event:
+        if no_modificado(if_none_match, event.version):
+            return respuesta_no_modificado(event.version)
+        response.headers["ETag"] = etag_de(event.version)
         return event
 
     # El manejo de errores de "No encontrado" (404) permanece en el router.
@@ -117,14 +314,18 @@ async def get_event(id: UUID, event_service: EventServiceDep):
 async def update_event(
     id: UUID, 
     event_update: Annotated[EventCreate, Body(...)],
-    event_service: EventServiceDep
+    response: Response,
+    event_service: EventServiceDep,
+    if_match: Optional[str] = Header(None),
 ):
     """
     Actualiza un evento existente. Devuelve 404 si no lo encuentra.
+    Con If-Match solo actualiza si el ETag coincide con la versión actual (412 si otra petición lo modificó).
     """
-    updated_event = await event_service.update_event(id, event_update) # Llama al Servicio
+    updated_event = await event_service.update_event(id, event_update, versiones_if_match(if_match)) # Llama al Servicio
 
     if updated_event:
+        response.headers["ETag"] = etag_de(updated_event.version)
         return updated_event
     
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No se pudo actualizar, evento con ID {id} no encontrado")
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Query, Depends, Request, status
+from typing import List, Annotated, Literal, Optional
+from uuid import UUID
+
+from ..service.importService import ImportService
+from ..dependencies import get_import_service
+from ..model.import_models import ImportCreate, ImportJob
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/imports",
+    tags=["Importación masiva"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+ImportServiceDep = Annotated[ImportService, Depends(get_import_service)]
+
+# --- Endpoints ---
+
+# 1. POST /imports : Registrar una importación (formato y valores por defecto de las filas)
+@router.post(
+    "/",
+    response_model=ImportJob,
+    status_code=status.HTTP_201_CREATED,
+    response_description="Importación pendiente de recibir el fichero",
+)
+async def create_import(import_data: ImportCreate, import_service: ImportServiceDep):
+    """
+    Registra una importación de eventos desde un fichero CSV o ICS. El fichero se sube
+    después con PUT /imports/{id}/contenido. 'idCalendario' y 'organizador' se aplican a las
+    filas que no los traen.
+    """
+    return await import_service.create_import(import_data)
+
+
+# 2. PUT /imports/{id}/contenido : Subir el fichero y encolar la importación
+@router.put(
+    "/{id}/contenido",
+    response_model=ImportJob,
+    status_code=status.HTTP_202_ACCEPTED,
+    response_description="Importación en cola; su progreso se consulta con GET /imports/{id}",
+)
+async def upload_import(id: UUID, request: Request, import_service: ImportServiceDep):
+    """
+    Recibe el fichero como cuerpo de la petición (en UTF-8, p.ej. Content-Type: text/csv o
+    text/calendar) y lo guarda según llega, sin cargarlo entero en memoria. La importación la
+    ejecuta la cola de trabajos: las filas no válidas se cuentan y se anotan en 'errores'; el
+    resto se inserta. GET /imports/{id} muestra el progreso. 404 si no existe, 409 si ya se subió.
+    """
+    return await import_service.upload(id, request.stream())
+
+
+# 3. GET /imports : Listar las importaciones más recientes
+@router.get(
+    "/",
+    response_model=List[ImportJob],
+    response_description="Importaciones, de la más reciente a la más antigua",
+)
+async def list_imports(
+    import_service: ImportServiceDep,
+    estado: Optional[Literal["pendiente", "recibiendo", "en_cola", "en_curso", "completado", "fallido"]] = Query(None, description="Filtrar por estado"),
+    limite: int = Query(50, ge=1, le=500, description="Número máximo de importaciones"),
+):
+    """
+    Devuelve las importaciones con su estado y progreso.
+    """
+    return await import_service.list_imports(estado, limite)
+
+
+# 4. GET /imports/{id} : Estado y progreso de una importación
+@router.get(
+    "/{id}",
+    response_model=ImportJob,
+    response_description="Estado, progreso y errores de fila de la importación",
+)
+async def get_import(id: UUID, import_service: ImportServiceDep):
+    """
+    Devuelve el estado, los contadores (bytes, filas leídas, insertadas y rechazadas) y los
+    errores de fila de la importación. 404 si no existe.
+    """
+    return await import_service.get_import(id)
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Query, Depends
+from typing import List, Annotated, Literal, Optional
+from uuid import UUID
+
+from ..service.jobQueue import JobQueue
+from ..dependencies import get_job_queue
+from ..model.job_models import Job
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Cola de trabajos"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia de la cola)
+JobQueueDep = Annotated[JobQueue, Depends(get_job_queue)]
+
+# --- Endpoints ---
+
+# 1. GET /jobs : Listar los trabajos más recientes de la cola
+@router.get(
+    "/",
+    response_model=List[Job],
+    response_description="Trabajos de la cola, del más reciente al más antiguo",
+)
+async def list_jobs(
+    job_queue: JobQueueDep,
+    estado: Optional[Literal["pendiente", "en_curso", "completado", "fallido"]] = Query(None, description="Filtrar por estado"),
+    tipo: Optional[str] = Query(None, description="Filtrar por tipo de trabajo"),
+    limite: int = Query(50, ge=1, le=500, description="Número máximo de trabajos"),
+):
+    """
+    Devuelve los trabajos de la cola con su estado, intentos y último error.
+    """
+    return await job_queue.list_jobs(estado, tipo, limite)
+
+
+# 2. GET /jobs/stats : Trabajos por tipo y estado
+@router.get(
+    "/stats",
+    response_description="Número de trabajos por tipo y estado y ocupación de este proceso",
+)
+async def get_job_stats(job_queue: JobQueueDep):
+    """
+    Cuenta los trabajos de la cola por tipo y estado (una cola que crece en 'pendiente'
+    indica que los trabajadores no dan abasto) y los que ejecuta ahora este proceso.
+    """
+    return await job_queue.stats()
+
+
+# 3. GET /jobs/{id} : Estado de un trabajo
+@router.get(
+    "/{id}",
+    response_model=Job,
+    response_description="Estado, intentos y resultado de un trabajo",
+)
+async def get_job(id: UUID, job_queue: JobQueueDep):
+    """
+    Devuelve el estado, los intentos, el último error y el resultado del trabajo. 404 si no existe.
+    """
+    return await job_queue.get_job(id)
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse
+from typing import Optional
+
+from .. import profiling
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["Perfilado"]
+)
+
+
+def _autorizar(token: Optional[str]) -> None:
+    """Los perfiles solo se sirven con el token de PROFILING_TOKEN (sin token configurado no hay acceso)."""
+    if not profiling.PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El perfilado no está activado en este servicio")
+    if not profiling.token_valido(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de perfilado no válido")
+
+# --- Endpoints ---
+
+# 1. GET /profiles : Perfiles guardados por este proceso (los más recientes primero)
+@router.get(
+    "/",
+    response_description="Metadatos de los perfiles guardados",
+)
+async def list_profiles(
+    limite: int = Query(50, ge=1, le=500, description="Número máximo de perfiles devueltos"),
+    x_profile_token: Optional[str] = Header(None),
+):
+    _autorizar(x_profile_token)
+    return profiling.list_profiles(limite)
+
+
+# 2. GET /profiles/{id} : Metadatos y resumen de texto de un perfil
+@router.get(
+    "/{id}",
+    response_description="Metadatos y resumen de un perfil",
+)
+async def get_profile(id: str, x_profile_token: Optional[str] = Header(None)):
+    _autorizar(x_profile_token)
+    perfil = profiling.get_profile(id)
+    if perfil is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Perfil {id} no encontrado")
+    perfil.pop("fichero")
+    return perfil
+
+
+# 3. GET /profiles/{id}/raw : Fichero completo (.prof de pstats o .folded de pilas colapsadas)
+@router.get(
+    "/{id}/raw",
+    response_class=FileResponse,
+    response_description="Fichero del perfil",
+)
+async def get_profile_raw(id: str, x_profile_token: Optional[str] = Header(None)):
+    _autorizar(x_profile_token)
+    perfil = profiling.get_profile(id)
+    if perfil is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Perfil {id} no encontrado")
+    return FileResponse(perfil["fichero"], filename=f"{perfil['servicio']}-{id}.{perfil['formato']}")
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Query, Depends
+from typing import List, Annotated, Optional
+from uuid import UUID
+
+from ..service.statsService import StatsService
+from ..dependencies import get_stats_service
+from ..model.stats_models import EventosPorMes, MinutosPorOrganizador
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Estadísticas"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+StatsServiceDep = Annotated[StatsService, Depends(get_stats_service)]
+
+# --- Endpoints ---
+
+# 1. GET /stats/calendars/{calendar_id}/events-per-month : Eventos por mes de un calendario
+@router.get(
+    "/calendars/{calendar_id}/events-per-month",
+    response_model=List[EventosPorMes],
+    response_description="Número de eventos por mes de un calendario",
+)
+async def get_events_per_month(calendar_id: UUID, stats_service: StatsServiceDep):
+    """
+    Devuelve los eventos por mes del calendario indicado, leídos del agregado precalculado.
+    """
+    return await stats_service.get_events_per_month(calendar_id)
+
+
+# 2. GET /stats/organizers/minutes : Minutos programados por organizador
+@router.get(
+    "/organizers/minutes",
+    response_model=List[MinutosPorOrganizador],
+    response_description="Minutos totales programados por organizador",
+)
+async def get_minutes_per_organizer(
+    stats_service: StatsServiceDep,
+    organizador: Optional[str] = Query(None, description="Limitar a un organizador concreto"),
+):
+    """
+    Devuelve los minutos totales programados y el número de eventos de cada organizador,
+    de mayor a menor, leídos del agregado precalculado.
+    """
+    return await stats_service.get_minutes_per_organizer(organizador)
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Query, Depends
+from typing import Annotated
+
+from ..service.syncService import SyncService
+from ..dependencies import get_sync_service
+from ..model.sync_models import SyncPage
+from ..encoding import EncodedRoute, EncodedResponse
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sincronización"],
+    route_class=EncodedRoute,
+    default_response_class=EncodedResponse,
+)
+
+# Definición del tipo inyectado (Dependencia del Servicio)
+SyncServiceDep = Annotated[SyncService, Depends(get_sync_service)]
+
+# --- Endpoints ---
+
+# 1. GET /sync?since=<token> : Eventos creados, modificados y eliminados desde un token
+@router.get(
+    "/",
+    response_model=SyncPage,
+    response_description="Cambios de eventos desde el token indicado",
+)
+async def sync_eventos(
+    sync_service: SyncServiceDep,
+    since: str = Query("0", description="Token devuelto por la sincronización anterior ('0' para descargarlo todo)"),
+    limite: int = Query(100, ge=1, le=1000, description="Número máximo de cambios devueltos"),
+):
+    """
+    Sincronización delta para clientes offline: devuelve los eventos escritos desde el token
+    (documento completo) y los IDs de los eliminados (bajas). Mientras 'hayMas' sea true se repite
+    con el token devuelto. Con 410 el token ha caducado y hay que volver a empezar con since=0.
+    """
+    return await sync_service.sync(since, limite)
@@ -1,35 +1,100 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID, uuid4
 from datetime import datetime
 import httpx
 from fastapi import HTTPException, status
+import math
 import os
 
 # Importaciones de tu proyecto
-from ..model.event_model import EventCreate, EventInDB
+from ..model.event_model import EventCreate, EventInDB, EventNearby, EventBatch, PurgeResult, Facetas, ValorFaceta
 from ..crud.event_crud import EventCRUD # Usamos el CRUD inyectado
+from ..encoding import cabeceras_cliente, contenido_respuesta
+from ..tracing import cabeceras_traza, start_span
+from .jobQueue import JobQueue
 
 CALENDAR_SERVICE_URL = os.getenv("CALENDAR_SERVICE_URL", "http://calendar_service:8000")
+# Máximo de IDs que se resuelven en una sola búsqueda por lotes
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+# Máximo de eventos que se eliminan en un solo lote del borrado en cascada
+MAX_PURGE_IDS = int(os.getenv("MAX_PURGE_IDS", "5000"))
+# Modos de X-Total-Count; en el estimado, con filtros se deja de contar al llegar a este total
+CONTEO_EXACTO = "exacto"
+CONTEO_ESTIMADO = "estimado"
+COUNT_ESTIMATE_LIMIT = int(os.getenv("COUNT_ESTIMATE_LIMIT", "10000"))
+# Campos por los que se pueden pedir facetas (campo del documento -> ¿es un array?)
+FACETAS = {"organizador": False, "lugar": False, "idCalendario": False}
+# Separación máxima (en longitud) entre los vértices de los lados norte y sur del rectángulo de /bbox
+BBOX_PASO_GRADOS = 0.5
+
+
+def _punto_geojson(latitud: float, longitud: float) -> dict:
+    """Construye un punto GeoJSON (ojo: GeoJSON usa el orden [longitud, latitud])."""
+    return {"type": "Point", "coordinates": [longitud, latitud]}
+
+
+def _rectangulo_geojson(lat_min: float, lon_min: float, lat_max: float, lon_max: float) -> dict:
+    """
+    Polígono GeoJSON que aproxima el rectángulo de latitudes y longitudes indicado.
+    MongoDB une los vértices de un polígono GeoJSON por geodésicas (círculos máximos), no por
+    paralelos: con solo las cuatro esquinas, los lados norte y sur se curvan hacia el polo y un
+    rectángulo ancho deja fuera (o incluye) puntos a decenas de kilómetros de esos lados. Por eso
+    llevan un vértice cada BBOX_PASO_GRADOS de longitud; con 0,5° cada tramo se separa del
+    paralelo unos 30 m como mucho (a 45° de latitud), menos cerca del ecuador.
+    """
+    pasos = max(1, math.ceil((lon_max - lon_min) / BBOX_PASO_GRADOS))
+    longitudes = [lon_min + (lon_max - lon_min) * i / pasos for i in range(pasos + 1)]
+    anillo = [[lon, lat_min] for lon in longitudes] + [[lon, lat_max] for lon in reversed(longitudes)]
+    return {"type": "Polygon", "coordinates": [anillo + [anillo[0]]]}
+
+
+def _ubicacion_desde_contenido(contenido_adjunto: Optional[dict]) -> Optional[dict]:
+    """Deriva el punto GeoJSON indexado a partir de contenidoAdjunto.mapa (None si no hay mapa)."""
+    mapa = (contenido_adjunto or {}).get("mapa")
+    if not mapa:
+        return None
+    return _punto_geojson(mapa["latitud"], mapa["longitud"])
+
+
+def _tamano_estimado(eventos: List[EventInDB]) -> int:
+    """Tamaño aproximado en bytes de un listado (para el presupuesto de memoria de la caché)."""
+    if not eventos:
+        return 64
+    # Se extrapola el tamaño serializado del primer evento para no recorrer todo el listado
+    return len(eventos) * len(eventos[0].model_dump_json())
+
 
 class EventService:
     """
     Capa de Servicio para Eventos. Maneja la lógica de negocio.
     """
-    def __init__(self, crud_repository: EventCRUD):
-        """Inyección de Dependencia del CRUD/Repository."""
+    def __init__(self, crud_repository: EventCRUD, jobs: Optional[JobQueue] = None):
+        """Inyección de Dependencia del CRUD/Repository y de la cola de trabajos."""
         self.crud = crud_repository
+        self.jobs = jobs
 
     
-    async def create_event(self, event: EventCreate) -> EventInDB:
+    async def create_event(self, event: EventCreate, event_id: Optional[UUID] = None) -> EventInDB:
         """
         Lógica: Asigna el ID (UUID) y llama al CRUD para la inserción.
+        'event_id' es el ID ya reservado con la Idempotency-Key de la petición, si la trae.
         """
         event_dict = event.model_dump(by_alias=True)
-        event_dict["_id"] = uuid4() 
-        
-        # Aquí se podría poner lógica de negocio avanzada (ej. notificaciones, validaciones cruzadas)
-        
-        return await self.crud.create(event_dict)
+        event_dict["_id"] = event_id or uuid4()
+        event_dict["ubicacion"] = _ubicacion_desde_contenido(event_dict.get("contenidoAdjunto"))
+
+        created = await self.crud.create(event_dict)
+        if self.jobs is not None:
+            # Notificación y validación cruzada fuera de la petición: aquí solo se encolan
+            await self.jobs.enqueue(
+                "notificar", {"evento": "evento.creado", "id": str(created.id)},
+                clave_dedup=f"notificar:evento.creado:{created.id}",
+            )
+            await self.jobs.enqueue(
+                "validar_calendario", {"idEvento": str(created.id), "idCalendario": str(created.id_calendario)},
+                clave_dedup=f"validar_calendario:{created.id}",
+            )
+        return created
 
 
     async def get_event_by_id(self, event_id: UUID) -> Optional[EventInDB]:
@@ -46,19 +111,90 @@ class EventService:
         titulo: Optional[str],
         duration_minima: Optional[int],
         duration_maxima: Optional[int],
+        limite: Optional[int] = None,
     ) -> List[EventInDB]:
         """
         Lógica: Construye el filtro de MongoDB con los parámetros de la API.
+        Con 'limite' devuelve como mucho ese número de eventos (0: ninguno, solo interesa el conteo).
         """
-        filtro = {}
-        
+        filtro = self._filtro_listado(
+            fecha_inicio, fecha_fin, lugar, organizador, titulo, duration_minima, duration_maxima
+        )
+        if limite == 0:
+            return []
+        if limite is not None:
+            return await self.crud.list_cache.get_or_load(
+                filtro, lambda: self.crud.list_by_filter(filtro, limite), _tamano_estimado, variant=("limite", limite)
+            )
+        return await self.crud.list_cache.get_or_load(
+            filtro, lambda: self.crud.list_by_filter(filtro), _tamano_estimado
+        )
+
+
+    async def count_events(self, modo: str, **filtros) -> Tuple[int, bool]:
+        """
+        Lógica: Total de eventos del listado con los mismos filtros (cabecera X-Total-Count).
+        Devuelve (total, exacto):
+        - 'exacto': count_documents del filtro.
+        - 'estimado': sin filtros, los metadatos de la colección; con filtros se deja de contar
+          en COUNT_ESTIMATE_LIMIT y el total pasa a ser una cota inferior.
+        """
+        filtro = self._filtro_listado(**filtros)
+
+        async def _contar() -> Tuple[int, bool]:
+            if modo == CONTEO_EXACTO:
+                return await self.crud.count_by_filter(filtro), True
+            if not filtro:
+                return await self.crud.estimated_count(), False
+            total = await self.crud.count_by_filter(filtro, COUNT_ESTIMATE_LIMIT)
+            return total, total < COUNT_ESTIMATE_LIMIT
+
+        return await self.crud.list_cache.get_or_load(filtro, _contar, lambda _: 64, variant=("conteo", modo))
+
+
+    async def facet_events(self, campos: Optional[List[str]], top: int, **filtros) -> Facetas:
+        """
+        Lógica: Recuentos de los eventos del listado agrupados por cada campo pedido (todos los
+        de FACETAS si no se indica ninguno), calculados en una sola agregación. Cada combinación
+        de filtros y campos se cachea con los listados, así que los paneles más pedidos no
+        vuelven a la base de datos hasta la siguiente escritura.
+        """
+        campos = list(dict.fromkeys(campos or FACETAS))
+        desconocidos = [campo for campo in campos if campo not in FACETAS]
+        if desconocidos:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"No se pueden pedir facetas de {', '.join(desconocidos)}; campos válidos: {', '.join(FACETAS)}"
+            )
+        filtro = self._filtro_listado(**filtros)
+        resultado = await self.crud.list_cache.get_or_load(
+            filtro,
+            lambda: self.crud.facet_counts(filtro, {campo: FACETAS[campo] for campo in campos}, top),
+            lambda valor: 64 * (1 + sum(len(valores) for valores in valor.values())),
+            variant=("facetas", tuple(campos), top),
+        )
+        return Facetas(
+            total=resultado["total"][0]["n"] if resultado["total"] else 0,
+            facetas={
+                campo: [ValorFaceta(valor=grupo["_id"], total=grupo["total"]) for grupo in resultado[campo]]
+                for campo in campos
+            },
+        )
+
+
+    def _filtro_listado(
+        self,
+        fecha_inicio: Optional[datetime] = None,
+        fecha_fin: Optional[datetime] = None,
+        lugar: Optional[str] = None,
+        organizador: Optional[str] = None,
+        titulo: Optional[str] = None,
+        duration_minima: Optional[int] = None,
+        duration_maxima: Optional[int] = None,
+    ) -> dict:
+        """Filtro de MongoDB del listado de eventos (compartido con su conteo y sus facetas)."""
         # Lógica de construcción de filtros (es lógica de consulta, va en el Service)
-        if fecha_inicio or fecha_fin:
-            filtro["horaComienzo"] = {}
-            if fecha_inicio:
-                filtro["horaComienzo"]["$gte"] = fecha_inicio
-            if fecha_fin:
-                filtro["horaComienzo"]["$lte"] = fecha_fin
+        filtro = self._filtro_fechas(fecha_inicio, fecha_fin)
         
         if lugar:
             filtro["lugar"] = {"$regex": lugar, "$options": "i"}
@@ -73,20 +209,89 @@ class EventService:
                 filtro["duracionMinutos"]["$gte"] = duration_minima
             if duration_maxima:
                 filtro["duracionMinutos"]["$lte"] = duration_maxima
+        return filtro
 
-        return await self.crud.list_by_filter(filtro)
 
-
-    async def update_event(self, event_id: UUID, event_update: EventCreate) -> Optional[EventInDB]:
-        """Actualiza un evento."""
+    async def update_event(
+        self, event_id: UUID, event_update: EventCreate, expected_versions: Optional[List[int]] = None
+    ) -> Optional[EventInDB]:
+        """Actualiza un evento. Con 'expected_versions' (If-Match) lanza 412 si la versión no coincide."""
         update_data = event_update.model_dump(by_alias=True, exclude_unset=True)
-        return await self.crud.update(event_id, update_data)
+        if "contenidoAdjunto" in update_data:
+            # Mantiene sincronizado el punto indexado con el mapa (None lo saca del índice)
+            update_data["ubicacion"] = _ubicacion_desde_contenido(update_data["contenidoAdjunto"])
+        updated_event = await self.crud.update(event_id, update_data, expected_versions)
+
+        if updated_event is None and expected_versions is not None and await self.crud.get_by_id(event_id) is not None:
+            # El recurso existe pero otra escritura cambió su versión: If-Match no coincide
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="El evento fue modificado por otra petición; vuelva a leerlo y reintente"
+            )
+        return updated_event
 
 
     async def delete_event(self, event_id: UUID) -> bool:
         """Elimina un evento y devuelve si la operación fue exitosa."""
         deleted_count = await self.crud.delete(event_id)
         return deleted_count > 0
+
+
+    async def list_events_near(
+        self,
+        latitud: float,
+        longitud: float,
+        radio_metros: float,
+        fecha_inicio: Optional[datetime] = None,
+        fecha_fin: Optional[datetime] = None,
+        limite: int = 100,
+    ) -> List[EventNearby]:
+        """
+        Lógica: Eventos en un radio alrededor de un punto, ordenados por distancia.
+        Se puede combinar con el rango de fechas de list_events.
+        """
+        filtro = self._filtro_fechas(fecha_inicio, fecha_fin)
+        return await self.crud.list_near(
+            _punto_geojson(latitud, longitud), filtro, max_distance=radio_metros, limit=limite
+        )
+
+
+    async def list_events_in_bbox(
+        self,
+        lat_min: float,
+        lon_min: float,
+        lat_max: float,
+        lon_max: float,
+        fecha_inicio: Optional[datetime] = None,
+        fecha_fin: Optional[datetime] = None,
+        limite: int = 100,
+    ) -> List[EventNearby]:
+        """
+        Lógica: Eventos dentro de un rectángulo (bounding box), ordenados por distancia a su centro.
+        El rectángulo se aproxima con un polígono GeoJSON sobre el índice 2dsphere (ver _rectangulo_geojson).
+        """
+        if lat_min > lat_max or lon_min > lon_max:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="El bounding box no es válido: los mínimos deben ser menores que los máximos"
+            )
+
+        filtro = self._filtro_fechas(fecha_inicio, fecha_fin)
+        filtro["ubicacion"] = {"$geoWithin": {"$geometry": _rectangulo_geojson(lat_min, lon_min, lat_max, lon_max)}}
+        centro = _punto_geojson((lat_min + lat_max) / 2, (lon_min + lon_max) / 2)
+        return await self.crud.list_near(centro, filtro, limit=limite)
+
+
+    def _filtro_fechas(self, fecha_inicio: Optional[datetime], fecha_fin: Optional[datetime]) -> dict:
+        """Construye el filtro de rango sobre horaComienzo (compartido por listados y búsquedas geo)."""
+        filtro = {}
+        if fecha_inicio or fecha_fin:
+            filtro["horaComienzo"] = {}
+            if fecha_inicio:
+                filtro["horaComienzo"]["$gte"] = fecha_inicio
+            if fecha_fin:
+                filtro["horaComienzo"]["$lte"] = fecha_fin
+        return filtro
     
     async def get_events_by_calendar_and_subcalendars(self, calendar_id: UUID) -> List[EventInDB]:
         """
@@ -96,14 +301,20 @@ class EventService:
         """
         # Llamada al microservicio de calendarios
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{CALENDAR_SERVICE_URL}/calendars/{calendar_id}/subcalendars")
+            url = f"{CALENDAR_SERVICE_URL}/calendars/{calendar_id}/subcalendars"
+            with start_span("GET calendar_service /calendars/{id}/subcalendars", "client", {"http.url": url}) as span:
+                async with httpx.AsyncClient() as client:
+                    # Se pide MessagePack (si está disponible): menos bytes y decodificación más barata.
+                    # traceparent: el servicio de calendarios continúa la traza de esta petición
+                    response = await client.get(url, headers={**cabeceras_cliente(), **cabeceras_traza()})
+                if span is not None:
+                    span.attributes["http.status_code"] = response.status_code
 
-                if response.status_code == 404:
-                    subcalendars = []  # El calendario no tiene subcalendarios
-                else:
-                    response.raise_for_status()
-                    subcalendars = response.json()
+            if response.status_code == 404:
+                subcalendars = []  # El calendario no tiene subcalendarios
+            else:
+                response.raise_for_status()
+                subcalendars = contenido_respuesta(response)
 
         except httpx.RequestError as e:
             raise HTTPException(
@@ -119,4 +330,39 @@ class EventService:
         filtro = {"idCalendario": {"$in": all_calendar_ids}}
         events = await self.crud.list_by_filter(filtro)
 
-        return events
\ No newline at end of file
+        return events
+
+
+    async def get_events_batch(self, event_ids: List[UUID]) -> EventBatch:
+        """
+        Lógica: Resuelve varios eventos con una sola consulta. Devuelve los encontrados
+        en el orden pedido (sin duplicados) y, aparte, los IDs que no existen.
+        """
+        ids = list(dict.fromkeys(event_ids))
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Se pueden pedir como máximo {MAX_BATCH_IDS} eventos por llamada ({len(ids)} recibidos)"
+            )
+
+        por_id = {event.id: event for event in await self.crud.get_many(ids)}
+        return EventBatch(
+            eventos=[por_id[event_id] for event_id in ids if event_id in por_id],
+            no_encontrados=[event_id for event_id in ids if event_id not in por_id],
+        )
+
+
+    async def list_event_ids_by_calendars(self, calendar_ids: List[UUID], limite: int) -> List[UUID]:
+        """Devuelve un lote de IDs de eventos de los calendarios indicados (para el borrado en cascada)."""
+        return await self.crud.list_ids_by_calendars(list(dict.fromkeys(calendar_ids)), limite)
+
+
+    async def purge_events(self, event_ids: List[UUID]) -> PurgeResult:
+        """Elimina un lote acotado de eventos por ID (los que ya no existen se ignoran)."""
+        ids = list(dict.fromkeys(event_ids))
+        if len(ids) > MAX_PURGE_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Se pueden eliminar como máximo {MAX_PURGE_IDS} eventos por lote ({len(ids)} recibidos)"
+            )
+        return PurgeResult(eliminados=await self.crud.delete_many(ids))
@@ -0,0 +1,235 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+import csv
+import io
+import re
+
+# Fila leída del fichero: (línea donde empieza, campos con los nombres JSON de EventCreate)
+Fila = Tuple[int, dict]
+
+# Columnas del CSV que van dentro de contenidoAdjunto.mapa
+COLUMNAS_MAPA = ("latitud", "longitud")
+
+
+class LectorCSV:
+    """
+    Lector incremental de CSV: recibe el texto en trozos de cualquier tamaño (alimentar) y
+    devuelve las filas completas que ya puede leer; el resto espera al siguiente trozo.
+    La primera fila es la cabecera, con los nombres JSON de EventCreate (idCalendario, titulo,
+    horaComienzo, duracionMinutos, lugar, organizador) y, opcionalmente, latitud y longitud.
+    Las celdas vacías cuentan como campos ausentes.
+    """
+
+    def __init__(self):
+        self._pendiente = ""
+        self._cabecera: Optional[List[str]] = None
+        self._linea = 0
+
+    def alimentar(self, texto: str) -> Iterator[Fila]:
+        """Devuelve las filas que terminan en este trozo."""
+        self._pendiente += texto
+        corte = self._ultimo_fin_de_registro()
+        if corte < 0:
+            return iter(())
+        completo, self._pendiente = self._pendiente[:corte + 1], self._pendiente[corte + 1:]
+        return self._leer(completo)
+
+    def terminar(self) -> Iterator[Fila]:
+        """Devuelve la última fila (la que no acaba en salto de línea)."""
+        completo, self._pendiente = self._pendiente, ""
+        return self._leer(completo) if completo.strip() else iter(())
+
+    def _ultimo_fin_de_registro(self) -> int:
+        """
+        Posición del último salto de línea que cierra un registro, es decir, que no está dentro
+        de un campo entre comillas (el número de comillas anteriores es par). -1 si no hay ninguno.
+        """
+        corte = self._pendiente.rfind("\n")
+        comillas = self._pendiente.count('"', 0, corte) if corte >= 0 else 0
+        while corte >= 0 and comillas % 2:
+            anterior = self._pendiente.rfind("\n", 0, corte)
+            comillas -= self._pendiente.count('"', anterior + 1, corte)
+            corte = anterior
+        return corte
+
+    def _leer(self, completo: str) -> Iterator[Fila]:
+        lector = csv.reader(io.StringIO(completo, newline=""))
+        base, inicio = self._linea, 1
+        for celdas in lector:
+            linea, inicio = base + inicio, lector.line_num + 1
+            if not any(celdas):
+                continue
+            if self._cabecera is None:
+                self._cabecera = [nombre.strip() for nombre in celdas]
+                continue
+            yield linea, self._fila(celdas)
+        self._linea = base + lector.line_num
+
+    def _fila(self, celdas: List[str]) -> dict:
+        fila = {nombre: valor.strip() for nombre, valor in zip(self._cabecera, celdas) if nombre and valor.strip()}
+        mapa = {columna: fila.pop(columna) for columna in COLUMNAS_MAPA if columna in fila}
+        if mapa:
+            fila["contenidoAdjunto"] = {"mapa": mapa}
+        return fila
+
+
+# Escapes de los valores de texto de iCalendar (RFC 5545, 3.3.11)
+_ESCAPES_ICS = re.compile(r"\\([\\;,nN])")
+_DURACION_ICS = re.compile(r"^(?P<signo>[+-])?P(?:(?P<semanas>\d+)W)?(?:(?P<dias>\d+)D)?(?:T(?:(?P<horas>\d+)H)?(?:(?P<minutos>\d+)M)?(?:(?P<segundos>\d+)S)?)?$")
+
+
+def _texto_ics(valor: str) -> str:
+    return _ESCAPES_ICS.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), valor)
+
+
+def _fecha_ics(valor: str, parametros: Dict[str, str]):
+    """
+    DTSTART/DTEND en cualquiera de sus formas: fecha (VALUE=DATE), hora local o con TZID
+    (se toma tal cual) y hora UTC con Z. Si no se entiende, se devuelve el texto para que la
+    validación de la fila informe del error.
+    """
+    try:
+        if parametros.get("VALUE") == "DATE" or len(valor) == 8:
+            return datetime.strptime(valor, "%Y%m%d")
+        return datetime.strptime(valor.rstrip("Z"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return valor
+
+
+def _duracion_ics(valor: str) -> Optional[timedelta]:
+    partes = _DURACION_ICS.match(valor)
+    if partes is None:
+        return None
+    duracion = timedelta(
+        weeks=int(partes["semanas"] or 0), days=int(partes["dias"] or 0), hours=int(partes["horas"] or 0),
+        minutes=int(partes["minutos"] or 0), seconds=int(partes["segundos"] or 0),
+    )
+    return -duracion if partes["signo"] == "-" else duracion
+
+
+def _separar(texto: str, separador: str) -> List[str]:
+    """Parte por 'separador' respetando los valores entre comillas de los parámetros."""
+    partes, actual, entre_comillas = [], [], False
+    for caracter in texto:
+        if caracter == '"':
+            entre_comillas = not entre_comillas
+        elif caracter == separador and not entre_comillas:
+            partes.append("".join(actual))
+            actual = []
+            continue
+        actual.append(caracter)
+    partes.append("".join(actual))
+    return partes
+
+
+class LectorICS:
+    """
+    Lector incremental de iCalendar: como LectorCSV, recibe el texto en trozos y devuelve cada
+    VEVENT en cuanto lee su END:VEVENT. SUMMARY es el título, DTSTART la hora de comienzo,
+    DTEND o DURATION la duración, LOCATION el lugar, ORGANIZER (su CN o su correo) el
+    organizador y GEO el mapa. El resto de propiedades y componentes se ignoran.
+    """
+
+    def __init__(self):
+        self._pendiente = ""
+        self._logica: Optional[str] = None
+        self._linea = 0
+        self._inicio_logica = 0
+        self._evento: Optional[dict] = None
+        self._inicio_evento = 0
+
+    def alimentar(self, texto: str) -> Iterator[Fila]:
+        self._pendiente += texto
+        corte = self._pendiente.rfind("\n")
+        if corte < 0:
+            return iter(())
+        completo, self._pendiente = self._pendiente[:corte], self._pendiente[corte + 1:]
+        return self._leer(completo.split("\n"))
+
+    def terminar(self) -> Iterator[Fila]:
+        lineas = [self._pendiente] if self._pendiente else []
+        self._pendiente = ""
+        yield from self._leer(lineas)
+        if self._logica is not None:
+            # La última línea lógica ya no puede continuar en otro trozo
+            fila = self._propiedad(self._logica, self._inicio_logica)
+            self._logica = None
+            if fila:
+                yield fila
+
+    def _leer(self, lineas: List[str]) -> Iterator[Fila]:
+        for linea in lineas:
+            self._linea += 1
+            linea = linea.rstrip("\r")
+            # Plegado de líneas: las que empiezan por espacio o tabulador continúan la anterior
+            if linea[:1] in (" ", "\t") and self._logica is not None:
+                self._logica += linea[1:]
+                continue
+            anterior, inicio = self._logica, self._inicio_logica
+            self._logica, self._inicio_logica = linea, self._linea
+            if anterior:
+                fila = self._propiedad(anterior, inicio)
+                if fila:
+                    yield fila
+
+    def _propiedad(self, logica: str, inicio: int) -> Optional[Fila]:
+        """Procesa una línea lógica ya desplegada; devuelve la fila al cerrar un VEVENT."""
+        nombre_y_parametros, _, valor = _separar_valor(logica)
+        nombre, *parametros = _separar(nombre_y_parametros, ";")
+        nombre = nombre.upper()
+        if nombre == "BEGIN" and valor.upper() == "VEVENT":
+            self._evento, self._inicio_evento = {}, inicio
+            return None
+        if self._evento is None:
+            return None
+        if nombre == "END" and valor.upper() == "VEVENT":
+            evento, self._evento = self._evento, None
+            return self._inicio_evento, self._fila(evento)
+        self._evento[nombre] = (valor, dict(_parametro(p) for p in parametros))
+        return None
+
+    def _fila(self, evento: Dict[str, Tuple[str, Dict[str, str]]]) -> dict:
+        fila: dict = {}
+        if "SUMMARY" in evento:
+            fila["titulo"] = _texto_ics(evento["SUMMARY"][0])
+        if "LOCATION" in evento:
+            fila["lugar"] = _texto_ics(evento["LOCATION"][0])
+        if "ORGANIZER" in evento:
+            valor, parametros = evento["ORGANIZER"]
+            fila["organizador"] = parametros.get("CN") or re.sub(r"^mailto:", "", valor, flags=re.IGNORECASE)
+        if "DTSTART" in evento:
+            comienzo = _fecha_ics(*evento["DTSTART"])
+            fila["horaComienzo"] = comienzo
+            duracion = None
+            if "DTEND" in evento:
+                fin = _fecha_ics(*evento["DTEND"])
+                if isinstance(comienzo, datetime) and isinstance(fin, datetime):
+                    duracion = fin - comienzo
+            elif "DURATION" in evento:
+                duracion = _duracion_ics(evento["DURATION"][0])
+            if duracion is not None:
+                fila["duracionMinutos"] = int(duracion.total_seconds() // 60)
+        if "GEO" in evento:
+            latitud, _, longitud = evento["GEO"][0].partition(";")
+            fila["contenidoAdjunto"] = {"mapa": {"latitud": latitud, "longitud": longitud}}
+        return fila
+
+
+def _separar_valor(logica: str) -> Tuple[str, str, str]:
+    """Separa 'NOMBRE;PARAM=...:valor' por los primeros dos puntos fuera de comillas."""
+    entre_comillas = False
+    for posicion, caracter in enumerate(logica):
+        if caracter == '"':
+            entre_comillas = not entre_comillas
+        elif caracter == ":" and not entre_comillas:
+            return logica[:posicion], ":", logica[posicion + 1:]
+    return logica, "", ""
+
+
+def _parametro(texto: str) -> Tuple[str, str]:
+    nombre, _, valor = texto.partition("=")
+    return nombre.upper(), valor.strip('"')
+
+
+# Lectores por formato de importación
+LECTORES = {"csv": LectorCSV, "ics": LectorICS}
@@ -0,0 +1,242 @@
+from typing import AsyncIterator, Callable, List, Optional, Set
+from uuid import UUID, uuid4
+from datetime import datetime
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+import codecs
+import os
+
+# Importaciones de tu proyecto
+from ..model.event_model import EventCreate
+from ..model.import_models import ImportCreate, ImportJob
+from ..crud.event_crud import EventCRUD
+from ..crud.import_crud import ImportCRUD
+from .eventService import _ubicacion_desde_contenido
+from .importReaders import LECTORES
+from .jobQueue import JobQueue
+
+# Filas validadas que se insertan de una vez (un insert_many y un progreso por lote)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Errores de fila que se guardan en la importación; del resto solo se cuentan las rechazadas
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+# Tamaño de los trozos en que se guarda el fichero subido hasta que lo procesa la cola
+IMPORT_CHUNK_BYTES = int(os.getenv("IMPORT_CHUNK_BYTES", str(1 << 20)))
+# Tiempo máximo de una importación en la cola (su lease; el del resto de trabajos es más corto)
+IMPORT_MAX_SECONDS = float(os.getenv("IMPORT_MAX_SECONDS", "3600"))
+
+
+def _mensaje(error: ValidationError) -> str:
+    """Resumen legible de los errores de validación de una fila ('campo: motivo; ...')."""
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalle['loc'])}: {detalle['msg']}" for detalle in error.errors()
+    )
+
+
+class _Lote:
+    """Filas pendientes de insertar y contadores acumulados de una importación en curso."""
+
+    def __init__(self):
+        self.eventos: List[dict] = []
+        self.errores: List[dict] = []
+        self.leidas = 0
+        self.rechazadas = 0
+        self.bytes = 0
+        self.totales = {"bytes": 0, "leidas": 0, "insertadas": 0, "rechazadas": 0}
+        self.errores_guardados = 0
+        # Calendarios cuya validación ya se encoló en esta importación
+        self.calendarios: Set[UUID] = set()
+
+
+class ImportService:
+    """
+    Importación masiva de eventos desde ficheros CSV o ICS.
+    PUT /imports/{id}/contenido solo guarda el fichero (upload) y encola 'importar'; la cola lo
+    procesa con process_upload. La CLI llama a run() directamente con los trozos del fichero.
+    El fichero se lee en trozos (nunca entero en memoria); cada fila se valida con
+    EventCreate y las válidas se insertan por lotes con EventCRUD.insert_many. El progreso y los
+    errores de las filas rechazadas se guardan tras cada lote en la importación (GET /imports/{id}).
+    Cada calendario distinto de la importación se valida una sola vez (validar_calendario en la cola),
+    no una vez por evento como en las altas individuales.
+    """
+
+    def __init__(self, crud_repository: EventCRUD, import_repository: ImportCRUD, jobs: Optional[JobQueue] = None):
+        self.crud = crud_repository
+        self.imports = import_repository
+        self.jobs = jobs
+
+
+    async def create_import(self, import_data: ImportCreate) -> ImportJob:
+        """Registra una importación pendiente; el fichero se sube después con upload() o run()."""
+        ahora = datetime.utcnow()
+        return await self.imports.create({
+            "_id": uuid4(),
+            **import_data.model_dump(by_alias=True),
+            "estado": "pendiente",
+            "bytes": 0,
+            "leidas": 0,
+            "insertadas": 0,
+            "rechazadas": 0,
+            "errores": [],
+            "error": None,
+            "creadoEn": ahora,
+            "actualizadoEn": ahora,
+            "completadoEn": None,
+        })
+
+
+    async def get_import(self, import_id: UUID) -> ImportJob:
+        """Devuelve una importación o 404 si no existe."""
+        job = await self.imports.get_by_id(import_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Importación con ID {import_id} no encontrada")
+        return job
+
+
+    async def list_imports(self, estado: Optional[str], limite: int) -> List[ImportJob]:
+        """Importaciones más recientes, opcionalmente filtradas por estado."""
+        return await self.imports.list_by_filter({"estado": estado} if estado else {}, limite)
+
+
+    async def upload(self, import_id: UUID, trozos: AsyncIterator[bytes]) -> ImportJob:
+        """
+        Guarda el fichero de la importación según llega, en trozos de IMPORT_CHUNK_BYTES, y encola
+        su procesamiento ('importar'). Devuelve la importación 'en_cola'. 404 si no existe, 409 si
+        ya se subió su fichero. Si la subida se corta, la importación queda fallida.
+        """
+        job = await self.imports.claim(import_id, desde="pendiente", estado="recibiendo")
+        if job is None:
+            await self.get_import(import_id)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="El fichero de la importación ya se ha subido")
+
+        pendiente, orden = bytearray(), 0
+        try:
+            async for trozo in trozos:
+                pendiente += trozo
+                if len(pendiente) >= IMPORT_CHUNK_BYTES:
+                    await self.imports.save_chunk(import_id, orden, bytes(pendiente))
+                    pendiente.clear()
+                    orden += 1
+            if pendiente:
+                await self.imports.save_chunk(import_id, orden, bytes(pendiente))
+        except BaseException as error:
+            # Cliente desconectado, error de la BD...: el fichero a medias no se procesa
+            await self.imports.delete_chunks(import_id)
+            await self.imports.finish(import_id, {"estado": "fallido", "error": str(error) or type(error).__name__})
+            raise
+
+        job = await self.imports.claim(import_id, desde="recibiendo", estado="en_cola")
+        await self.jobs.enqueue("importar", {"idImportacion": str(import_id)}, clave_dedup=f"importar:{import_id}")
+        return job
+
+
+    async def process_upload(self, import_id: UUID) -> ImportJob:
+        """
+        Procesa con run() el fichero guardado por upload() y después borra sus trozos (trabajo
+        'importar'). Si un intento anterior se cortó a mitad (caída del proceso) la importación
+        queda fallida: repetirla duplicaría los lotes ya insertados.
+        """
+        try:
+            job = await self.get_import(import_id)
+            if job.estado == "en_curso":
+                return await self.imports.finish(import_id, {"estado": "fallido", "error": "La importación se interrumpió a mitad"})
+            return await self.run(import_id, self.imports.chunks(import_id))
+        finally:
+            await self.imports.delete_chunks(import_id)
+
+
+    async def run(
+        self,
+        import_id: UUID,
+        trozos: AsyncIterator[bytes],
+        progreso: Optional[Callable[[dict], None]] = None,
+    ) -> ImportJob:
+        """
+        Lee el fichero de la importación (trozos de bytes en UTF-8) e inserta sus eventos.
+        Cada importación se ejecuta una sola vez: 409 si ya se empezó (o si su fichero se está
+        subiendo con upload() y aún no está en la cola). Si el fichero no es
+        UTF-8 la importación queda fallida (400); lo insertado en lotes anteriores se mantiene.
+        'progreso' recibe los contadores acumulados tras cada lote (p.ej. para la CLI).
+        """
+        job = await self.imports.claim(import_id, desde="pendiente", estado="en_curso")
+        job = job or await self.imports.claim(import_id, desde="en_cola", estado="en_curso")
+        if job is None:
+            await self.get_import(import_id)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="La importación ya se ha ejecutado")
+
+        defectos = {"idCalendario": job.id_calendario, "organizador": job.organizador}
+        defectos = {campo: valor for campo, valor in defectos.items() if valor is not None}
+        lector = LECTORES[job.formato]()
+        decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+        lote = _Lote()
+
+        try:
+            async for trozo in trozos:
+                lote.bytes += len(trozo)
+                for linea, fila in lector.alimentar(decodificador.decode(trozo)):
+                    self._validar(lote, linea, {**defectos, **fila})
+                    if len(lote.eventos) >= IMPORT_BATCH_SIZE:
+                        await self._volcar(import_id, lote, progreso)
+            for linea, fila in [*lector.alimentar(decodificador.decode(b"", final=True)), *lector.terminar()]:
+                self._validar(lote, linea, {**defectos, **fila})
+            await self._volcar(import_id, lote, progreso)
+        except UnicodeDecodeError as error:
+            await self._volcar(import_id, lote, progreso)
+            await self.imports.finish(import_id, {"estado": "fallido", "error": f"El fichero no está en UTF-8: {error}"})
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El fichero no está en UTF-8")
+        except BaseException as error:
+            # Cliente desconectado, error de la BD...: la importación no se puede reanudar
+            await self.imports.finish(import_id, {"estado": "fallido", "error": str(error) or type(error).__name__})
+            raise
+
+        terminado = await self.imports.finish(import_id, {"estado": "completado"})
+        if self.jobs is not None:
+            # Una sola notificación por importación, no una por evento insertado
+            await self.jobs.enqueue(
+                "notificar", {"evento": "importacion.completada", "id": str(import_id)},
+                clave_dedup=f"notificar:importacion.completada:{import_id}",
+            )
+        return terminado
+
+
+    def _validar(self, lote: _Lote, linea: int, fila: dict) -> None:
+        """Valida una fila con EventCreate: la añade al lote o anota su error."""
+        lote.leidas += 1
+        try:
+            evento = EventCreate.model_validate(fila).model_dump(by_alias=True)
+        except ValidationError as error:
+            lote.rechazadas += 1
+            if lote.errores_guardados + len(lote.errores) < IMPORT_MAX_ERRORS:
+                lote.errores.append({"linea": linea, "error": _mensaje(error)})
+            return
+        evento["_id"] = uuid4()
+        evento["ubicacion"] = _ubicacion_desde_contenido(evento.get("contenidoAdjunto"))
+        lote.eventos.append(evento)
+
+
+    async def _volcar(self, import_id: UUID, lote: _Lote, progreso: Optional[Callable[[dict], None]]) -> None:
+        """Inserta las filas válidas del lote y suma su progreso a la importación."""
+        insertadas = await self.crud.insert_many(lote.eventos)
+        await self._validar_calendarios(import_id, lote)
+        incremento = {"bytes": lote.bytes, "leidas": lote.leidas, "insertadas": insertadas, "rechazadas": lote.rechazadas}
+        await self.imports.update_progress(import_id, incremento, lote.errores)
+        for campo, valor in incremento.items():
+            lote.totales[campo] += valor
+        lote.errores_guardados += len(lote.errores)
+        lote.eventos, lote.errores = [], []
+        lote.leidas = lote.rechazadas = lote.bytes = 0
+        if progreso is not None:
+            progreso(dict(lote.totales))
+
+
+    async def _validar_calendarios(self, import_id: UUID, lote: _Lote) -> None:
+        """Encola la validación de los calendarios del lote que aún no se han validado en la importación."""
+        if self.jobs is None:
+            return
+        for calendario in dict.fromkeys(evento["idCalendario"] for evento in lote.eventos):
+            if calendario in lote.calendarios:
+                continue
+            lote.calendarios.add(calendario)
+            await self.jobs.enqueue(
+                "validar_calendario", {"idImportacion": str(import_id), "idCalendario": str(calendario)},
+                clave_dedup=f"validar_calendario:importacion:{import_id}:{calendario}",
+            )
@@ -0,0 +1,72 @@
+from typing import Optional
+from uuid import UUID
+from fastapi import HTTPException
+import httpx
+import logging
+import os
+
+# Importaciones de tu proyecto
+from ..encoding import cabeceras_cliente
+from .jobQueue import JobQueue, ErrorPermanente
+from .importService import ImportService, IMPORT_MAX_SECONDS
+
+CALENDAR_SERVICE_URL = os.getenv("CALENDAR_SERVICE_URL", "http://calendar_service:8000")
+# Destino de las notificaciones (POST con JSON). Sin configurar solo se registran en el log.
+NOTIFICATIONS_WEBHOOK_URL = os.getenv("NOTIFICATIONS_WEBHOOK_URL", "")
+# Llamadas simultáneas a otros servicios desde la cola (en cada proceso)
+MAX_LLAMADAS_EXTERNAS = int(os.getenv("JOBS_MAX_HTTP_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+
+
+async def notificar(payload: dict) -> dict:
+    """Envía la notificación de un cambio (p.ej. evento.creado) al webhook configurado."""
+    if not NOTIFICATIONS_WEBHOOK_URL:
+        logger.info("Notificación %s de %s (sin NOTIFICATIONS_WEBHOOK_URL)", payload["evento"], payload["id"])
+        return {"enviada": False}
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.post(NOTIFICATIONS_WEBHOOK_URL, json=payload)
+    # Un error del webhook (o de red) lanza la excepción: la cola reintenta con espera
+    response.raise_for_status()
+    return {"enviada": True, "status": response.status_code}
+
+
+async def validar_calendario(payload: dict) -> dict:
+    """
+    Validación cruzada de un evento recién creado (idEvento) o de los eventos de una importación
+    con el mismo calendario (idImportacion): comprueba en el servicio de calendarios que el
+    calendario existe. Los eventos huérfanos se registran en el log y en el resultado.
+    """
+    url = f"{CALENDAR_SERVICE_URL}/calendars/{payload['idCalendario']}"
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url, headers=cabeceras_cliente())
+    if response.status_code == 404:
+        if "idImportacion" in payload:
+            logger.warning(
+                "La importación %s tiene eventos de un calendario inexistente (%s)", payload["idImportacion"], payload["idCalendario"]
+            )
+        else:
+            logger.warning("El evento %s pertenece a un calendario inexistente (%s)", payload["idEvento"], payload["idCalendario"])
+        return {"calendarioExiste": False}
+    response.raise_for_status()
+    return {"calendarioExiste": True}
+
+
+def registrar_manejadores(
+    queue: JobQueue, imports: ImportService, max_llamadas: Optional[int] = MAX_LLAMADAS_EXTERNAS
+) -> None:
+    """Registra en la cola los trabajos del servicio de eventos."""
+
+    async def importar(payload: dict) -> dict:
+        """Procesa el fichero subido a una importación (PUT /imports/{id}/contenido)."""
+        try:
+            job = await imports.process_upload(UUID(payload["idImportacion"]))
+        except HTTPException as e:
+            # Fichero que no es UTF-8, importación ya ejecutada...: reintentar no lo arregla
+            raise ErrorPermanente(e.detail)
+        return {"estado": job.estado, "insertadas": job.insertadas, "rechazadas": job.rechazadas}
+
+    queue.registrar("notificar", notificar, max_concurrencia=max_llamadas)
+    queue.registrar("validar_calendario", validar_calendario, max_concurrencia=max_llamadas)
+    # Una importación a la vez en cada proceso: ya escribe por lotes y puede durar minutos
+    queue.registrar("importar", importar, max_concurrencia=1, lease_segundos=IMPORT_MAX_SECONDS)
@@ -0,0 +1,253 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from fastapi import HTTPException, status
+import asyncio
+import logging
+import os
+import random
+import socket
+
+# Importaciones de tu proyecto
+from ..model.job_models import Job
+from ..crud.job_crud import JobCRUD
+
+# Trabajadores de la cola en cada proceso de la API. Con 0 la API solo encola y los
+# trabajos los ejecuta un proceso aparte: python -m app.job_worker
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# Cada cuánto se busca trabajo si no llega ningún aviso (trabajos de otros procesos, reintentos)
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1"))
+# Tiempo máximo de un intento: pasado este tiempo otro proceso puede tomar el trabajo
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+# Espera entre reintentos: exponencial desde la base, con tope y aleatorizada
+JOBS_BACKOFF_BASE_SECONDS = float(os.getenv("JOBS_BACKOFF_BASE_SECONDS", "2"))
+JOBS_BACKOFF_MAX_SECONDS = float(os.getenv("JOBS_BACKOFF_MAX_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+Manejador = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+class ErrorPermanente(Exception):
+    """Error de un manejador que no se arregla reintentando: el trabajo falla sin más intentos."""
+
+
+@dataclass
+class _Registro:
+    funcion: Manejador
+    max_concurrencia: Optional[int]
+    max_intentos: int
+    lease_segundos: float
+
+
+def espera_reintento(intento: int) -> float:
+    """Segundos hasta el siguiente intento: base·2^(intento-1) con tope, entre el 50 % y el 100 %."""
+    espera = min(JOBS_BACKOFF_MAX_SECONDS, JOBS_BACKOFF_BASE_SECONDS * 2 ** (intento - 1))
+    return espera * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    """
+    Cola de trabajos persistente en MongoDB para los efectos secundarios de las escrituras
+    (notificaciones, validaciones cruzadas...). Las peticiones solo encolan; los trabajos los
+    ejecuta un grupo de trabajadores asíncronos, en el propio proceso de la API o en uno
+    aparte (app.job_worker), con reintentos con espera exponencial, claves de deduplicación
+    y un límite de trabajos simultáneos por tipo en cada proceso.
+    """
+
+    def __init__(self, job_repository: JobCRUD):
+        self.jobs = job_repository
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._manejadores: Dict[str, _Registro] = {}
+        self._en_curso: Dict[str, int] = {}
+        self._aviso: Optional[asyncio.Event] = None
+        self._trabajadores: Set[asyncio.Task] = set()
+
+
+    def registrar(
+        self,
+        tipo: str,
+        funcion: Manejador,
+        max_concurrencia: Optional[int] = None,
+        max_intentos: int = JOBS_MAX_ATTEMPTS,
+        lease_segundos: float = JOBS_LEASE_SECONDS,
+    ) -> None:
+        """
+        Registra el manejador de un tipo de trabajo: una corrutina que recibe el payload y
+        devuelve un resultado opcional (dict). Si lanza una excepción el trabajo se reintenta;
+        si lanza ErrorPermanente, falla directamente. 'lease_segundos' es el tiempo máximo de
+        un intento, para los trabajos que tardan más que JOBS_LEASE_SECONDS.
+        """
+        self._manejadores[tipo] = _Registro(funcion, max_concurrencia, max_intentos, lease_segundos)
+        self._en_curso.setdefault(tipo, 0)
+
+
+    async def enqueue(
+        self,
+        tipo: str,
+        payload: Dict[str, Any],
+        clave_dedup: Optional[str] = None,
+        retraso_segundos: float = 0,
+    ) -> Job:
+        """
+        Encola un trabajo y despierta a los trabajadores del proceso. Con 'clave_dedup', si
+        ya hay un trabajo activo (pendiente o en curso) con la misma clave se devuelve ese.
+        """
+        if tipo not in self._manejadores:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        ahora = datetime.utcnow()
+        job_data = {
+            "_id": uuid4(),
+            "tipo": tipo,
+            "payload": payload,
+            "estado": "pendiente",
+            "intentos": 0,
+            "maxIntentos": self._manejadores[tipo].max_intentos,
+            "disponibleEn": ahora + timedelta(seconds=retraso_segundos),
+            "error": None,
+            "resultado": None,
+            "creadoEn": ahora,
+            "actualizadoEn": ahora,
+            "terminadoEn": None,
+            "propietario": None,
+            "leaseHasta": None,
+        }
+        if clave_dedup is not None:
+            job_data["claveDedup"] = clave_dedup
+        job, creado = await self.jobs.enqueue(job_data)
+        if creado and self._aviso is not None:
+            self._aviso.set()
+        return job
+
+
+    async def get_job(self, job_id: UUID) -> Job:
+        """Devuelve el estado de un trabajo. Lanza 404 si no existe."""
+        job = await self.jobs.get_by_id(job_id)
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Trabajo con ID {job_id} no encontrado"
+            )
+        return job
+
+
+    async def list_jobs(self, estado: Optional[str], tipo: Optional[str], limite: int) -> List[Job]:
+        """Lista los trabajos más recientes, opcionalmente filtrados por estado o tipo."""
+        filtro = {}
+        if estado:
+            filtro["estado"] = estado
+        if tipo:
+            filtro["tipo"] = tipo
+        return await self.jobs.list_by_filter(filtro, limite)
+
+
+    async def stats(self) -> dict:
+        """Trabajos por tipo y estado, y ocupación de los trabajadores de este proceso."""
+        por_tipo: Dict[str, Dict[str, int]] = {}
+        for fila in await self.jobs.count_by_state():
+            por_tipo.setdefault(fila["_id"]["tipo"], {})[fila["_id"]["estado"]] = fila["total"]
+        return {
+            "trabajos": por_tipo,
+            "proceso": {
+                "trabajadores": len(self._trabajadores),
+                "enCurso": {tipo: n for tipo, n in self._en_curso.items() if n},
+            },
+        }
+
+
+    # --- Ejecución ---
+
+    def iniciar(self, trabajadores: int = JOBS_WORKERS) -> None:
+        """Arranca los trabajadores de este proceso (dentro de un bucle de eventos en marcha)."""
+        self._aviso = asyncio.Event()
+        for n in range(trabajadores):
+            self._trabajadores.add(asyncio.create_task(self._trabajador(), name=f"cola-trabajos-{n}"))
+
+
+    async def detener(self) -> None:
+        """Para los trabajadores; los trabajos interrumpidos vuelven a la cola sin gastar el intento."""
+        for tarea in list(self._trabajadores):
+            tarea.cancel()
+        await asyncio.gather(*self._trabajadores, return_exceptions=True)
+        self._trabajadores.clear()
+
+
+    def _tipos_con_hueco(self) -> List[str]:
+        return [
+            tipo for tipo, registro in self._manejadores.items()
+            if registro.max_concurrencia is None or self._en_curso[tipo] < registro.max_concurrencia
+        ]
+
+
+    async def _trabajador(self) -> None:
+        while True:
+            try:
+                # Se limpia el aviso ANTES de buscar: un encolado posterior vuelve a despertarlo
+                self._aviso.clear()
+                if await self.ejecutar_siguiente():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error al tomar trabajos de la cola")
+            try:
+                await asyncio.wait_for(self._aviso.wait(), JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def ejecutar_siguiente(self) -> bool:
+        """Toma y ejecuta un trabajo disponible. Devuelve False si no había ninguno."""
+        tipos = self._tipos_con_hueco()
+        if not tipos:
+            return False
+        job = await self.jobs.claim(tipos, self.propietario, JOBS_LEASE_SECONDS)
+        if job is None:
+            return False
+        await self._ejecutar(job)
+        return True
+
+
+    async def procesar_pendientes(self) -> int:
+        """Ejecuta en este proceso los trabajos disponibles hasta vaciar la cola. Devuelve cuántos."""
+        ejecutados = 0
+        while await self.ejecutar_siguiente():
+            ejecutados += 1
+        return ejecutados
+
+
+    async def _ejecutar(self, job: dict) -> None:
+        job_id, tipo = job["_id"], job["tipo"]
+        registro = self._manejadores[tipo]
+        if job["intentos"] > job["maxIntentos"]:
+            # Solo pasa si los procesos que lo tomaron cayeron a mitad de cada intento
+            await self.jobs.fail(job_id, self.propietario, job.get("error") or "Intentos agotados")
+            return
+
+        self._en_curso[tipo] += 1
+        try:
+            if registro.lease_segundos != JOBS_LEASE_SECONDS:
+                await self.jobs.extend_lease(job_id, self.propietario, registro.lease_segundos)
+            # Un intento no puede durar más que su lease: después otro proceso podría repetirlo
+            resultado = await asyncio.wait_for(registro.funcion(job["payload"]), registro.lease_segundos)
+        except asyncio.CancelledError:
+            await self.jobs.release(job_id, self.propietario)
+            raise
+        except ErrorPermanente as e:
+            logger.warning("Trabajo %s (%s) descartado: %s", job_id, tipo, e)
+            await self.jobs.fail(job_id, self.propietario, str(e))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["intentos"] >= job["maxIntentos"]:
+                logger.exception("Trabajo %s (%s) fallido tras %d intentos", job_id, tipo, job["intentos"])
+                await self.jobs.fail(job_id, self.propietario, error)
+            else:
+                espera = espera_reintento(job["intentos"])
+                logger.warning("Trabajo %s (%s) falló (%s); reintento en %.1fs", job_id, tipo, error, espera)
+                await self.jobs.retry(job_id, self.propietario, error, datetime.utcnow() + timedelta(seconds=espera))
+        else:
+            await self.jobs.complete(job_id, self.propietario, resultado)
+        finally:
+            self._en_curso[tipo] -= 1
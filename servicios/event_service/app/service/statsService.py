@@ -0,0 +1,31 @@
+from typing import List, Optional
+from uuid import UUID
+
+# Importaciones de tu proyecto
+from ..model.stats_models import EventosPorMes, MinutosPorOrganizador
+from ..crud.stats_crud import EventStatsCRUD  # Usamos el CRUD inyectado
+
+
+class StatsService:
+    """
+    Capa de Servicio para las estadísticas de eventos.
+    Lee los agregados que mantienen incrementalmente las escrituras de eventos.
+    """
+    def __init__(self, stats_repository: EventStatsCRUD):
+        """Inyección de Dependencia del CRUD/Repository."""
+        self.stats = stats_repository
+
+
+    async def get_events_per_month(self, calendar_id: UUID) -> List[EventosPorMes]:
+        """Obtiene el número de eventos por mes de un calendario."""
+        return [EventosPorMes(**fila) for fila in await self.stats.get_events_per_month(calendar_id)]
+
+
+    async def get_minutes_per_organizer(self, organizador: Optional[str] = None) -> List[MinutosPorOrganizador]:
+        """Obtiene los minutos programados por organizador (opcionalmente de uno solo)."""
+        return [MinutosPorOrganizador(**fila) for fila in await self.stats.get_minutes_per_organizer(organizador)]
+
+
+    async def rebuild(self) -> None:
+        """Recalcula los agregados desde cero (reparación de derivas)."""
+        await self.stats.rebuild()
@@ -0,0 +1,287 @@
+"""
+Trazas distribuidas con propagación de contexto W3C (cabecera 'traceparent').
+
+- TracingMiddleware abre un span por petición HTTP, continuando la traza de la cabecera
+  'traceparent' entrante (si la hay) y respetando su decisión de muestreo.
+- cabeceras_traza() devuelve la cabecera para las llamadas salientes a otros servicios.
+- MongoTracingListener convierte cada comando de MongoDB en un span hijo del actual
+  (monitorización de comandos del driver).
+
+Configuración (variables de entorno):
+    TRACING_EXPORTER     'none' (por defecto: no se registra nada), 'console' (stderr) o 'file'
+    TRACING_FILE         fichero JSON Lines del exportador 'file' (por defecto traces.jsonl)
+    TRACING_SAMPLE_RATE  fracción de las trazas nuevas que se muestrean (por defecto 1).
+                         Las que llegan con 'traceparent' siguen la decisión de quien llama.
+
+Sin exportador solo se reenvía la cabecera entrante y no se registra el listener de MongoDB.
+Una petición no muestreada no crea ningún span: cuesta una consulta a un ContextVar.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from pymongo import monitoring
+
+EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+ENABLED = EXPORTER in ("console", "file")
+SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1")) if ENABLED else 0.0
+
+# Cabecera de contexto W3C: versión-traceid-parentid-flags
+TRACEPARENT = "traceparent"
+FLAG_MUESTREADO = 0x01
+
+
+class Span:
+    """Un tramo de la traza: nombre, tiempos, atributos y su posición en el árbol."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "status", "_inicio", "_inicio_ns")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self._inicio = time.time()
+        self._inicio_ns = time.perf_counter_ns()
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{FLAG_MUESTREADO:02x}"
+
+    def finish(self) -> None:
+        duracion_ms = (time.perf_counter_ns() - self._inicio_ns) / 1e6
+        _exportador.export({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": _servicio,
+            "startTime": datetime.fromtimestamp(self._inicio, timezone.utc).isoformat(),
+            "durationMs": round(duracion_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+        })
+
+
+# --- Exportadores ---
+
+class ConsoleExporter:
+    """Escribe cada span terminado como una línea JSON en stderr."""
+
+    def export(self, span: dict) -> None:
+        print(json.dumps(span, default=str), file=sys.stderr, flush=True)
+
+
+class FileExporter:
+    """
+    Añade cada span terminado como una línea JSON a un fichero. Varios procesos pueden
+    compartirlo: cada línea se escribe con una sola llamada en modo 'append'.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fichero = None
+
+    def export(self, span: dict) -> None:
+        linea = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            if self._fichero is None:
+                self._fichero = open(self.path, "a", buffering=1, encoding="utf-8")
+            self._fichero.write(linea)
+
+
+def _crear_exportador():
+    if EXPORTER == "file":
+        return FileExporter(TRACE_FILE)
+    return ConsoleExporter()
+
+
+_exportador = _crear_exportador()
+# Nombre del servicio en los spans (lo fija TracingMiddleware)
+_servicio = ""
+
+# Span activo de la petición (o tarea) en curso
+_span_actual: ContextVar[Optional[Span]] = ContextVar("span_actual", default=None)
+# Cabecera entrante no muestreada: se reenvía tal cual para no romper la traza de quien llama
+_traceparent_entrante: ContextVar[Optional[str]] = ContextVar("traceparent_entrante", default=None)
+
+
+def parse_traceparent(valor: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_id, muestreado) de una cabecera traceparent, o None si no es válida."""
+    if not valor:
+        return None
+    partes = valor.strip().split("-")
+    if len(partes) < 4 or len(partes[1]) != 32 or len(partes[2]) != 16 or len(partes[3]) != 2:
+        return None
+    try:
+        if int(partes[1], 16) == 0 or int(partes[2], 16) == 0:
+            return None
+        flags = int(partes[3], 16)
+    except ValueError:
+        return None
+    return partes[1], partes[2], bool(flags & FLAG_MUESTREADO)
+
+
+def current_span() -> Optional[Span]:
+    return _span_actual.get()
+
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[dict] = None) -> Iterator[Optional[Span]]:
+    """
+    Abre un span hijo del actual mientras dura el bloque. Si no hay traza muestreada en
+    curso no hace nada (devuelve None), así que puede envolver código caliente.
+    """
+    padre = _span_actual.get()
+    if padre is None:
+        yield None
+        return
+    span = Span(padre.trace_id, padre.span_id, name, kind, attributes)
+    token = _span_actual.set(span)
+    try:
+        yield span
+    except BaseException:
+        span.status = "error"
+        raise
+    finally:
+        _span_actual.reset(token)
+        span.finish()
+
+
+def cabeceras_traza() -> Dict[str, str]:
+    """Cabecera traceparent para una llamada saliente (vacía si no hay traza en curso)."""
+    span = _span_actual.get()
+    if span is not None:
+        return {TRACEPARENT: span.traceparent()}
+    entrante = _traceparent_entrante.get()
+    return {TRACEPARENT: entrante} if entrante else {}
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI: un span 'server' por petición HTTP. Continúa la traza entrante si viene
+    muestreada; si no viene ninguna, muestrea trazas nuevas con probabilidad SAMPLE_RATE.
+    """
+
+    def __init__(self, app, service_name: str, sample_rate: Optional[float] = None):
+        global _servicio
+        _servicio = service_name
+        self.app = app
+        self.sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+        self.enabled = ENABLED
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabecera = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"traceparent":
+                cabecera = valor.decode("latin-1")
+                break
+        contexto = parse_traceparent(cabecera)
+
+        if contexto is not None:
+            trace_id, parent_id, muestreado = contexto
+            muestreado = muestreado and self.enabled
+        else:
+            trace_id, parent_id = None, None
+            muestreado = self.sample_rate > 0 and random.random() < self.sample_rate
+
+        if not muestreado:
+            if contexto is None:
+                await self.app(scope, receive, send)
+                return
+            token = _traceparent_entrante.set(cabecera)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _traceparent_entrante.reset(token)
+            return
+
+        span = Span(trace_id or f"{random.getrandbits(128):032x}", parent_id, f"{scope['method']} {scope['path']}", "server", {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+        token = _span_actual.set(span)
+
+        async def send_con_estado(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    span.status = "error"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_con_estado)
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            _span_actual.reset(token)
+            # Tras el enrutado FastAPI deja la ruta en el scope: el nombre agrupa por plantilla
+            ruta = scope.get("route")
+            if ruta is not None and getattr(ruta, "path", None):
+                span.name = f"{scope['method']} {ruta.path}"
+                span.attributes["http.route"] = ruta.path
+            span.finish()
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    """
+    Convierte cada comando de MongoDB en un span hijo del span activo. El driver síncrono
+    emite los eventos en el mismo hilo (y contexto) que hizo la llamada.
+    """
+
+    def __init__(self):
+        self._pendientes: Dict[Tuple[int, object], Span] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        padre = _span_actual.get()
+        if padre is None:
+            return
+        coleccion = event.command.get(event.command_name)
+        atributos = {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "net.peer.name": str(event.connection_id),
+        }
+        if isinstance(coleccion, str):
+            atributos["db.mongodb.collection"] = coleccion
+        nombre = f"mongo {event.command_name} {coleccion}" if isinstance(coleccion, str) else f"mongo {event.command_name}"
+        self._pendientes[(event.request_id, event.connection_id)] = Span(padre.trace_id, padre.span_id, nombre, "client", atributos)
+
+    def _terminar(self, event, error: bool) -> None:
+        span = self._pendientes.pop((event.request_id, event.connection_id), None)
+        if span is None:
+            return
+        span.attributes["db.duration_ms"] = event.duration_micros / 1000
+        if error:
+            span.status = "error"
+            span.attributes["error"] = str(event.failure.get("errmsg", ""))
+        span.finish()
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._terminar(event, False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._terminar(event, True)
+
+
+def mongo_listeners() -> list:
+    """Listeners para el MongoClient: ninguno si no hay exportador configurado."""
+    return [MongoTracingListener()] if ENABLED else []
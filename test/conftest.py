@@ -1,33 +1,34 @@
-import pytest
-from pymongo import MongoClient
 import os
 
-# Importamos las colecciones que serán "monkeypatched"
-from app.database import calendarios_collection, eventos_collection
+import pytest
 
-# Cambiamos el scope a "function". Esta fixture se ejecutará ANTES de CADA test.
-@pytest.fixture(scope="function", autouse=True)
-def test_db(monkeypatch):
-    # Nombre para la base de datos de prueba
-    test_db_name = "KalendasDB_Test"
-    uri = os.getenv('MONGODB_URI')
-    if not uri:
-        raise ValueError("La variable de entorno MONGODB_URI no está configurada.")
+# Los tests usan el motor en memoria: no necesitan MongoDB y cada proceso (p.ej. cada
+# worker de pytest-xdist) tiene sus propios datos. Debe fijarse antes de importar las apps.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("MONGODB_TRANSACTIONS", "false")
 
-    # Creamos un cliente que apunta a la BBDD de test
-    test_client = MongoClient(uri, uuidRepresentation='standard')
-    test_db = test_client[test_db_name]
+from servicios.calendar_service.app import dependencies as calendar_dependencies
+from servicios.calendar_service.app.storage import MemoryStorage as CalendarMemoryStorage
+from servicios.event_service.app import dependencies as event_dependencies
+from servicios.event_service.app.storage import MemoryStorage as EventMemoryStorage
+from servicios.comment_service.app import dependencies as comment_dependencies
+from servicios.comment_service.app.storage import MemoryStorage as CommentMemoryStorage
 
-    # Reemplazamos los objetos de la BBDD en app.database con los de test
-    monkeypatch.setattr("app.database.client", test_client)
-    monkeypatch.setattr("app.database.db", test_db)
-    monkeypatch.setattr("app.database.calendarios_collection", test_db["calendarios"])
-    monkeypatch.setattr("app.database.eventos_collection", test_db["eventos"])
 
-    print(f"\n--- Usando BBDD de test: {test_db_name} ---")
+# Esta fixture se ejecuta ANTES de CADA test: cada uno empieza con almacenes vacíos
+@pytest.fixture(scope="function", autouse=True)
+def test_storage():
+    almacenes = {
+        "calendar": CalendarMemoryStorage(),
+        "event": EventMemoryStorage(),
+        "comment": CommentMemoryStorage(),
+    }
+    calendar_dependencies.configure_storage(almacenes["calendar"])
+    event_dependencies.configure_storage(almacenes["event"])
+    comment_dependencies.configure_storage(almacenes["comment"])
 
     # Ejecutar tests
-    yield
+    yield almacenes
 
-    test_client.drop_database(test_db_name)
-    test_client.close()
\ No newline at end of file
+    for almacen in almacenes.values():
+        almacen.close()
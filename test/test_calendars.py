@@ -1,8 +1,20 @@
+from datetime import datetime, timedelta
+from uuid import UUID
 from fastapi.testclient import TestClient
 from servicios.calendar_service.app.main import app
+from servicios.calendar_service.app import dependencies as calendar_dependencies
+from servicios.calendar_service.app.crud.deletion_job_crud import DeletionJobCRUD
+from servicios.calendar_service.app.service import cascadeService
+from servicios.calendar_service.app.service.cascadeService import CascadeDeleteService
+from servicios.event_service.app.main import app as event_app
+from servicios.comment_service.app.main import app as comment_app
+import asyncio
+import httpx
 import json
 
 client = TestClient(app)
+event_client = TestClient(event_app)
+comment_client = TestClient(comment_app)
 
 def test_list_calendars():
     response = client.get("/calendars/")
@@ -88,7 +100,7 @@ def test_delete_calendar():
 
     # Lo eliminamos
     delete_response = client.delete(f"/calendars/{calendar_id}")
-    assert delete_response.status_code == 204
+    assert delete_response.status_code == 202
 
     # Verificamos que ya no existe (debería dar 404)
     get_response = client.get(f"/calendars/{calendar_id}")
@@ -100,5 +112,153 @@ def test_delete_calendar_not_found():
     assert response.status_code == 404
 
 
+# --- Tests de la búsqueda por lotes ---
 
+def test_lookup_calendars_keeps_requested_order_and_reports_missing():
+    ids = [client.post("/calendars/", json={"titulo": f"Lote {i}", "organizador": "Test lookup"}).json()["_id"] for i in range(3)]
+    inexistente = "12345678-1234-5678-1234-567812345678"
+    pedidos = [ids[1], ids[1], inexistente, ids[0]]
 
+    response = client.post("/calendars/lookup", json={"ids": pedidos})
+    assert response.status_code == 200
+    data = response.json()
+    assert [c["_id"] for c in data["calendarios"]] == [ids[1], ids[0]]
+    assert data["noEncontrados"] == [inexistente]
+    assert client.get("/calendars/lookup", params={"ids": pedidos}).json() == data
+
+# --- Tests de ETag / If-None-Match / If-Match ---
+
+def test_calendar_etag_and_if_match():
+    calendario = {"titulo": "Con ETag", "organizador": "Test ETag"}
+    calendar_id = client.post("/calendars/", json=calendario).json()["_id"]
+    assert client.get(f"/calendars/{calendar_id}").headers["ETag"] == '"1"'
+    assert client.get(f"/calendars/{calendar_id}", headers={"If-None-Match": '"1"'}).status_code == 304
+
+    response = client.put(f"/calendars/{calendar_id}", json={**calendario, "titulo": "Uno"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+    assert client.put(f"/calendars/{calendar_id}", json={**calendario, "titulo": "Dos"}, headers={"If-Match": '"1"'}).status_code == 412
+    assert client.put(f"/calendars/{calendar_id}", json={**calendario, "titulo": "Tres"}, headers={"If-Match": "*"}).status_code == 200
+    # La versión 1 ya no es la vigente
+    response = client.get(f"/calendars/{calendar_id}", headers={"If-None-Match": '"1"'})
+    assert response.status_code == 200 and response.json()["titulo"] == "Tres"
+
+# --- Tests de la caché de listados ---
+
+def test_list_cache_serves_repeats_until_a_write():
+    client.post("/calendars/", json={"titulo": "Cacheado", "organizador": "Test caché"})
+    filtros = {"organizador": "Test caché"}
+
+    primera = client.get("/calendars/", params=filtros).json()
+    assert client.get("/calendars/", params=filtros).json() == primera
+    listados = client.get("/metrics/cache").json()["listadosCalendarios"]
+    assert (listados["hits"], listados["misses"]) == (1, 1)
+
+    client.put(f"/calendars/{primera[0]['_id']}", json={"titulo": "Renombrado", "organizador": "Test caché"})
+    assert [c["titulo"] for c in client.get("/calendars/", params=filtros).json()] == ["Renombrado"]
+
+# --- Tests del borrado en cascada ---
+
+def _jerarquia_con_contenido():
+    """Calendario raíz con un subcalendario, un evento en cada uno y comentarios de ambos tipos."""
+    raiz = client.post("/calendars/", json={"titulo": "Raíz", "organizador": "Test cascada"}).json()["_id"]
+    hijo = client.post("/calendars/", json={"titulo": "Hijo", "organizador": "Test cascada", "idCalendarioPadre": raiz}).json()["_id"]
+    eventos = []
+    for calendario in (raiz, hijo):
+        response = event_client.post("/events/", json={
+            "idCalendario": calendario, "titulo": "Evento", "horaComienzo": "2025-11-10T10:00:00",
+            "duracionMinutos": 60, "lugar": "Sala", "organizador": "Test cascada",
+        })
+        eventos.append(response.json()["_id"])
+    comment_client.post("/comments/", json={"contenido": "Del evento", "idEvento": eventos[0]})
+    comment_client.post("/comments/", json={"contenido": "Otro del evento", "idEvento": eventos[0]})
+    comment_client.post("/comments/", json={"contenido": "Del calendario", "idCalendario": raiz})
+    comment_client.post("/comments/", json={"contenido": "Del subcalendario", "idCalendario": hijo})
+    return raiz, hijo, eventos
+
+
+def _servicio_cascada(jobs, al_responder=None):
+    """CascadeDeleteService cuyas peticiones van a las apps de eventos y comentarios en memoria."""
+    async def registrar(response):
+        if al_responder is not None:
+            await al_responder(response.request.url.path)
+
+    def client_factory(**kwargs):
+        return httpx.AsyncClient(
+            mounts={
+                cascadeService.EVENT_SERVICE_URL: httpx.ASGITransport(app=event_app),
+                cascadeService.COMMENT_SERVICE_URL: httpx.ASGITransport(app=comment_app),
+            },
+            event_hooks={"response": [registrar]},
+            **kwargs,
+        )
+
+    return CascadeDeleteService(calendar_dependencies.CALENDAR_CRUD_INSTANCE, jobs, client_factory)
+
+
+def test_cascade_runs_phases_in_order(test_storage, monkeypatch):
+    monkeypatch.setattr(cascadeService, "CASCADE_PAUSE_SECONDS", 0)
+    raiz, hijo, eventos = _jerarquia_con_contenido()
+    jobs = DeletionJobCRUD(test_storage["calendar"])
+    peticiones = []
+
+    async def al_responder(ruta):
+        job = jobs.collection.find_one({})
+        peticiones.append((job["fase"], ruta))
+
+    async def escenario():
+        servicio = _servicio_cascada(jobs, al_responder)
+        job = await servicio.start(UUID(raiz))
+        await asyncio.gather(*list(servicio._tareas))
+        return job.id
+
+    job_id = asyncio.run(escenario())
+
+    # Eventos (con sus comentarios) antes que los comentarios de los calendarios
+    assert peticiones == [
+        ("eventos", "/events/ids"),
+        ("eventos", "/comments/purge"),
+        ("eventos", "/events/purge"),
+        ("eventos", "/events/ids"),
+        ("comentarios", "/comments/purge"),
+    ]
+    job = client.get(f"/deletion-jobs/{job_id}").json()
+    assert job["estado"] == "completado"
+    assert job["eliminados"] == {"calendarios": 2, "eventos": 2, "comentarios": 4}
+    assert client.get(f"/calendars/{hijo}").status_code == 404
+    assert all(event_client.get(f"/events/{evento}").status_code == 404 for evento in eventos)
+    assert test_storage["comment"].collection("comentarios").count_documents({}) == 0
+
+
+def test_cascade_stops_when_another_process_takes_the_lease(test_storage, monkeypatch):
+    monkeypatch.setattr(cascadeService, "CASCADE_PAUSE_SECONDS", 0)
+    monkeypatch.setattr(cascadeService, "CASCADE_BATCH_SIZE", 1)
+    raiz, hijo, eventos = _jerarquia_con_contenido()
+    jobs = DeletionJobCRUD(test_storage["calendar"])
+    otro = _servicio_cascada(jobs)
+    peticiones = []
+
+    async def al_responder(ruta):
+        peticiones.append(ruta)
+        if ruta == "/comments/purge" and len(peticiones) == 2:
+            # A mitad de los comentarios del primer evento el lease caduca y otro proceso toma el trabajo
+            job = jobs.collection.find_one({})
+            jobs.collection.update_one({"_id": job["_id"]}, {"$set": {"leaseHasta": datetime.utcnow() - timedelta(seconds=1)}})
+            assert await jobs.claim(job["_id"], otro.propietario, 60) is not None
+
+    async def escenario():
+        servicio = _servicio_cascada(jobs, al_responder)
+        job = await servicio.start(UUID(raiz))
+        await asyncio.gather(*list(servicio._tareas))
+        # El primer proceso se detuvo sin pedir otro lote ni borrar el evento
+        assert peticiones == ["/events/ids", "/comments/purge"]
+        assert event_client.get(f"/events/{eventos[0]}").status_code == 200
+        await otro.run(job.id)
+        return job.id
+
+    job_id = asyncio.run(escenario())
+
+    job = client.get(f"/deletion-jobs/{job_id}").json()
+    assert job["estado"] == "completado"
+    assert job["eliminados"] == {"calendarios": 2, "eventos": 2, "comentarios": 4}
+    assert all(event_client.get(f"/events/{evento}").status_code == 404 for evento in eventos)
+    assert test_storage["comment"].collection("comentarios").count_documents({}) == 0
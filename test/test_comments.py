@@ -0,0 +1,115 @@
+import asyncio
+from uuid import UUID
+
+import httpx
+from fastapi.testclient import TestClient
+from servicios.comment_service.app.main import app
+from servicios.comment_service.app import database
+from servicios.comment_service.app.dependencies import get_comment_crud, get_stats_service
+from servicios.comment_service.app.crud.subscription_crud import SubscriptionCRUD
+from servicios.comment_service.app.service.calendarResolver import CalendarResolver
+from servicios.comment_service.app.service.statsService import StatsService
+from servicios.event_service.app.main import app as event_app
+
+client = TestClient(app)
+event_client = TestClient(event_app)
+
+ID_CALENDARIO = "f47ac10b-58cc-4372-a567-0e02b2c3d479"
+ID_OTRO_CALENDARIO = "b47ac10b-58cc-4372-a567-0e02b2c3d471"
+ID_EVENTO = "a47ac10b-58cc-4372-a567-0e02b2c3d470"
+
+
+def _resolutor(test_storage) -> CalendarResolver:
+    """CalendarResolver que consulta a la app de eventos en memoria."""
+    def client_factory(**kwargs):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=event_app), **kwargs)
+
+    return CalendarResolver(get_comment_crud(), SubscriptionCRUD(test_storage["comment"]), client_factory=client_factory)
+
+def _total(calendario):
+    return client.get(f"/stats/calendars/{calendario}/comments").json()["total"]
+
+def test_calendar_stats_include_comments_on_its_events(test_storage):
+    datos_evento = {
+        "idCalendario": ID_CALENDARIO, "titulo": "Evento", "horaComienzo": "2025-11-10T10:00:00",
+        "duracionMinutos": 60, "lugar": "Sala", "organizador": "Test de Pytest",
+    }
+    evento = event_client.post("/events/", json=datos_evento).json()["_id"]
+    resolutor = _resolutor(test_storage)
+
+    # Crear el comentario no consulta al servicio de eventos: su calendario queda pendiente
+    client.post("/comments/", json={"contenido": "Del evento", "idEvento": evento})
+    client.post("/comments/", json={"contenido": "Del calendario", "idCalendario": ID_CALENDARIO})
+    # Con los dos IDs cuenta una sola vez para el calendario
+    ambos = client.post("/comments/", json={"contenido": "De ambos", "idCalendario": ID_CALENDARIO, "idEvento": evento})
+    assert _total(ID_CALENDARIO) == 2
+    assert client.get(f"/stats/events/{evento}/comments").json()["total"] == 2
+
+    asyncio.run(resolutor.sondear())
+    assert _total(ID_CALENDARIO) == 3
+    # Repetir la pasada no cuenta dos veces
+    asyncio.run(resolutor.sondear())
+    assert _total(ID_CALENDARIO) == 3
+
+    # El evento cambia de calendario: el feed de cambios de eventos mueve sus comentarios
+    event_client.put(f"/events/{evento}", json={**datos_evento, "idCalendario": ID_OTRO_CALENDARIO})
+    asyncio.run(resolutor.sondear())
+    assert (_total(ID_CALENDARIO), _total(ID_OTRO_CALENDARIO)) == (2, 2)
+
+    # La reconstrucción vuelve a resolver los calendarios guardados que se quedaron viejos
+    test_storage["comment"].collection(database.COMENTARIOS).update_many(
+        {"idEvento": UUID(evento)}, {"$set": {"idCalendarioEvento": UUID(ID_CALENDARIO)}}
+    )
+    test_storage["comment"].collection(database.ESTADISTICAS).delete_many({})
+    asyncio.run(StatsService(get_stats_service().stats, resolutor).rebuild())
+    assert (_total(ID_CALENDARIO), _total(ID_OTRO_CALENDARIO)) == (2, 2)
+
+    client.delete(f"/comments/{ambos.json()['_id']}")
+    assert (_total(ID_CALENDARIO), _total(ID_OTRO_CALENDARIO)) == (1, 1)
+    assert client.get(f"/stats/events/{evento}/comments").json()["total"] == 1
+
+
+# --- Tests de la paginación keyset de los hilos ---
+
+def recorrer_hilo(ruta, **params):
+    """Pide todas las páginas de un hilo siguiendo 'siguienteCursor'; devuelve los IDs por página."""
+    paginas, cursor = [], None
+    while True:
+        response = client.get(ruta, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        data = response.json()
+        paginas.append([c["_id"] for c in data["comentarios"]])
+        cursor = data["siguienteCursor"]
+        if cursor is None:
+            return paginas
+
+def test_thread_pages_follow_creation_order():
+    ids = [
+        client.post("/comments/", json={
+            "contenido": f"Comentario {i}", "idCalendario": ID_CALENDARIO, "fechaCreacion": f"2025-01-0{i}T10:00:00",
+        }).json()["_id"]
+        for i in range(1, 6)
+    ]
+    ruta = f"/comments/calendar/{ID_CALENDARIO}"
+    assert recorrer_hilo(ruta, limite=2) == [ids[4:2:-1], ids[2:0:-1], ids[:1]]
+    assert recorrer_hilo(ruta, limite=2, orden="asc") == [ids[0:2], ids[2:4], ids[4:]]
+    # Una página exacta no deja un cursor a una página vacía
+    assert recorrer_hilo(ruta, limite=5) == [ids[::-1]]
+
+def test_thread_cursor_breaks_ties_on_equal_creation_dates():
+    ids = [
+        client.post("/comments/", json={
+            "contenido": f"Comentario {i}", "idEvento": ID_EVENTO, "fechaCreacion": "2025-01-01T10:00:00",
+        }).json()["_id"]
+        for i in range(5)
+    ]
+    ruta = f"/comments/event/{ID_EVENTO}"
+    # Con la misma fechaCreacion el orden lo decide _id: ni se repiten ni se saltan comentarios
+    paginas = recorrer_hilo(ruta, limite=2)
+    assert [len(p) for p in paginas] == [2, 2, 1]
+    assert sum(paginas, []) == sorted(ids, key=UUID, reverse=True)
+    assert sum(recorrer_hilo(ruta, limite=2, orden="asc"), []) == sorted(ids, key=UUID)
+
+def test_thread_rejects_tampered_cursor():
+    response = client.get(f"/comments/calendar/{ID_CALENDARIO}", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
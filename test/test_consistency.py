@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from bson import Timestamp
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo import ReadPreference
+
+from servicios.event_service.app import consistency
+from servicios.event_service.app.cache import EntityCache
+from servicios.event_service.app.consistency import ConsistencyMiddleware, codificar, decodificar
+from servicios.event_service.app.storage import ESCRITURA, LECTURA_ID, LISTADO, MASIVA, MongoStorage, read_preference, write_concern
+
+
+class _SesionFalsa:
+    """Lo que registrar_escritura lee de una ClientSession de pymongo."""
+
+    def __init__(self, segundos: int):
+        self.operation_time = Timestamp(segundos, 1)
+        self.cluster_time = {"clusterTime": Timestamp(segundos, 1), "signature": {"keyId": 0}}
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ConsistencyMiddleware)
+
+    @app.post("/escribir")
+    async def escribir():
+        consistency.registrar_escritura(_SesionFalsa(int(time.time())))
+        return {}
+
+    @app.get("/leer")
+    async def leer():
+        marca = consistency.marca_causal()
+        return {"operationTime": marca.operation_time.time if marca else None}
+
+    return app
+
+
+def test_token_round_trip_and_invalid_tokens():
+    ts = Timestamp(1760000000, 7)
+    cluster = {"clusterTime": ts, "signature": {"keyId": 1}}
+    assert decodificar(codificar(ts, cluster)) == (ts, cluster)
+    assert decodificar("no-es-un-token") is None
+    assert decodificar("") is None
+
+
+def test_middleware_returns_token_only_after_writes():
+    client = TestClient(_app())
+
+    assert "x-consistency-token" not in client.get("/leer").headers
+    token = client.post("/escribir").headers["x-consistency-token"]
+
+    # El token reenviado marca las lecturas de la siguiente petición
+    leido = client.get("/leer", headers={"X-Consistency-Token": token}).json()
+    assert leido["operationTime"] == decodificar(token)[0].time
+    # Uno manipulado se ignora: la lectura se hace sin garantía causal
+    assert client.get("/leer", headers={"X-Consistency-Token": "basura"}).json() == {"operationTime": None}
+
+
+def test_collections_use_operation_class_profiles():
+    perfiles = {
+        ESCRITURA: {"write_concern": write_concern("majority")},
+        LECTURA_ID: {"read_preference": read_preference("primary")},
+        LISTADO: {"read_preference": read_preference("secondaryPreferred", 90)},
+        MASIVA: {"write_concern": write_concern("1")},
+    }
+    # MongoClient no conecta hasta la primera operación
+    storage = MongoStorage("mongodb://localhost:1/?serverSelectionTimeoutMS=1", "pruebas", perfiles=perfiles)
+    try:
+        assert storage.collection("eventos").write_concern.document == {"w": "majority"}
+        assert storage.collection("eventos", LECTURA_ID).read_preference == ReadPreference.PRIMARY
+        listado = storage.collection("eventos", LISTADO).read_preference
+        assert listado.mongos_mode == "secondaryPreferred" and listado.max_staleness == 90
+        assert storage.collection("eventos", MASIVA).write_concern.document == {"w": 1}
+        assert storage.collection("eventos", LISTADO) is storage.collection("eventos", LISTADO)
+    finally:
+        storage.close()
+
+
+class _ClienteFalso:
+    """Lo que comprobar_transacciones lee de un MongoClient: la respuesta de 'hello'."""
+
+    def __init__(self, hello: dict):
+        self.admin = self
+        self.hello = hello
+
+    def command(self, nombre: str) -> dict:
+        return self.hello
+
+
+def test_transactions_follow_server_topology(caplog):
+    def comprobar(use_transactions, hello):
+        storage = MongoStorage("mongodb://localhost:1/?serverSelectionTimeoutMS=1", "pruebas", use_transactions)
+        cliente, storage.client = storage.client, _ClienteFalso(hello)
+        try:
+            return storage.comprobar_transacciones()
+        finally:
+            cliente.close()
+
+    # Sin configurar (MONGODB_TRANSACTIONS=auto) se usan solo en un replica set o a través de mongos
+    assert comprobar(None, {"setName": "rs0", "isWritablePrimary": True}) is True
+    assert comprobar(None, {"msg": "isdbgrid"}) is True
+    assert comprobar(None, {"isWritablePrimary": True}) is False
+    assert "SIN transacción" in caplog.text
+    # Exigidas en un servidor standalone: se siguen usando, pero se avisa de que fallarán
+    assert comprobar(True, {"isWritablePrimary": True}) is True
+    assert "todas las escrituras fallarán" in caplog.text
+
+
+def test_recent_write_bypasses_entity_cache():
+    cache = EntityCache(ttl=30)
+    cargas = []
+
+    async def loader():
+        cargas.append(1)
+        return "valor"
+
+    async def escenario():
+        await cache.get_or_load("clave", loader)
+        await cache.get_or_load("clave", loader)
+        # Con un token reciente en la petición se vuelve a leer de la base de datos
+        token = consistency._marca_actual.set(consistency._Marca(Timestamp(int(time.time()), 1)))
+        try:
+            await cache.get_or_load("clave", loader)
+        finally:
+            consistency._marca_actual.reset(token)
+
+    asyncio.run(escenario())
+    assert len(cargas) == 2
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+import logging
+import re
+
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app import db_timing
+from servicios.event_service.app.main import app
+
+client = TestClient(app)
+
+
+def _evento(request_id, command, duration_micros=None):
+    nombre = next(iter(command))
+    evento = SimpleNamespace(request_id=request_id, connection_id=("localhost", 27017), database_name="KalendasDB",
+                             command_name=nombre, command=command)
+    if duration_micros is not None:
+        evento.duration_micros = duration_micros
+    return evento
+
+
+def test_forma_hides_values():
+    filtro = {"titulo": {"$regex": "concierto", "$options": "i"}, "idCalendario": {"$in": ["a", "b", "c"]}, "duracion": 90}
+    assert db_timing.forma(filtro) == {
+        "titulo": {"$regex": "?", "$options": "?"},
+        "idCalendario": {"$in": ["?", "…3"]},
+        "duracion": "?",
+    }
+
+
+def test_resumen_plan():
+    explain = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "evento_calendario"}}}}
+    assert db_timing.resumen_plan(explain) == "IXSCAN(evento_calendario) > FETCH"
+    assert db_timing.resumen_plan({"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}}}) == "COLLSCAN"
+
+
+def test_listener_accumulates_and_logs_slow_queries(caplog):
+    listener = db_timing.DbTimingListener(slow_query_ms=50)
+    rapida = {"find": "eventos", "filter": {"_id": "x"}}
+    lenta = {"find": "eventos", "filter": {"titulo": {"$regex": "secreto"}}, "sort": {"horaComienzo": 1}}
+
+    with caplog.at_level(logging.WARNING, logger=db_timing.__name__):
+        listener.started(_evento(1, rapida))
+        listener.succeeded(_evento(1, rapida, 2000))
+        listener.started(_evento(2, lenta))
+        listener.succeeded(_evento(2, lenta, 80000))
+
+    [fila] = listener.stats()
+    assert fila == {"comando": "find", "coleccion": "eventos", "llamadas": 2, "totalMs": 82.0,
+                    "mediaMs": 41.0, "maxMs": 80.0, "lentas": 1}
+    [registro] = caplog.records
+    assert "find eventos" in registro.getMessage()
+    assert '"$regex": "?"' in registro.getMessage() and "secreto" not in registro.getMessage()
+
+
+def test_server_timing_header():
+    response = client.get("/events/")
+    assert response.status_code == 200
+    assert re.fullmatch(r'db;dur=[\d.]+;desc="\d+ comandos", app;dur=[\d.]+, total;dur=[\d.]+', response.headers["server-timing"])
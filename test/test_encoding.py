@@ -0,0 +1,59 @@
+import msgpack
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app.main import app
+from servicios.event_service.app import encoding
+
+client = TestClient(app)
+
+EVENTO = {
+    "idCalendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+    "titulo": "Concierto",
+    "horaComienzo": "2025-08-15T21:30:00",
+    "duracionMinutos": 90,
+    "lugar": "Parque",
+    "organizador": "Test",
+}
+
+
+def test_msgpack_round_trip_encodes_once(monkeypatch):
+    # El cuerpo de la petición también puede ir en MessagePack
+    creado = client.post(
+        "/events/", content=msgpack.packb(EVENTO), headers={"Content-Type": encoding.MSGPACK, "Accept": encoding.MSGPACK}
+    )
+    assert creado.status_code == 201
+    assert creado.headers["content-type"] == encoding.MSGPACK
+    evento = msgpack.unpackb(creado.content, raw=False)
+    assert evento["titulo"] == "Concierto"
+
+    llamadas = {encoding.JSON: 0, encoding.MSGPACK: 0}
+    for media_type, (codificar, decodificar) in list(encoding.CODIFICADORES.items()):
+        def contar(contenido, media_type=media_type, codificar=codificar):
+            llamadas[media_type] += 1
+            return codificar(contenido)
+        monkeypatch.setitem(encoding.CODIFICADORES, media_type, (contar, decodificar))
+
+    response = client.get(f"/events/{evento['_id']}", headers={"Accept": f"{encoding.MSGPACK}, {encoding.JSON};q=0.5"})
+    assert msgpack.unpackb(response.content, raw=False) == evento
+    assert response.headers["Vary"] == "Accept"
+    # Una sola codificación, directamente en MessagePack
+    assert llamadas == {encoding.JSON: 0, encoding.MSGPACK: 1}
+
+    por_defecto = client.get(f"/events/{evento['_id']}")
+    assert por_defecto.headers["content-type"] == encoding.JSON and por_defecto.json() == evento
+    assert por_defecto.headers["Vary"] == "Accept"
+
+
+def test_response_model_only_documents_the_schema():
+    # FastAPI no vuelve a validar ni serializar la respuesta: el modelo queda en OpenAPI
+    ruta = next(r for r in app.routes if getattr(r, "path", None) == "/events/{id}" and "GET" in r.methods)
+    assert ruta.response_model is None and ruta.response_field is None
+    esquema = app.openapi()["paths"]["/events/{id}"]["get"]["responses"]["200"]["content"][encoding.JSON]["schema"]
+    assert esquema == {"$ref": "#/components/schemas/EventInDB"}
+
+    # El código de la ruta y las cabeceras que fija el endpoint se conservan
+    creado = client.post("/events/", json=EVENTO)
+    assert creado.status_code == 201
+    leido = client.get(f"/events/{creado.json()['_id']}")
+    assert leido.headers["ETag"] and leido.headers["Vary"] == "Accept"
+    assert leido.json() == creado.json()
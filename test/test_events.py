@@ -1,9 +1,30 @@
-from fastapi.testclient import TestClient
-from servicios.calendar_service.app.main import app
+import asyncio
 import json
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+from servicios.event_service.app.main import app
+from servicios.event_service.app import database
+from servicios.event_service.app.cache import OutboxInvalidator, ResultCache
+from servicios.event_service.app.crud.event_crud import EventCRUD
+from servicios.event_service.app.crud.outbox_crud import OutboxCRUD
+from servicios.event_service.app.model.event_model import EventCreate
+from servicios.event_service.app.service.eventService import BBOX_PASO_GRADOS, _rectangulo_geojson
 
 client = TestClient(app)
 
+ID_CALENDARIO = "f47ac10b-58cc-4372-a567-0e02b2c3d479"
+
+def nuevo_evento(titulo, hora_comienzo):
+    return {
+        "idCalendario": ID_CALENDARIO,
+        "titulo": titulo,
+        "horaComienzo": hora_comienzo,
+        "duracionMinutos": 120,
+        "lugar": "Parque Central",
+        "organizador": "Test de Pytest",
+    }
+
 def test_list_events():
     response = client.get("/events/")
     data = response.json()
@@ -12,40 +33,29 @@ def test_list_events():
     assert isinstance(data, list)
 
 def test_create_event():
-    new_event = {
-        "title": "Test Event",
-        "description": "This is a test event",
-        "start_time": "2023-01-01T10:00:00",
-        "end_time": "2023-01-01T12:00:00"
-    }
+    new_event = nuevo_evento("Test Event", "2023-01-01T10:00:00")
     response = client.post("/events/", json=new_event)
     data = response.json()
     print(f"==>> test_create_event: {json.dumps(data, indent=4)}")
     assert response.status_code == 201
-    assert data["id"] is not None
-    assert data["title"] == new_event["title"]
-    assert data["description"] == new_event["description"]
+    assert data["_id"] is not None
+    assert data["titulo"] == new_event["titulo"]
+    assert data["lugar"] == new_event["lugar"]
     
 def test_get_event_by_id():
     # Primero, creamos un evento para tener un ID con el que trabajar
-    new_event = {
-        "title": "Event for GET",
-        "description": "This event is for testing GET by ID",
-        "start_time": "2023-02-01T10:00:00",
-        "end_time": "2023-02-01T12:00:00"
-    }
+    new_event = nuevo_evento("Event for GET", "2023-02-01T10:00:00")
     create_response = client.post("/events/", json=new_event)
     assert create_response.status_code == 201
     created_event = create_response.json()
-    event_id = created_event["id"]
+    event_id = created_event["_id"]
 
     # Ahora, lo solicitamos por su ID
     response = client.get(f"/events/{event_id}")
     assert response.status_code == 200
     data = response.json()
-    assert data["id"] == event_id
-    assert data["title"] == "Event for GET"
-    assert data["description"] == "This event is for testing GET by ID"
+    assert data["_id"] == event_id
+    assert data["titulo"] == "Event for GET"
     
 def test_get_event_not_found():
     # Usamos un UUID que sabemos que no existe
@@ -55,54 +65,34 @@ def test_get_event_not_found():
     
 def test_update_event():
     # Primero, creamos un evento para tener un ID con el que trabajar
-    new_event = {
-        "title": "Event to Update",
-        "description": "This event will be updated",
-        "start_time": "2023-03-01T10:00:00",
-        "end_time": "2023-03-01T12:00:00"
-    }
+    new_event = nuevo_evento("Event to Update", "2023-03-01T10:00:00")
     create_response = client.post("/events/", json=new_event)
     assert create_response.status_code == 201
     created_event = create_response.json()
-    event_id = created_event["id"]
+    event_id = created_event["_id"]
 
     # Ahora, actualizamos el evento
-    updated_event = {
-        "title": "Updated Event Title",
-        "description": "This event has been updated",
-        "start_time": "2023-03-01T11:00:00",
-        "end_time": "2023-03-01T13:00:00"
-    }
+    updated_event = {**new_event, "titulo": "Updated Event Title", "horaComienzo": "2023-03-01T11:00:00", "lugar": "Auditorio"}
     update_response = client.put(f"/events/{event_id}", json=updated_event)
     assert update_response.status_code == 200
     data = update_response.json()
-    assert data["id"] == event_id
-    assert data["title"] == updated_event["title"]
-    assert data["description"] == updated_event["description"]
+    assert data["_id"] == event_id
+    assert data["titulo"] == updated_event["titulo"]
+    assert data["lugar"] == updated_event["lugar"]
     
 def test_update_event_not_found():
     non_existent_id = "12345678-1234-5678-1234-567812345678"
-    updated_event = {
-        "title": "Non-existent Event",
-        "description": "Trying to update a non-existent event",
-        "start_time": "2023-04-01T10:00:00",
-        "end_time": "2023-04-01T12:00:00"
-    }
+    updated_event = nuevo_evento("Non-existent Event", "2023-04-01T10:00:00")
     response = client.put(f"/events/{non_existent_id}", json=updated_event)
     assert response.status_code == 404
     
 def test_delete_event():
     # Primero, creamos un evento para tener un ID con el que trabajar
-    new_event = {
-        "title": "Event to Delete",
-        "description": "This event will be deleted",
-        "start_time": "2023-05-01T10:00:00",
-        "end_time": "2023-05-01T12:00:00"
-    }
+    new_event = nuevo_evento("Event to Delete", "2023-05-01T10:00:00")
     create_response = client.post("/events/", json=new_event)
     assert create_response.status_code == 201
     created_event = create_response.json()
-    event_id = created_event["id"]
+    event_id = created_event["_id"]
 
     # Ahora, eliminamos el evento
     delete_response = client.delete(f"/events/{event_id}")
@@ -116,3 +106,179 @@ def test_delete_event_not_found():
     non_existent_id = "12345678-1234-5678-1234-567812345678"
     response = client.delete(f"/events/{non_existent_id}")
     assert response.status_code == 404
+
+
+# --- Tests de la búsqueda por lotes ---
+
+def test_lookup_keeps_requested_order_and_reports_missing():
+    ids = [client.post("/events/", json=nuevo_evento(f"Lote {i}", "2025-03-01T10:00:00")).json()["_id"] for i in range(3)]
+    inexistente = "12345678-1234-5678-1234-567812345678"
+    pedidos = [ids[2], inexistente, ids[0], ids[2]]
+
+    response = client.get("/events/lookup", params={"ids": pedidos})
+    assert response.status_code == 200
+    data = response.json()
+    # En el orden pedido, sin duplicados y con los que no existen aparte
+    assert [e["_id"] for e in data["eventos"]] == [ids[2], ids[0]]
+    assert data["noEncontrados"] == [inexistente]
+    assert client.post("/events/lookup", json={"ids": pedidos}).json() == data
+
+def test_lookup_rejects_too_many_ids():
+    response = client.post("/events/lookup", json={"ids": [str(uuid4()) for _ in range(101)]})
+    assert response.status_code == 400
+
+# --- Tests de búsqueda geográfica ---
+
+def evento_en(titulo, latitud, longitud):
+    return {**nuevo_evento(titulo, "2025-06-01T10:00:00"), "contenidoAdjunto": {"mapa": {"latitud": latitud, "longitud": longitud}}}
+
+def crear_eventos_geo():
+    client.post("/events/", json=evento_en("Centro", 36.7213, -4.4214))
+    client.post("/events/", json=evento_en("A un kilómetro", 36.7303, -4.4214))
+    client.post("/events/", json=evento_en("Madrid", 40.4168, -3.7038))
+    client.post("/events/", json=nuevo_evento("Sin mapa", "2025-06-01T10:00:00"))
+
+def test_events_near_sorted_by_distance():
+    crear_eventos_geo()
+    response = client.get("/events/near", params={"lat": 36.7213, "lon": -4.4214, "radius": 2000})
+    assert response.status_code == 200
+    data = response.json()
+    assert [e["titulo"] for e in data] == ["Centro", "A un kilómetro"]
+    assert data[0]["distanciaMetros"] < 1
+    assert 900 < data[1]["distanciaMetros"] < 1100
+
+def test_events_in_bbox():
+    crear_eventos_geo()
+    response = client.get("/events/bbox", params={"lat_min": 36.7, "lon_min": -4.45, "lat_max": 36.74, "lon_max": -4.40})
+    assert response.status_code == 200
+    assert sorted(e["titulo"] for e in response.json()) == ["A un kilómetro", "Centro"]
+
+def test_bbox_polygon_follows_parallels():
+    # Los lados norte y sur llevan vértices intermedios: una geodésica entre las esquinas se curvaría hacia el polo
+    anillo = _rectangulo_geojson(40.0, -10.0, 50.0, 10.0)["coordinates"][0]
+    assert anillo[0] == anillo[-1] == [-10.0, 40.0]
+    assert {lat for _, lat in anillo} == {40.0, 50.0}
+    sur = [lon for lon, lat in anillo[:-1] if lat == 40.0]
+    assert sur[0] == -10.0 and sur[-1] == 10.0
+    assert max(b - a for a, b in zip(sur, sur[1:])) <= BBOX_PASO_GRADOS
+
+def test_bbox_rejects_invalid_rectangle():
+    valido = {"lat_min": 36.7, "lon_min": -4.45, "lat_max": 36.74, "lon_max": -4.40}
+    for cambio in ({"lat_min": 37.0}, {"lon_min": -4.0}, {"lon_min": -181}, {"lon_max": 180.5}, {"lat_max": 91}):
+        response = client.get("/events/bbox", params={**valido, **cambio})
+        assert response.status_code == 422, cambio
+
+
+# --- Tests de ETag / If-None-Match / If-Match ---
+
+def test_get_event_revalidates_with_etag():
+    event_id = client.post("/events/", json=nuevo_evento("Con ETag", "2025-05-01T10:00:00")).json()["_id"]
+    response = client.get(f"/events/{event_id}")
+    assert response.headers["ETag"] == '"1"'
+
+    for etiqueta in ('"1"', 'W/"1"', '"7", "1"', "*"):
+        no_modificado = client.get(f"/events/{event_id}", headers={"If-None-Match": etiqueta})
+        assert no_modificado.status_code == 304, etiqueta
+        assert no_modificado.content == b"" and no_modificado.headers["ETag"] == '"1"'
+    assert client.get(f"/events/{event_id}", headers={"If-None-Match": '"0"'}).status_code == 200
+
+def test_update_event_with_if_match():
+    evento = nuevo_evento("Con If-Match", "2025-05-01T10:00:00")
+    event_id = client.post("/events/", json=evento).json()["_id"]
+
+    response = client.put(f"/events/{event_id}", json={**evento, "lugar": "Sala 1"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+    # Otra petición ya escribió la versión 2: la que aún tiene la 1 recibe 412 y no escribe
+    response = client.put(f"/events/{event_id}", json={**evento, "lugar": "Sala 2"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 412
+    assert client.put(f"/events/{event_id}", json=evento, headers={"If-Match": '"no-es-version"'}).status_code == 412
+    assert client.get(f"/events/{event_id}").json()["lugar"] == "Sala 1"
+
+    # '*' solo exige que exista
+    response = client.put(f"/events/{event_id}", json={**evento, "lugar": "Sala 3"}, headers={"If-Match": "*"})
+    assert response.status_code == 200 and response.headers["ETag"] == '"3"'
+    inexistente = "12345678-1234-5678-1234-567812345678"
+    assert client.put(f"/events/{inexistente}", json=evento, headers={"If-Match": "*"}).status_code == 404
+
+def test_if_match_on_document_without_version(test_storage):
+    # Documento escrito antes de que existiera 'version': su ETag es "0"
+    event_id = uuid4()
+    evento = EventCreate.model_validate(nuevo_evento("Antiguo", "2025-05-01T10:00:00")).model_dump(by_alias=True)
+    test_storage["event"].collection(database.EVENTOS).insert_one({**evento, "_id": event_id})
+    assert client.get(f"/events/{event_id}").headers["ETag"] == '"0"'
+
+    cambio = {**nuevo_evento("Antiguo", "2025-05-01T10:00:00"), "lugar": "Sala nueva"}
+    assert client.put(f"/events/{event_id}", json=cambio, headers={"If-Match": '"1"'}).status_code == 412
+    response = client.put(f"/events/{event_id}", json=cambio, headers={"If-Match": '"0"'})
+    assert response.status_code == 200 and response.headers["ETag"] == '"1"'
+    assert client.put(f"/events/{event_id}", json=cambio, headers={"If-Match": '"0"'}).status_code == 412
+
+# --- Tests de la caché de listados ---
+
+def test_list_cache_serves_repeats_until_a_write():
+    client.post("/events/", json=nuevo_evento("Cacheado", "2025-04-01T10:00:00"))
+    filtros = {"organizador": "Test de Pytest"}
+
+    primera = client.get("/events/", params=filtros).json()
+    assert client.get("/events/", params=filtros).json() == primera
+    listados = client.get("/metrics/cache").json()["listadosEventos"]
+    assert (listados["hits"], listados["misses"]) == (1, 1)
+
+    # Una escritura cambia la generación: el siguiente listado ya la incluye
+    client.post("/events/", json=nuevo_evento("Nuevo", "2025-04-02T10:00:00"))
+    assert len(client.get("/events/", params=filtros).json()) == len(primera) + 1
+    listados = client.get("/metrics/cache").json()["listadosEventos"]
+    assert (listados["hits"], listados["misses"]) == (1, 2)
+
+def test_list_cache_skips_results_loaded_during_a_write():
+    cache = ResultCache()
+    cargas = []
+
+    async def carga_con_escritura():
+        cargas.append(1)
+        cache.bump()  # Otra petición escribe mientras se lee el listado
+        return ["obsoleto"]
+
+    async def escenario():
+        await cache.get_or_load({"lugar": "Sala"}, carga_con_escritura, lambda _: 64)
+        await cache.get_or_load({"lugar": "Sala"}, carga_con_escritura, lambda _: 64)
+
+    asyncio.run(escenario())
+    assert len(cargas) == 2 and cache.stats()["entries"] == 0
+
+def test_cache_drops_writes_from_other_workers(test_storage):
+    # Dos workers sobre la misma BD: cada uno con sus propias cachés en proceso
+    almacen = test_storage["event"]
+    worker, otro = EventCRUD(almacen, outbox=OutboxCRUD(almacen)), EventCRUD(almacen)
+    invalidador = OutboxInvalidator(worker.outbox, worker.cache, worker.list_cache)
+
+    async def escenario():
+        await invalidador.sondear()
+        evento = EventCreate.model_validate(nuevo_evento("Uno", "2025-01-01T10:00:00")).model_dump(by_alias=True)
+        creado = await worker.create({**evento, "_id": uuid4()})
+        assert (await worker.get_by_id(creado.id)).titulo == "Uno"
+
+        await otro.update(creado.id, {"titulo": "Dos"})
+        obsoleto = (await worker.get_by_id(creado.id)).titulo
+        await invalidador.sondear()
+        return obsoleto, await worker.get_by_id(creado.id)
+
+    obsoleto, actual = asyncio.run(escenario())
+    assert obsoleto == "Uno"  # Hasta la siguiente lectura de la outbox
+    assert actual.titulo == "Dos" and actual.version == 2
+
+
+def test_cache_is_suspended_while_outbox_is_unreadable(test_storage):
+    worker = EventCRUD(test_storage["event"])
+
+    class OutboxCaida:
+        async def latest_sequence(self):
+            raise ConnectionError("sin MongoDB")
+
+    invalidador = OutboxInvalidator(OutboxCaida(), worker.cache, worker.list_cache)
+    asyncio.run(invalidador.sondear())
+    assert not worker.cache.enabled and not worker.list_cache.enabled
+
+    invalidador.outbox = worker.outbox
+    asyncio.run(invalidador.sondear())
+    assert worker.cache.enabled and worker.list_cache.enabled
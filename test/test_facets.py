@@ -0,0 +1,77 @@
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app.main import app
+from servicios.event_service.app.service import eventService
+from servicios.calendar_service.app.main import app as calendar_app
+
+client = TestClient(app)
+calendarios = TestClient(calendar_app)
+
+EVENTO = {
+    "idCalendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+    "titulo": "Concierto",
+    "horaComienzo": "2025-08-15T21:30:00",
+    "duracionMinutos": 90,
+    "lugar": "Parque",
+    "organizador": "Test",
+}
+
+
+def _eventos():
+    for organizador, lugar in [("Ayto", "Parque"), ("Ayto", "Teatro"), ("Ayto", "Parque"), ("Uma", "Campus")]:
+        client.post("/events/", json={**EVENTO, "organizador": organizador, "lugar": lugar})
+
+
+def test_total_count_is_opt_in():
+    _eventos()
+    sin_conteo = client.get("/events/")
+    assert "x-total-count" not in sin_conteo.headers
+
+    # limite=0: solo el total, sin descargar los eventos
+    response = client.get("/events/", params={"conteo": "exacto", "organizador": "Ayto", "limite": 0})
+    assert response.json() == []
+    assert response.headers["X-Total-Count"] == "3"
+    assert response.headers["X-Total-Count-Exact"] == "true"
+
+    pagina = client.get("/events/", params={"conteo": "exacto", "limite": 2})
+    assert len(pagina.json()) == 2 and pagina.headers["X-Total-Count"] == "4"
+
+
+def test_estimated_count_stops_at_limit(monkeypatch):
+    _eventos()
+    monkeypatch.setattr(eventService, "COUNT_ESTIMATE_LIMIT", 2)
+    acotado = client.get("/events/", params={"conteo": "estimado", "organizador": "Ayto", "limite": 0})
+    assert acotado.headers["X-Total-Count"] == "2"
+    assert acotado.headers["X-Total-Count-Exact"] == "false"
+
+    bajo_el_limite = client.get("/events/", params={"conteo": "estimado", "organizador": "Uma", "limite": 0})
+    assert bajo_el_limite.headers["X-Total-Count"] == "1"
+    assert bajo_el_limite.headers["X-Total-Count-Exact"] == "true"
+
+
+def test_event_facets_follow_filters_and_writes():
+    _eventos()
+    facetas = client.get("/events/facets", params={"campos": ["organizador", "lugar"], "top": 2}).json()
+    assert facetas["total"] == 4
+    assert facetas["facetas"]["organizador"] == [{"valor": "Ayto", "total": 3}, {"valor": "Uma", "total": 1}]
+    assert facetas["facetas"]["lugar"] == [{"valor": "Parque", "total": 2}, {"valor": "Campus", "total": 1}]
+
+    filtradas = client.get("/events/facets", params={"campos": "lugar", "organizador": "Uma"}).json()
+    assert filtradas == {"total": 1, "facetas": {"lugar": [{"valor": "Campus", "total": 1}]}}
+
+    # El resultado cacheado se invalida con la siguiente escritura
+    client.post("/events/", json={**EVENTO, "organizador": "Uma", "lugar": "Campus"})
+    assert client.get("/events/facets", params={"campos": "lugar", "organizador": "Uma"}).json()["total"] == 2
+
+    assert client.get("/events/facets", params={"campos": "titulo"}).status_code == 400
+
+
+def test_calendar_facets_count_each_keyword():
+    for titulo, palabras, publico in [("Uno", ["cultura", "ciudad"], True), ("Dos", ["cultura"], False)]:
+        calendarios.post("/calendars/", json={
+            "titulo": titulo, "organizador": "Ayto", "palabras_clave": palabras, "es_publico": publico,
+        })
+    facetas = calendarios.get("/calendars/facets").json()
+    assert facetas["total"] == 2
+    assert facetas["facetas"]["palabras_clave"] == [{"valor": "cultura", "total": 2}, {"valor": "ciudad", "total": 1}]
+    assert facetas["facetas"]["es_publico"] == [{"valor": False, "total": 1}, {"valor": True, "total": 1}]
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app.main import app
+from servicios.event_service.app import database
+from servicios.event_service.app.dependencies import get_event_crud
+from servicios.event_service.app.model.event_model import EventCreate
+from servicios.event_service.app.service.idempotencyService import huella
+from servicios.comment_service.app.main import app as comment_app
+
+client = TestClient(app)
+
+EVENTO = {
+    "idCalendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+    "titulo": "Concierto",
+    "horaComienzo": "2025-08-15T21:30:00",
+    "duracionMinutos": 90,
+    "lugar": "Parque",
+    "organizador": "Test",
+}
+
+
+def _reserva(test_storage, clave: str, **campos) -> dict:
+    ahora = datetime.utcnow()
+    doc = {
+        "_id": f"events:{clave}", "huella": None, "idRecurso": uuid4(), "estado": "en_curso",
+        "propietario": "otro-proceso", "bloqueoHasta": ahora + timedelta(seconds=30),
+        "creadoEn": ahora, "expiraEn": ahora + timedelta(days=1), **campos,
+    }
+    test_storage["event"].collection(database.IDEMPOTENCIA).insert_one(doc)
+    return doc
+
+
+def test_retry_with_same_key_returns_original_response():
+    primera = client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "reintento-1"})
+    repetida = client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "reintento-1"})
+
+    assert primera.status_code == repetida.status_code == 201
+    assert repetida.json() == primera.json()
+    assert "idempotent-replayed" not in primera.headers
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert len(client.get("/events/").json()) == 1
+
+    # Sin clave (o con otra) cada POST crea un evento nuevo
+    client.post("/events/", json=EVENTO)
+    client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "reintento-2"})
+    assert len(client.get("/events/").json()) == 3
+
+
+def test_key_reused_with_different_body_is_rejected():
+    client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "clave"})
+    response = client.post("/events/", json={**EVENTO, "titulo": "Otro concierto"}, headers={"Idempotency-Key": "clave"})
+    assert response.status_code == 422
+    assert len(client.get("/events/").json()) == 1
+
+
+def test_concurrent_duplicate_gets_conflict(test_storage):
+    _reserva(test_storage, "en-curso", huella=huella(EventCreate.model_validate(EVENTO)))
+    response = client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "en-curso"})
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/events/").json() == []
+
+
+def test_abandoned_reservation_is_taken_over_without_duplicating(test_storage):
+    # El proceso que reservó la clave creó el evento y cayó antes de guardar la respuesta
+    reserva = _reserva(
+        test_storage, "abandonada", huella=huella(EventCreate.model_validate(EVENTO)),
+        bloqueoHasta=datetime.utcnow() - timedelta(seconds=1),
+    )
+    asyncio.run(get_event_crud().create({**EventCreate.model_validate(EVENTO).model_dump(by_alias=True), "_id": reserva["idRecurso"]}))
+
+    response = client.post("/events/", json=EVENTO, headers={"Idempotency-Key": "abandonada"})
+    assert response.status_code == 201
+    assert response.json()["_id"] == str(reserva["idRecurso"])
+    assert len(client.get("/events/").json()) == 1
+
+
+def test_failed_create_releases_key():
+    comentarios = TestClient(comment_app)
+    # Sin idCalendario ni idEvento el servicio responde 400; la clave no queda bloqueada
+    for _ in range(2):
+        response = comentarios.post("/comments/", json={"contenido": "Hola"}, headers={"Idempotency-Key": "fallo"})
+        assert response.status_code == 400
+
+
+def test_comment_retry_ignores_server_filled_fields():
+    comentarios = TestClient(comment_app)
+    cuerpo = {"contenido": "Hola", "idEvento": str(uuid4())}
+    # fechaCreacion la rellena el servidor en cada petición: no forma parte de la huella
+    primera = comentarios.post("/comments/", json=cuerpo, headers={"Idempotency-Key": "k1"})
+    repetida = comentarios.post("/comments/", json=cuerpo, headers={"Idempotency-Key": "k1"})
+    assert primera.status_code == repetida.status_code == 201
+    assert repetida.json() == primera.json()
+    assert repetida.headers["Idempotent-Replayed"] == "true"
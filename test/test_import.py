@@ -0,0 +1,128 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app.main import app
+from servicios.event_service.app import database
+from servicios.event_service.app.dependencies import get_import_service, get_job_queue
+from servicios.event_service.app.model.import_models import ImportCreate
+from servicios.event_service.app.service import importService
+from servicios.event_service.app.service.importReaders import LectorCSV
+
+client = TestClient(app)
+
+CALENDARIO = "f47ac10b-58cc-4372-a567-0e02b2c3d479"
+
+CSV = (
+    "titulo,horaComienzo,duracionMinutos,lugar,organizador,latitud,longitud\n"
+    'Concierto,2025-08-15T21:30:00,90,"Plaza Mayor, 1",Ayto,36.72,-4.42\n'
+    "Taller,2025-08-16T10:00:00,0,Biblioteca,Ayto,,\n"
+    '"Feria\nde verano",2025-08-17T18:00:00,240,Recinto,,,\n'
+)
+
+ICS = (
+    "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    "BEGIN:VEVENT\r\nSUMMARY:Cine de\r\n  verano\r\nDTSTART:20250815T213000Z\r\nDTEND:20250815T233000Z\r\n"
+    "LOCATION:Parque\\, zona norte\r\nORGANIZER;CN=\"Ayto: Cultura\":mailto:cultura@ayto.es\r\nGEO:36.72;-4.42\r\nEND:VEVENT\r\n"
+    "BEGIN:VEVENT\r\nSUMMARY:Mercadillo\r\nDTSTART;VALUE=DATE:20250816\r\nDURATION:PT4H\r\nLOCATION:Plaza\r\n"
+    "ORGANIZER:mailto:mercado@ayto.es\r\nEND:VEVENT\r\n"
+    "END:VCALENDAR\r\n"
+)
+
+
+def _importar(formato: str, contenido: bytes, **defectos) -> dict:
+    job = client.post("/imports/", json={"formato": formato, "idCalendario": CALENDARIO, **defectos}).json()
+    assert job["estado"] == "pendiente"
+    response = client.put(f"/imports/{job['_id']}/contenido", content=contenido)
+    assert response.status_code == 202
+    assert response.json()["estado"] == "en_cola"
+    # La importación la ejecuta la cola, fuera de la petición
+    asyncio.run(get_job_queue().procesar_pendientes())
+    return client.get(f"/imports/{job['_id']}").json()
+
+
+def test_csv_import_reports_rejected_rows():
+    job = _importar("csv", CSV.encode(), organizador="Importación")
+    assert (job["estado"], job["leidas"], job["insertadas"], job["rechazadas"]) == ("completado", 3, 2, 1)
+    assert job["errores"] == [{"linea": 3, "error": "duracionMinutos: Input should be greater than 0"}]
+    assert job["bytes"] == len(CSV.encode())
+
+    eventos = {e["titulo"]: e for e in client.get("/events/").json()}
+    assert eventos["Concierto"]["lugar"] == "Plaza Mayor, 1"
+    assert eventos["Concierto"]["contenidoAdjunto"]["mapa"] == {"latitud": 36.72, "longitud": -4.42}
+    # Los valores por defecto de la importación cubren las celdas vacías
+    assert eventos["Feria\nde verano"]["organizador"] == "Importación"
+    assert eventos["Feria\nde verano"]["idCalendario"] == CALENDARIO
+    assert client.get(f"/imports/{job['_id']}").json() == job
+
+
+def test_ics_import():
+    job = _importar("ics", ICS.encode())
+    assert (job["insertadas"], job["rechazadas"]) == (2, 0)
+    cine, mercadillo = sorted(client.get("/events/").json(), key=lambda e: e["horaComienzo"])
+    assert cine["titulo"] == "Cine de verano" and cine["lugar"] == "Parque, zona norte"
+    assert cine["organizador"] == "Ayto: Cultura" and cine["duracionMinutos"] == 120
+    assert cine["contenidoAdjunto"]["mapa"] == {"latitud": 36.72, "longitud": -4.42}
+    assert mercadillo["horaComienzo"] == "2025-08-16T00:00:00" and mercadillo["duracionMinutos"] == 240
+    assert mercadillo["organizador"] == "mercado@ayto.es"
+
+
+def test_rows_split_across_chunks_and_batches(monkeypatch):
+    monkeypatch.setattr(importService, "IMPORT_BATCH_SIZE", 2)
+    contenido = CSV.encode()
+    service = get_import_service()
+    avances = []
+
+    async def trozos():
+        # Trozos de 7 bytes: cortan filas, campos entre comillas y caracteres UTF-8
+        for inicio in range(0, len(contenido), 7):
+            yield contenido[inicio:inicio + 7]
+
+    async def escenario():
+        job = await service.create_import(ImportCreate(formato="csv", id_calendario=CALENDARIO, organizador="X"))
+        return await service.run(job.id, trozos(), avances.append)
+
+    job = asyncio.run(escenario())
+    assert (job.leidas, job.insertadas, job.rechazadas) == (3, 2, 1)
+    # El lote se vuelca al reunir 2 eventos válidos (tras la fila 3) y otra vez al terminar
+    assert avances[0] == {"bytes": len(contenido), "leidas": 3, "insertadas": 2, "rechazadas": 1}
+    assert avances[-1] == avances[0]
+
+
+def test_import_validates_each_calendar_once(monkeypatch):
+    monkeypatch.setattr(importService, "IMPORT_BATCH_SIZE", 1)
+    otro = "a47ac10b-58cc-4372-a567-0e02b2c3d470"
+    contenido = (
+        "idCalendario,titulo,horaComienzo,duracionMinutos,lugar\n"
+        ",Uno,2025-08-15T10:00:00,60,Sala\n"
+        f"{otro},Dos,2025-08-15T11:00:00,60,Sala\n"
+        ",Tres,2025-08-15T12:00:00,60,Sala\n"
+        f"{otro},Cuatro,2025-08-15T13:00:00,60,Sala\n"
+    )
+    job = _importar("csv", contenido.encode(), organizador="Importación")
+    assert job["insertadas"] == 4
+
+    # Una validación por calendario distinto (no una por evento), aunque lleguen en lotes distintos
+    validaciones = [t for t in client.get("/jobs/").json() if t["tipo"] == "validar_calendario"]
+    assert sorted(t["payload"]["idCalendario"] for t in validaciones) == sorted([CALENDARIO, otro])
+    assert all(t["payload"]["idImportacion"] == job["_id"] for t in validaciones)
+
+def test_csv_reader_line_numbers():
+    lector = LectorCSV()
+    filas = [*lector.alimentar('a,b\n1,"x\ny"\n\n2,z'), *lector.terminar()]
+    assert filas == [(2, {"a": "1", "b": "x\ny"}), (5, {"a": "2", "b": "z"})]
+
+
+def test_import_runs_once_and_rejects_invalid_encoding(test_storage):
+    job = _importar("csv", CSV.encode(), organizador="X")
+    assert client.put(f"/imports/{job['_id']}/contenido", content=CSV.encode()).status_code == 409
+
+    otro = client.post("/imports/", json={"formato": "csv"}).json()
+    assert client.put(f"/imports/{otro['_id']}/contenido", content="título\nCafé".encode("latin-1")).status_code == 202
+    asyncio.run(get_job_queue().procesar_pendientes())
+    assert client.get(f"/imports/{otro['_id']}").json()["estado"] == "fallido"
+    assert [j["estado"] for j in client.get("/imports/").json()] == ["fallido", "completado"]
+    # El trabajo falla sin reintentos y no deja el fichero guardado
+    importar = next(t for t in client.get("/jobs/").json() if t["payload"] == {"idImportacion": otro["_id"]})
+    assert (importar["estado"], importar["error"]) == ("fallido", "El fichero no está en UTF-8")
+    assert test_storage["event"].collection(database.IMPORTACIONES_TROZOS).count_documents({}) == 0
@@ -0,0 +1,113 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from servicios.calendar_service.app.main import app
+from servicios.calendar_service.app import dependencies
+from servicios.calendar_service.app.crud.job_crud import JobCRUD
+from servicios.calendar_service.app.service import jobQueue as job_queue_module
+from servicios.calendar_service.app.service.jobQueue import ErrorPermanente, JobQueue
+
+client = TestClient(app)
+
+
+def _cola(test_storage) -> JobQueue:
+    return JobQueue(JobCRUD(test_storage["calendar"]))
+
+
+def test_create_calendar_only_enqueues_side_effects():
+    padre = client.post("/calendars/", json={"titulo": "Padre", "organizador": "Test"}).json()
+    hijo = client.post("/calendars/", json={"titulo": "Hijo", "organizador": "Test", "idCalendarioPadre": padre["_id"]}).json()
+
+    pendientes = client.get("/jobs/", params={"estado": "pendiente"}).json()
+    assert sorted(job["tipo"] for job in pendientes) == ["notificar", "notificar", "validar_padre"]
+
+    # Los trabajos se ejecutan fuera de la petición
+    assert asyncio.run(dependencies.get_job_queue().procesar_pendientes()) == 3
+    validacion = next(job for job in client.get("/jobs/").json() if job["tipo"] == "validar_padre")
+    assert validacion["estado"] == "completado"
+    assert validacion["resultado"] == {"padreExiste": True}
+    assert validacion["payload"]["idCalendario"] == hijo["_id"]
+    assert client.get(f"/jobs/{validacion['_id']}").status_code == 200
+    assert client.get("/jobs/stats").json()["trabajos"]["notificar"] == {"completado": 2}
+
+
+def test_dedup_key_while_job_is_active(test_storage):
+    cola = _cola(test_storage)
+    resultados = []
+
+    async def manejador(payload):
+        resultados.append(payload["n"])
+        return {"ok": True}
+
+    cola.registrar("tarea", manejador)
+
+    async def escenario():
+        primero = await cola.enqueue("tarea", {"n": 1}, clave_dedup="clave")
+        repetido = await cola.enqueue("tarea", {"n": 2}, clave_dedup="clave")
+        assert repetido.id == primero.id
+        await cola.procesar_pendientes()
+        # Terminado el trabajo, la clave se puede volver a usar
+        nuevo = await cola.enqueue("tarea", {"n": 3}, clave_dedup="clave")
+        assert nuevo.id != primero.id
+        await cola.procesar_pendientes()
+
+    asyncio.run(escenario())
+    assert resultados == [1, 3]
+
+
+def test_retries_with_backoff_then_fails(test_storage, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "JOBS_BACKOFF_BASE_SECONDS", 0)
+    cola = _cola(test_storage)
+    intentos = []
+
+    async def falla(payload):
+        intentos.append(1)
+        raise RuntimeError("servicio caído")
+
+    async def permanente(payload):
+        raise ErrorPermanente("datos no válidos")
+
+    cola.registrar("falla", falla, max_intentos=3)
+    cola.registrar("permanente", permanente)
+
+    async def escenario():
+        job = await cola.enqueue("falla", {})
+        descartado = await cola.enqueue("permanente", {})
+        await cola.procesar_pendientes()
+        return await cola.get_job(job.id), await cola.get_job(descartado.id)
+
+    job, descartado = asyncio.run(escenario())
+    assert len(intentos) == 3
+    assert job.estado == "fallido" and job.intentos == 3
+    assert job.error == "RuntimeError: servicio caído"
+    assert descartado.estado == "fallido" and descartado.intentos == 1
+
+
+def test_workers_respect_concurrency_limit(test_storage, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "JOBS_POLL_SECONDS", 0.01)
+    cola = _cola(test_storage)
+    estado = {"actuales": 0, "maximo": 0}
+
+    async def lenta(payload):
+        estado["actuales"] += 1
+        estado["maximo"] = max(estado["maximo"], estado["actuales"])
+        await asyncio.sleep(0.01)
+        estado["actuales"] -= 1
+
+    cola.registrar("lenta", lenta, max_concurrencia=2)
+
+    async def escenario():
+        cola.iniciar(4)
+        jobs = [await cola.enqueue("lenta", {"n": n}) for n in range(8)]
+        for _ in range(200):
+            estados = [(await cola.get_job(job.id)).estado for job in jobs]
+            if all(e == "completado" for e in estados):
+                break
+            await asyncio.sleep(0.01)
+        await cola.detener()
+        return [await cola.get_job(job.id) for job in jobs]
+
+    jobs = asyncio.run(escenario())
+    assert all(job.estado == "completado" for job in jobs)
+    assert estado["maximo"] == 2
@@ -0,0 +1,56 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from servicios.event_service.app import profiling
+from servicios.event_service.app.router import profiles
+
+TOKEN = "secreto"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILING_DIR", tmp_path)
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware, service_name="event_service", sample_rate=0)
+    app.include_router(profiles.router)
+
+    @app.get("/lento")
+    async def lento():
+        fin = time.perf_counter() + 0.02
+        while time.perf_counter() < fin:
+            pass
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_request_without_token_is_not_profiled(client, tmp_path):
+    response = client.get("/lento", headers={"X-Profile-Token": "otro"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("modo,formato", [("cprofile", "prof"), ("sampling", "folded")])
+def test_profiled_request_can_be_retrieved(client, modo, formato):
+    response = client.get("/lento", headers={"X-Profile-Token": TOKEN, "X-Profile-Mode": modo})
+    servicio, profile_id = response.headers["x-profile-id"].split(":")
+    assert servicio == "event_service"
+
+    perfil = client.get(f"/profiles/{profile_id}", headers={"X-Profile-Token": TOKEN}).json()
+    assert perfil["ruta"] == "/lento" and perfil["status"] == 200 and perfil["modo"] == modo
+    assert "lento" in perfil["resumen"]
+    assert [p["id"] for p in client.get("/profiles/", headers={"X-Profile-Token": TOKEN}).json()] == [profile_id]
+
+    raw = client.get(f"/profiles/{profile_id}/raw", headers={"X-Profile-Token": TOKEN})
+    assert raw.status_code == 200
+    assert f"{profile_id}.{formato}" in raw.headers["content-disposition"]
+
+
+def test_profiles_require_token(client):
+    assert client.get("/profiles/").status_code == 403
+    assert client.get("/profiles/..%2F..%2Fetc", headers={"X-Profile-Token": TOKEN}).status_code == 404
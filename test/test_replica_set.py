@@ -0,0 +1,59 @@
+"""
+Pruebas contra un replica set real (p.ej. el de docker-compose.replica.yml):
+    MONGODB_REPLICA_URI="mongodb://localhost:27017/?directConnection=true" python -m pytest test/test_replica_set.py
+Sin MONGODB_REPLICA_URI se saltan.
+"""
+import os
+import uuid
+
+import pytest
+
+from servicios.event_service.app import consistency, database
+from servicios.event_service.app.storage import LISTADO, MASIVA, MongoStorage, write_concern
+
+REPLICA_URI = os.getenv("MONGODB_REPLICA_URI")
+
+pytestmark = pytest.mark.skipif(not REPLICA_URI, reason="MONGODB_REPLICA_URI no configurada")
+
+
+@pytest.fixture
+def storage():
+    almacen = MongoStorage(REPLICA_URI, f"pruebas_{uuid.uuid4().hex[:8]}", perfiles=database.perfiles_operacion())
+    yield almacen
+    almacen.client.drop_database(almacen.db.name)
+    almacen.close()
+
+
+@pytest.fixture
+def marca():
+    """La marca causal de una petición, como la deja ConsistencyMiddleware."""
+    marca = consistency._Marca()
+    token = consistency._marca_actual.set(marca)
+    yield marca
+    consistency._marca_actual.reset(token)
+
+
+def test_causal_write_then_read_from_list_profile(storage, marca):
+    eventos = storage.collection("eventos")
+    storage.run_in_transaction(lambda session: eventos.insert_one({"_id": 1, "titulo": "Concierto"}, session=session))
+    assert marca.escrita and marca.operation_time is not None
+
+    # La siguiente petición trae el token: la lectura de listado (secondaryPreferred) ve la escritura
+    token = consistency.codificar(marca.operation_time, marca.cluster_time)
+    siguiente = consistency._Marca(*consistency.decodificar(token))
+    contexto = consistency._marca_actual.set(siguiente)
+    try:
+        listado = storage.collection("eventos", LISTADO)
+        documentos = storage.run_causal(lambda session: list(listado.find({}, session=session)))
+    finally:
+        consistency._marca_actual.reset(contexto)
+    assert [doc["_id"] for doc in documentos] == [1]
+
+
+def test_bulk_write_concern(storage):
+    masiva = storage.collection("eventos", MASIVA)
+    assert masiva.write_concern == write_concern(database.MONGO_BULK_WRITE_CONCERN)
+    masiva.insert_many([{"_id": n} for n in range(100)])
+    storage.run_in_transaction(lambda session: masiva.delete_many({}, session=session), MASIVA)
+    assert storage.collection("eventos").count_documents({}) == 0
+
@@ -0,0 +1,64 @@
+from servicios.event_service.app.storage import MemoryStorage
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import pytest
+
+
+def test_find_filters_sort_and_projection():
+    storage = MemoryStorage()
+    eventos = storage.collection("eventos")
+    eventos.insert_many([
+        {"_id": 1, "titulo": "A", "duracion": 30, "etiquetas": ["cultura"]},
+        {"_id": 2, "titulo": "B", "duracion": 90, "etiquetas": ["deporte", "cultura"]},
+        {"_id": 3, "titulo": "C", "duracion": 60},
+    ])
+
+    resultado = list(eventos.find({"duracion": {"$gte": 60}}, {"titulo": 1}).sort("duracion", -1))
+    assert resultado == [{"_id": 2, "titulo": "B"}, {"_id": 3, "titulo": "C"}]
+    assert eventos.count_documents({"etiquetas": "cultura"}) == 2
+    assert eventos.count_documents({"$or": [{"titulo": "A"}, {"etiquetas": {"$exists": False}}]}) == 2
+
+
+def test_documents_are_copied():
+    storage = MemoryStorage()
+    eventos = storage.collection("eventos")
+    documento = {"_id": 1, "etiquetas": ["cultura"]}
+    eventos.insert_one(documento)
+    documento["etiquetas"].append("modificado")
+
+    leido = eventos.find_one({"_id": 1})
+    leido["etiquetas"].append("otro")
+    assert eventos.find_one({"_id": 1})["etiquetas"] == ["cultura"]
+
+
+def test_updates_and_upsert():
+    storage = MemoryStorage()
+    contadores = storage.collection("contadores")
+    for _ in range(3):
+        actual = contadores.find_one_and_update(
+            {"_id": "eventos"}, {"$inc": {"valor": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    assert actual == {"_id": "eventos", "valor": 3}
+    with pytest.raises(DuplicateKeyError):
+        contadores.insert_one({"_id": "eventos"})
+
+
+def test_transaction_rolls_back_on_error():
+    storage = MemoryStorage()
+    eventos = storage.collection("eventos")
+    eventos.insert_one({"_id": 1, "version": 1})
+
+    def escribir(session):
+        eventos.update_one({"_id": 1}, {"$inc": {"version": 1}}, session=session)
+        eventos.insert_one({"_id": 2}, session=session)
+        raise RuntimeError("fallo a mitad de la transacción")
+
+    with pytest.raises(RuntimeError):
+        storage.run_in_transaction(escribir)
+    assert list(eventos.find({})) == [{"_id": 1, "version": 1}]
+
+
+def test_stores_are_isolated():
+    primero, segundo = MemoryStorage(), MemoryStorage()
+    primero.collection("eventos").insert_one({"_id": 1})
+    assert segundo.collection("eventos").count_documents({}) == 0
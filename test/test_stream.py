@@ -0,0 +1,110 @@
+import asyncio
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from servicios.calendar_service.app.main import app
+from servicios.calendar_service.app.crud.calendar_crud import CalendarCRUD
+from servicios.calendar_service.app.crud.outbox_crud import OutboxCRUD
+from servicios.calendar_service.app.service import streamService
+from servicios.calendar_service.app.service.streamService import CalendarStreamHub, COMENTARIOS, EVENTOS
+
+client = TestClient(app)
+
+
+def _hub(test_storage):
+    outbox = OutboxCRUD(test_storage["calendar"])
+    crud = CalendarCRUD(test_storage["calendar"], outbox=outbox)
+    # Sin servicios remotos: los cambios de eventos y comentarios se publican a mano
+    return crud, CalendarStreamHub(crud, outbox, remotos={})
+
+
+async def _calendario(crud, titulo, padre=None):
+    return (await crud.create({"_id": uuid4(), "titulo": titulo, "organizador": "Test", "idCalendarioPadre": padre})).id
+
+
+def _cambio(secuencia, entidad, padres, operacion="crear"):
+    return {
+        "_id": secuencia, "entidad": entidad, "idEntidad": str(uuid4()), "operacion": operacion,
+        "version": 1, "padres": {k: str(v) if v else None for k, v in padres.items()}, "fecha": "2025-01-01T00:00:00",
+    }
+
+
+def _recibidos(conexion):
+    tramas = []
+    while not conexion.cola.empty():
+        tramas.append(conexion.cola.get_nowait().decode())
+    return [linea.split(": ", 1)[1] for trama in tramas for linea in trama.splitlines() if linea.startswith("event:")]
+
+
+def test_stream_delivers_subtree_changes(test_storage):
+    crud, hub = _hub(test_storage)
+
+    async def escenario():
+        raiz = await _calendario(crud, "Raiz")
+        otro = await _calendario(crud, "Otro")
+        conexion = await hub.conectar(raiz)
+
+        hijo = await _calendario(crud, "Hijo", raiz)
+        await _calendario(crud, "Ajeno", otro)
+        await hub.sondear()
+        # El subcalendario nuevo pasa a formar parte del flujo
+        evento = _cambio(1, "evento", {"idCalendario": hijo})
+        await hub.publicar(EVENTOS, evento)
+        await hub.publicar(EVENTOS, _cambio(2, "evento", {"idCalendario": otro}))
+        # Un comentario de evento llega por el calendario del evento
+        await hub.publicar(COMENTARIOS, _cambio(1, "comentario", {"idCalendario": None, "idEvento": evento["idEntidad"]}))
+        await hub.detener()
+        return conexion
+
+    conexion = asyncio.run(escenario())
+    assert _recibidos(conexion) == ["conectado", "calendario.crear", "evento.crear", "comentario.crear"]
+
+
+def test_resume_with_last_event_id(test_storage):
+    crud, hub = _hub(test_storage)
+
+    async def escenario():
+        raiz = await _calendario(crud, "Raiz")
+        primera = await hub.conectar(raiz)
+        ultimo_id = hub.posicion()
+        hub.desconectar(primera)
+
+        await hub.publicar(EVENTOS, _cambio(1, "evento", {"idCalendario": raiz}))
+        await hub.publicar(EVENTOS, _cambio(2, "evento", {"idCalendario": raiz}, "eliminar"))
+        reanudada = await hub.conectar(raiz, streamService.codificar_posicion(ultimo_id))
+        perdida = await hub.conectar(raiz, "no-es-una-posicion")
+        await hub.detener()
+        return reanudada, perdida
+
+    reanudada, perdida = asyncio.run(escenario())
+    assert _recibidos(reanudada) == ["evento.crear", "evento.eliminar", "conectado"]
+    assert _recibidos(perdida) == ["reset", "conectado"]
+
+
+def test_slow_connection_is_closed(test_storage, monkeypatch):
+    monkeypatch.setattr(streamService, "STREAM_QUEUE_SIZE", 3)
+    crud, hub = _hub(test_storage)
+
+    async def escenario():
+        raiz = await _calendario(crud, "Raiz")
+        conexion = await hub.conectar(raiz)
+        for secuencia in range(1, 6):
+            await hub.publicar(EVENTOS, _cambio(secuencia, "evento", {"idCalendario": raiz}))
+        # Entrega lo que tenía encolado y termina: el cliente reconecta con Last-Event-ID
+        tramas = [trama async for trama in hub.transmitir(conexion)]
+        await hub.detener()
+        return conexion, tramas
+
+    conexion, tramas = asyncio.run(escenario())
+    assert conexion.desbordada and len(tramas) == 3
+    assert hub.conexiones == 0
+
+
+def test_stream_of_missing_calendar_and_latest_change_token():
+    assert client.get(f"/calendars/{uuid4()}/stream").status_code == 404
+
+    client.post("/calendars/", json={"titulo": "Uno", "organizador": "Test"})
+    client.post("/calendars/", json={"titulo": "Dos", "organizador": "Test"})
+    pagina = client.get("/changes/", params={"since": "ultimo"}).json()
+    assert pagina == {"cambios": [], "token": "2"}
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from servicios.event_service.app.main import app
+from servicios.event_service.app import database
+from servicios.event_service.app.dependencies import get_event_crud, get_outbox
+from servicios.event_service.app.service.syncService import codificar_token
+from servicios.comment_service.app.main import app as comment_app
+
+client = TestClient(app)
+
+EVENTO = {
+    "idCalendario": "f47ac10b-58cc-4372-a567-0e02b2c3d479",
+    "titulo": "Concierto",
+    "horaComienzo": "2025-08-15T21:30:00",
+    "duracionMinutos": 90,
+    "lugar": "Parque",
+    "organizador": "Test",
+}
+
+
+def _crear(titulo: str) -> str:
+    return client.post("/events/", json={**EVENTO, "titulo": titulo}).json()["_id"]
+
+
+def test_sync_returns_only_changes_since_token():
+    uno, dos, tres = _crear("Uno"), _crear("Dos"), _crear("Tres")
+    inicial = client.get("/sync/").json()
+    assert [e["_id"] for e in inicial["actualizados"]] == [uno, dos, tres]
+    assert inicial["eliminados"] == [] and inicial["hayMas"] is False
+
+    client.put(f"/events/{dos}", json={**EVENTO, "titulo": "Dos (cambiado)"})
+    client.delete(f"/events/{uno}")
+    delta = client.get("/sync/", params={"since": inicial["token"]}).json()
+    assert [e["titulo"] for e in delta["actualizados"]] == ["Dos (cambiado)"]
+    assert [b["_id"] for b in delta["eliminados"]] == [uno]
+
+    # Sin cambios nuevos: página vacía y el mismo punto de la secuencia
+    vacia = client.get("/sync/", params={"since": delta["token"]}).json()
+    assert vacia["actualizados"] == [] and vacia["eliminados"] == []
+    assert vacia["token"].split(".")[0] == delta["token"].split(".")[0]
+
+
+def test_sync_pages_in_sequence_order():
+    ids = [_crear(f"Evento {i}") for i in range(5)]
+    vistos, token, hay_mas = [], "0", True
+    while hay_mas:
+        pagina = client.get("/sync/", params={"since": token, "limite": 2}).json()
+        vistos += [e["_id"] for e in pagina["actualizados"]]
+        token, hay_mas = pagina["token"], pagina["hayMas"]
+    assert vistos == ids
+
+
+def test_expired_or_invalid_token():
+    _crear("Uno")
+    caducado = codificar_token(1, datetime.utcnow() - timedelta(seconds=database.TOMBSTONE_RETENTION_SECONDS + 60))
+    assert client.get("/sync/", params={"since": caducado}).status_code == 410
+    assert client.get("/sync/", params={"since": "abc"}).status_code == 400
+    assert client.get("/sync/", params={"since": "5"}).status_code == 400
+
+
+def test_sync_pages_through_documents_older_than_retention(test_storage):
+    ids = [_crear(f"Antiguo {i}") for i in range(3)]
+    # Escritos hace más que la retención de las bajas: su fecha no debe caducar el token
+    hace_tiempo = datetime.utcnow() - timedelta(seconds=database.TOMBSTONE_RETENTION_SECONDS + 10 * 24 * 3600)
+    test_storage["event"].collection(database.EVENTOS).update_many({}, {"$set": {"fechaActualizacion": hace_tiempo}})
+
+    primera = client.get("/sync/", params={"limite": 2}).json()
+    assert [e["_id"] for e in primera["actualizados"]] == ids[:2] and primera["hayMas"] is True
+    segunda = client.get("/sync/", params={"since": primera["token"], "limite": 2})
+    assert segunda.status_code == 200
+    assert [e["_id"] for e in segunda.json()["actualizados"]] == ids[2:] and segunda.json()["hayMas"] is False
+    assert client.get("/sync/", params={"since": segunda.json()["token"]}).status_code == 200
+
+    # La marca de un cliente que no terminó de paginar no avanza hasta que se pone al día
+    atrasado = codificar_token(0, datetime.utcnow() - timedelta(days=1))
+    pagina = client.get("/sync/", params={"since": atrasado, "limite": 1}).json()
+    assert pagina["hayMas"] is True and pagina["token"].split(".")[1] == atrasado.split(".")[1]
+    pagina = client.get("/sync/", params={"since": pagina["token"], "limite": 10}).json()
+    assert pagina["hayMas"] is False and int(pagina["token"].split(".")[1]) > int(atrasado.split(".")[1])
+
+def test_sync_reads_from_the_primary(monkeypatch):
+    uno = _crear("Uno")
+
+    class SecundarioAtrasado:
+        def find(self, *args, **kwargs):
+            raise AssertionError("GET /sync no debe leer del perfil de listados (secundarios)")
+
+    monkeypatch.setattr(get_event_crud(), "list_collection", SecundarioAtrasado())
+    assert [e["_id"] for e in client.get("/sync/").json()["actualizados"]] == [uno]
+
+def test_legacy_documents_get_a_sequence(test_storage):
+    legado = uuid4()
+    test_storage["event"].collection(database.EVENTOS).insert_one({**EVENTO, "_id": legado, "titulo": "Antiguo"})
+    assert asyncio.run(get_event_crud().backfill_secuencias()) == 1
+    assert asyncio.run(get_event_crud().backfill_secuencias()) == 0
+    assert [e["_id"] for e in client.get("/sync/").json()["actualizados"]] == [str(legado)]
+
+
+def test_comment_tombstones_keep_parents():
+    comentarios = TestClient(comment_app)
+    creado = comentarios.post("/comments/", json={"contenido": "Hola", "idEvento": str(uuid4())}).json()
+    token = comentarios.get("/sync/").json()["token"]
+    comentarios.delete(f"/comments/{creado['_id']}")
+    baja = comentarios.get("/sync/", params={"since": token}).json()["eliminados"][0]
+    assert baja["_id"] == creado["_id"]
+    assert baja["padres"]["idEvento"] == creado["idEvento"]
+
+
+def test_changes_stop_before_a_write_still_in_flight():
+    _crear("Uno")
+    # Un escritor lento reservó la secuencia 2 y aún no ha confirmado; la 3 sí se confirma
+    with get_outbox().reservar() as secuencia:
+        assert secuencia == 2
+        _crear("Tres")
+        assert [c["_id"] for c in client.get("/changes/", params={"since": "0"}).json()["cambios"]] == [1]
+        assert client.get("/changes/", params={"since": "ultimo"}).json()["token"] == "1"
+        assert [e["titulo"] for e in client.get("/sync/").json()["actualizados"]] == ["Uno"]
+    # Al terminar (o descartarse) la escritura lenta, el lector sigue sin saltarse nada
+    assert [c["_id"] for c in client.get("/changes/", params={"since": "1"}).json()["cambios"]] == [3]
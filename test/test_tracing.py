@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from servicios.event_service.app import tracing
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+@pytest.fixture
+def exportados(monkeypatch):
+    spans = []
+    monkeypatch.setattr(tracing, "_exportador", SimpleNamespace(export=spans.append))
+    return spans
+
+
+def _app(sample_rate):
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware, service_name="test", sample_rate=sample_rate)
+
+    @app.get("/items/{id}")
+    def item(id: int):
+        with tracing.start_span("interno"):
+            return tracing.cabeceras_traza()
+
+    return app
+
+
+def test_parse_traceparent():
+    assert tracing.parse_traceparent(TRACEPARENT) == ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True)
+    assert tracing.parse_traceparent(TRACEPARENT[:-2] + "00")[2] is False
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01") is None
+    assert tracing.parse_traceparent("basura") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_sampled_request_exports_server_and_child_spans(exportados):
+    response = TestClient(_app(sample_rate=1.0)).get("/items/1")
+
+    servidor = next(span for span in exportados if span["kind"] == "server")
+    interno = next(span for span in exportados if span["name"] == "interno")
+    assert servidor["name"] == "GET /items/{id}"
+    assert servidor["attributes"]["http.status_code"] == 200
+    assert interno["traceId"] == servidor["traceId"]
+    assert interno["parentSpanId"] == servidor["spanId"]
+    # La cabecera saliente continúa la misma traza
+    trace_id, _, muestreado = tracing.parse_traceparent(response.json()["traceparent"])
+    assert trace_id == servidor["traceId"] and muestreado
+
+
+def test_unsampled_request_only_propagates(exportados):
+    cliente = TestClient(_app(sample_rate=0.0))
+    assert cliente.get("/items/1").json() == {}
+    no_muestreada = TRACEPARENT[:-2] + "00"
+    assert cliente.get("/items/1", headers={"traceparent": no_muestreada}).json() == {"traceparent": no_muestreada}
+    assert exportados == []
+
+
+def test_mongo_listener_creates_child_spans(exportados):
+    listener = tracing.MongoTracingListener()
+    comando = dict(request_id=7, connection_id=("localhost", 27017), database_name="KalendasDB",
+                   command_name="find", command={"find": "eventos", "filter": {}})
+
+    # Sin span activo el comando no se traza
+    listener.started(SimpleNamespace(**comando))
+    listener.succeeded(SimpleNamespace(**comando, duration_micros=1500))
+    assert exportados == []
+
+    padre = tracing.Span("0af7651916cd43dd8448eb211c80319c", None, "GET /events", "server")
+    token = tracing._span_actual.set(padre)
+    try:
+        listener.started(SimpleNamespace(**comando))
+        listener.succeeded(SimpleNamespace(**comando, duration_micros=1500))
+    finally:
+        tracing._span_actual.reset(token)
+
+    [span] = exportados
+    assert span["name"] == "mongo find eventos"
+    assert span["parentSpanId"] == padre.span_id
+    assert span["attributes"]["db.mongodb.collection"] == "eventos"
+    assert span["attributes"]["db.duration_ms"] == 1.5